@@ -5,13 +5,17 @@ Gerencia conexões PostgreSQL e operações de dados
 """
 
 import os
+import sys
 import logging
-import psycopg2
 from psycopg2.extras import RealDictCursor
+from sqlalchemy.engine import URL
 from typing import List, Dict, Optional
 from datetime import datetime
 import json
 
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from backend.database import get_engine
+
 class DatabaseManager:
     """Gerenciador de banco de dados PostgreSQL"""
     
@@ -28,11 +32,17 @@ class DatabaseManager:
             'password': os.getenv('DB_PASSWORD', 'password')
         }
     
+    def database_url(self) -> URL:
+        """URL SQLAlchemy a partir de db_config"""
+        config = self.db_config
+        return URL.create('postgresql+psycopg2', username=config['user'], password=config['password'],
+                          host=config['host'], port=int(config['port']), database=config['database'])
+
     def connect(self) -> bool:
-        """Conecta ao banco de dados"""
+        """Pega uma conexão do pool compartilhado (backend.database)"""
         try:
-            self.connection = psycopg2.connect(**self.db_config)
-            self.connection.autocommit = True
+            self.connection = get_engine(self.database_url().render_as_string(hide_password=False)).raw_connection()
+            self.connection.driver_connection.autocommit = True
             self.logger.info("Conectado ao banco de dados PostgreSQL")
             return True
         except Exception as e:
@@ -40,8 +50,10 @@ class DatabaseManager:
             return False
     
     def disconnect(self):
-        """Desconecta do banco de dados"""
+        """Devolve a conexão ao pool"""
         if self.connection:
+            # As demais conexões do pool trabalham em transação
+            self.connection.driver_connection.autocommit = False
             self.connection.close()
             self.connection = None
             self.logger.info("Desconectado do banco de dados")
@@ -3,6 +3,7 @@ from flask import Flask
 from flask_cors import CORS
 from backend.config import Config
 from backend import db
+from backend.database import pool_stats, track_engine
 
 def create_app():
     """
@@ -25,8 +26,17 @@ def create_app():
     app.register_blueprint(tickers_bp, url_prefix='/api')
     app.register_blueprint(financials_bp, url_prefix='/api')
 
+    # A engine do Flask-SQLAlchemy entra nas métricas de pool e é reaproveitada
+    # por get_engine() dentro do mesmo processo
+    with app.app_context():
+        track_engine(db.engine)
+
     @app.route('/')
     def index():
         return "Backend do Dashboard Financeiro está funcionando!"
 
+    @app.route('/api/health/db-pool')
+    def db_pool():
+        return pool_stats()
+
     return app
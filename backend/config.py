@@ -1,7 +1,7 @@
 # backend/config.py
 import os
 from dotenv import load_dotenv
-from sqlalchemy import create_engine
+from backend.database import engine_options, get_engine
 
 load_dotenv() # Carrega variáveis do arquivo .env
 
@@ -27,18 +27,18 @@ class Config:
         SQLALCHEMY_DATABASE_URI = 'sqlite:///:memory:'
 
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+    # Mesmas opções de pool (DB_POOL_*, DB_PGBOUNCER) da fábrica de backend.database
+    SQLALCHEMY_ENGINE_OPTIONS = engine_options(SQLALCHEMY_DATABASE_URI)
 
 def get_db_engine():
     """
-    Cria e retorna uma engine do SQLAlchemy baseada na URI de configuração.
-    Esta função centraliza a criação da engine para ser usada por scripts
-    e outras partes da aplicação que não estão diretamente no contexto do Flask.
+    Retorna a engine compartilhada (backend.database.get_engine) para a URI de
+    configuração, usada por scripts e partes da aplicação fora do contexto do Flask.
     """
     uri = Config.SQLALCHEMY_DATABASE_URI
     if uri.startswith('sqlite'):
         print("AVISO: get_db_engine está usando o banco de dados em memória (SQLite) de fallback.")
     
-    # pool_pre_ping=True verifica a validade das conexões antes de usá-las,
-    # o que ajuda a lidar com conexões que foram encerradas pelo servidor de BD.
-    return create_engine(uri, pool_pre_ping=True)
+    # pool_pre_ping e o tamanho do pool vêm de backend.database.engine_options
+    return get_engine(uri)
 
@@ -1,35 +1,265 @@
 # backend/database.py
+"""
+Fábrica única de conexões com o banco para a API, os scripts e os workers.
+
+Todos os pontos de entrada usam `get_engine()` em vez de montar a própria
+string de conexão e engine (ou conexão psycopg2 avulsa). Há uma engine por
+URL por processo, com pool configurável por variáveis de ambiente:
+
+    DATABASE_URL           URL completa (tem prioridade sobre DB_*)
+    DB_USER, DB_PASSWORD, DB_HOST, DB_NAME, DB_PORT
+    DB_POOL_SIZE           conexões mantidas no pool (padrão 5)
+    DB_MAX_OVERFLOW        conexões extras sob pico (padrão 10)
+    DB_POOL_RECYCLE        segundos até reciclar uma conexão (padrão 1800)
+    DB_POOL_TIMEOUT        espera máxima por uma conexão livre (padrão 30)
+    DB_PGBOUNCER           1 = atrás do PgBouncer (modo transaction): sem pool
+                           local (NullPool), quem faz o pool é o PgBouncer
+    DB_APPLICATION_NAME    nome que aparece em pg_stat_activity
+    DB_SQLITE_FALLBACK     caminho de um SQLite usado quando não há
+                           credenciais (testes locais); desligado por padrão
+
+Leituras grandes usam cursor no servidor (`iter_rows`, `read_sql_chunks`),
+sem trazer o resultado inteiro para a memória. `pool_stats()` expõe o uso
+dos pools (checkouts, conexões abertas, pico, invalidações).
+"""
+import logging
 import os
-from dotenv import load_dotenv
-from sqlalchemy import create_engine
+import threading
+from contextlib import contextmanager
+from functools import lru_cache
 from pathlib import Path
 
+from dotenv import load_dotenv
+from sqlalchemy import create_engine, event, make_url, text
+from sqlalchemy.pool import NullPool
+
+logger = logging.getLogger(__name__)
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+
+DEFAULT_POOL_SIZE = 5
+DEFAULT_MAX_OVERFLOW = 10
+DEFAULT_POOL_RECYCLE = 1800
+DEFAULT_POOL_TIMEOUT = 30
+DEFAULT_APPLICATION_NAME = 'mercado-brasil'
+DEFAULT_STREAM_BATCH = 10000
+
+_engines = {}
+_engines_lock = threading.Lock()
+_pool_counters = {}
+
+
+@lru_cache(maxsize=1)
+def _load_env():
+    env_path = PROJECT_ROOT / '.env'
+    if env_path.exists():
+        load_dotenv(dotenv_path=env_path)
+
+
+def _env_int(name, default):
+    value = os.getenv(name)
+    return int(value) if value not in (None, '') else default
+
+
+def _env_flag(name):
+    return os.getenv(name, '').lower() in ('1', 'true', 'yes', 'on')
+
+
 def get_database_url():
     """
-    Carrega as credenciais do arquivo .env na raiz do projeto
-    e retorna a string de conexão SQLAlchemy.
+    Retorna a string de conexão SQLAlchemy: DATABASE_URL, ou a URL do
+    PostgreSQL montada com as credenciais DB_* do ambiente/.env da raiz, ou o
+    SQLite de DB_SQLITE_FALLBACK quando não há credenciais.
     """
-    # Garante que estamos procurando o .env a partir da raiz do projeto
-    project_root = Path(__file__).resolve().parent.parent
-    env_path = project_root / '.env'
-    
-    if not env_path.exists():
-        raise FileNotFoundError(f"Arquivo .env não encontrado em {env_path}. Certifique-se de que ele está na raiz do projeto.")
-        
-    load_dotenv(dotenv_path=env_path)
+    _load_env()
+
+    url = os.getenv("DATABASE_URL")
+    if url:
+        return url
 
     user = os.getenv("DB_USER")
     password = os.getenv("DB_PASSWORD")
     host = os.getenv("DB_HOST")
     dbname = os.getenv("DB_NAME", "postgres")
-    
+    port = os.getenv("DB_PORT")
+
     if not all([user, password, host, dbname]):
-        raise ValueError("Uma ou mais variáveis de banco de dados (DB_USER, DB_PASSWORD, DB_HOST, DB_NAME) não estão definidas no arquivo .env.")
-    
+        sqlite_path = os.getenv("DB_SQLITE_FALLBACK")
+        if sqlite_path:
+            if sqlite_path.lower() in ('1', 'true'):
+                sqlite_path = str(PROJECT_ROOT / 'local.db')
+            logger.warning(f"Credenciais do banco ausentes: usando SQLite local em {sqlite_path}")
+            return f"sqlite:///{sqlite_path}"
+        raise ValueError("Uma ou mais variáveis de banco de dados (DB_USER, DB_PASSWORD, DB_HOST, DB_NAME) "
+                         "não estão definidas no ambiente ou no arquivo .env.")
+
     # Retorna a string de conexão padrão para SQLAlchemy com psycopg2
-    return f"postgresql+psycopg2://{user}:{password}@{host}/{dbname}?sslmode=require"
+    address = f"{host}:{port}" if port else host
+    return f"postgresql+psycopg2://{user}:{password}@{address}/{dbname}?sslmode=require"
+
+
+@lru_cache(maxsize=1)
+def _default_url():
+    return get_database_url()
+
+
+def engine_options(url):
+    """Argumentos de create_engine para a URL, a partir das variáveis DB_*"""
+    if url.startswith('sqlite'):
+        # SQLite não tem servidor: o pool padrão do dialeto já serve
+        return {'connect_args': {'check_same_thread': False}}
+
+    options = {
+        'pool_pre_ping': True,
+        'connect_args': {'application_name': os.getenv('DB_APPLICATION_NAME', DEFAULT_APPLICATION_NAME)},
+    }
+    if _env_flag('DB_PGBOUNCER'):
+        # Em modo transaction o PgBouncer troca a conexão do servidor a cada
+        # transação: pool local só duplicaria conexões ociosas
+        options['poolclass'] = NullPool
+        return options
+
+    options.update(
+        pool_size=_env_int('DB_POOL_SIZE', DEFAULT_POOL_SIZE),
+        max_overflow=_env_int('DB_MAX_OVERFLOW', DEFAULT_MAX_OVERFLOW),
+        pool_recycle=_env_int('DB_POOL_RECYCLE', DEFAULT_POOL_RECYCLE),
+        pool_timeout=_env_int('DB_POOL_TIMEOUT', DEFAULT_POOL_TIMEOUT),
+        pool_use_lifo=True,
+    )
+    return options
+
+
+def _instrument(engine, key):
+    counters = _pool_counters[key] = {
+        'connects': 0, 'checkouts': 0, 'checkins': 0, 'invalidations': 0,
+        'checked_out': 0, 'max_checked_out': 0,
+    }
+    lock = threading.Lock()
+
+    @event.listens_for(engine, 'connect')
+    def on_connect(dbapi_connection, connection_record):
+        with lock:
+            counters['connects'] += 1
+
+    @event.listens_for(engine, 'checkout')
+    def on_checkout(dbapi_connection, connection_record, connection_proxy):
+        with lock:
+            counters['checkouts'] += 1
+            counters['checked_out'] += 1
+            counters['max_checked_out'] = max(counters['max_checked_out'], counters['checked_out'])
+
+    @event.listens_for(engine, 'checkin')
+    def on_checkin(dbapi_connection, connection_record):
+        with lock:
+            counters['checkins'] += 1
+            counters['checked_out'] = max(counters['checked_out'] - 1, 0)
+
+    @event.listens_for(engine, 'invalidate')
+    def on_invalidate(dbapi_connection, connection_record, exception):
+        with lock:
+            counters['invalidations'] += 1
+
+
+def _url_key(url):
+    # Mesma URL escrita de jeitos diferentes (str/URL, escapes) -> mesma engine
+    return make_url(url).render_as_string(hide_password=False)
+
+
+def get_engine(url=None, **overrides):
+    """
+    Retorna a engine compartilhada do processo para `url` (padrão:
+    get_database_url()), criada no primeiro uso. `overrides` substituem as
+    opções de create_engine, mas só valem na criação.
+    """
+    url = _url_key(url or _default_url())
+    engine = _engines.get(url)
+    if engine is not None:
+        return engine
+    with _engines_lock:
+        engine = _engines.get(url)
+        if engine is None:
+            options = engine_options(url)
+            options.update(overrides)
+            engine = create_engine(url, **options)
+            _instrument(engine, url)
+            _engines[url] = engine
+    return engine
+
+
+def track_engine(engine):
+    """
+    Registra uma engine criada fora daqui (ex.: a do Flask-SQLAlchemy): ela
+    entra em pool_stats() e passa a ser a devolvida por get_engine(url).
+    """
+    url = _url_key(engine.url)
+    with _engines_lock:
+        if url not in _engines:
+            _instrument(engine, url)
+            _engines[url] = engine
+    return _engines[url]
+
+
+@contextmanager
+def raw_connection(engine=None):
+    """
+    Conexão DBAPI (psycopg2) emprestada do pool, para scripts que usam
+    cursor/COPY direto. O close do final devolve a conexão ao pool.
+    """
+    connection = (engine or get_engine()).raw_connection()
+    try:
+        yield connection
+    finally:
+        connection.close()
+
+
+def iter_rows(sql, params=None, batch_size=DEFAULT_STREAM_BATCH, engine=None):
+    """
+    Itera o resultado de `sql` com cursor no servidor, buscando `batch_size`
+    linhas por vez (no SQLite o resultado é lido em lotes do mesmo jeito).
+    """
+    with (engine or get_engine()).connect() as connection:
+        result = connection.execution_options(stream_results=True, yield_per=batch_size) \
+            .execute(text(sql) if isinstance(sql, str) else sql, params or {})
+        for partition in result.partitions():
+            yield from partition
+
+
+def read_sql_chunks(sql, params=None, chunksize=DEFAULT_STREAM_BATCH, engine=None):
+    """DataFrames de `chunksize` linhas lidos com cursor no servidor"""
+    import pandas as pd
+
+    with (engine or get_engine()).connect() as connection:
+        streaming = connection.execution_options(stream_results=True)
+        yield from pd.read_sql(text(sql) if isinstance(sql, str) else sql, streaming,
+                               params=params, chunksize=chunksize)
+
+
+def pool_stats():
+    """Uso dos pools de todas as engines do processo (senha omitida da URL)"""
+    stats = {}
+    for url, engine in list(_engines.items()):
+        pool = engine.pool
+        entry = dict(_pool_counters.get(url, {}))
+        entry['pool'] = type(pool).__name__
+        for name in ('size', 'checkedin', 'overflow'):
+            method = getattr(pool, name, None)
+            if callable(method):
+                entry[name] = method()
+        stats[engine.url.render_as_string(hide_password=True)] = entry
+    return stats
+
+
+def dispose_engines():
+    """Fecha as conexões de todos os pools (ex.: depois de um fork)"""
+    with _engines_lock:
+        for engine in _engines.values():
+            engine.dispose()
+
 
-# Cria uma única instância da engine para ser importada por outros módulos
-# Isso é mais eficiente do que criar uma nova engine toda vez.
-db_url = get_database_url()
-engine = create_engine(db_url)
+def __getattr__(name):
+    # Compatibilidade com `from backend.database import engine` / `db_url` (PEP 562)
+    if name == 'engine':
+        return get_engine()
+    if name == 'db_url':
+        return _default_url()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
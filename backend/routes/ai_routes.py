@@ -1,25 +1,36 @@
 
 import os
 from flask import Blueprint, request, jsonify, abort
-import google.generativeai as genai
 from dotenv import load_dotenv
 
-# Carrega as variáveis de ambiente do arquivo .env
-load_dotenv()
-
 # Cria o Blueprint para as rotas de IA
 ai_bp = Blueprint('ai_bp', __name__)
 
 # --- Configuração do Gemini ---
-GOOGLE_API_KEY = os.environ.get("GOOGLE_API_KEY")
-if not GOOGLE_API_KEY:
-    # Em um ambiente de produção, seria melhor logar este erro
-    # do que simplesmente imprimir no console.
-    print("ALERTA: A variável de ambiente GOOGLE_API_KEY não foi definida.")
-    # Não vamos lançar um erro aqui para permitir que a app inicie mesmo sem a chave,
-    # mas as rotas de IA falharão.
-else:
-    genai.configure(api_key=GOOGLE_API_KEY)
+_genai = None
+
+def get_genai():
+    """
+    Retorna o módulo do Gemini já configurado, ou None sem GOOGLE_API_KEY.
+    O .env e o SDK (import pesado) só são carregados na primeira requisição.
+    Só o sucesso fica guardado: sem a chave, a próxima requisição tenta de novo.
+    """
+    global _genai
+    if _genai is not None:
+        return _genai
+
+    load_dotenv()
+    api_key = os.environ.get("GOOGLE_API_KEY")
+    if not api_key:
+        # Não lançamos erro para permitir que a app funcione sem a chave,
+        # mas as rotas de IA responderão 503.
+        print("ALERTA: A variável de ambiente GOOGLE_API_KEY não foi definida.")
+        return None
+
+    import google.generativeai as genai
+    genai.configure(api_key=api_key)
+    _genai = genai
+    return genai
 
 # --- Prompt de Sistema para o Analista Financeiro ---
 # Este prompt define a persona e as diretrizes para o modelo de IA.
@@ -42,7 +53,8 @@ def ask_financial_analyst():
     Endpoint para receber perguntas para o assistente de análise financeira.
     Espera um JSON com 'history' (uma lista de mensagens) e 'prompt' (a nova pergunta).
     """
-    if not GOOGLE_API_KEY:
+    genai = get_genai()
+    if genai is None:
         abort(503, "Serviço de IA indisponível: a chave de API não foi configurada no servidor.")
 
     data = request.get_json()
@@ -4,8 +4,8 @@ from utils.rate_limiter import apply_rate_limit
 from utils.validators import validate_cvm_code, validate_pagination, validate_report_type, validate_aggregation
 from services.data_fetcher import data_fetcher
 from services.calculations import financial_calc
-from models import Company, FinancialStatement, db
-from datetime import datetime
+from services.ratio_engine import RATIO_GROUPS
+from models import Company, CompanyRatios, FinancialStatement, db
 
 companies_bp = Blueprint('companies', __name__)
 
@@ -158,42 +158,17 @@ def get_financial_ratios(cvm_code):
     if not valid:
         return jsonify({'error': error}), 400
     
-    # Fetch latest financial statements
-    statements = data_fetcher.fetch_financial_statements(cvm_code, aggregation='CONSOLIDATED')
+    # Snapshot calculado em lote para todas as empresas (leitura pela chave primária)
+    snapshot = db.session.get(CompanyRatios, cvm_code)
     
-    if not statements:
+    if not snapshot:
         return jsonify({'error': 'Financial data not available'}), 404
     
-    # Mock calculation with sample data structure
-    sample_ratios = {
-        'liquidity_ratios': {
-            'current_ratio': 2.15,
-            'quick_ratio': 1.87,
-            'cash_ratio': 0.54
-        },
-        'profitability_ratios': {
-            'gross_margin': 0.45,
-            'operating_margin': 0.32,
-            'net_margin': 0.28,
-            'roe': 0.18,
-            'roa': 0.12,
-            'roic': 0.15
-        },
-        'leverage_ratios': {
-            'debt_to_equity': 0.65,
-            'debt_to_assets': 0.38,
-            'interest_coverage': 8.5
-        },
-        'efficiency_ratios': {
-            'asset_turnover': 0.85,
-            'inventory_turnover': 12.3,
-            'receivables_turnover': 6.7
-        },
-        'reference_date': datetime.now().isoformat(),
-        'cvm_code': cvm_code
-    }
+    ratios = _snapshot_groups(snapshot, ('liquidity_ratios', 'profitability_ratios', 'leverage_ratios', 'efficiency_ratios'))
+    ratios['reference_date'] = snapshot.reference_date.isoformat() if snapshot.reference_date else None
+    ratios['cvm_code'] = cvm_code
     
-    return jsonify(sample_ratios)
+    return jsonify(ratios)
 
 @companies_bp.route('/companies/<int:cvm_code>/market-ratios', methods=['GET'])
 @require_api_key
@@ -204,35 +179,25 @@ def get_market_ratios(cvm_code):
     if not valid:
         return jsonify({'error': error}), 400
     
-    # Mock market ratios data
-    market_ratios = {
-        'valuation_ratios': {
-            'pe_ratio': 12.5,
-            'pb_ratio': 1.8,
-            'ev_ebitda': 8.9,
-            'peg_ratio': 1.2,
-            'price_to_sales': 2.1,
-            'price_to_book': 1.8,
-            'price_to_cash_flow': 9.8
-        },
-        'per_share_data': {
-            'earnings_per_share': 8.45,
-            'book_value_per_share': 47.32,
-            'dividend_per_share': 2.15,
-            'cash_flow_per_share': 12.67
-        },
-        'market_data': {
-            'market_cap': 389450000000,
-            'enterprise_value': 445230000000,
-            'shares_outstanding': 13007000000,
-            'float_shares': 7804200000
-        },
-        'reference_date': datetime.now().isoformat(),
-        'cvm_code': cvm_code
-    }
+    snapshot = db.session.get(CompanyRatios, cvm_code)
+    
+    if not snapshot:
+        return jsonify({'error': 'Market data not available'}), 404
+    
+    market_ratios = _snapshot_groups(snapshot, ('valuation_ratios', 'per_share_data', 'market_data'))
+    market_ratios['price'] = snapshot.price
+    market_ratios['reference_date'] = snapshot.computed_at.isoformat() if snapshot.computed_at else None
+    market_ratios['cvm_code'] = cvm_code
     
     return jsonify(market_ratios)
 
+def _snapshot_groups(snapshot, groups):
+    """Colunas do snapshot agrupadas como em `ratio_engine.RATIO_GROUPS`"""
+    return {
+        group: {name: getattr(snapshot, name) for name in RATIO_GROUPS[group]}
+        for group in groups
+    }
+
 @companies_bp.route('/companies/<int:cvm_code>/dividends', methods=['GET'])
 @require_api_key
 @apply_rate_limit
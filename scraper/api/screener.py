@@ -0,0 +1,98 @@
+from flask import Blueprint, request, jsonify
+from utils.auth import require_api_key
+from utils.rate_limiter import apply_rate_limit
+from utils.validators import validate_pagination
+from services.ratio_engine import RATIO_GROUPS
+from services.screener import screener_cache, parse_predicates, METRICS, DEFAULT_FIELDS, DEFAULT_SORT
+
+screener_bp = Blueprint('screener', __name__)
+
+# Filtros por rótulo aceitos na query string -> coluna do snapshot
+LABEL_FILTERS = {
+    'sector': 'sector',
+    'subsector': 'subsector',
+    'segment': 'segment',
+}
+
+@screener_bp.route('/screener', methods=['GET'])
+@require_api_key
+@apply_rate_limit
+def screen_companies():
+    """
+    Screener de ações sobre o snapshot de indicadores (`company_ratios`)
+    
+    Exemplo: /screener?filter=roe>0.15&filter=net_debt_to_ebitda<2&sort=pe_ratio&order=asc
+    - filter: métrica<op>valor (op: >, >=, <, <=, =, !=); repetível ou separado por vírgula
+    - sector/subsector/segment: igualdade (sem diferenciar maiúsculas)
+    - sort/order: métrica de ordenação (padrão market_cap desc); valores ausentes por último
+    - fields: métricas retornadas (padrão: principais + as usadas nos filtros/ordenação)
+    """
+    valid, error, page, limit = validate_pagination()
+    if not valid:
+        return jsonify({'error': error}), 400
+    
+    try:
+        predicates = parse_predicates(request.args.getlist('filter'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    sort = request.args.get('sort', DEFAULT_SORT).lower()
+    if sort not in METRICS:
+        return jsonify({'error': f"Unknown sort metric '{sort}'"}), 400
+    
+    order = request.args.get('order', 'desc').lower()
+    if order not in ('asc', 'desc'):
+        return jsonify({'error': "Order must be 'asc' or 'desc'"}), 400
+    
+    fields = request.args.get('fields')
+    if fields:
+        fields = [field.strip().lower() for field in fields.split(',') if field.strip()]
+        unknown = [field for field in fields if field not in METRICS]
+        if unknown:
+            return jsonify({'error': f"Unknown fields: {', '.join(unknown)}"}), 400
+    else:
+        fields = list(DEFAULT_FIELDS)
+        for metric in [metric for metric, _, _ in predicates] + [sort]:
+            if metric not in fields:
+                fields.append(metric)
+    
+    labels = {
+        column: request.args[param]
+        for param, column in LABEL_FILTERS.items()
+        if request.args.get(param)
+    }
+    
+    snapshot = screener_cache.snapshot()
+    total, indices = snapshot.screen(
+        predicates, labels, sort=sort, descending=(order == 'desc'),
+        offset=(page - 1) * limit, limit=limit
+    )
+    
+    return jsonify({
+        'results': snapshot.rows(indices, fields),
+        'filters': [{'metric': metric, 'operator': op, 'value': value} for metric, op, value in predicates],
+        'sort': {'metric': sort, 'order': order},
+        'pagination': {
+            'current_page': page,
+            'total_pages': (total + limit - 1) // limit,
+            'total_items': total,
+            'per_page': limit
+        },
+        'universe': len(snapshot)
+    })
+
+@screener_bp.route('/screener/metrics', methods=['GET'])
+@require_api_key
+def list_screener_metrics():
+    """Métricas disponíveis para filtros e ordenação"""
+    snapshot = screener_cache.snapshot()
+    computed_at = snapshot.version[0] if snapshot.version else None
+    
+    return jsonify({
+        'metrics': METRICS,
+        'groups': RATIO_GROUPS,
+        'label_filters': list(LABEL_FILTERS),
+        'operators': ['>', '>=', '<', '<=', '=', '!='],
+        'universe': len(snapshot),
+        'computed_at': computed_at.isoformat() if computed_at else None
+    })
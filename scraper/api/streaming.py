@@ -2,8 +2,12 @@ from flask import Blueprint, request
 from flask_socketio import emit, join_room, leave_room, disconnect
 from utils.auth import validate_api_key
 from services.data_fetcher import data_fetcher
+from services.quote_fanout import QuoteFanout, ENCODINGS, MSGPACK_AVAILABLE, encode_message
+from services.stream_cluster import SubscriptionRegistry, LeaderLease, QuoteRelay, new_worker_id
+from services.stream_outbox import OutboxManager
 from app import socketio, redis_client
 import json
+import os
 import asyncio
 import threading
 import time
@@ -11,9 +15,53 @@ from datetime import datetime
 
 streaming_bp = Blueprint('streaming', __name__)
 
-# Store active connections and their subscriptions
+# Store active connections (this worker) and their subscriptions
 active_connections = {}
-subscription_rooms = {}
+
+UPDATE_INTERVAL = 5  # seconds between quote cycles
+ERROR_BACKOFF = 10
+
+# STREAM_MODE=redis: several workers share the subscription counts through
+# Redis, emits go through the Socket.IO message queue and only the elected
+# leader polls the quotes (once per ticker for the whole cluster)
+STREAM_MODE = os.getenv('STREAM_MODE', 'local')
+CLUSTERED = STREAM_MODE == 'redis'
+WORKER_ID = new_worker_id()
+CLUSTER_TTL = UPDATE_INTERVAL * 3
+
+subscription_registry = SubscriptionRegistry(redis_client if CLUSTERED else None, worker_id=WORKER_ID, ttl=CLUSTER_TTL)
+updater_lease = LeaderLease(redis_client, worker_id=WORKER_ID, ttl=CLUSTER_TTL) if CLUSTERED else None
+
+# Streaming limits per API key plan (connections counted across the cluster)
+STREAM_PLAN_LIMITS = {
+    'basic': {'max_connections': 2, 'max_subscriptions_per_connection': 20},
+    'professional': {'max_connections': 10, 'max_subscriptions_per_connection': 100},
+    'enterprise': {'max_connections': 50, 'max_subscriptions_per_connection': 500},
+}
+DEFAULT_PLAN = 'basic'
+
+# 'full': one quote_update per ticker with the whole quote (original protocol)
+# 'delta': quotes_snapshot on subscribe, then one quotes_batch per tick with field deltas
+QUOTE_PROTOCOLS = ('full', 'delta')
+
+def epoch_ms():
+    return int(time.time() * 1000)
+
+def plan_limits(api_key_obj):
+    return STREAM_PLAN_LIMITS.get(api_key_obj.plan, STREAM_PLAN_LIMITS[DEFAULT_PLAN])
+
+def new_subscription_rooms(connection, rooms):
+    """Rooms not subscribed yet, or None if they would exceed the plan limit"""
+    new_rooms = [room for room in dict.fromkeys(rooms) if room not in connection['subscriptions']]
+    limit = connection['limits']['max_subscriptions_per_connection']
+    if len(connection['subscriptions']) + len(new_rooms) > limit:
+        emit('error', {
+            'message': f'Subscription limit of {limit} per connection exceeded',
+            'limit': limit,
+            'current': len(connection['subscriptions'])
+        })
+        return None
+    return new_rooms
 
 @socketio.on('connect')
 def on_connect():
@@ -21,7 +69,7 @@ def on_connect():
     print(f'Client {request.sid} connected')
     active_connections[request.sid] = {
         'connected_at': datetime.now(),
-        'subscriptions': [],
+        'subscriptions': {},  # room -> subscription
         'authenticated': False
     }
 
@@ -31,9 +79,11 @@ def on_disconnect():
     print(f'Client {request.sid} disconnected')
     
     # Clean up subscriptions
+    subscription_registry.remove_sid(request.sid)
+    quote_outboxes.unregister(request.sid)
     if request.sid in active_connections:
-        for subscription in active_connections[request.sid]['subscriptions']:
-            leave_room(subscription['room'])
+        for room in active_connections[request.sid]['subscriptions']:
+            leave_room(room)
         del active_connections[request.sid]
 
 @socketio.on('authenticate')
@@ -54,13 +104,27 @@ def on_authenticate(data):
     
     # Update connection info
     if request.sid in active_connections:
+        limits = plan_limits(api_key_obj)
+        
+        # Concurrent connections per API key (all workers in cluster mode)
+        key_room = f'apikey_{api_key_obj.id}'
+        subscription_registry.add(key_room, request.sid)
+        if subscription_registry.count(key_room) > limits['max_connections']:
+            subscription_registry.remove(key_room, request.sid)
+            emit('error', {'message': f"Connection limit of {limits['max_connections']} "
+                                      f"reached for plan {api_key_obj.plan}"})
+            disconnect()
+            return
+        
         active_connections[request.sid]['authenticated'] = True
         active_connections[request.sid]['api_key_obj'] = api_key_obj
+        active_connections[request.sid]['limits'] = limits
         
         emit('authenticated', {
             'message': 'Successfully authenticated',
             'plan': api_key_obj.plan,
-            'rate_limit': api_key_obj.requests_per_hour
+            'rate_limit': api_key_obj.requests_per_hour,
+            'limits': limits
         })
     else:
         emit('error', {'message': 'Connection not found'})
@@ -90,25 +154,46 @@ def on_subscribe_quotes(data):
             emit('error', {'message': f'Invalid ticker {ticker}: {error}'})
             return
     
+    connection = active_connections[request.sid]
+    protocol = data.get('protocol', connection.get('quote_protocol', 'full'))
+    encoding = data.get('encoding', connection.get('encoding', 'json'))
+    if protocol not in QUOTE_PROTOCOLS:
+        emit('error', {'message': f'Unsupported protocol {protocol}; use one of {list(QUOTE_PROTOCOLS)}'})
+        return
+    if encoding not in ENCODINGS or (encoding == 'msgpack' and (protocol != 'delta' or not MSGPACK_AVAILABLE)):
+        emit('error', {'message': f'Unsupported encoding {encoding} for protocol {protocol}'})
+        return
+    if connection.get('quote_protocol', protocol) != protocol:
+        emit('error', {'message': 'Protocol cannot change while quote subscriptions are active'})
+        return
+    new_rooms = new_subscription_rooms(connection, [f'quotes_{ticker}' for ticker in valid_tickers])
+    if new_rooms is None:
+        return
+    connection['quote_protocol'] = protocol
+    connection['encoding'] = encoding
+    connection['ack'] = bool(data.get('ack', connection.get('ack', False)))
+    connection.setdefault('quote_tickers', set()).update(valid_tickers)
+    
+    # Outbound queue: one pending update per ticker, coalesced while the client is slow
+    quote_outboxes.register(request.sid, merge=(protocol == 'delta'), ack=connection['ack'])
+    
     # Join rooms for each ticker
-    for ticker in valid_tickers:
-        room_name = f'quotes_{ticker}'
-        join_room(room_name)
+    for room_name in new_rooms:
+        if protocol == 'full':
+            # Delta clients are served per connection, not through the ticker rooms
+            join_room(room_name)
         
         # Track subscription
-        subscription = {
+        connection['subscriptions'][room_name] = {
             'type': 'quotes',
-            'ticker': ticker,
+            'ticker': room_name[len('quotes_'):],
             'room': room_name,
             'subscribed_at': datetime.now()
         }
-        
-        active_connections[request.sid]['subscriptions'].append(subscription)
-        
-        # Add to subscription tracking
-        if room_name not in subscription_rooms:
-            subscription_rooms[room_name] = []
-        subscription_rooms[room_name].append(request.sid)
+    
+    # Subscription counts shared with the updater (cluster-wide in cluster mode)
+    room_prefix = 'quotes_' if protocol == 'full' else 'deltas_'
+    subscription_registry.add_many([f'{room_prefix}{ticker}' for ticker in valid_tickers], request.sid)
     
     emit('subscribed', {
         'type': 'quotes',
@@ -116,14 +201,24 @@ def on_subscribe_quotes(data):
         'message': f'Subscribed to {len(valid_tickers)} tickers'
     })
     
-    # Send initial quote data
+    if protocol == 'delta':
+        # Full snapshot that the following quotes_batch deltas apply to
+        emit('quotes_snapshot', encode_message({
+            'ts': epoch_ms(),
+            'quotes': quote_snapshot(valid_tickers)
+        }, encoding))
+        return
+    
+    # Send initial quote data (one batched fetch for all tickers)
+    initial_quotes = quote_fanout.fetch(valid_tickers)
+    timestamp = datetime.now().isoformat()
     for ticker in valid_tickers:
-        quote_data = data_fetcher.fetch_quote(ticker)
+        quote_data = initial_quotes.get(ticker)
         if quote_data:
             emit('quote_update', {
                 'ticker': ticker,
                 'data': quote_data,
-                'timestamp': datetime.now().isoformat()
+                'timestamp': timestamp
             })
 
 @socketio.on('subscribe_orderbook')
@@ -146,18 +241,19 @@ def on_subscribe_orderbook(data):
     
     ticker = ticker.upper()
     room_name = f'orderbook_{ticker}'
+    connection = active_connections[request.sid]
+    if new_subscription_rooms(connection, [room_name]) is None:
+        return
     join_room(room_name)
     
     # Track subscription
-    subscription = {
+    connection['subscriptions'][room_name] = {
         'type': 'orderbook',
         'ticker': ticker,
         'room': room_name,
         'subscribed_at': datetime.now()
     }
     
-    active_connections[request.sid]['subscriptions'].append(subscription)
-    
     emit('subscribed', {
         'type': 'orderbook',
         'ticker': ticker,
@@ -202,18 +298,19 @@ def on_subscribe_trades(data):
     
     ticker = ticker.upper()
     room_name = f'trades_{ticker}'
+    connection = active_connections[request.sid]
+    if new_subscription_rooms(connection, [room_name]) is None:
+        return
     join_room(room_name)
     
     # Track subscription
-    subscription = {
+    connection['subscriptions'][room_name] = {
         'type': 'trades',
         'ticker': ticker,
         'room': room_name,
         'subscribed_at': datetime.now()
     }
     
-    active_connections[request.sid]['subscriptions'].append(subscription)
-    
     emit('subscribed', {
         'type': 'trades',
         'ticker': ticker,
@@ -234,15 +331,27 @@ def on_unsubscribe(data):
         emit('error', {'message': 'Subscription type is required'})
         return
     
-    # Find and remove subscription
-    subscriptions = active_connections[request.sid]['subscriptions']
-    removed_subscriptions = []
-    
-    for i, subscription in enumerate(subscriptions):
-        if subscription['type'] == subscription_type:
-            if not ticker or subscription['ticker'] == ticker.upper():
-                leave_room(subscription['room'])
-                removed_subscriptions.append(subscriptions.pop(i))
+    # Find and remove subscriptions (collected first, then removed)
+    connection = active_connections[request.sid]
+    removed_subscriptions = [
+        subscription for subscription in connection['subscriptions'].values()
+        if subscription['type'] == subscription_type and (not ticker or subscription['ticker'] == ticker.upper())
+    ]
+    
+    for subscription in removed_subscriptions:
+        del connection['subscriptions'][subscription['room']]
+        leave_room(subscription['room'])
+        if subscription['type'] == 'quotes':
+            subscription_registry.remove(subscription['room'], request.sid)
+            subscription_registry.remove(f"deltas_{subscription['ticker']}", request.sid)
+    
+    removed_tickers = {subscription['ticker'] for subscription in removed_subscriptions if subscription['type'] == 'quotes'}
+    quote_tickers = connection.get('quote_tickers')
+    if quote_tickers and removed_tickers:
+        quote_tickers.difference_update(removed_tickers)
+        quote_outboxes.discard(request.sid, removed_tickers)
+        if not quote_tickers:
+            connection.pop('quote_protocol', None)
     
     if removed_subscriptions:
         emit('unsubscribed', {
@@ -267,46 +376,145 @@ def on_get_connection_info():
     if 'api_key_obj' in connection_info:
         del connection_info['api_key_obj']
     
-    # Convert datetime to string
+    # Convert datetime/set to JSON types (on copies, the stored subscriptions stay untouched)
     connection_info['connected_at'] = connection_info['connected_at'].isoformat()
+    if 'quote_tickers' in connection_info:
+        connection_info['quote_tickers'] = sorted(connection_info['quote_tickers'])
     
-    for subscription in connection_info['subscriptions']:
-        subscription['subscribed_at'] = subscription['subscribed_at'].isoformat()
+    connection_info['subscriptions'] = [
+        {**subscription, 'subscribed_at': subscription['subscribed_at'].isoformat()}
+        for subscription in connection_info['subscriptions'].values()
+    ]
     
     emit('connection_info', connection_info)
 
-# Background task to simulate real-time data updates
+# Background task to push real-time data updates
+def publish_quote_updates(changed_quotes, deltas):
+    """Deliver the quotes that changed since the last cycle
+
+    The quotes also advance the live indicator states served by
+    /technical-analysis/<ticker>/indicators. In cluster mode this runs on
+    the leader only and the cycle is relayed so every worker delivers it to
+    its own clients.
+    """
+    try:
+        data_fetcher.indicator_states.feed_quotes(changed_quotes)
+    except Exception as e:
+        print(f"Error updating indicator states: {e}")
+    
+    if CLUSTERED:
+        quote_relay.publish(changed_quotes, deltas)
+    else:
+        deliver_quote_updates(changed_quotes, deltas)
+
+def deliver_quote_updates(changed_quotes, deltas):
+    """Queue each client's changed tickers (whole quotes for 'full', deltas for 'delta') and flush"""
+    for sid, connection in list(active_connections.items()):
+        tickers = connection.get('quote_tickers')
+        if not tickers:
+            continue
+        source = deltas if connection.get('quote_protocol') == 'delta' else changed_quotes
+        updates = {ticker: source[ticker] for ticker in tickers if ticker in source}
+        if updates:
+            quote_outboxes.offer(sid, updates)
+
+def send_quote_updates(sid, updates, callback=None):
+    """Emit a client's drained outbox: one quotes_batch ('delta') or one quote_update per ticker ('full')"""
+    connection = active_connections.get(sid)
+    if connection is None:
+        return
+    
+    if connection.get('quote_protocol') == 'delta':
+        socketio.emit('quotes_batch', encode_message({'ts': epoch_ms(), 'quotes': dict(updates)}, connection['encoding']),
+                      to=sid, callback=callback)
+        return
+    
+    timestamp = datetime.now().isoformat()
+    last = len(updates) - 1
+    for index, (ticker, quote_data) in enumerate(updates.items()):
+        socketio.emit('quote_update', {
+            'ticker': ticker,
+            'data': quote_data,
+            'timestamp': timestamp
+        }, to=sid, callback=callback if index == last else None)
+
+def transport_backlog(sid):
+    """Packets the Socket.IO server still holds for `sid` (0 when the server does not expose it)"""
+    try:
+        server = socketio.server
+        eio_sid = server.manager.eio_sid_from_sid(sid, '/')
+        return server.eio.sockets[eio_sid].queue.qsize()
+    except Exception:
+        return 0
+
+quote_outboxes = OutboxManager(send_quote_updates, backlog=transport_backlog)
+quote_fanout = QuoteFanout(data_fetcher, publish_quote_updates)
+quote_relay = QuoteRelay(redis_client, on_cycle=deliver_quote_updates) if CLUSTERED else None
+
+def quote_snapshot(tickers):
+    """Full quotes a new delta subscriber starts from (the leader's last sent ones in cluster mode)"""
+    if not CLUSTERED:
+        return quote_fanout.snapshot(tickers)
+    quotes = quote_relay.last_quotes(tickers)
+    missing = [ticker for ticker in tickers if ticker not in quotes]
+    if missing:
+        quotes.update(quote_fanout.fetch(missing))
+    return quotes
+
+def subscribed_quote_tickers():
+    """Tickers with at least one client (full or delta), across the cluster in cluster mode"""
+    return sorted({
+        room.split('_', 1)[1]
+        for room in list(subscription_registry.counts('quotes_')) + list(subscription_registry.counts('deltas_'))
+    })
+
 def background_data_updater():
     """Background task to push real-time data updates"""
     while True:
+        started = time.monotonic()
         try:
-            # Update quotes for all subscribed tickers
-            for room_name, connection_ids in subscription_rooms.items():
-                if room_name.startswith('quotes_') and connection_ids:
-                    ticker = room_name.replace('quotes_', '')
-                    
-                    # Fetch fresh quote data
-                    quote_data = data_fetcher.fetch_quote(ticker)
-                    
-                    if quote_data:
-                        socketio.emit('quote_update', {
-                            'ticker': ticker,
-                            'data': quote_data,
-                            'timestamp': datetime.now().isoformat()
-                        }, room=room_name)
+            if CLUSTERED:
+                subscription_registry.heartbeat()
+                if not updater_lease.acquire():
+                    # Another worker polls the quotes; retry the lease next interval
+                    time.sleep(UPDATE_INTERVAL)
+                    continue
+            
+            tickers = subscribed_quote_tickers()
+            if tickers:
+                quote_fanout.run_cycle(tickers)
+            if CLUSTERED:
+                quote_relay.prune(tickers)
             
-            # Wait before next update
-            time.sleep(5)  # Update every 5 seconds
+            # Keep a steady cadence: the cycle time counts towards the interval
+            time.sleep(max(0.0, UPDATE_INTERVAL - (time.monotonic() - started)))
             
         except Exception as e:
             print(f"Error in background data updater: {e}")
-            time.sleep(10)  # Wait longer on error
+            time.sleep(ERROR_BACKOFF)  # Wait longer on error
 
 # Start background updater thread
-def start_background_updater():
-    """Start the background data updater thread"""
-    updater_thread = threading.Thread(target=background_data_updater, daemon=True)
-    updater_thread.start()
+_updater_thread = None
+_updater_lock = threading.Lock()
+
+def start_background_updater(app=None):
+    """Start the background data updater thread (once per process).
+
+    Called by the server entry point (`app.start`), never at import time, so
+    scripts, shells and tests that import this module do not start polling.
+    `app` gives the thread an app context for the database work it triggers
+    (replaying indicator history for newly streamed tickers).
+    """
+    global _updater_thread
+    with _updater_lock:
+        if _updater_thread is not None:
+            return
+        if app is not None:
+            data_fetcher.init_app(app)
+        if CLUSTERED:
+            quote_relay.start()
+        _updater_thread = threading.Thread(target=background_data_updater, name='quote-updater', daemon=True)
+        _updater_thread.start()
 
 # REST endpoint for WebSocket connection info
 @streaming_bp.route('/stream/info', methods=['GET'])
@@ -328,23 +536,38 @@ def get_streaming_info():
                 'subscribed',
                 'unsubscribed',
                 'quote_update',
+                'quotes_snapshot',
+                'quotes_batch',
                 'orderbook_update',
                 'trade_update',
                 'connection_info',
                 'error'
             ]
         },
+        'quote_protocols': {
+            'full': 'quote_update per ticker with the whole quote (default)',
+            'delta': 'quotes_snapshot on subscribe, then one quotes_batch per tick with '
+                     'changed fields only (removed fields are null)',
+            'subscribe_format': '{"tickers": ["PETR4"], "protocol": "delta", "encoding": "json|msgpack", "ack": false}',
+            'flow_control': 'pending updates are kept per ticker (latest quote / merged delta) while the '
+                            'client is slow; with "ack": true the next message waits for the ack of the previous',
+            'msgpack_available': MSGPACK_AVAILABLE
+        },
         'authentication': {
             'method': 'API key via authenticate event',
             'format': '{"api_key": "your_api_key_here"}'
         },
-        'rate_limits': {
-            'max_connections': 50,
-            'max_subscriptions_per_connection': 100
-        },
+        'limits': STREAM_PLAN_LIMITS,
         'active_connections': len(active_connections),
-        'active_subscriptions': sum(len(conn['subscriptions']) for conn in active_connections.values())
+        'active_subscriptions': sum(len(conn['subscriptions']) for conn in active_connections.values()),
+        'outbound_queues': quote_outboxes.stats(),
+        'quote_updater': quote_fanout.stats(),
+        'cluster': {
+            'mode': STREAM_MODE,
+            'worker': subscription_registry.stats(),
+            'leader': updater_lease.holder() if CLUSTERED else WORKER_ID,
+            'is_leader': updater_lease.is_leader if CLUSTERED else True,
+            'relayed_cycles': quote_relay.received if CLUSTERED else None
+        },
+        'indicator_states': data_fetcher.indicator_states.stats()
     }
-
-# Initialize background updater when module is imported
-start_background_updater()
@@ -55,19 +55,12 @@ def get_technical_indicators(ticker):
         'requested_indicators': requested_indicators
     }
     
-    # Add MACD if requested
-    if 'macd' in requested_indicators:
-        result['indicators']['macd'] = {
-            'macd_line': 0.45,
-            'signal_line': 0.38,
-            'histogram': 0.07,
-            'signal': 'bullish' if 0.45 > 0.38 else 'bearish'
-        }
-    
-    # Add EMA if requested
-    if 'ema' in requested_indicators:
-        result['indicators']['ema_12'] = round(sum(prices[-12:]) / 12, 2) if len(prices) >= 12 else 0
-        result['indicators']['ema_26'] = round(sum(prices[-26:]) / 26, 2) if len(prices) >= 26 else 0
+    # MACD and EMAs come from the indicator engine; drop them if not requested
+    if 'macd' not in requested_indicators:
+        result['indicators'].pop('macd', None)
+    if 'ema' not in requested_indicators:
+        for name in ('ema_12', 'ema_20', 'ema_26', 'ema_50'):
+            result['indicators'].pop(name, None)
     
     return jsonify(result)
 
@@ -5,7 +5,7 @@ from flask import Flask
 from flask_cors import CORS
 
 # CORREÇÃO: Importa as extensões do arquivo central
-from extensions import db
+from extensions import db, socketio, redis_client, REDIS_URL
 
 def create_app():
     app = Flask(__name__)
@@ -19,27 +19,87 @@ def create_app():
     db.init_app(app)
     CORS(app)
     
+    # Com STREAM_MODE=redis, vários workers (gunicorn) compartilham salas e
+    # emits do Socket.IO pela fila de mensagens do Redis
+    message_queue = REDIS_URL if os.environ.get("STREAM_MODE") == "redis" else None
+    socketio.init_app(app, message_queue=message_queue, cors_allowed_origins="*")
+    
     # O contexto da aplicação agora é criado aqui
     with app.app_context():
         # Importa os modelos aqui, depois que o 'db' está inicializado
         import models
-        # Cria as tabelas
-        db.create_all()
 
         # Importa e registra os blueprints aqui
         from api.companies import companies_bp
+        from api.screener import screener_bp
+        from api.streaming import streaming_bp
         # ... (importar outros blueprints)
         
         app.register_blueprint(companies_bp, url_prefix='/api/v1')
+        app.register_blueprint(screener_bp, url_prefix='/api/v1')
+        app.register_blueprint(streaming_bp, url_prefix='/api/v1')
         # ... (registrar outros blueprints)
 
     @app.route('/')
     def index():
         return "API do Scraper está funcionando!"
 
+    @app.cli.command('init-db')
+    def init_db_command():
+        """Cria as tabelas que ainda não existem"""
+        init_db(app)
+        print("Tabelas criadas (se não existiam).")
+
+    # A primeira app criada no processo (wsgi, main, scripts) passa a ser a
+    # padrão: `get_app()`/`from app import app` devolvem ela em vez de montar
+    # uma segunda app, que refaria db.init_app e trocaria o socketio.server
+    global _app
+    if _app is None:
+        _app = app
+    return app
+
+
+def init_db(app):
+    """
+    Cria as tabelas (db.create_all). Não roda mais dentro de create_app:
+    chame no deploy (`flask --app app init-db`) ou nos scripts que precisam.
+    """
+    with app.app_context():
+        import models
+        db.create_all()
     return app
 
-app = create_app()
+
+def start(app):
+    """
+    Inicia as tarefas em segundo plano do servidor (atualizador do streaming).
+    Só o entrypoint do servidor chama isto; importar módulos ou criar a app
+    não inicia threads nem abre conexões.
+    """
+    from api.streaming import start_background_updater
+    from utils.auth import start_last_used_flusher
+    start_background_updater(app)
+    start_last_used_flusher(app)
+    return app
+
+
+_app = None
+
+
+def get_app():
+    """App padrão do processo, criada no primeiro uso"""
+    global _app
+    if _app is None:
+        _app = create_app()
+    return _app
+
+
+def __getattr__(name):
+    # `from app import app` continua funcionando, mas a app só é criada quando
+    # alguém a usa de fato (PEP 562)
+    if name == 'app':
+        return get_app()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 if __name__ == '__main__':
     # Para rodar, use 'flask run' ou, se executar diretamente,
@@ -48,6 +108,5 @@ if __name__ == '__main__':
     # Por agora, o objetivo é criar as tabelas.
     
     # Para garantir que as tabelas sejam criadas ao executar diretamente:
-    with app.app_context():
-        db.create_all()
+    init_db(get_app())
     print("Tabelas criadas (se não existiam). Inicie com 'flask run' ou um servidor WSGI.")
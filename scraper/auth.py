@@ -6,12 +6,15 @@ from flask_jwt_extended import create_access_token, jwt_required, get_jwt_identi
 from functools import wraps
 import redis
 import logging
+from utils.api_key_cache import ApiKeyCache, LastUsedFlusher
 
 logger = logging.getLogger(__name__)
 
 class AuthService:
-    def __init__(self, redis_client):
+    def __init__(self, redis_client, key_cache_ttl=60, last_used_interval=30):
         self.redis = redis_client
+        self.key_cache = ApiKeyCache(redis_client, ttl=key_cache_ttl)
+        self.last_used = LastUsedFlusher(self._flush_last_used, interval=last_used_interval)
         
     def generate_api_key(self, name, plan='basic'):
         """Generate a new API key"""
@@ -58,32 +61,57 @@ class AuthService:
         key_hash = hashlib.sha256(api_key.encode()).hexdigest()
         
         try:
-            from models import APIKey
+            api_key_info = self.key_cache.get_or_load(key_hash, self._load_api_key)
             
-            api_key_record = APIKey.query.filter_by(
-                key_hash=key_hash,
-                is_active=True
-            ).first()
+            if api_key_info:
+                # Update last used timestamp (batched by the flusher, no commit per request)
+                if not self.last_used.running:
+                    self.last_used.start(current_app._get_current_object().app_context)
+                self.last_used.touch(api_key_info['id'])
             
-            if api_key_record:
-                # Update last used timestamp
-                api_key_record.last_used_at = datetime.utcnow()
-                from app import db
-                db.session.commit()
-                
-                return {
-                    'id': api_key_record.id,
-                    'name': api_key_record.name,
-                    'plan': api_key_record.plan,
-                    'rate_limit': api_key_record.rate_limit
-                }
-            
-            return None
+            return api_key_info
             
         except Exception as e:
             logger.error(f"Failed to validate API key: {str(e)}")
             return None
     
+    def _load_api_key(self, key_hash):
+        """Key info for an active key hash (None if unknown/inactive)"""
+        from models import APIKey
+        
+        api_key_record = APIKey.query.filter_by(
+            key_hash=key_hash,
+            is_active=True
+        ).first()
+        
+        if not api_key_record:
+            return None
+        
+        return {
+            'id': api_key_record.id,
+            'name': api_key_record.name,
+            'plan': api_key_record.plan,
+            'rate_limit': api_key_record.rate_limit
+        }
+    
+    def _flush_last_used(self, pending):
+        """Write the collected last_used_at values in one batch (inside the flusher's app context)"""
+        from models import APIKey
+        from app import db
+        
+        try:
+            db.session.bulk_update_mappings(APIKey, [
+                {'id': key_id, 'last_used_at': last_used} for key_id, last_used in pending.items()
+            ])
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+    
+    def revoke_api_key(self, key_hash=None):
+        """Drop a key (or all keys) from the validation cache of every worker"""
+        self.key_cache.revoke(key_hash)
+    
     def check_rate_limit(self, api_key_info):
         """Check if request is within rate limit"""
         if not api_key_info:
@@ -286,6 +314,9 @@ def revoke_api_key(api_key):
         if api_key_record:
             api_key_record.is_active = False
             db.session.commit()
+            # Drop it from the validation cache of every worker, not only after the TTL
+            if auth_service is not None:
+                auth_service.revoke_api_key(key_hash)
             return True
         return False
         
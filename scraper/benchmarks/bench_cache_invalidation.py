@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+"""
+Benchmark da invalidação do CacheService sobre um keyspace grande (fakeredis)
+
+Compara a invalidação antiga (KEYS por padrão + DEL) com a indexada por tag
+(`invalidate_ticker_data` / `invalidate_company_data`) e o cálculo de
+estatísticas com KEYS('*') versus DBSIZE + SCARD dos sets de namespace.
+Confere também que as invalidações por tag removem as chaves com parâmetros
+depois do id (`historical:{ticker}:{period}:{interval}`,
+`statements:{cvm_code}:...`, `dividends:{company_id}:{years}`) e que ids de
+empresa e códigos CVM não se misturam (uma empresa cujo id é o código CVM de
+outra); código de saída 1 se alguma sobrar ou sair a chave errada.
+
+Uso:
+    pip install fakeredis
+    python scraper/benchmarks/bench_cache_invalidation.py --keys 1000000
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+import fakeredis
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from services.cache_service import CacheService, TAG_PREFIX, default_tags
+
+PIPELINE_BATCH = 10000
+
+
+def populate(redis_client, total_keys: int, tickers: int, companies: int):
+    """Preenche o keyspace direto via pipeline, com o mesmo layout de chaves/tags do CacheService"""
+    prefixes = ['quote:live', 'history:1d', 'technical:rsi', 'financial']
+    payload = json.dumps({'price': 38.5, 'volume': 1000})
+    pipeline = redis_client.pipeline(transaction=False)
+    for i in range(total_keys):
+        prefix = prefixes[(i // tickers) % len(prefixes)]
+        if prefix == 'financial':
+            key = f"financial:report{i}:{i % companies}"
+        else:
+            key = f"{prefix}:{i}:T{i % tickers:04d}"
+        pipeline.set(key, payload, ex=3600)
+        for tag in default_tags(key):
+            pipeline.sadd(f"{TAG_PREFIX}{tag}", key)
+        if i % PIPELINE_BATCH == PIPELINE_BATCH - 1:
+            pipeline.execute()
+    pipeline.execute()
+
+
+def old_flush_pattern(redis_client, pattern: str) -> list:
+    """Invalidação anterior: KEYS (varre o keyspace inteiro, bloqueando o Redis) + DEL"""
+    keys = redis_client.keys(pattern)
+    if keys:
+        redis_client.delete(*keys)
+    return keys
+
+
+def check_parameterized_keys(cache):
+    """Chaves com parâmetros depois do id saem com invalidate_ticker_data / invalidate_company_data"""
+    ticker_keys = ['historical:PETR4:1y:1d', 'historical:PETR4:5d:15m', 'quote:PETR4', 'quote:live:PETR4']
+    company_keys = ['statements:9512:DFP:CON', 'dividends:42:5', 'ratios:financial:42', 'ratios:market:42']
+    for key in ticker_keys + company_keys + ['historical:VALE3:1y:1d', 'dividends:7:5']:
+        cache.set(key, {'value': 1}, 3600)
+    cache.invalidate_ticker_data('petr4')
+    cache.invalidate_company_data(42, cvm_code=9512)
+    left = [key for key in ticker_keys + company_keys if cache.get(key) is not None]
+    others = [key for key in ('historical:VALE3:1y:1d', 'dividends:7:5') if cache.get(key) is None]
+    print(f"Invalidação de chaves com parâmetros: {len(ticker_keys + company_keys) - len(left)}/"
+          f"{len(ticker_keys + company_keys)} removidas, {len(others)} de outros ids removidas por engano")
+    return not left and not others
+
+
+def check_id_domains(cache):
+    """company_id 42 de uma empresa e cvm_code 42 de outra: cada invalidação só leva as suas chaves"""
+    by_company_id = ['ratios:financial:42', 'ratios:market:42', 'dividends:42:5', 'financial:dre:42']
+    by_cvm_code = ['company:cvm:42', 'company:42', 'statements:42:DFP:CON']
+    own_cvm_keys = ['company:cvm:9512', 'statements:9512:DFP:CON']  # CVM da empresa de id 42
+    for key in by_company_id + by_cvm_code + own_cvm_keys:
+        cache.set(key, {'value': 1}, 3600)
+
+    cache.invalidate_company_data(42, cvm_code=9512)
+    wrong = [key for key in by_cvm_code if cache.get(key) is None]
+    left = [key for key in by_company_id + own_cvm_keys if cache.get(key) is not None]
+    cache.invalidate_cvm_data(42)
+    left += [key for key in by_cvm_code if cache.get(key) is not None]
+    print(f"Id de empresa x código CVM: {len(wrong)} chaves da outra empresa removidas por engano, "
+          f"{len(left)} chaves que deviam sair ficaram")
+    return not wrong and not left
+
+
+def timed(func, *args):
+    started = time.perf_counter()
+    result = func(*args)
+    return result, (time.perf_counter() - started) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark da invalidação do cache")
+    parser.add_argument('--keys', type=int, default=1_000_000, help="Tamanho do keyspace")
+    parser.add_argument('--tickers', type=int, default=2000)
+    parser.add_argument('--companies', type=int, default=1000)
+    args = parser.parse_args()
+
+    redis_client = fakeredis.FakeRedis()
+    cache = CacheService(redis_client)
+
+    started = time.perf_counter()
+    populate(redis_client, args.keys, args.tickers, args.companies)
+    print(f"Keyspace: {redis_client.dbsize()} chaves (incluindo sets de tag) em {time.perf_counter() - started:.0f} s")
+
+    ticker = 'T0007'
+    patterns = [f"quote:*:{ticker}", f"technical:*:{ticker}", f"history:*:{ticker}"]
+    old_keys, old_ms = timed(lambda: [k for p in patterns for k in old_flush_pattern(redis_client, p)])
+    print(f"Ticker (KEYS):       {len(old_keys)} chaves em {old_ms:.0f} ms")
+
+    # Repõe as mesmas chaves do ticker para medir o caminho novo sobre o mesmo volume
+    for key in old_keys:
+        cache.set(key.decode(), {'price': 1.0}, 3600)
+    new_deleted, new_ms = timed(cache.invalidate_ticker_data, ticker)
+    print(f"Ticker (tag):        {new_deleted} chaves em {new_ms:.2f} ms ({old_ms / max(new_ms, 1e-6):.0f}x)")
+
+    company_id = 42
+    new_deleted, new_ms = timed(cache.invalidate_company_data, company_id)
+    print(f"Empresa (tag):       {new_deleted} chaves em {new_ms:.2f} ms")
+
+    _, old_stats_ms = timed(lambda: len(redis_client.keys('*')))
+    stats, new_stats_ms = timed(cache.get_cache_stats)
+    print(f"Stats KEYS('*'):     {old_stats_ms:.0f} ms")
+    print(f"Stats DBSIZE/SCARD:  {new_stats_ms:.2f} ms -> {stats.get('namespace_keys')}")
+
+    ok = check_parameterized_keys(CacheService(fakeredis.FakeRedis()))
+    ok = check_id_domains(CacheService(fakeredis.FakeRedis())) and ok
+    if not ok:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
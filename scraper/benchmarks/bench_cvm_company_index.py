@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+Benchmark da extração por empresa do CVMAdvancedScraper
+
+Compara, sobre um ano sintético com o tamanho aproximado de um DFP real:
+- caminho antigo: a cada empresa o ano inteiro é reprocessado (parse dos CSVs
+  + `_filter_company_data`), como fazia `batch_extract_top_companies`;
+- caminho novo: o ano é carregado e indexado por CD_CVM uma vez
+  (`get_company_index`) e cada empresa é servida pelo índice.
+
+Uso:
+    python scraper/benchmarks/bench_cvm_company_index.py --companies 800 --sample 5
+"""
+import argparse
+import io
+import logging
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from services.cvm_parquet_store import read_cvm_csv
+from services.scraper_cvm_advanced import CVMAdvancedScraper
+
+STATEMENTS = ['BPA_con', 'BPP_con', 'DRE_con', 'DFC_MI_con', 'DVA_con']
+ACCOUNTS_PER_STATEMENT = 60
+
+
+def build_synthetic_year(companies: int, year: int) -> dict:
+    """CSVs (bytes latin-1) no formato dos arquivos de DFP, um por demonstração"""
+    rng = np.random.default_rng(42)
+    csvs = {}
+    for statement in STATEMENTS:
+        codes = np.repeat(np.arange(1000, 1000 + companies), ACCOUNTS_PER_STATEMENT)
+        accounts = np.tile([f"{i // 10 + 1}.{i % 10:02d}" for i in range(ACCOUNTS_PER_STATEMENT)], companies)
+        df = pd.DataFrame({
+            'CNPJ_CIA': [f"00.000.{c:03d}/0001-00" for c in codes % 1000],
+            'DT_REFER': f"{year}-12-31",
+            'VERSAO': 1,
+            'DENOM_CIA': [f"COMPANHIA {c}" for c in codes],
+            'CD_CVM': codes,
+            'GRUPO_DFP': 'DF Consolidado - Balanço Patrimonial Ativo',
+            'MOEDA': 'REAL',
+            'ESCALA_MOEDA': 'MIL',
+            'ORDEM_EXERC': 'ÚLTIMO',
+            'DT_FIM_EXERC': f"{year}-12-31",
+            'CD_CONTA': accounts,
+            'DS_CONTA': [f"Conta {a}" for a in accounts],
+            'VL_CONTA': rng.normal(1e6, 1e5, len(codes)).round(2),
+            'ST_CONTA_FIXA': 'S',
+        })
+        csvs[f"dfp_cia_aberta_{statement}_{year}"] = df.to_csv(sep=';', index=False).encode('latin-1')
+    return csvs
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark do índice por empresa da CVM")
+    parser.add_argument('--companies', type=int, default=800, help="Empresas no ano sintético")
+    parser.add_argument('--sample', type=int, default=5, help="Empresas medidas no caminho antigo (lento)")
+    parser.add_argument('--year', type=int, default=2023)
+    args = parser.parse_args()
+
+    logging.disable(logging.INFO)
+    csvs = build_synthetic_year(args.companies, args.year)
+    total_mb = sum(len(data) for data in csvs.values()) / (1024 * 1024)
+    print(f"Ano sintético: {args.companies} empresas, {len(csvs)} arquivos, {total_mb:.1f} MB de CSV")
+
+    scraper = CVMAdvancedScraper()
+    scraper.parquet_store = None
+    # Substitui o download pelo parse dos CSVs em memória (o custo medido é o de parse + filtro)
+    scraper.download_and_extract_dataset = lambda dataset_code, year: (
+        {name: read_cvm_csv(io.BytesIO(data)) for name, data in csvs.items()} if dataset_code == 'dfp' else {}
+    )
+    codes = [str(1000 + i) for i in range(args.companies)]
+
+    # Caminho antigo: reprocessa o ano para cada empresa
+    started = time.perf_counter()
+    for cvm_code in codes[:args.sample]:
+        datasets = scraper.download_and_extract_dataset('dfp', args.year)
+        scraper._filter_company_data(datasets, cvm_code)
+    old_per_company = (time.perf_counter() - started) / args.sample
+
+    # Caminho novo: carrega e indexa uma vez, serve todas as empresas
+    started = time.perf_counter()
+    index = scraper.get_company_index('dfp', args.year)
+    build_time = time.perf_counter() - started
+    started = time.perf_counter()
+    rows = sum(len(df) for cvm_code in codes for df in index.get(cvm_code).values())
+    serve_time = time.perf_counter() - started
+    new_per_company = (build_time + serve_time) / len(codes)
+
+    print(f"Antigo: {old_per_company * 1000:.0f} ms/empresa (amostra de {args.sample})")
+    print(f"Novo:   índice em {build_time * 1000:.0f} ms + {serve_time / len(codes) * 1000:.2f} ms/empresa "
+          f"({rows} linhas servidas) = {new_per_company * 1000:.2f} ms/empresa amortizado")
+    print(f"Lote de {len(codes)} empresas: {old_per_company * len(codes):.1f} s -> "
+          f"{build_time + serve_time:.2f} s ({old_per_company / new_per_company:.0f}x)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""
+Benchmark dos estados incrementais de indicadores técnicos
+
+Simula ticks intradiários sobre um histórico diário e compara, por tick:
+- caminho antigo: recalcular os indicadores do ticker sobre o histórico
+  inteiro (`indicator_engine.compute_indicators` com o histórico + a barra
+  do dia);
+- caminho novo: `IndicatorState.update` + `values()` (O(1) por tick).
+
+Confere que os dois chegam aos mesmos valores e mostra o tamanho do
+checkpoint JSON gravado no Redis por ticker. Também alimenta o
+IndicatorStateStore a partir de uma thread sem app context (como a
+quote-updater) com um loader que usa db.session, e falha (código de saída 1)
+se o histórico não carregar.
+
+Uso:
+    python scraper/benchmarks/bench_indicator_state.py --tickers 100 --history 400 --ticks 20
+"""
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+from datetime import date, timedelta
+
+import numpy as np
+from flask import Flask
+from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import text
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from services import indicator_engine
+from services.indicator_state import IndicatorState, IndicatorStateStore
+
+
+def check_loader_context(history):
+    """feed_quotes numa thread sem app context, com o contexto dado por set_loader_context"""
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite://'
+    db = SQLAlchemy(app)
+    dates = [date(2024, 1, 1) + timedelta(days=i) for i in range(history)]
+    closes = [20.0 + i * 0.01 for i in range(history)]
+
+    def loader(tickers):
+        # Como TechnicalIndicatorsETL.build_states: precisa de db.session (app context)
+        db.session.execute(text("SELECT 1"))
+        return {ticker: IndicatorState.from_bars(dates, closes) for ticker in tickers}
+
+    quote = {'regularMarketPrice': 21.0, 'regularMarketTime': (dates[-1] + timedelta(days=1)).isoformat()}
+    results = {}
+    for label, context in (('sem contexto', None), ('com app.app_context', app.app_context)):
+        store = IndicatorStateStore(history_loader=loader)
+        store.set_loader_context(context)
+        thread = threading.Thread(target=lambda: store.feed_quotes({'PETR4': quote}))
+        thread.start()
+        thread.join()
+        values = store.values('PETR4')
+        results[label] = values is not None and values['indicators'].get('sma_20') is not None
+        print(f"Histórico carregado na thread ({label}): {'sim' if results[label] else 'não'}")
+    return results['com app.app_context']
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark dos estados incrementais de indicadores")
+    parser.add_argument('--tickers', type=int, default=100)
+    parser.add_argument('--history', type=int, default=400, help="Pregões de histórico por ticker")
+    parser.add_argument('--ticks', type=int, default=20, help="Ticks intradiários por ticker")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(42)
+    close = 20 * np.exp(np.cumsum(rng.normal(0, 0.02, (args.tickers, args.history)), axis=1))
+    high, low = close * 1.01, close * 0.99
+    volume = rng.integers(1_000, 1_000_000, close.shape).astype(float)
+    dates = [date(2024, 1, 1) + timedelta(days=i) for i in range(args.history)]
+    today = dates[-1] + timedelta(days=1)
+    ticks = close[:, -1:] * np.exp(np.cumsum(rng.normal(0, 0.002, (args.tickers, args.ticks)), axis=1))
+
+    states = [IndicatorState.from_bars(dates, close[i], high[i], low[i], volume[i]) for i in range(args.tickers)]
+
+    started = time.perf_counter()
+    for i in range(args.tickers):
+        day_high = day_low = ticks[i, 0]
+        for price in ticks[i]:
+            day_high, day_low = max(day_high, price), min(day_low, price)
+            old = indicator_engine.latest(indicator_engine.compute_indicators(
+                np.append(close[i], price), np.append(high[i], day_high),
+                np.append(low[i], day_low), np.append(volume[i], 0.0)))
+    old_time = time.perf_counter() - started
+    total_ticks = args.tickers * args.ticks
+    print(f"Antigo: {old_time / total_ticks * 1e6:.0f} µs/tick (recalcula {args.history} pregões)")
+
+    started = time.perf_counter()
+    for i, state in enumerate(states):
+        for price in ticks[i]:
+            state.update(price, bar_date=today)
+            new = state.values()
+    new_time = time.perf_counter() - started
+    print(f"Novo:   {new_time / total_ticks * 1e6:.1f} µs/tick ({old_time / new_time:.0f}x)")
+
+    worst = max(abs(new[name] - old[name]) for name in old if old[name] is not None)
+    size = len(json.dumps(states[-1].to_dict()))
+    print(f"Diferença máxima no último tick: {worst:.2e}; checkpoint: {size / 1024:.1f} KiB por ticker")
+
+    if not check_loader_context(args.history):
+        print("FALHA: o histórico não carrega fora do app context")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
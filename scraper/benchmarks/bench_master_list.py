@@ -0,0 +1,192 @@
+#!/usr/bin/env python3
+"""
+Benchmark da carga da lista mestra de empresas (scripts/build_master_list.py)
+
+Gera dados sintéticos no formato já mapeado dos arquivos da CVM (cadastro,
+valores mobiliários e FCA geral) e compara, num SQLite local com o esquema
+de scraper/models.py:
+- caminho antigo: groupby com lambda, `to_dict('records')` + laço Python
+  para tickers/website, TRUNCATE ... CASCADE (aqui: DELETE das empresas e
+  dos demonstrativos dependentes) e `bulk_insert_mappings`;
+- caminho novo: `build_master_frame` (vetorizado) + `load_master_list`
+  (upsert por CNPJ).
+
+Confere que os dois chegam às mesmas empresas e tickers, que os
+demonstrativos dependentes e os ids das empresas sobrevivem à carga nova, e
+mede uma segunda carga sem mudanças (nenhuma linha reescrita). Por fim carrega
+sobre uma tabela já preenchida por outros ETLs (CNPJ formatado ou vazio, mesmo
+código CVM) e confere que as linhas são casadas em vez de esbarrar no UNIQUE
+de cvm_code (código de saída 1 se falhar).
+
+Uso:
+    python scraper/benchmarks/bench_master_list.py --companies 3000
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+import pandas as pd
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import sessionmaker
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', 'scripts')))
+from models import Base, Company, FinancialStatement
+from build_master_list import build_master_frame, load_master_list
+
+
+def synthetic_cvm(companies, rng):
+    cad, vm, geral = [], [], []
+    for index in range(companies):
+        cnpj = f"{10 ** 13 + index:014d}"
+        status = 'ATIVO' if rng.random() < 0.8 else 'CANCELADA'
+        cad.append({'cnpj': cnpj, 'company_name': f'Companhia {index} S.A.', 'cvm_code': str(1000 + index),
+                    'b3_sector': rng.choice(['Energia', 'Bancos', 'Varejo', 'Mineração']),
+                    'main_activity': 'Atividade principal', 'website': f'www.cia{index}.com.br', 'status': status})
+        root = f"C{index:03d}"[-4:].upper()
+        for suffix in rng.sample(['3', '4', '5', '6', '11'], rng.randint(1, 3)):
+            vm.append({'cnpj': cnpj, 'ticker': f'{root}{suffix}'})
+        vm.append({'cnpj': cnpj, 'ticker': None})
+        if rng.random() < 0.7:
+            geral.append({'cnpj': cnpj, 'website': f'https://ri.cia{index}.com.br'})
+    tickers = sorted({row['ticker'] for row in vm if row['ticker']})
+    reference = set(rng.sample(tickers, int(len(tickers) * 0.6)))
+    return pd.DataFrame(cad), pd.DataFrame(vm), pd.DataFrame(geral), reference
+
+
+def old_load(session, df_cad, df_fca_vm, df_fca_geral, reference_tickers):
+    """run_etl anterior (TRUNCATE CASCADE simulado com DELETE no SQLite)"""
+    df_fca_filtered = df_fca_vm[df_fca_vm['ticker'].str.upper().isin(reference_tickers)].copy()
+    df_merged = pd.merge(df_cad, df_fca_filtered[['cnpj', 'ticker']], on='cnpj', how='inner')
+    if not df_fca_geral.empty and 'website' in df_fca_geral.columns:
+        df_merged = pd.merge(df_merged, df_fca_geral[['cnpj', 'website']], on='cnpj', how='left')
+    agg_funcs = {'ticker': (lambda x: sorted(list(x.unique())))}
+    for col in ['company_name', 'cvm_code', 'b3_sector', 'main_activity', 'website', 'status']:
+        if col in df_merged.columns:
+            agg_funcs[col] = 'first'
+    df_final_agg = df_merged.groupby('cnpj').agg(agg_funcs).reset_index()
+    df_final = df_final_agg[df_final_agg['status'] == 'ATIVO'].copy()
+
+    session.execute(text("DELETE FROM financial_statements"))
+    session.execute(text("DELETE FROM companies"))
+    valid_model_columns = {c.name for c in Company.__table__.columns}
+    cleaned_load = []
+    for record in df_final.to_dict(orient='records'):
+        tickers_list = record.get('ticker', [])
+        record['tickers'] = tickers_list
+        record['ticker'] = tickers_list[0] if tickers_list else None
+        record['trade_name'] = record.get('trade_name') or record.get('company_name')
+        record['is_b3_listed'] = True
+        if 'website' in record and record['website'] and len(record['website']) > 255:
+            record['website'] = record['website'][:255]
+        cleaned_load.append({k: v for k, v in record.items() if k in valid_model_columns})
+    session.bulk_insert_mappings(Company, cleaned_load)
+    session.commit()
+
+
+def formatted_cnpj(cnpj):
+    return f"{cnpj[:2]}.{cnpj[2:5]}.{cnpj[5:8]}/{cnpj[8:12]}-{cnpj[12:]}"
+
+
+def check_existing_rows(df_final):
+    """Carga sobre empresas gravadas por etl_companies (CNPJ formatado; um vazio)"""
+    engine = create_engine(f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'existing.db')}")
+    Base.metadata.create_all(engine)
+    seeded = df_final.head(50)
+    with engine.begin() as connection:
+        connection.execute(Company.__table__.insert(), [
+            {'cvm_code': int(row.cvm_code), 'company_name': row.company_name,
+             'cnpj': '' if index == 0 else formatted_cnpj(row.cnpj)}
+            for index, row in enumerate(seeded.itertuples())])
+    with engine.connect() as connection:
+        ids_before = dict(connection.execute(text("SELECT cvm_code, id FROM companies")).fetchall())
+    try:
+        with engine.begin() as connection:
+            load_master_list(connection, df_final)
+    except Exception as e:
+        print(f"Carga sobre linhas existentes: FALHOU ({type(e).__name__}: {str(e).splitlines()[0]})")
+        return False
+    with engine.connect() as connection:
+        rows = connection.execute(text("SELECT cvm_code, id, cnpj FROM companies")).fetchall()
+    kept = all(ids_before[cvm_code] == company_id for cvm_code, company_id, _ in rows if cvm_code in ids_before)
+    normalized = all(cnpj and cnpj.isdigit() for _, _, cnpj in rows)
+    print(f"Carga sobre {len(seeded)} linhas existentes com CNPJ formatado/vazio: {len(rows)} empresas; "
+          f"ids preservados: {'sim' if kept else 'NÃO'}; CNPJs normalizados: {'sim' if normalized else 'NÃO'}")
+    return kept and normalized and len(rows) == len(df_final)
+
+
+def listed(engine):
+    with engine.connect() as connection:
+        rows = connection.execute(text("SELECT id, cnpj, tickers FROM companies WHERE is_b3_listed")).fetchall()
+    return {cnpj: (company_id, tickers if isinstance(tickers, str) else str(tickers)) for company_id, cnpj, tickers in rows}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark da lista mestra de empresas")
+    parser.add_argument('--companies', type=int, default=3000)
+    parser.add_argument('--statements', type=int, default=5, help="Demonstrativos por empresa")
+    args = parser.parse_args()
+
+    rng = random.Random(42)
+    df_cad, df_fca_vm, df_fca_geral, reference = synthetic_cvm(args.companies, rng)
+    path = os.path.join(tempfile.mkdtemp(), 'master_list.db')
+    engine = create_engine(f'sqlite:///{path}')
+    Base.metadata.create_all(engine)
+    Session = sessionmaker(bind=engine)
+
+    started = time.perf_counter()
+    with Session() as session:
+        old_load(session, df_cad, df_fca_vm, df_fca_geral, reference)
+    old_time = time.perf_counter() - started
+    before = listed(engine)
+
+    # Demonstrativos dependentes, que o TRUNCATE ... CASCADE apagava
+    with engine.begin() as connection:
+        connection.execute(FinancialStatement.__table__.insert(), [
+            {'company_id': company_id, 'cvm_code': 0, 'report_type': 'DFP', 'aggregation': 'CON',
+             'reference_date': datetime(2024 - year, 12, 31)}
+            for company_id, _ in before.values() for year in range(args.statements)])
+
+    started = time.perf_counter()
+    df_final = build_master_frame(df_cad, df_fca_vm, reference, df_fca_geral)
+    build_time = time.perf_counter() - started
+    with engine.begin() as connection:
+        sent, delisted = load_master_list(connection, df_final)
+    new_time = time.perf_counter() - started
+    after = listed(engine)
+
+    time.sleep(1.1)  # updated_at tem resolução de segundos
+    since = datetime.utcnow().strftime('%Y-%m-%d %H:%M:%S')
+    started = time.perf_counter()
+    with engine.begin() as connection:
+        load_master_list(connection, build_master_frame(df_cad, df_fca_vm, reference, df_fca_geral))
+    rerun_time = time.perf_counter() - started
+    with engine.connect() as connection:
+        rewritten = connection.execute(text("SELECT COUNT(*) FROM companies WHERE updated_at >= :since"),
+                                       {'since': since}).scalar()
+
+    with engine.connect() as connection:
+        statements = connection.execute(text("SELECT COUNT(*) FROM financial_statements")).scalar()
+    same_companies = set(before) == set(after)
+    same_tickers = all(before[cnpj][1].replace(' ', '') == after[cnpj][1].replace(' ', '') for cnpj in before)
+    same_ids = all(before[cnpj][0] == after[cnpj][0] for cnpj in before)
+
+    print(f"{args.companies} empresas no cadastro, {len(df_fca_vm)} valores mobiliários, {len(after)} na lista mestra")
+    print(f"Antigo (laço + TRUNCATE CASCADE + bulk insert): {old_time * 1000:.0f} ms")
+    print(f"Novo (vetorizado + upsert por CNPJ):           {new_time * 1000:.0f} ms "
+          f"(montagem {build_time * 1000:.0f} ms; {sent} enviadas, {delisted} desmarcadas)")
+    print(f"Segunda carga sem mudanças:                     {rerun_time * 1000:.0f} ms ({rewritten} linhas reescritas)")
+    print(f"Mesmas empresas: {'sim' if same_companies else 'NÃO'}; mesmos tickers: {'sim' if same_tickers else 'NÃO'}; "
+          f"ids preservados: {'sim' if same_ids else 'NÃO'}; "
+          f"demonstrativos dependentes: {statements}/{len(before) * args.statements}")
+
+    if not check_existing_rows(df_final):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+"""
+Benchmark do coletor concorrente de cotações contra um servidor HTTP local
+
+O servidor imita a brapi (`/quote/{tickers}` e `?range=` para histórico) com
+latência injetada e uma fração de respostas 503 para exercitar o retry.
+Compara:
+- caminho antigo: lotes de 50 tickers, históricos e câmbio buscados em série
+  com `requests.get` (nova conexão a cada chamada);
+- caminho novo: `QuoteCollector` (sessão com pool, limite por host, retry e
+  todas as requisições em paralelo).
+
+Uso:
+    python scraper/benchmarks/bench_quote_collector.py --tickers 400 --histories 40 --latency 150
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, unquote, urlparse
+
+import requests
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from services.quote_collector import QuoteCollector
+
+
+def make_handler(latency_ms: float, error_rate: float):
+    rng = random.Random(7)
+    rng_lock = threading.Lock()
+
+    class StubBrapiHandler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def log_message(self, *args):
+            pass
+
+        def do_GET(self):
+            with rng_lock:
+                delay = latency_ms * rng.uniform(0.8, 1.2) / 1000
+                fail = rng.random() < error_rate
+            time.sleep(delay)
+            if fail:
+                self._send(503, {'error': 'unavailable'})
+                return
+
+            url = urlparse(self.path)
+            symbols = unquote(url.path.rsplit('/', 1)[-1]).split(',')
+            history = 'range' in parse_qs(url.query)
+            results = []
+            for symbol in symbols:
+                quote = {'symbol': symbol, 'regularMarketPrice': 10.0, 'regularMarketVolume': 1000}
+                if history:
+                    quote['historicalDataPrice'] = [
+                        {'date': 1700000000 + day * 86400, 'open': 10, 'high': 11, 'low': 9, 'close': 10.5, 'volume': 1000}
+                        for day in range(30)
+                    ]
+                results.append(quote)
+            self._send(200, {'results': results})
+
+        def _send(self, status, payload):
+            body = json.dumps(payload).encode()
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+    return StubBrapiHandler
+
+
+def old_collect(base_url, tickers, history_tickers, currencies):
+    """Caminho antigo: tudo em série, sem sessão e sem retry"""
+    quotes, histories, rates, failures = [], {}, [], 0
+    for i in range(0, len(tickers), 50):
+        response = requests.get(f"{base_url}/quote/{','.join(tickers[i:i + 50])}", timeout=30)
+        if response.status_code == 200:
+            quotes.extend(response.json()['results'])
+        else:
+            failures += 1
+    for ticker in history_tickers:
+        response = requests.get(f"{base_url}/quote/{ticker}", params={'range': '30d', 'interval': '1d'}, timeout=30)
+        if response.status_code == 200:
+            histories[ticker] = response.json()['results'][0]['historicalDataPrice']
+        else:
+            failures += 1
+    for currency in currencies:
+        response = requests.get(f"{base_url}/quote/{currency}=X", timeout=30)
+        if response.status_code == 200:
+            rates.append(response.json()['results'][0])
+        else:
+            failures += 1
+    return quotes, histories, rates, failures
+
+
+def new_collect(collector, tickers, history_tickers, currencies):
+    """Caminho novo: cada etapa dispara todas as suas requisições no pool"""
+    quotes = collector.fetch_quotes(tickers)
+    histories = collector.fetch_histories(history_tickers, 30)
+    rates = collector.map(lambda c: collector.get_json(f"{collector.base_url}/quote/{c}=X"), currencies)
+    return quotes, histories, [r for r in rates if r], 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark do coletor de cotações")
+    parser.add_argument('--tickers', type=int, default=400)
+    parser.add_argument('--histories', type=int, default=40, help="Tickers com histórico")
+    parser.add_argument('--latency', type=float, default=150, help="Latência injetada (ms)")
+    parser.add_argument('--error-rate', type=float, default=0.05, help="Fração de respostas 503")
+    parser.add_argument('--workers', type=int, default=16)
+    parser.add_argument('--per-host', type=int, default=8)
+    args = parser.parse_args()
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), make_handler(args.latency, args.error_rate))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f"http://127.0.0.1:{server.server_address[1]}/api"
+
+    tickers = [f"T{i:04d}" for i in range(args.tickers)]
+    history_tickers = tickers[:args.histories]
+    currencies = ['USDBRL', 'EURBRL', 'GBPBRL']
+
+    started = time.perf_counter()
+    quotes, histories, rates, failures = old_collect(base_url, tickers, history_tickers, currencies)
+    old_time = time.perf_counter() - started
+    print(f"Antigo: {old_time:.2f} s -> {len(quotes)} cotações, {len(histories)} históricos, "
+          f"{len(rates)} câmbios ({failures} requisições perdidas)")
+
+    collector = QuoteCollector(base_url=base_url, max_workers=args.workers,
+                               per_host_limit=args.per_host, backoff=0.05)
+    started = time.perf_counter()
+    quotes, histories, rates, _ = new_collect(collector, tickers, history_tickers, currencies)
+    new_time = time.perf_counter() - started
+    complete = sum(1 for history in histories.values() if history)
+    print(f"Novo:   {new_time:.2f} s -> {len(quotes)} cotações, {complete} históricos, "
+          f"{len(rates)} câmbios ({old_time / new_time:.1f}x)")
+
+    collector.close()
+    server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""
+Benchmark do protocolo de cotações do streaming
+
+Simula clientes com uma watchlist grande recebendo N ticks e compara:
+- protocolo 'full': um `quote_update` por ticker com a cotação inteira + timestamp ISO;
+- protocolo 'delta': um `quotes_batch` por conexão por tick, só com os campos
+  alterados (JSON e, se instalado, MessagePack).
+
+Uso:
+    python scraper/benchmarks/bench_quote_deltas.py --tickers 300 --ticks 60 --changed 0.3
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+from datetime import datetime
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from services.quote_fanout import MSGPACK_AVAILABLE, encode_message, quote_delta
+
+
+def brapi_quote(symbol: str, price: float) -> dict:
+    """Cotação com os campos que a brapi devolve em /quote/{ticker}"""
+    return {
+        'currency': 'BRL',
+        'shortName': f"{symbol} ON NM",
+        'longName': f"Companhia {symbol} S.A.",
+        'regularMarketChange': 0.0,
+        'regularMarketChangePercent': 0.0,
+        'regularMarketTime': datetime.now().isoformat(),
+        'regularMarketPrice': price,
+        'regularMarketDayHigh': price,
+        'regularMarketDayRange': f"{price} - {price}",
+        'regularMarketDayLow': price,
+        'regularMarketVolume': 1_000_000,
+        'regularMarketPreviousClose': price,
+        'regularMarketOpen': price,
+        'fiftyTwoWeekRange': f"{price * 0.7:.2f} - {price * 1.3:.2f}",
+        'fiftyTwoWeekLow': round(price * 0.7, 2),
+        'fiftyTwoWeekHigh': round(price * 1.3, 2),
+        'symbol': symbol,
+        'priceEarnings': 7.5,
+        'earningsPerShare': 4.1,
+        'logourl': f"https://icons.brapi.dev/icons/{symbol}.svg",
+    }
+
+
+def tick(quote: dict, rng: random.Random) -> dict:
+    """Novo preço/volume/horário, como num pregão"""
+    quote = dict(quote)
+    price = round(quote['regularMarketPrice'] * (1 + rng.uniform(-0.002, 0.002)), 2)
+    quote['regularMarketPrice'] = price
+    quote['regularMarketChange'] = round(price - quote['regularMarketPreviousClose'], 2)
+    quote['regularMarketChangePercent'] = round(quote['regularMarketChange'] / quote['regularMarketPreviousClose'] * 100, 4)
+    quote['regularMarketDayHigh'] = max(quote['regularMarketDayHigh'], price)
+    quote['regularMarketDayLow'] = min(quote['regularMarketDayLow'], price)
+    quote['regularMarketVolume'] += rng.randint(100, 10_000)
+    quote['regularMarketTime'] = datetime.now().isoformat()
+    return quote
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark do protocolo de cotações")
+    parser.add_argument('--tickers', type=int, default=300, help="Tamanho da watchlist por cliente")
+    parser.add_argument('--ticks', type=int, default=60)
+    parser.add_argument('--changed', type=float, default=0.3, help="Fração dos tickers alterados por tick")
+    args = parser.parse_args()
+
+    rng = random.Random(42)
+    quotes = {f"T{i:04d}": brapi_quote(f"T{i:04d}", rng.uniform(5, 100)) for i in range(args.tickers)}
+
+    full = {'messages': 0, 'bytes': 0}
+    delta_json = {'messages': 0, 'bytes': 0}
+    delta_msgpack = {'messages': 0, 'bytes': 0}
+    encode_time = 0.0
+
+    for _ in range(args.ticks):
+        changed = {ticker: tick(quotes[ticker], rng)
+                   for ticker in rng.sample(sorted(quotes), int(args.tickers * args.changed))}
+        timestamp = datetime.now().isoformat()
+
+        # 'full' (protocolo original): toda cotação de toda a watchlist, uma mensagem por ticker
+        for ticker, quote in quotes.items():
+            payload = {'ticker': ticker, 'data': changed.get(ticker, quote), 'timestamp': timestamp}
+            full['messages'] += 1
+            full['bytes'] += len(json.dumps(payload))
+
+        started = time.perf_counter()
+        deltas = {ticker: quote_delta(quotes[ticker], quote) for ticker, quote in changed.items()}
+        message = {'ts': int(time.time() * 1000), 'quotes': deltas}
+        delta_json['messages'] += 1
+        delta_json['bytes'] += len(json.dumps(encode_message(message)))
+        if MSGPACK_AVAILABLE:
+            delta_msgpack['messages'] += 1
+            delta_msgpack['bytes'] += len(encode_message(message, 'msgpack'))
+        encode_time += time.perf_counter() - started
+        quotes.update(changed)
+
+    print(f"Watchlist de {args.tickers} tickers, {args.ticks} ticks, {args.changed:.0%} alterados por tick")
+    print(f"full:           {full['messages']:>7} mensagens {full['bytes'] / 1024:>9.0f} KB")
+    for name, result in (('delta (json)', delta_json), ('delta (msgpack)', delta_msgpack)):
+        if not result['messages']:
+            print(f"{name}: msgpack não instalado")
+            continue
+        print(f"{name + ':':<16}{result['messages']:>7} mensagens {result['bytes'] / 1024:>9.0f} KB "
+              f"({full['bytes'] / result['bytes']:.0f}x menos bytes, "
+              f"{full['messages'] / result['messages']:.0f}x menos emits)")
+    print(f"Diff + codificação: {encode_time / args.ticks * 1000:.2f} ms/tick")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""
+Benchmark do rate limiter (requisições/s por worker)
+
+Compara, por requisição autenticada:
+- caminho antigo: ZREMRANGEBYSCORE + ZCARD + ZADD + EXPIRE para a checagem
+  e mais ZREMRANGEBYSCORE + ZCARD para os headers (6 comandos);
+- caminho novo: `RateLimiter.check` (um EVALSHA do script GCRA, que já
+  devolve remaining/reset), sem e com orçamento local de tokens.
+
+Mostra também quantas requisições de um mesmo segundo o limitador antigo
+conta de fato (membros `str(current_time)` colidem no sorted set) e confere
+que requisições mais espaçadas que o lease custam um token cada (os tokens
+não usados do lease voltam ao Redis); código de saída 1 se não custarem.
+
+Por padrão usa fakeredis (precisa de `lupa` para Lua); com --redis-url mede
+contra um Redis real, onde a diferença de round trips pesa muito mais.
+
+Uso:
+    pip install fakeredis lupa
+    python scraper/benchmarks/bench_rate_limiter.py --requests 20000 --limit 100000
+"""
+import argparse
+import os
+import sys
+import time
+
+import fakeredis
+import redis
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from utils.gcra import RateLimiter
+
+
+def old_request(client, key, limit, window=3600):
+    """Checagem + headers como no limitador antigo"""
+    current_time = int(time.time())
+    client.zremrangebyscore(key, 0, current_time - window)
+    current_requests = client.zcard(key)
+    if current_requests >= limit:
+        return False
+    client.zadd(key, {str(current_time): current_time})
+    client.expire(key, window)
+    client.zremrangebyscore(key, 0, current_time - window)
+    client.zcard(key)
+    return True
+
+
+def timed(label, requests, func, baseline=None):
+    started = time.perf_counter()
+    for _ in range(requests):
+        func()
+    elapsed = time.perf_counter() - started
+    rate = requests / elapsed
+    suffix = f" ({rate / baseline:.1f}x)" if baseline else ""
+    print(f"{label:<32} {rate:>10,.0f} req/s{suffix}")
+    return rate
+
+
+def check_spaced_requests(client, budget, requests=200, limit=1000):
+    """Requisições espaçadas além do lease: todas aceitas e `remaining` cai um por requisição"""
+    lease_seconds = 0.005
+    spaced = RateLimiter(client, local_budget=budget, lease_seconds=lease_seconds)
+    client.delete('bench:spaced')
+    allowed, result = 0, None
+    for _ in range(requests):
+        result = spaced.check('bench:spaced', limit)
+        allowed += result.allowed
+        time.sleep(lease_seconds * 2)
+    expected_remaining = limit - requests
+    ok = allowed == requests and abs(result.remaining - expected_remaining) <= budget
+    print(f"Limite {limit}/h, {requests} requisições espaçadas além do lease: {allowed} aceitas, "
+          f"remaining {result.remaining} (esperado ~{expected_remaining}){'' if ok else ' FALHA'}")
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark do rate limiter")
+    parser.add_argument('--requests', type=int, default=20_000)
+    parser.add_argument('--limit', type=int, default=100_000, help="Requisições por hora da chave")
+    parser.add_argument('--budget', type=int, default=10, help="Orçamento local de tokens por worker")
+    parser.add_argument('--redis-url', help="Redis real (padrão: fakeredis)")
+    args = parser.parse_args()
+
+    client = redis.Redis.from_url(args.redis_url) if args.redis_url else fakeredis.FakeRedis()
+    for key in ('bench:old', 'bench:gcra', 'bench:local'):
+        client.delete(key)
+
+    baseline = timed("Antigo (6 comandos)", args.requests,
+                     lambda: old_request(client, 'bench:old', args.limit))
+    counted = client.zcard('bench:old')
+    print(f"  requisições registradas pelo antigo: {counted} de {args.requests}")
+
+    limiter = RateLimiter(client, local_budget=1)
+    timed("GCRA (1 EVALSHA)", args.requests, lambda: limiter.check('bench:gcra', args.limit), baseline)
+
+    local = RateLimiter(client, local_budget=args.budget)
+    timed(f"GCRA + orçamento local ({args.budget})", args.requests,
+          lambda: local.check('bench:local', args.limit), baseline)
+
+    # Precisão: uma chave pequena deve aceitar exatamente `limit` requisições
+    exact = RateLimiter(client, local_budget=args.budget)
+    client.delete('bench:exact')
+    allowed = sum(exact.check('bench:exact', 500).allowed for _ in range(600))
+    print(f"Limite 500/h com orçamento local: {allowed} aceitas de 600")
+
+    if not check_spaced_requests(client, args.budget):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+"""
+Benchmark do worker RTD com o terminal MT5 simulado e SQLite
+
+Compara, por ciclo:
+- caminho antigo: `pd.read_sql` da carteira, `symbol_select` +
+  `symbol_info_tick` + `copy_rates_from_pos` por ativo e gravação via
+  `to_sql('temp_quotes', if_exists='replace')` + INSERT ... SELECT;
+- caminho novo: `RTDWorker.run_cycle` (carteira em memória, uma chamada por
+  ativo, só os preços alterados gravados com um executemany).
+
+Confere também o fechamento anterior antes do primeiro negócio do dia (sem
+barra diária de hoje): deve ser o do pregão anterior e não ficar guardado
+para o resto do dia; código de saída 1 se não for.
+
+Uso:
+    python scraper/benchmarks/bench_rtd_worker.py --tickers 300 --cycles 20 --latency 0.2
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import pandas as pd
+from sqlalchemy import create_engine, text
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+from scripts.rtd_worker import (
+    FakeMT5Terminal, MT5QuoteSource, PortfolioConfigWatcher, RealtimeQuoteWriter, RTDWorker,
+)
+
+SCHEMA = [
+    "CREATE TABLE portfolio_config (ticker VARCHAR(20) PRIMARY KEY)",
+    """CREATE TABLE realtime_quotes (
+        ticker VARCHAR(20) PRIMARY KEY,
+        last_price FLOAT,
+        previous_close FLOAT,
+        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )""",
+]
+
+
+def create_database(path: str, tickers: int):
+    engine = create_engine(f"sqlite:///{path}")
+    with engine.begin() as conn:
+        for ddl in SCHEMA:
+            conn.execute(text(ddl))
+        conn.execute(text("INSERT INTO portfolio_config (ticker) VALUES (:ticker)"),
+                     [{'ticker': f"T{i:04d}"} for i in range(tickers)])
+    return engine
+
+
+def old_cycle(engine, mt5):
+    """Ciclo do worker original (NOW() trocado por CURRENT_TIMESTAMP para rodar no SQLite)"""
+    df_config = pd.read_sql("SELECT ticker FROM portfolio_config", engine)
+    quotes_to_upsert = []
+    for ticker in df_config['ticker']:
+        if not mt5.symbol_select(ticker, True):
+            continue
+        tick = mt5.symbol_info_tick(ticker)
+        rates = mt5.copy_rates_from_pos(ticker, mt5.TIMEFRAME_D1, 0, 2)
+        if tick and tick.last > 0 and rates is not None and len(rates) > 1:
+            quotes_to_upsert.append({"ticker": ticker, "last_price": tick.last, "previous_close": rates[0]['close']})
+    if quotes_to_upsert:
+        with engine.connect() as conn:
+            pd.DataFrame(quotes_to_upsert).to_sql('temp_quotes', conn, if_exists='replace', index=False)
+            conn.execute(text("""
+                INSERT INTO realtime_quotes (ticker, last_price, previous_close)
+                SELECT ticker, last_price, previous_close FROM temp_quotes WHERE true
+                ON CONFLICT (ticker) DO UPDATE
+                SET last_price = EXCLUDED.last_price,
+                    previous_close = EXCLUDED.previous_close,
+                    updated_at = CURRENT_TIMESTAMP
+            """))
+            conn.commit()
+    return len(quotes_to_upsert)
+
+
+def check_previous_close():
+    """Fechamento anterior antes e depois da barra diária de hoje existir"""
+    mt5 = FakeMT5Terminal(change_rate=0.0)
+    source = MT5QuoteSource(mt5)
+    source.prepare({'PETR4'})
+    expected = round(mt5.prices['PETR4'] * 0.99, 2)
+
+    mt5.today_bar = False
+    before_open = source.read_ticks(['PETR4'])['PETR4'][1]
+    cached_before_open = 'PETR4' in source._previous_close
+    mt5.today_bar = True
+    after_open = source.read_ticks(['PETR4'])['PETR4'][1]
+    calls = mt5.calls
+    source.read_ticks(['PETR4'])
+    cached_after_open = mt5.calls - calls == 1  # só symbol_info_tick
+
+    ok = before_open == expected and after_open == expected and not cached_before_open and cached_after_open
+    print(f"Fechamento anterior antes da barra de hoje: {before_open} (esperado {expected}, "
+          f"guardado: {'sim' if cached_before_open else 'não'}); depois: {after_open} "
+          f"(guardado: {'sim' if cached_after_open else 'não'}){'' if ok else ' FALHA'}")
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark do worker RTD")
+    parser.add_argument('--tickers', type=int, default=300)
+    parser.add_argument('--cycles', type=int, default=20)
+    parser.add_argument('--latency', type=float, default=0.2, help="Custo de cada chamada ao terminal (ms)")
+    parser.add_argument('--change-rate', type=float, default=0.3, help="Fração de ativos com preço novo por leitura")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_database(os.path.join(tmp, 'old.db'), args.tickers)
+        mt5 = FakeMT5Terminal(change_rate=args.change_rate, latency_ms=args.latency)
+        started = time.perf_counter()
+        written = sum(old_cycle(engine, mt5) for _ in range(args.cycles))
+        old_time = (time.perf_counter() - started) / args.cycles
+        print(f"Antigo: {old_time * 1000:.0f} ms/ciclo, {mt5.calls / args.cycles:.0f} chamadas MT5/ciclo, "
+              f"{written / args.cycles:.0f} linhas gravadas/ciclo")
+
+        engine = create_database(os.path.join(tmp, 'new.db'), args.tickers)
+        mt5 = FakeMT5Terminal(change_rate=args.change_rate, latency_ms=args.latency)
+        worker = RTDWorker(MT5QuoteSource(mt5), PortfolioConfigWatcher(engine), RealtimeQuoteWriter(engine))
+        worker.reload_tickers()
+        mt5.calls = 0
+        started = time.perf_counter()
+        written = sum(worker.run_cycle()['written'] for _ in range(args.cycles))
+        new_time = (time.perf_counter() - started) / args.cycles
+        print(f"Novo:   {new_time * 1000:.0f} ms/ciclo, {mt5.calls / args.cycles:.0f} chamadas MT5/ciclo, "
+              f"{written / args.cycles:.0f} linhas gravadas/ciclo ({old_time / new_time:.1f}x)")
+
+    if not check_previous_close():
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""
+Benchmark do screener de ações
+
+Gera um universo sintético de empresas (padrão 10 mil) com todas as
+métricas do snapshot `company_ratios` (com ~10% de valores ausentes) e
+compara, para o mesmo conjunto de filtros + ordenação + página:
+- caminho antigo: percorrer os indicadores empresa a empresa (um dict por
+  empresa, como devolvido por `/companies/<cvm_code>/financial-ratios`),
+  filtrar e ordenar em Python;
+- caminho novo: `ScreenerSnapshot.screen` (máscaras NumPy + ordem por
+  métrica pré-calculada).
+
+Confere que os dois devolvem a mesma página.
+
+Uso:
+    python scraper/benchmarks/bench_screener.py --companies 10000 --repeat 200
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from services.screener import METRICS, ScreenerSnapshot, parse_predicates
+
+SECTORS = ['Financeiro', 'Utilidade Pública', 'Materiais Básicos', 'Consumo Cíclico', 'Petróleo, Gás e Biocombustíveis']
+FILTERS = ['roe>0.15', 'net_debt_to_ebitda<2', 'pe_ratio>0']
+
+
+def synthetic_snapshot(companies, rng):
+    metrics = {name: rng.lognormal(0, 1, companies) * rng.choice([-1, 1], companies, p=[0.1, 0.9])
+               for name in METRICS}
+    metrics['roe'] = rng.normal(0.12, 0.1, companies)
+    metrics['net_debt_to_ebitda'] = rng.normal(2, 1.5, companies)
+    for values in metrics.values():
+        values[rng.random(companies) < 0.1] = np.nan
+    labels = {
+        'ticker': [f'T{i:04d}3' for i in range(companies)],
+        'company_name': [f'Empresa {i}' for i in range(companies)],
+        'sector': list(rng.choice(SECTORS, companies)),
+        'subsector': [None] * companies,
+        'segment': [None] * companies,
+    }
+    return ScreenerSnapshot(np.arange(1, companies + 1), metrics, labels)
+
+
+def old_screen(records, predicates, sort, limit):
+    """Filtro e ordenação empresa a empresa (implementação ingênua)"""
+    checks = {'>': lambda a, b: a > b, '<': lambda a, b: a < b}
+    matches = [
+        record for record in records
+        if all(record[metric] is not None and checks[op](record[metric], value)
+               for metric, op, value in predicates)
+    ]
+    ranked = sorted((record for record in matches if record[sort] is not None), key=lambda r: r[sort])
+    ranked += [record for record in matches if record[sort] is None]
+    return len(matches), [record['cvm_code'] for record in ranked[:limit]]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark do screener de ações")
+    parser.add_argument('--companies', type=int, default=10_000)
+    parser.add_argument('--repeat', type=int, default=200, help="Consultas por caminho")
+    parser.add_argument('--limit', type=int, default=50)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(42)
+    snapshot = synthetic_snapshot(args.companies, rng)
+    predicates = parse_predicates(FILTERS)
+    records = snapshot.rows(np.arange(len(snapshot)), METRICS)
+    print(f"Universo: {len(snapshot)} empresas, {len(METRICS)} métricas; filtros: {', '.join(FILTERS)}")
+
+    started = time.perf_counter()
+    for _ in range(args.repeat):
+        old_total, old_page = old_screen(records, predicates, 'pe_ratio', args.limit)
+    old_time = (time.perf_counter() - started) / args.repeat
+    print(f"Antigo: {old_time * 1000:.2f} ms/consulta")
+
+    started = time.perf_counter()
+    snapshot.order('pe_ratio')
+    first = time.perf_counter() - started
+
+    started = time.perf_counter()
+    for _ in range(args.repeat):
+        total, indices = snapshot.screen(predicates, sort='pe_ratio', descending=False, limit=args.limit)
+        page = snapshot.rows(indices, ['pe_ratio', 'roe', 'net_debt_to_ebitda'])
+    new_time = (time.perf_counter() - started) / args.repeat
+    print(f"Novo:   {new_time * 1000:.3f} ms/consulta ({old_time / new_time:.0f}x); "
+          f"ordem por métrica calculada uma vez em {first * 1000:.2f} ms")
+
+    same = total == old_total and [row['cvm_code'] for row in page] == old_page
+    print(f"{total} empresas aprovadas; mesma página nos dois caminhos: {'sim' if same else 'NÃO'}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""
+Checagem da revogação de API keys com o cache de validação (auth.AuthService)
+
+Dois AuthService sobre o mesmo Redis (fakeredis) fazem o papel de dois
+workers, com a tabela de chaves em memória. Depois de as duas validarem (e
+guardarem no cache) a mesma chave, ela é desativada como em
+`auth.revoke_api_key`: is_active = false e `AuthService.revoke_api_key`.
+Confere que o worker que revogou rejeita a chave na hora e que o outro a
+rejeita assim que recebe o aviso do pub/sub, sem esperar o TTL do cache.
+Mostra também o caso sem o aviso (só o UPDATE), que continua aceitando a
+chave até o TTL. Código de saída 1 se a chave revogada ainda for aceita.
+
+Uso:
+    pip install fakeredis
+    python scraper/benchmarks/check_api_key_revocation.py
+"""
+import hashlib
+import os
+import sys
+import time
+
+import fakeredis
+from flask import Flask
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from auth import AuthService
+
+PUBSUB_WAIT = 2.0  # segundos de espera pelo aviso no outro worker
+
+
+class InMemoryAuthService(AuthService):
+    """AuthService com a tabela de chaves num dict (key_hash -> registro)"""
+
+    def __init__(self, redis_client, keys):
+        super().__init__(redis_client, key_cache_ttl=3600, last_used_interval=3600)
+        self.keys = keys
+
+    def _load_api_key(self, key_hash):
+        record = self.keys.get(key_hash)
+        if not record or not record['is_active']:
+            return None
+        return {'id': record['id'], 'name': record['name'], 'plan': record['plan'], 'rate_limit': record['rate_limit']}
+
+    def _flush_last_used(self, pending):
+        for key_id, last_used in pending.items():
+            for record in self.keys.values():
+                if record['id'] == key_id:
+                    record['last_used_at'] = last_used
+
+
+def rejected_within(service, api_key, timeout):
+    deadline = time.monotonic() + timeout
+    while service.validate_api_key(api_key) is not None:
+        if time.monotonic() > deadline:
+            return None
+        time.sleep(0.01)
+    return PUBSUB_WAIT - max(deadline - time.monotonic(), 0.0)
+
+
+def scenario(notify):
+    server = fakeredis.FakeServer()
+    keys = {}
+    workers = [InMemoryAuthService(fakeredis.FakeRedis(server=server), keys) for _ in range(2)]
+    api_key = f"mb_{os.urandom(16).hex()}"
+    key_hash = hashlib.sha256(api_key.encode()).hexdigest()
+    keys[key_hash] = {'id': 1, 'name': 'check', 'plan': 'basic', 'rate_limit': 1000, 'is_active': True}
+
+    app = Flask(__name__)
+    with app.app_context():
+        for worker in workers:
+            worker.validate_api_key(api_key)
+        time.sleep(0.2)  # listeners inscritos no canal (a inscrição limpa o cache local)
+        assert all(worker.validate_api_key(api_key) for worker in workers)
+
+        keys[key_hash]['is_active'] = False
+        if notify:
+            workers[0].revoke_api_key(key_hash)
+        local = workers[0].validate_api_key(api_key) is None
+        remote = rejected_within(workers[1], api_key, PUBSUB_WAIT)
+    return local, remote
+
+
+def main():
+    ok = True
+    for notify, label in ((False, 'só UPDATE (antes)'), (True, 'UPDATE + revoke_api_key')):
+        local, remote = scenario(notify)
+        remote_text = f"em {remote * 1000:.0f} ms" if remote is not None else f"NÃO (ainda aceita após {PUBSUB_WAIT:.0f} s)"
+        print(f"{label:<26} worker que revogou rejeita: {'sim' if local else 'NÃO'}; outro worker rejeita: {remote_text}")
+        if notify:
+            ok = local and remote is not None
+    if not ok:
+        print("FALHA: chave revogada ainda aceita")
+        sys.exit(1)
+    print("OK: chave revogada rejeitada em todos os workers sem esperar o TTL")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+"""
+Checagem do tempo de importação e dos efeitos colaterais na importação
+
+Para cada módulo, roda `python -X importtime -c "import <módulo>"` num
+processo novo (--repeat vezes, usa a mediana) e compara o tempo cumulativo
+com o registrado em import_time_baseline.json. Falha (código de saída 1) se:
+- algum módulo ficar mais lento que baseline * (1 + --tolerance) + --slack-ms;
+- a importação iniciar threads (importar não pode iniciar tarefas em segundo
+  plano; isso é feito por `app.start` no entrypoint do servidor);
+- a importação falhar.
+
+Módulos sem baseline são só reportados. Depois de uma mudança esperada
+(ou numa máquina nova de CI), regrave o baseline com --update.
+
+Os imports rodam a partir de scraper/ com a raiz do projeto no PYTHONPATH,
+então tanto os módulos do scraper (`app`, `services.*`) quanto os do backend
+(`backend.*`) resolvem.
+
+Uso:
+    python scraper/benchmarks/check_import_time.py
+    python scraper/benchmarks/check_import_time.py --modules app api.streaming --repeat 7
+    python scraper/benchmarks/check_import_time.py --update
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+SCRAPER_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+PROJECT_ROOT = os.path.dirname(SCRAPER_DIR)
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'import_time_baseline.json')
+
+# api.streaming, api.companies, api.screener, services.data_fetcher e utils.auth
+# ficam fora enquanto a árvore não tiver models.ApiKey e config.Config (a
+# importação deles falha antes de qualquer medição); inclua com --modules.
+DEFAULT_MODULES = [
+    'app',
+    'services.screener',
+    'services.quote_fanout',
+    'services.stream_cluster',
+    'utils.rate_limiter',
+    'utils.gcra',
+    'models',
+    'backend.database',
+    'backend.routes.ai_routes',
+]
+
+# Conta as threads depois do import: qualquer uma além da principal foi iniciada por ele
+PROBE = "import threading, {module}; print('THREADS', threading.active_count())"
+
+
+def measure(module):
+    """Tempo cumulativo de importação (ms) e threads vivas depois do import"""
+    env = dict(os.environ)
+    env['PYTHONPATH'] = os.pathsep.join(filter(None, [PROJECT_ROOT, env.get('PYTHONPATH')]))
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', PROBE.format(module=module)],
+                            cwd=SCRAPER_DIR, env=env, capture_output=True, text=True)
+    if result.returncode != 0:
+        errors = [line for line in result.stderr.splitlines() if line and not line.startswith('import time:')]
+        raise RuntimeError(errors[-1] if errors else 'erro')
+
+    cumulative_us = None
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:'):
+            continue
+        parts = line[len('import time:'):].split('|')
+        if len(parts) == 3 and parts[2].strip() == module:
+            cumulative_us = int(parts[1])
+    threads = next(int(line.split()[1]) for line in result.stdout.splitlines() if line.startswith('THREADS'))
+    return (cumulative_us or 0) / 1000, threads
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Checagem do tempo de importação")
+    parser.add_argument('--modules', nargs='+', default=DEFAULT_MODULES)
+    parser.add_argument('--repeat', type=int, default=5, help="Execuções por módulo (mediana)")
+    parser.add_argument('--tolerance', type=float, default=0.5, help="Aumento relativo aceito sobre o baseline")
+    parser.add_argument('--slack-ms', type=float, default=20.0, help="Folga absoluta (ruído de máquina)")
+    parser.add_argument('--baseline', default=BASELINE_PATH)
+    parser.add_argument('--update', action='store_true', help="Regrava o baseline com as medições atuais")
+    args = parser.parse_args()
+
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+
+    failures = []
+    measured = {}
+    print(f"{'Módulo':<26} {'atual (ms)':>11} {'baseline':>10} {'limite':>9}  threads")
+    for module in args.modules:
+        try:
+            runs = [measure(module) for _ in range(args.repeat)]
+        except RuntimeError as e:
+            failures.append(f"{module}: falha ao importar ({e})")
+            print(f"{module:<26} {'ERRO':>11}")
+            continue
+        current = statistics.median(ms for ms, _ in runs)
+        threads = max(count for _, count in runs)
+        measured[module] = round(current, 1)
+
+        reference = baseline.get(module)
+        limit = reference * (1 + args.tolerance) + args.slack_ms if reference is not None else None
+        print(f"{module:<26} {current:>11.1f} {reference if reference is not None else '-':>10} "
+              f"{f'{limit:.1f}' if limit is not None else '-':>9}  {threads}")
+        if threads > 1:
+            failures.append(f"{module}: a importação iniciou {threads - 1} thread(s)")
+        if limit is not None and current > limit and not args.update:
+            failures.append(f"{module}: {current:.1f} ms > limite {limit:.1f} ms (baseline {reference} ms)")
+
+    if args.update:
+        baseline.update(measured)
+        with open(args.baseline, 'w') as f:
+            json.dump(dict(sorted(baseline.items())), f, indent=2)
+            f.write('\n')
+        print(f"Baseline gravado em {args.baseline}")
+
+    if failures:
+        print("\nRegressões:")
+        for failure in failures:
+            print(f"- {failure}")
+        sys.exit(1)
+    print("\nOK: sem regressões de tempo de importação nem threads iniciadas no import")
+
+
+if __name__ == '__main__':
+    main()
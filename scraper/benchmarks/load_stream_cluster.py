@@ -0,0 +1,199 @@
+#!/usr/bin/env python3
+"""
+Teste de carga do streaming em cluster (vários workers, um Redis)
+
+Simula no mesmo processo `--workers` workers de Socket.IO, cada um com seu
+`SubscriptionRegistry`, `LeaderLease`, `QuoteRelay` e `QuoteFanout`, todos
+no mesmo Redis (fakeredis por padrão, ou --redis-url), e `--clients`
+clientes distribuídos entre eles assinando tickers aleatórios (protocolos
+full e delta). A camada Socket.IO é simulada: cada worker recebe o ciclo
+retransmitido pelo líder e entrega aos seus clientes pelas filas de saída
+(`OutboxManager`). Uma fração `--slow` dos clientes usa ack e nunca
+confirma: as atualizações deles ficam retidas e coalescidas por ticker.
+
+Confere, por ciclo:
+- exatamente um worker atua como líder;
+- cada ticker assinado é buscado uma única vez no cluster;
+- todo cliente recebe as atualizações dos seus tickers (nem mais nem menos);
+- clientes lentos recebem só a primeira mensagem e a fila não passa do
+  número de tickers assinados;
+e depois mede a troca de líder quando ele para de renovar o lease e a
+saída das assinaturas de um worker que para de enviar heartbeat.
+
+Uso:
+    pip install fakeredis lupa
+    python scraper/benchmarks/load_stream_cluster.py --workers 4 --clients 5000 --tickers 400
+"""
+import argparse
+import os
+import random
+import sys
+import threading
+import time
+from collections import Counter
+
+import fakeredis
+import redis
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from services.quote_fanout import QuoteFanout
+from services.stream_cluster import LeaderLease, QuoteRelay, SubscriptionRegistry
+from services.stream_outbox import OutboxManager
+
+
+class FakeBrapi:
+    """Fetcher com preços aleatórios que conta as buscas por ticker"""
+
+    def __init__(self, rng):
+        self.rng = rng
+        self.fetches = Counter()
+        self.lock = threading.Lock()
+
+    def fetch_quotes(self, tickers, executor=None, **kwargs):
+        with self.lock:
+            self.fetches.update(tickers)
+            return {ticker: {'symbol': ticker, 'regularMarketPrice': round(self.rng.uniform(10, 50), 2),
+                             'regularMarketVolume': self.rng.randint(1, 10 ** 6)} for ticker in tickers}
+
+
+class Worker:
+    def __init__(self, name, client, ttl, fetcher):
+        self.name = name
+        self.registry = SubscriptionRegistry(client, worker_id=name, ttl=ttl)
+        self.lease = LeaderLease(client, worker_id=name, ttl=ttl)
+        self.relay = QuoteRelay(client, on_cycle=self.on_cycle)
+        self.fanout = QuoteFanout(fetcher, self.relay.publish)
+        self.outboxes = OutboxManager(self.send, ack_timeout=3600)
+        self.clients = {}  # sid -> (tickers, delta, slow)
+        self.messages = Counter()
+        self.relayed = threading.Event()
+
+    def send(self, sid, updates, callback):
+        # Socket.IO simulado: delta = um quotes_batch; full = um quote_update por ticker
+        _, delta, slow = self.clients[sid]
+        self.messages[sid] += 1 if delta else len(updates)
+        if callback and not slow:
+            callback()
+
+    def on_cycle(self, changed, deltas):
+        for sid, (tickers, delta, _) in self.clients.items():
+            source = deltas if delta else changed
+            updates = {ticker: source[ticker] for ticker in tickers if ticker in source}
+            if updates:
+                self.outboxes.offer(sid, updates)
+        self.relayed.set()
+
+    def tick(self):
+        """Um passo do background_data_updater; devolve True se atuou como líder"""
+        self.registry.heartbeat()
+        if not self.lease.acquire():
+            return False
+        rooms = list(self.registry.counts('quotes_')) + list(self.registry.counts('deltas_'))
+        tickers = sorted({room.split('_', 1)[1] for room in rooms})
+        if tickers:
+            self.fanout.run_cycle(tickers)
+        return True
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Teste de carga do streaming em cluster")
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--clients', type=int, default=5000)
+    parser.add_argument('--tickers', type=int, default=400, help="Universo de tickers")
+    parser.add_argument('--per-client', type=int, default=10, help="Tickers por cliente")
+    parser.add_argument('--cycles', type=int, default=5)
+    parser.add_argument('--ttl', type=float, default=1.0, help="TTL do lease/heartbeat (s)")
+    parser.add_argument('--slow', type=float, default=0.05, help="Fração de clientes lentos (ack sem resposta)")
+    parser.add_argument('--redis-url', help="Redis real (padrão: fakeredis)")
+    args = parser.parse_args()
+
+    rng = random.Random(42)
+    server = fakeredis.FakeServer()
+    new_client = (lambda: redis.Redis.from_url(args.redis_url)) if args.redis_url \
+        else (lambda: fakeredis.FakeRedis(server=server))
+    new_client().flushdb()
+
+    fetcher = FakeBrapi(rng)
+    cluster = []
+    for index in range(args.workers):
+        cluster.append(Worker(f'worker-{index}', new_client(), args.ttl, fetcher))
+    for worker in cluster:
+        worker.relay.start()
+    time.sleep(0.2)  # assinaturas pub/sub ativas
+
+    universe = [f'TICK{i}' for i in range(args.tickers)]
+    expected = {}
+    started = time.perf_counter()
+    for index in range(args.clients):
+        worker = cluster[index % args.workers]
+        sid = f'client-{index}'
+        tickers = rng.sample(universe, args.per_client)
+        delta = rng.random() < 0.3
+        slow = rng.random() < args.slow
+        worker.registry.add_many([f'deltas_{ticker}' if delta else f'quotes_{ticker}' for ticker in tickers], sid)
+        worker.clients[sid] = (tickers, delta, slow)
+        worker.outboxes.register(sid, merge=delta, ack=True)
+        expected[sid] = (delta, slow, len(tickers))
+    elapsed = time.perf_counter() - started
+    subscriptions = args.clients * args.per_client
+    print(f"{args.clients} clientes em {args.workers} workers: {subscriptions} assinaturas em "
+          f"{elapsed:.2f}s ({subscriptions / elapsed:,.0f}/s)")
+
+    subscribed = {ticker for worker in cluster for room in worker.registry.local_counts()
+                  for ticker in [room.split('_', 1)[1]]}
+    leaders_per_cycle = []
+    cycle_times = []
+    for _ in range(args.cycles):
+        for worker in cluster:
+            worker.relayed.clear()
+        fetcher.fetches.clear()
+        started = time.perf_counter()
+        leaders = [worker.name for worker in cluster if worker.tick()]
+        for worker in cluster:
+            worker.relayed.wait(5)
+        cycle_times.append(time.perf_counter() - started)
+        leaders_per_cycle.append(leaders)
+        assert set(fetcher.fetches) == subscribed and max(fetcher.fetches.values()) == 1, \
+            "cada ticker assinado deve ser buscado uma vez por ciclo"
+
+    single_leader = all(len(leaders) == 1 for leaders in leaders_per_cycle)
+    delivered = Counter()
+    for worker in cluster:
+        delivered.update(worker.messages)
+    # Full: uma mensagem por ticker por ciclo; delta: um quotes_batch por ciclo; lentos: só o primeiro ciclo
+    wrong = [sid for sid, (delta, slow, count) in expected.items()
+             if delivered[sid] != (1 if slow else args.cycles) * (1 if delta else count)]
+    print(f"Ciclos: {args.cycles}; líder único em todos: {'sim' if single_leader else 'NÃO'} "
+          f"({leaders_per_cycle[0][0] if leaders_per_cycle[0] else '-'}); "
+          f"{len(subscribed)} tickers buscados 1x por ciclo")
+    print(f"Ciclo médio (busca + fan-out + retransmissão): {sum(cycle_times) / len(cycle_times) * 1000:.1f} ms; "
+          f"clientes com entregas erradas: {len(wrong)}")
+    queues = [worker.outboxes.stats() for worker in cluster]
+    print(f"Filas de saída: {sum(q['queued_updates'] for q in queues)} atualizações retidas, "
+          f"profundidade máxima {max(q['max_queue_depth'] for q in queues)} (limite {args.per_client}), "
+          f"{sum(q['stale_updates_dropped'] for q in queues)} atualizações velhas descartadas, "
+          f"{sum(q['awaiting_ack'] for q in queues)} clientes aguardando ack")
+
+    # Failover: o líder para de renovar; outro assume depois do TTL
+    leader = next(worker for worker in cluster if worker.lease.is_leader)
+    before = sum(leader.registry.counts().values())
+    followers = [worker for worker in cluster if worker is not leader]
+    started = time.perf_counter()
+    new_leader = None
+    while new_leader is None and time.perf_counter() - started < args.ttl * 5:
+        time.sleep(args.ttl / 10)
+        new_leader = next((worker for worker in followers if worker.tick()), None)
+    print(f"Troca de líder após parada de {leader.name}: "
+          f"{new_leader.name if new_leader else 'NENHUM'} em {time.perf_counter() - started:.2f}s")
+
+    # Worker sem heartbeat: as assinaturas dele saem da contagem do cluster após o TTL
+    time.sleep(args.ttl * 1.2)
+    for worker in followers:
+        worker.registry.heartbeat()
+    after = sum(new_leader.registry.counts().values())
+    print(f"Assinaturas no cluster: {before} -> {after} após {leader.name} sair "
+          f"(esperado {before - sum(leader.registry.local_counts().values())})")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,8 +1,8 @@
 # scraper/database.py
-from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
 from contextlib import contextmanager
 from scraper.config import DATABASE_URL
+from backend.database import get_engine
 import logging
 
 # Configura o logging
@@ -10,9 +10,9 @@ logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 try:
-    # Cria a engine do SQLAlchemy. 
-    # O pool_pre_ping verifica as conexões antes de usá-las, o que ajuda a lidar com conexões que podem ter sido fechadas pelo banco de dados.
-    engine = create_engine(DATABASE_URL, pool_pre_ping=True)
+    # Engine compartilhada (backend.database): pool configurável, pool_pre_ping
+    # e a mesma instância para todos os módulos do processo que usam esta URL.
+    engine = get_engine(DATABASE_URL)
     
     # Cria uma classe de Session configurada. Esta é a "fábrica" de sessões.
     SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
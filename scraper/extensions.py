@@ -1,8 +1,18 @@
 # scraper/extensions.py
+import os
+import redis
 from flask_sqlalchemy import SQLAlchemy
+from flask_socketio import SocketIO
 from sqlalchemy.orm import DeclarativeBase
 
 class Base(DeclarativeBase):
     pass
 
 db = SQLAlchemy(model_class=Base)
+
+REDIS_URL = os.environ.get("REDIS_URL", "redis://localhost:6379/0")
+# A conexão só é aberta no primeiro comando
+redis_client = redis.Redis.from_url(REDIS_URL)
+
+# Inicializado em create_app (com a fila de mensagens do Redis em STREAM_MODE=redis)
+socketio = SocketIO()
@@ -7,7 +7,7 @@ import re
 import sys
 sys.path.append('.')
 
-from app import create_app, db
+from app import create_app, init_db, db
 from models import Company
 
 def extract_companies_from_dadosdemercado():
@@ -185,7 +185,7 @@ def extract_companies_from_dadosdemercado():
 def populate_database():
     """Popula o database com as empresas"""
     
-    app = create_app()
+    app = init_db(create_app())
     with app.app_context():
         try:
             # Get companies
@@ -7,12 +7,12 @@ from flask import Flask, render_template, jsonify, request
 import sys
 sys.path.append('.')
 
-from app import create_app, db
+from app import get_app, init_db, start, db
 from models import Company
 import logging
 
 # Create Flask app
-app = create_app() 
+app = get_app()
 
 @app.route('/')
 def financial_dashboard():
@@ -98,82 +98,86 @@ def get_complete_company_data(ticker):
         except Exception as e:
             return jsonify({'success': False, 'message': f'Erro: {str(e)}'})
 
-# Initialize companies
-with app.app_context():
-    try:
-        count = db.session.query(Company).count()
-        if count == 0:
-            # Principais empresas B3
-            companies_data = [
-                ("BBAS3", "Banco do Brasil", 1023),
-                ("AZUL4", "Azul", 22490),
-                ("VALE3", "Vale", 4170),
-                ("BBDC4", "Banco Bradesco", 906),
-                ("B3SA3", "B3", 22101),
-                ("WEGE3", "WEG", 5410),
-                ("ITUB4", "Itaú Unibanco", 18520),
-                ("MGLU3", "Magazine Luiza", 12190),
-                ("ABEV3", "Ambev", 3570),
-                ("PETR4", "Petrobras", 9512),
-                ("LREN3", "Lojas Renner", 7541),
-                ("ITSA4", "Itaúsa", 14109),
-                ("GGBR4", "Gerdau", 3441),
-                ("CSNA3", "CSN", 1098),
-                ("CMIG4", "Cemig", 1403),
-                ("PCAR3", "P&G", 1155),
-                ("MRVE3", "MRV", 11573),
-                ("EMBR3", "Embraer", 4766),
-                ("PRIO3", "PetroRio", 22187),
-                ("PETR3", "Petrobras", 9512),
-                ("YDUQ3", "YDUQS", 18066),
-                ("RADL3", "RaiaDrogasil", 19526),
-                ("ELET3", "Eletrobras", 2437),
-                ("MULT3", "Multiplan", 6505),
-                ("SUZB3", "Suzano", 20710),
-                ("EQTL3", "Equatorial", 19924),
-                ("RAIL3", "Rumo", 14207),
-                ("VIVT3", "Vivo", 18724),
-                ("MRFG3", "Marfrig", 20850),
-                ("KLBN11", "Klabin", 4529),
-                ("LWSA3", "Locaweb", 23825),
-                ("ODPV3", "Odontoprev", 9628),
-                ("BRKM5", "Braskem", 1358),
-                ("SLCE3", "SLC", 20087),
-                ("CYRE3", "Cyrela", 11312),
-                ("FLRY3", "Fleury", 11395),
-                ("ENEV3", "Eneva", 20605),
-                ("HAPV3", "Hapvida", 22845),
-                ("TOTS3", "Totvs", 4827),
-                ("TIMS3", "TIM", 18061),
-                ("SANB11", "Santander", 20766),
-                ("RENT3", "Localiza", 15305),
-                ("BRFS3", "BRF", 20478),
-                ("SBSP3", "Sabesp", 1228),
-                ("AMER3", "Americanas", 5258),
-                ("RDOR3", "Rede D'Or", 24066),
-                ("CASH3", "Méliuz", 20001),
-                ("GRND3", "Grendene", 20002),
-                ("QUAL3", "Qualicorp", 20003),
-                ("ALPA4", "Alpargatas", 20004),
-                ("INTB3", "Intelbras", 20005)
-            ]
+def seed_companies():
+    """Cadastra as principais empresas da B3 se a tabela estiver vazia"""
+    with app.app_context():
+        try:
+            count = db.session.query(Company).count()
+            if count == 0:
+                # Principais empresas B3
+                companies_data = [
+                    ("BBAS3", "Banco do Brasil", 1023),
+                    ("AZUL4", "Azul", 22490),
+                    ("VALE3", "Vale", 4170),
+                    ("BBDC4", "Banco Bradesco", 906),
+                    ("B3SA3", "B3", 22101),
+                    ("WEGE3", "WEG", 5410),
+                    ("ITUB4", "Itaú Unibanco", 18520),
+                    ("MGLU3", "Magazine Luiza", 12190),
+                    ("ABEV3", "Ambev", 3570),
+                    ("PETR4", "Petrobras", 9512),
+                    ("LREN3", "Lojas Renner", 7541),
+                    ("ITSA4", "Itaúsa", 14109),
+                    ("GGBR4", "Gerdau", 3441),
+                    ("CSNA3", "CSN", 1098),
+                    ("CMIG4", "Cemig", 1403),
+                    ("PCAR3", "P&G", 1155),
+                    ("MRVE3", "MRV", 11573),
+                    ("EMBR3", "Embraer", 4766),
+                    ("PRIO3", "PetroRio", 22187),
+                    ("PETR3", "Petrobras", 9512),
+                    ("YDUQ3", "YDUQS", 18066),
+                    ("RADL3", "RaiaDrogasil", 19526),
+                    ("ELET3", "Eletrobras", 2437),
+                    ("MULT3", "Multiplan", 6505),
+                    ("SUZB3", "Suzano", 20710),
+                    ("EQTL3", "Equatorial", 19924),
+                    ("RAIL3", "Rumo", 14207),
+                    ("VIVT3", "Vivo", 18724),
+                    ("MRFG3", "Marfrig", 20850),
+                    ("KLBN11", "Klabin", 4529),
+                    ("LWSA3", "Locaweb", 23825),
+                    ("ODPV3", "Odontoprev", 9628),
+                    ("BRKM5", "Braskem", 1358),
+                    ("SLCE3", "SLC", 20087),
+                    ("CYRE3", "Cyrela", 11312),
+                    ("FLRY3", "Fleury", 11395),
+                    ("ENEV3", "Eneva", 20605),
+                    ("HAPV3", "Hapvida", 22845),
+                    ("TOTS3", "Totvs", 4827),
+                    ("TIMS3", "TIM", 18061),
+                    ("SANB11", "Santander", 20766),
+                    ("RENT3", "Localiza", 15305),
+                    ("BRFS3", "BRF", 20478),
+                    ("SBSP3", "Sabesp", 1228),
+                    ("AMER3", "Americanas", 5258),
+                    ("RDOR3", "Rede D'Or", 24066),
+                    ("CASH3", "Méliuz", 20001),
+                    ("GRND3", "Grendene", 20002),
+                    ("QUAL3", "Qualicorp", 20003),
+                    ("ALPA4", "Alpargatas", 20004),
+                    ("INTB3", "Intelbras", 20005)
+                ]
             
-            for ticker, name, cvm_code in companies_data:
-                try:
-                    company = Company(
-                        cvm_code=cvm_code,
-                        company_name=name,
-                        ticker=ticker,
-                        is_b3_listed=True,
-                        is_active=True
-                    )
-                    db.session.add(company)
-                except:
-                    continue
+                for ticker, name, cvm_code in companies_data:
+                    try:
+                        company = Company(
+                            cvm_code=cvm_code,
+                            company_name=name,
+                            ticker=ticker,
+                            is_b3_listed=True,
+                            is_active=True
+                        )
+                        db.session.add(company)
+                    except:
+                        continue
             
-            db.session.commit()
-    except Exception as e:
-        print(f"Error initializing: {str(e)}")
+                db.session.commit()
+        except Exception as e:
+            print(f"Error initializing: {str(e)}")
 
 if __name__ == '__main__':
+    init_db(app)
+    seed_companies()
+    start(app)
     app.run(debug=True, host='0.0.0.0', port=5000)
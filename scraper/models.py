@@ -107,3 +107,51 @@ class CompanyRiskFactor(Base):
     mitigation_measures = Column(Text)
     created_at = Column(DateTime, default=datetime.utcnow)
     company = relationship("Company", back_populates="risk_factors")
+
+class CompanyRatios(Base):
+    """Snapshot dos indicadores de todas as empresas, recalculado em lote (CompanyRatiosETL)"""
+    __tablename__ = 'company_ratios'
+    cvm_code = Column(Integer, primary_key=True)
+    company_id = Column(Integer, ForeignKey('companies.id'), nullable=False, index=True)
+    ticker = Column(String(10))
+    statement_type = Column(String(10))
+    reference_year = Column(Integer)
+    reference_date = Column(DateTime)
+    price = Column(Float)
+    # Liquidez
+    current_ratio = Column(Float)
+    quick_ratio = Column(Float)
+    cash_ratio = Column(Float)
+    # Rentabilidade
+    gross_margin = Column(Float)
+    operating_margin = Column(Float)
+    net_margin = Column(Float)
+    roe = Column(Float)
+    roa = Column(Float)
+    roic = Column(Float)
+    # Endividamento
+    debt_to_equity = Column(Float)
+    debt_to_assets = Column(Float)
+    interest_coverage = Column(Float)
+    net_debt_to_ebitda = Column(Float)
+    # Eficiência
+    asset_turnover = Column(Float)
+    inventory_turnover = Column(Float)
+    receivables_turnover = Column(Float)
+    # Valuation
+    pe_ratio = Column(Float)
+    pb_ratio = Column(Float)
+    ev_ebitda = Column(Float)
+    price_to_sales = Column(Float)
+    price_to_book = Column(Float)
+    price_to_cash_flow = Column(Float)
+    # Por ação
+    earnings_per_share = Column(Float)
+    book_value_per_share = Column(Float)
+    dividend_per_share = Column(Float)
+    cash_flow_per_share = Column(Float)
+    # Mercado
+    market_cap = Column(Float)
+    enterprise_value = Column(Float)
+    shares_outstanding = Column(Float)
+    computed_at = Column(DateTime, default=datetime.utcnow)
@@ -6,14 +6,14 @@ Script para popular o database com empresas B3 reais
 import sys
 sys.path.append('.')
 
-from app import create_app, db
+from app import create_app, init_db, db
 from models import Company
 from sqlalchemy import text
 
 def populate_companies():
     """Popula o database com empresas B3 reais"""
     
-    app = create_app()
+    app = init_db(create_app())
     with app.app_context():
         
         print("🔄 Populando database com empresas B3...")
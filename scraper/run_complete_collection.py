@@ -10,7 +10,7 @@ sys.path.append('.')
 
 from services.complete_implementation import CompleteBrazilianFinancialAPI
 from models_extended import *
-from app import create_app, db
+from app import create_app, init_db, db
 import logging
 
 # Configure logging
@@ -33,7 +33,7 @@ def main():
     print()
     
     # Create Flask app context
-    app = create_app()
+    app = init_db(create_app())
     
     with app.app_context():
         try:
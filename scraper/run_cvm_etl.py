@@ -6,7 +6,7 @@ ETL simples e direto: carrega empresas DadosDeMercado + executa scraping CVM
 import sys
 sys.path.append('.')
 
-from app import create_app, db
+from app import create_app, init_db, db
 from models import Company
 from sqlalchemy import text
 import logging
@@ -158,7 +158,7 @@ def main():
     print(f"📅 {datetime.now().strftime('%d/%m/%Y %H:%M:%S')}")
     print()
     
-    app = create_app()
+    app = init_db(create_app())
     with app.app_context():
         
         # STEP 1: Clear and load companies
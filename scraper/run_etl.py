@@ -6,7 +6,7 @@ ETL completo: Extract (DadosDeMercado) -> Transform -> Load + Scraping CVM
 import sys
 sys.path.append('.')
 
-from app import create_app, db
+from app import create_app, init_db, db
 from models import Company
 from extract_companies import extract_companies_from_dadosdemercado
 from services.complete_implementation import CompleteBrazilianFinancialAPI
@@ -24,7 +24,7 @@ def run_complete_etl():
     print(f"📅 {datetime.now().strftime('%d/%m/%Y %H:%M:%S')}")
     print()
     
-    app = create_app()
+    app = init_db(create_app())
     with app.app_context():
         
         # EXTRACT: Obter empresas da DadosDeMercado
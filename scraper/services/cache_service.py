@@ -1,41 +1,359 @@
+import contextvars
+import fnmatch
 import json
 import logging
+import threading
+import time
+import uuid
+from collections import OrderedDict, defaultdict
 from datetime import datetime, timedelta
-from typing import Any, Optional
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
 
 logger = logging.getLogger(__name__)
 
+# Marker for entries stored with a stale-while-revalidate envelope
+SWR_MARKER = '__swr__'
+QUOTE_STALE_TTL = 300  # quotes may be served up to 5 min stale while refreshing
+
+# Tag index: `tag:<tag>` is a Redis set with the keys registered under that tag
+TAG_PREFIX = 'tag:'
+TAG_TTL = 7 * 86400  # refreshed on every write; bounds sets of tags no longer used
+INVALIDATION_BATCH = 1000
+# Namespaces keyed by a ticker / a company id / a CVM code -> position of that
+# id in the key. Most keys end with it (`quote:live:PETR4`, `ratios:market:42`);
+# the others put parameters after it (`historical:PETR4:1y:1d`, `dividends:42:5`).
+# Company ids (primary keys) and CVM codes are different domains, so they get
+# different tags: `company:42` and `cvm:9512` never collide.
+TICKER_NAMESPACES = {'quote': -1, 'technical': -1, 'history': -1, 'historical': 1}
+COMPANY_NAMESPACES = {'financial': -1, 'ratios': -1, 'dividends': 1}
+CVM_NAMESPACES = {'company': -1, 'statements': 1}
+
+
+def default_tags(key: str) -> List[str]:
+    """
+    Tags derived from the key layout: its namespace (`ns:quote`) plus
+    `ticker:{SYMBOL}`, `company:{id}` or `cvm:{code}` for the namespaces keyed
+    by them, read from the segment given in TICKER_NAMESPACES /
+    COMPANY_NAMESPACES / CVM_NAMESPACES.
+    """
+    parts = key.split(':')
+    namespace = parts[0]
+    tags = [f"ns:{namespace}"]
+    if len(parts) > 1:
+        if namespace in TICKER_NAMESPACES:
+            tags.append(f"ticker:{parts[TICKER_NAMESPACES[namespace]].upper()}")
+        elif namespace in COMPANY_NAMESPACES:
+            tags.append(f"company:{parts[COMPANY_NAMESPACES[namespace]]}")
+        elif namespace in CVM_NAMESPACES:
+            tags.append(f"cvm:{parts[CVM_NAMESPACES[namespace]]}")
+    return tags
+
+
+class LocalLRUCache:
+    """Bounded in-process LRU with per-entry expiry (values are already decoded)"""
+    
+    def __init__(self, max_entries: int = 10000):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, Tuple[Any, float, Optional[float]]]" = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def get(self, key: str) -> Optional[Tuple[Any, Optional[float]]]:
+        """Return (value, fresh_until) or None if missing/expired"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, expires_at, fresh_until = entry
+            if expires_at <= time.time():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value, fresh_until
+    
+    def set(self, key: str, value: Any, expires_at: float, fresh_until: Optional[float] = None):
+        with self._lock:
+            self._entries[key] = (value, expires_at, fresh_until)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+    
+    def delete(self, key: str) -> bool:
+        with self._lock:
+            return self._entries.pop(key, None) is not None
+    
+    def delete_matching(self, pattern: str) -> int:
+        with self._lock:
+            keys = [key for key in self._entries if fnmatch.fnmatchcase(key, pattern)]
+            for key in keys:
+                del self._entries[key]
+            return len(keys)
+    
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+    
+    def __len__(self):
+        return len(self._entries)
+
+
+class CacheStats:
+    """Hit/miss/latency counters per key namespace (`quote:`, `financial:`, `macro:`...)"""
+    
+    EVENTS = ('local_hits', 'redis_hits', 'misses', 'stale_served', 'coalesced', 'loads', 'load_errors')
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = defaultdict(lambda: dict.fromkeys(self.EVENTS + ('get_time', 'load_time'), 0))
+    
+    @staticmethod
+    def namespace(key: str) -> str:
+        return key.split(':', 1)[0]
+    
+    def record(self, key: str, event: str, elapsed: Optional[float] = None, timer: str = 'get_time'):
+        with self._lock:
+            counters = self._counters[self.namespace(key)]
+            counters[event] += 1
+            if elapsed is not None:
+                counters[timer] += elapsed
+    
+    def snapshot(self) -> Dict[str, dict]:
+        with self._lock:
+            result = {}
+            for namespace, counters in self._counters.items():
+                # stale_served is a subset of the hits (an expired entry found in a tier)
+                hits = counters['local_hits'] + counters['redis_hits']
+                lookups = hits + counters['misses']
+                result[namespace] = {
+                    **{event: counters[event] for event in self.EVENTS},
+                    'hit_ratio': round(hits / lookups, 4) if lookups else 0.0,
+                    'avg_get_ms': round(counters['get_time'] / lookups * 1000, 3) if lookups else 0.0,
+                    'avg_load_ms': round(counters['load_time'] / counters['loads'] * 1000, 3) if counters['loads'] else 0.0,
+                }
+            return result
+    
+    def reset(self):
+        with self._lock:
+            self._counters.clear()
+
+
+class _Flight:
+    """A load in progress for one key; followers wait on it instead of calling the loader"""
+    
+    def __init__(self):
+        self.event = threading.Event()
+        self.value = None
+
+
 class CacheService:
-    """Service for caching data using Redis"""
+    """
+    Service for caching data using Redis, with an in-process LRU in front of it.
     
-    def __init__(self, redis_client):
+    - `get`/`set` read and write both tiers; local entries live at most
+      `local_ttl` seconds so invalidations from other workers propagate.
+    - `get_or_set` coalesces concurrent misses (single-flight, in-process and
+      across workers via a short Redis lock) so only one caller runs the loader.
+    - entries written with `stale_ttl` are served stale for that long after
+      expiring while a single background refresh runs (stale-while-revalidate).
+    """
+    
+    def __init__(self, redis_client, local_max_entries: int = 10000, local_ttl: int = 30,
+                 lock_timeout: float = 5.0):
         self.redis = redis_client
         self.default_ttl = 3600  # 1 hour default TTL
+        self.local = LocalLRUCache(local_max_entries)
+        self.local_ttl = local_ttl
+        self.lock_timeout = lock_timeout
+        self.stats = CacheStats()
+        self._flights: Dict[str, _Flight] = {}
+        self._flights_lock = threading.Lock()
+    
+    def _decode(self, raw) -> Tuple[Any, Optional[float]]:
+        """Decode a Redis payload into (value, fresh_until)"""
+        payload = json.loads(raw)
+        if isinstance(payload, dict) and payload.get(SWR_MARKER):
+            return payload['value'], payload['fresh_until']
+        return payload, None
     
-    def get(self, key: str) -> Optional[Any]:
-        """Get value from cache"""
+    def _lookup(self, key: str) -> Optional[Tuple[Any, Optional[float]]]:
+        """Two-tier lookup. Returns (value, fresh_until) or None; records hit/miss counters"""
+        started = time.perf_counter()
+        entry = self.local.get(key)
+        if entry is not None:
+            self.stats.record(key, 'local_hits', time.perf_counter() - started)
+            return entry
+        
         try:
-            cached_value = self.redis.get(key)
-            if cached_value:
-                return json.loads(cached_value)
+            pipeline = self.redis.pipeline()
+            pipeline.get(key)
+            pipeline.pttl(key)
+            raw, pttl = pipeline.execute()
+            # An undecodable payload counts as a miss, so get_or_set reloads it
+            entry = self._decode(raw) if raw else None
+        except Exception as e:
+            logger.error(f"Cache get error for key {key}: {str(e)}")
+            entry, pttl = None, None
+        
+        if entry is None:
+            self.stats.record(key, 'misses', time.perf_counter() - started)
             return None
+        
+        value, fresh_until = entry
+        remaining = pttl / 1000 if pttl and pttl > 0 else self.local_ttl
+        self.local.set(key, value, time.time() + min(remaining, self.local_ttl), fresh_until)
+        self.stats.record(key, 'redis_hits', time.perf_counter() - started)
+        return value, fresh_until
+    
+    def get(self, key: str, allow_stale: bool = False) -> Optional[Any]:
+        """Get value from cache (stale entries only if `allow_stale`)"""
+        try:
+            entry = self._lookup(key)
+            if entry is None:
+                return None
+            value, fresh_until = entry
+            if fresh_until is not None and fresh_until <= time.time() and not allow_stale:
+                return None
+            return value
         except Exception as e:
             logger.error(f"Cache get error for key {key}: {str(e)}")
             return None
     
-    def set(self, key: str, value: Any, ttl: Optional[int] = None) -> bool:
-        """Set value in cache with TTL"""
+    def set(self, key: str, value: Any, ttl: Optional[int] = None, stale_ttl: int = 0,
+            tags: Optional[Iterable[str]] = None) -> bool:
+        """
+        Set value in cache with TTL (and an extra stale window if `stale_ttl`).
+        The key is registered under `default_tags(key)` plus any extra `tags`
+        in the same pipeline, so it can later be invalidated by tag.
+        """
         try:
             ttl = ttl or self.default_ttl
-            serialized_value = json.dumps(value, default=self._json_serializer)
-            return self.redis.setex(key, ttl, serialized_value)
+            now = time.time()
+            fresh_until = None
+            payload = value
+            if stale_ttl:
+                fresh_until = now + ttl
+                payload = {SWR_MARKER: 1, 'value': value, 'fresh_until': fresh_until}
+            serialized_value = json.dumps(payload, default=self._json_serializer)
+            
+            # Local tier keeps the decoded form so both tiers return the same thing
+            decoded = json.loads(serialized_value)
+            self.local.set(key, decoded['value'] if stale_ttl else decoded,
+                           now + min(ttl + stale_ttl, self.local_ttl), fresh_until)
+            
+            pipeline = self.redis.pipeline(transaction=False)
+            pipeline.setex(key, ttl + stale_ttl, serialized_value)
+            for tag in set(default_tags(key)).union(tags or ()):
+                pipeline.sadd(f"{TAG_PREFIX}{tag}", key)
+                pipeline.expire(f"{TAG_PREFIX}{tag}", max(TAG_TTL, ttl + stale_ttl))
+            return bool(pipeline.execute()[0])
         except Exception as e:
             logger.error(f"Cache set error for key {key}: {str(e)}")
             return False
     
+    def get_or_set(self, key: str, loader: Callable[[], Any], ttl: Optional[int] = None,
+                   stale_ttl: int = 0) -> Optional[Any]:
+        """
+        Return the cached value or load it once. A `None` result from the
+        loader is not cached. With `stale_ttl`, an expired value is returned
+        immediately and refreshed in the background.
+        """
+        entry = self._lookup(key)
+        if entry is not None:
+            value, fresh_until = entry
+            if fresh_until is None or fresh_until > time.time():
+                return value
+            self.stats.record(key, 'stale_served')
+            self._refresh_in_background(key, loader, ttl, stale_ttl)
+            return value
+        
+        return self._single_flight(key, lambda: self._load_and_store(key, loader, ttl, stale_ttl))
+    
+    def _load_and_store(self, key: str, loader: Callable[[], Any], ttl: Optional[int], stale_ttl: int):
+        started = time.perf_counter()
+        try:
+            value = loader()
+        except Exception as e:
+            self.stats.record(key, 'load_errors')
+            logger.error(f"Cache loader error for key {key}: {str(e)}")
+            return None
+        self.stats.record(key, 'loads', time.perf_counter() - started, timer='load_time')
+        if value is not None:
+            self.set(key, value, ttl, stale_ttl)
+        return value
+    
+    def _single_flight(self, key: str, load: Callable[[], Any]):
+        with self._flights_lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+        
+        if not leader:
+            self.stats.record(key, 'coalesced')
+            flight.event.wait(self.lock_timeout)
+            return flight.value
+        
+        try:
+            flight.value = self._load_with_redis_lock(key, load)
+            return flight.value
+        finally:
+            with self._flights_lock:
+                self._flights.pop(key, None)
+            flight.event.set()
+    
+    def _load_with_redis_lock(self, key: str, load: Callable[[], Any]):
+        """Only one worker process refills a key; the others wait briefly for its result"""
+        lock_key = f"lock:{key}"
+        token = uuid.uuid4().hex
+        try:
+            acquired = self.redis.set(lock_key, token, nx=True, px=int(self.lock_timeout * 1000))
+        except Exception as e:
+            logger.error(f"Cache lock error for key {key}: {str(e)}")
+            return load()
+        
+        if not acquired:
+            deadline = time.time() + self.lock_timeout
+            while time.time() < deadline:
+                time.sleep(0.05)
+                try:
+                    raw = self.redis.get(key)
+                    entry = self._decode(raw) if raw else None
+                except Exception:
+                    break
+                if entry is None:
+                    continue
+                value, fresh_until = entry
+                if fresh_until is None or fresh_until > time.time():
+                    self.local.set(key, value, time.time() + self.local_ttl, fresh_until)
+                    self.stats.record(key, 'coalesced')
+                    return value
+            return load()
+        
+        try:
+            return load()
+        finally:
+            try:
+                if self.redis.get(lock_key) in (token, token.encode()):
+                    self.redis.delete(lock_key)
+            except Exception as e:
+                logger.error(f"Cache unlock error for key {key}: {str(e)}")
+    
+    def _refresh_in_background(self, key: str, loader: Callable[[], Any], ttl: Optional[int], stale_ttl: int):
+        with self._flights_lock:
+            if key in self._flights:
+                return
+        # Copy the context so the loader still sees the Flask app context
+        context = contextvars.copy_context()
+        thread = threading.Thread(
+            target=context.run,
+            args=(self._single_flight, key, lambda: self._load_and_store(key, loader, ttl, stale_ttl)),
+            daemon=True,
+        )
+        thread.start()
+    
     def delete(self, key: str) -> bool:
         """Delete key from cache"""
         try:
+            self.local.delete(key)
             return bool(self.redis.delete(key))
         except Exception as e:
             logger.error(f"Cache delete error for key {key}: {str(e)}")
@@ -52,6 +370,7 @@ class CacheService:
     def increment(self, key: str, amount: int = 1) -> Optional[int]:
         """Increment value in cache"""
         try:
+            self.local.delete(key)
             return self.redis.incr(key, amount)
         except Exception as e:
             logger.error(f"Cache increment error for key {key}: {str(e)}")
@@ -60,6 +379,7 @@ class CacheService:
     def expire(self, key: str, ttl: int) -> bool:
         """Set expiration time for key"""
         try:
+            self.local.delete(key)
             return bool(self.redis.expire(key, ttl))
         except Exception as e:
             logger.error(f"Cache expire error for key {key}: {str(e)}")
@@ -74,13 +394,52 @@ class CacheService:
             logger.error(f"Cache TTL error for key {key}: {str(e)}")
             return None
     
+    def invalidate_tag(self, tag: str) -> int:
+        """
+        Delete every key registered under `tag`, popping the tag set in
+        batches (SPOP) and deleting each batch in one pipeline, so Redis is
+        never blocked by a whole-keyspace scan. Returns the number of keys deleted.
+        """
+        tag_key = f"{TAG_PREFIX}{tag}"
+        deleted = 0
+        try:
+            while True:
+                members = self.redis.spop(tag_key, INVALIDATION_BATCH)
+                if not members:
+                    break
+                keys = [m.decode() if isinstance(m, bytes) else m for m in members]
+                pipeline = self.redis.pipeline(transaction=False)
+                pipeline.delete(*keys)
+                # Drop the keys from their other derived tag sets (namespace counts)
+                for key in keys:
+                    self.local.delete(key)
+                    for other in default_tags(key):
+                        if other != tag:
+                            pipeline.srem(f"{TAG_PREFIX}{other}", key)
+                deleted += pipeline.execute()[0]
+        except Exception as e:
+            logger.error(f"Cache invalidate error for tag {tag}: {str(e)}")
+        return deleted
+    
     def flush_pattern(self, pattern: str) -> int:
         """Delete all keys matching pattern"""
+        namespace = pattern[:-2] if pattern.endswith(':*') else None
+        if namespace and not any(ch in namespace for ch in '*?[:'):
+            # Whole namespace: use its tag set instead of matching the keyspace
+            return self.invalidate_tag(f"ns:{namespace}")
+        
         try:
-            keys = self.redis.keys(pattern)
-            if keys:
-                return self.redis.delete(*keys)
-            return 0
+            self.local.delete_matching(pattern)
+            deleted = 0
+            batch = []
+            for key in self.redis.scan_iter(match=pattern, count=INVALIDATION_BATCH):
+                batch.append(key)
+                if len(batch) >= INVALIDATION_BATCH:
+                    deleted += self.redis.delete(*batch)
+                    batch = []
+            if batch:
+                deleted += self.redis.delete(*batch)
+            return deleted
         except Exception as e:
             logger.error(f"Cache flush pattern error for {pattern}: {str(e)}")
             return 0
@@ -88,41 +447,60 @@ class CacheService:
     def get_cache_stats(self) -> dict:
         """Get cache statistics"""
         try:
-            info = self.redis.info()
+            try:
+                info = self.redis.info()
+            except Exception as e:
+                logger.warning(f"Cache INFO unavailable: {str(e)}")
+                info = {}
+            pipeline = self.redis.pipeline(transaction=False)
+            pipeline.dbsize()
+            namespaces = [*TICKER_NAMESPACES, *COMPANY_NAMESPACES, *CVM_NAMESPACES, 'macro', 'market', 'news']
+            for namespace in namespaces:
+                pipeline.scard(f"{TAG_PREFIX}ns:{namespace}")
+            keys_count, *namespace_sizes = pipeline.execute()
             return {
                 'connected_clients': info.get('connected_clients', 0),
                 'used_memory': info.get('used_memory', 0),
                 'used_memory_human': info.get('used_memory_human', '0B'),
                 'keyspace_hits': info.get('keyspace_hits', 0),
                 'keyspace_misses': info.get('keyspace_misses', 0),
-                'keys_count': len(self.redis.keys('*'))
+                'keys_count': keys_count,
+                # Registered keys per namespace (may include entries that already expired)
+                'namespace_keys': {ns: size for ns, size in zip(namespaces, namespace_sizes) if size},
+                'local_entries': len(self.local),
+                'namespaces': self.stats.snapshot()
             }
         except Exception as e:
             logger.error(f"Cache stats error: {str(e)}")
             return {}
     
     def _json_serializer(self, obj):
-        """Custom JSON serializer for datetime objects"""
+        """JSON serializer for datetimes (ISO format) and anything else as str (Decimal, date, ...)"""
         if isinstance(obj, (datetime, )):
             return obj.isoformat()
-        raise TypeError(f"Object of type {type(obj)} is not JSON serializable")
+        return str(obj)
     
     # Specialized cache methods for financial data
     
     def cache_quote(self, ticker: str, quote_data: dict, ttl: int = 60):
-        """Cache quote data with short TTL"""
+        """Cache quote data with short TTL (kept a while longer for stale serving)"""
         key = f"quote:live:{ticker.upper()}"
-        return self.set(key, quote_data, ttl)
+        return self.set(key, quote_data, ttl, stale_ttl=QUOTE_STALE_TTL)
     
     def get_cached_quote(self, ticker: str) -> Optional[dict]:
         """Get cached quote data"""
         key = f"quote:live:{ticker.upper()}"
         return self.get(key)
     
+    def get_or_load_quote(self, ticker: str, loader: Callable[[], Optional[dict]], ttl: int = 60) -> Optional[dict]:
+        """Cached quote, loading it once on a miss and refreshing stale quotes in the background"""
+        key = f"quote:live:{ticker.upper()}"
+        return self.get_or_set(key, loader, ttl, stale_ttl=QUOTE_STALE_TTL)
+    
     def cache_financial_data(self, company_id: int, data_type: str, data: dict, ttl: int = 86400):
         """Cache financial data with long TTL"""
         key = f"financial:{data_type}:{company_id}"
-        return self.set(key, data, ttl)
+        return self.set(key, data, ttl, tags=[f"company:{company_id}"])
     
     def get_cached_financial_data(self, company_id: int, data_type: str) -> Optional[dict]:
         """Get cached financial data"""
@@ -159,33 +537,43 @@ class CacheService:
         key = f"macro:{indicator_code}"
         return self.get(key)
     
-    def invalidate_company_data(self, company_id: int):
-        """Invalidate all cached data for a company"""
-        patterns = [
-            f"financial:*:{company_id}",
-            f"ratios:*:{company_id}",
-            f"company:*:{company_id}"
-        ]
-        
-        total_deleted = 0
-        for pattern in patterns:
-            total_deleted += self.flush_pattern(pattern)
-        
-        return total_deleted
+    def invalidate_company_data(self, company_id: int, cvm_code: Optional[int] = None):
+        """Invalidate all cached data for a company (and its CVM-keyed entries when `cvm_code` is given)"""
+        deleted = self.invalidate_tag(f"company:{company_id}")
+        if cvm_code is not None:
+            deleted += self.invalidate_cvm_data(cvm_code)
+        return deleted
+    
+    def invalidate_cvm_data(self, cvm_code: int):
+        """Invalidate the entries keyed by a CVM code (`company:cvm:{code}`, `statements:{code}:...`)"""
+        return self.invalidate_tag(f"cvm:{cvm_code}")
+    
+    def invalidate_company_ratios(self, company_ids: Optional[Iterable[int]] = None) -> int:
+        """
+        Drop the cached ratio responses (`ratios:financial:{id}`,
+        `ratios:market:{id}`) of `company_ids`, or of every company when None
+        (full snapshot rebuild). Returns the number of keys deleted.
+        """
+        if company_ids is None:
+            return self.invalidate_tag('ns:ratios')
+        keys = [f"ratios:{kind}:{company_id}" for company_id in company_ids for kind in ('financial', 'market')]
+        if not keys:
+            return 0
+        try:
+            pipeline = self.redis.pipeline(transaction=False)
+            pipeline.delete(*keys)
+            for key in keys:
+                self.local.delete(key)
+                for tag in default_tags(key):
+                    pipeline.srem(f"{TAG_PREFIX}{tag}", key)
+            return pipeline.execute()[0]
+        except Exception as e:
+            logger.error(f"Cache ratios invalidation error: {str(e)}")
+            return 0
     
     def invalidate_ticker_data(self, ticker: str):
         """Invalidate all cached data for a ticker"""
-        patterns = [
-            f"quote:*:{ticker.upper()}",
-            f"technical:*:{ticker.upper()}",
-            f"history:*:{ticker.upper()}"
-        ]
-        
-        total_deleted = 0
-        for pattern in patterns:
-            total_deleted += self.flush_pattern(pattern)
-        
-        return total_deleted
+        return self.invalidate_tag(f"ticker:{ticker.upper()}")
     
     def warm_up_cache(self):
         """Warm up cache with frequently accessed data"""
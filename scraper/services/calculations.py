@@ -2,150 +2,125 @@ import numpy as np
 import pandas as pd
 from typing import Dict, List, Optional
 
+from services import indicator_engine, ratio_engine
+
 class FinancialCalculations:
     
     @staticmethod
     def calculate_financial_ratios(balance_sheet: Dict, income_statement: Dict) -> Dict:
-        """Calculate comprehensive financial ratios"""
+        """Calculate comprehensive financial ratios (single-company case of `ratio_engine`)"""
         try:
-            # Extract key values (handling potential missing data)
-            current_assets = balance_sheet.get('total_current_assets', 0)
-            total_assets = balance_sheet.get('total_assets', 0)
-            current_liabilities = balance_sheet.get('total_current_liabilities', 0)
-            total_liabilities = balance_sheet.get('total_liabilities', 0)
-            total_equity = balance_sheet.get('total_equity', total_assets - total_liabilities)
-            
-            revenue = income_statement.get('total_revenue', 0)
-            gross_profit = income_statement.get('gross_profit', 0)
-            operating_income = income_statement.get('operating_income', 0)
-            net_income = income_statement.get('net_income', 0)
-            
-            ratios = {
-                'liquidity_ratios': {
-                    'current_ratio': current_assets / current_liabilities if current_liabilities > 0 else 0,
-                    'quick_ratio': (current_assets - balance_sheet.get('inventory', 0)) / current_liabilities if current_liabilities > 0 else 0,
-                    'cash_ratio': balance_sheet.get('cash_and_equivalents', 0) / current_liabilities if current_liabilities > 0 else 0
-                },
-                'profitability_ratios': {
-                    'gross_margin': gross_profit / revenue if revenue > 0 else 0,
-                    'operating_margin': operating_income / revenue if revenue > 0 else 0,
-                    'net_margin': net_income / revenue if revenue > 0 else 0,
-                    'roe': net_income / total_equity if total_equity > 0 else 0,
-                    'roa': net_income / total_assets if total_assets > 0 else 0,
-                    'roic': operating_income / (total_equity + balance_sheet.get('total_debt', 0)) if (total_equity + balance_sheet.get('total_debt', 0)) > 0 else 0
-                },
-                'leverage_ratios': {
-                    'debt_to_equity': balance_sheet.get('total_debt', 0) / total_equity if total_equity > 0 else 0,
-                    'debt_to_assets': balance_sheet.get('total_debt', 0) / total_assets if total_assets > 0 else 0,
-                    'interest_coverage': operating_income / income_statement.get('interest_expense', 1) if income_statement.get('interest_expense', 0) > 0 else 0
-                },
-                'efficiency_ratios': {
-                    'asset_turnover': revenue / total_assets if total_assets > 0 else 0,
-                    'inventory_turnover': income_statement.get('cost_of_goods_sold', 0) / balance_sheet.get('inventory', 1) if balance_sheet.get('inventory', 0) > 0 else 0,
-                    'receivables_turnover': revenue / balance_sheet.get('accounts_receivable', 1) if balance_sheet.get('accounts_receivable', 0) > 0 else 0
-                }
+            inputs = {
+                'total_assets': balance_sheet.get('total_assets'),
+                'current_assets': balance_sheet.get('total_current_assets'),
+                'total_liabilities': balance_sheet.get('total_liabilities'),
+                'current_liabilities': balance_sheet.get('total_current_liabilities'),
+                'shareholders_equity': balance_sheet.get('total_equity'),
+                'cash_and_equivalents': balance_sheet.get('cash_and_equivalents'),
+                'inventory': balance_sheet.get('inventory'),
+                'accounts_receivable': balance_sheet.get('accounts_receivable'),
+                'total_debt': balance_sheet.get('total_debt'),
+                'revenue': income_statement.get('total_revenue'),
+                'gross_profit': income_statement.get('gross_profit'),
+                'operating_income': income_statement.get('operating_income'),
+                'net_income': income_statement.get('net_income'),
+                'interest_expense': income_statement.get('interest_expense'),
+                'cost_of_goods_sold': income_statement.get('cost_of_goods_sold'),
             }
+            ratios = ratio_engine.compute_ratios(pd.DataFrame([inputs])).iloc[0].to_dict()
             
-            return ratios
+            # Ratios without a meaningful denominator are reported as 0, as before
+            return ratio_engine.group_ratios(ratios, {
+                group: ratio_engine.RATIO_GROUPS[group]
+                for group in ('liquidity_ratios', 'profitability_ratios', 'leverage_ratios', 'efficiency_ratios')
+            }, missing=0)
             
         except Exception as e:
             return {'error': f'Error calculating ratios: {str(e)}'}
     
     @staticmethod
     def calculate_market_ratios(market_data: Dict, financial_data: Dict) -> Dict:
-        """Calculate market valuation ratios"""
+        """Calculate market valuation ratios (single-company case of `ratio_engine`)"""
         try:
-            market_cap = market_data.get('market_cap', 0)
-            share_price = market_data.get('share_price', 0)
-            shares_outstanding = market_data.get('shares_outstanding', 0)
-            
-            net_income = financial_data.get('net_income', 0)
-            book_value = financial_data.get('total_equity', 0)
-            revenue = financial_data.get('total_revenue', 0)
-            ebitda = financial_data.get('ebitda', 0)
-            
-            earnings_per_share = net_income / shares_outstanding if shares_outstanding > 0 else 0
-            book_value_per_share = book_value / shares_outstanding if shares_outstanding > 0 else 0
-            
-            ratios = {
-                'valuation_ratios': {
-                    'pe_ratio': share_price / earnings_per_share if earnings_per_share > 0 else 0,
-                    'pb_ratio': share_price / book_value_per_share if book_value_per_share > 0 else 0,
-                    'ev_ebitda': (market_cap + financial_data.get('total_debt', 0) - financial_data.get('cash', 0)) / ebitda if ebitda > 0 else 0,
-                    'price_to_sales': market_cap / revenue if revenue > 0 else 0,
-                    'price_to_book': market_cap / book_value if book_value > 0 else 0
-                },
-                'per_share_data': {
-                    'earnings_per_share': earnings_per_share,
-                    'book_value_per_share': book_value_per_share,
-                    'dividend_per_share': financial_data.get('dividends_paid', 0) / shares_outstanding if shares_outstanding > 0 else 0,
-                    'cash_flow_per_share': financial_data.get('operating_cash_flow', 0) / shares_outstanding if shares_outstanding > 0 else 0
-                },
-                'market_data': {
-                    'market_cap': market_cap,
-                    'enterprise_value': market_cap + financial_data.get('total_debt', 0) - financial_data.get('cash', 0),
-                    'shares_outstanding': shares_outstanding,
-                    'float_shares': shares_outstanding * 0.6  # Approximate free float
-                }
+            inputs = {
+                'price': market_data.get('share_price'),
+                'shares_outstanding': market_data.get('shares_outstanding'),
+                'market_cap': market_data.get('market_cap'),
+                'net_income': financial_data.get('net_income'),
+                'shareholders_equity': financial_data.get('total_equity'),
+                'revenue': financial_data.get('total_revenue'),
+                'ebitda': financial_data.get('ebitda'),
+                'total_debt': financial_data.get('total_debt'),
+                'cash_and_equivalents': financial_data.get('cash'),
+                'dividends_paid': financial_data.get('dividends_paid'),
+                'operating_cash_flow': financial_data.get('operating_cash_flow'),
             }
+            ratios = ratio_engine.compute_ratios(pd.DataFrame([inputs])).iloc[0].to_dict()
             
-            return ratios
+            result = ratio_engine.group_ratios(ratios, {
+                group: ratio_engine.RATIO_GROUPS[group]
+                for group in ('valuation_ratios', 'per_share_data', 'market_data')
+            }, missing=0)
+            result['market_data']['float_shares'] = result['market_data']['shares_outstanding'] * 0.6  # Approximate free float
+            return result
             
         except Exception as e:
             return {'error': f'Error calculating market ratios: {str(e)}'}
     
     @staticmethod
     def calculate_technical_indicators(prices: List[float], volumes: List[int] = None) -> Dict:
-        """Calculate technical analysis indicators"""
+        """Calculate technical analysis indicators (latest values of the full rolling series)"""
         try:
             if not prices or len(prices) < 2:
                 return {'error': 'Insufficient price data'}
             
-            prices_array = np.array(prices)
+            prices_array = np.array(prices, dtype=np.float64)
+            series = indicator_engine.compute_indicators(
+                prices_array,
+                volume=volumes if volumes and len(volumes) == len(prices) else None,
+                ema_windows=(12, 20, 26, 50)
+            )
+            values = indicator_engine.latest(series)
             
-            # Simple Moving Averages
-            sma_20 = np.mean(prices_array[-20:]) if len(prices_array) >= 20 else np.mean(prices_array)
-            sma_50 = np.mean(prices_array[-50:]) if len(prices_array) >= 50 else np.mean(prices_array)
-            sma_200 = np.mean(prices_array[-200:]) if len(prices_array) >= 200 else np.mean(prices_array)
-            
-            # RSI calculation
-            def calculate_rsi(prices, period=14):
-                if len(prices) < period + 1:
-                    return 50  # Neutral RSI
-                
-                deltas = np.diff(prices)
-                gains = np.where(deltas > 0, deltas, 0)
-                losses = np.where(deltas < 0, -deltas, 0)
-                
-                avg_gain = np.mean(gains[-period:])
-                avg_loss = np.mean(losses[-period:])
-                
-                if avg_loss == 0:
-                    return 100
-                
-                rs = avg_gain / avg_loss
-                rsi = 100 - (100 / (1 + rs))
-                return rsi
-            
-            # Bollinger Bands
-            sma_20_full = sma_20
-            std_20 = np.std(prices_array[-20:]) if len(prices_array) >= 20 else np.std(prices_array)
+            def value_or_mean(name, window):
+                # Shorter histories fall back to the mean of what is available
+                value = values.get(name)
+                if value is None:
+                    value = float(np.mean(prices_array[-window:]))
+                return round(value, 2)
+            
+            std_20 = np.std(prices_array[-20:])
+            middle = value_or_mean('bb_middle', 20)
             
             indicators = {
-                'sma_20': round(sma_20, 2),
-                'sma_50': round(sma_50, 2),
-                'sma_200': round(sma_200, 2),
-                'rsi': round(calculate_rsi(prices_array), 2),
+                'sma_20': value_or_mean('sma_20', 20),
+                'sma_50': value_or_mean('sma_50', 50),
+                'sma_200': value_or_mean('sma_200', 200),
+                'ema_12': value_or_mean('ema_12', 12),
+                'ema_20': value_or_mean('ema_20', 20),
+                'ema_26': value_or_mean('ema_26', 26),
+                'ema_50': value_or_mean('ema_50', 50),
+                'rsi': round(values['rsi'], 2) if values['rsi'] is not None else 50,  # Neutral RSI
                 'bollinger_bands': {
-                    'upper': round(sma_20_full + (2 * std_20), 2),
-                    'middle': round(sma_20_full, 2),
-                    'lower': round(sma_20_full - (2 * std_20), 2)
+                    'upper': round(values['bb_upper'], 2) if values['bb_upper'] is not None else round(middle + 2 * std_20, 2),
+                    'middle': middle,
+                    'lower': round(values['bb_lower'], 2) if values['bb_lower'] is not None else round(middle - 2 * std_20, 2)
                 },
                 'current_price': round(prices_array[-1], 2),
-                'price_change': round(prices_array[-1] - prices_array[-2], 2) if len(prices_array) >= 2 else 0,
-                'price_change_percent': round(((prices_array[-1] - prices_array[-2]) / prices_array[-2]) * 100, 2) if len(prices_array) >= 2 and prices_array[-2] != 0 else 0
+                'price_change': round(prices_array[-1] - prices_array[-2], 2),
+                'price_change_percent': round(((prices_array[-1] - prices_array[-2]) / prices_array[-2]) * 100, 2) if prices_array[-2] != 0 else 0
             }
             
+            if values['macd_signal'] is not None:
+                indicators['macd'] = {
+                    'macd_line': round(values['macd_line'], 4),
+                    'signal_line': round(values['macd_signal'], 4),
+                    'histogram': round(values['macd_histogram'], 4),
+                    'signal': 'bullish' if values['macd_line'] > values['macd_signal'] else 'bearish'
+                }
+            if values.get('obv') is not None:
+                indicators['obv'] = values['obv']
+            
             return indicators
             
         except Exception as e:
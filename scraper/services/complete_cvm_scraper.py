@@ -10,10 +10,16 @@ import logging
 from datetime import datetime, timedelta
 from typing import Dict, List, Optional, Any
 import time
+import io
 import json
 from sqlalchemy import create_engine, text
 import os
 
+try:
+    from .cvm_parquet_store import get_parquet_store, read_cvm_csv
+except ImportError:
+    from cvm_parquet_store import get_parquet_store, read_cvm_csv
+
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -36,6 +42,9 @@ class CompleteCVMScraper:
         self.db_url = os.environ.get("DATABASE_URL", "sqlite:///mercado_brasil.db")
         self.engine = create_engine(self.db_url)
         
+        # Staging Parquet dos zips da CVM (None sem pyarrow)
+        self.parquet_store = get_parquet_store()
+        
         # Years range - desde 2012
         self.years_range = list(range(2012, datetime.now().year + 1))
         logger.info(f"Initialized scraper for years: {self.years_range}")
@@ -98,6 +107,7 @@ class CompleteCVMScraper:
         logger.info("=== INICIANDO PONTO 2: Demonstrações Financeiras ===")
         
         statement_types = ['DFP', 'ITR']
+        file_types = ['BPA', 'BPP', 'DRE', 'DFC_MD', 'DFC_MI', 'DMPL', 'DVA']
         
         for statement_type in statement_types:
             url = f"{self.base_url_cvm}/CIA_ABERTA/DOC/{statement_type}/DADOS/"
@@ -106,27 +116,23 @@ class CompleteCVMScraper:
                 try:
                     logger.info(f"Coletando {statement_type} para {year}")
                     
-                    # URLs dos diferentes arquivos CSV
-                    files = {
-                        'BPA': f"dfp_cia_aberta_BPA_con_{year}.csv" if statement_type == 'DFP' else f"itr_cia_aberta_BPA_con_{year}.csv",
-                        'BPP': f"dfp_cia_aberta_BPP_con_{year}.csv" if statement_type == 'DFP' else f"itr_cia_aberta_BPP_con_{year}.csv",
-                        'DRE': f"dfp_cia_aberta_DRE_con_{year}.csv" if statement_type == 'DFP' else f"itr_cia_aberta_DRE_con_{year}.csv",
-                        'DFC_MD': f"dfp_cia_aberta_DFC_MD_con_{year}.csv" if statement_type == 'DFP' else f"itr_cia_aberta_DFC_MD_con_{year}.csv",
-                        'DFC_MI': f"dfp_cia_aberta_DFC_MI_con_{year}.csv" if statement_type == 'DFP' else f"itr_cia_aberta_DFC_MI_con_{year}.csv",
-                        'DMPL': f"dfp_cia_aberta_DMPL_con_{year}.csv" if statement_type == 'DFP' else f"itr_cia_aberta_DMPL_con_{year}.csv",
-                        'DVA': f"dfp_cia_aberta_DVA_con_{year}.csv" if statement_type == 'DFP' else f"itr_cia_aberta_DVA_con_{year}.csv"
-                    }
-                    
-                    for file_type, filename in files.items():
-                        csv_url = f"{url}{filename}"
-                        
+                    for file_type in file_types:
                         try:
-                            response = self.session.get(csv_url, timeout=30)
-                            if response.status_code == 200:
-                                df = pd.read_csv(csv_url, sep=';', encoding='latin-1')
+                            if self.parquet_store is not None:
+                                # Zip convertido uma única vez; leitura colunar com dtypes compactos
+                                df = self.parquet_store.read_statement(
+                                    statement_type.lower(), year, f"{file_type}_con", session=self.session
+                                )
+                            else:
+                                filename = f"{statement_type.lower()}_cia_aberta_{file_type}_con_{year}.csv"
+                                response = self.session.get(f"{url}{filename}", timeout=30)
+                                df = read_cvm_csv(io.BytesIO(response.content)) \
+                                    if response.status_code == 200 else pd.DataFrame()
+                                time.sleep(1)
+                            
+                            if not df.empty:
                                 self._save_financial_statements_data(df, year, statement_type, file_type)
                                 logger.info(f"✅ {statement_type} {file_type} {year} salvo")
-                            time.sleep(1)
                         except Exception as e:
                             logger.warning(f"Erro em {file_type} {year}: {str(e)}")
                             
@@ -2,6 +2,7 @@
 Scraper completo para todos os dados financeiros, insiders e históricos
 """
 import requests
+import numpy as np
 import pandas as pd
 import logging
 from datetime import datetime, timedelta
@@ -10,6 +11,7 @@ import time
 import json
 from app import db
 from models import Company, FinancialStatement, Quote
+from services import indicator_engine
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -261,48 +263,29 @@ class CompleteFinancialScraper:
             # Buscar dados para cálculo de indicadores
             quotes = self.get_historical_quotes(ticker)
             if quotes:
-                closes = [float(q['close']) for q in quotes[-50:] if q['close']]  # Últimos 50 dias
+                closes = np.array([float(q['close']) for q in quotes if q['close']])
                 
                 if len(closes) >= 20:
-                    # SMA 20
-                    indicators['sma_20'] = sum(closes[-20:]) / 20
+                    series = indicator_engine.compute_indicators(closes, sma_windows=(20, 50), ema_windows=())
+                    values = indicator_engine.latest(series)
                     
-                    # SMA 50
-                    if len(closes) >= 50:
-                        indicators['sma_50'] = sum(closes[-50:]) / 50
+                    indicators['sma_20'] = values['sma_20']
+                    if values['sma_50'] is not None:
+                        indicators['sma_50'] = values['sma_50']
                     
-                    # RSI simplificado
-                    indicators['rsi'] = self._calculate_rsi(closes)
+                    # RSI de Wilder
+                    indicators['rsi'] = values['rsi'] if values['rsi'] is not None else 50.0
                     
-                    # Volatilidade
-                    returns = [(closes[i] - closes[i-1]) / closes[i-1] for i in range(1, len(closes))]
-                    indicators['volatility'] = (sum(r**2 for r in returns) / len(returns)) ** 0.5
+                    # Volatilidade (últimos 50 dias)
+                    recent = closes[-50:]
+                    returns = np.diff(recent) / recent[:-1]
+                    indicators['volatility'] = float(np.sqrt(np.mean(returns ** 2)))
         
         except Exception as e:
             logger.error(f"Erro ao calcular indicadores técnicos {ticker}: {str(e)}")
         
         return indicators
     
-    def _calculate_rsi(self, prices: List[float], period: int = 14) -> float:
-        """Calcula RSI"""
-        if len(prices) < period + 1:
-            return 50.0
-        
-        deltas = [prices[i] - prices[i-1] for i in range(1, len(prices))]
-        gains = [d if d > 0 else 0 for d in deltas]
-        losses = [-d if d < 0 else 0 for d in deltas]
-        
-        avg_gain = sum(gains[-period:]) / period
-        avg_loss = sum(losses[-period:]) / period
-        
-        if avg_loss == 0:
-            return 100.0
-        
-        rs = avg_gain / avg_loss
-        rsi = 100 - (100 / (1 + rs))
-        
-        return rsi
-    
     def get_news_and_sentiment(self, ticker: str) -> Dict:
         """Notícias e análise de sentimento"""
         return {
@@ -0,0 +1,374 @@
+"""
+Cache local em disco para os arquivos do portal de dados abertos da CVM
+
+Todos os pontos de entrada que baixam `dfp/itr/fre/fca/ipe_cia_aberta_{ano}.zip`
+passam por aqui, de modo que uma coleta completa baixa cada arquivo no máximo
+uma vez:
+
+- os arquivos são gravados de forma endereçada por conteúdo
+  (`objects/<sha256[:2]>/<sha256>`), com um índice URL -> sha256/ETag/Last-Modified;
+- requisições seguintes usam GET condicional (If-None-Match / If-Modified-Since)
+  e uma URL já validada no processo não volta à rede;
+- o tamanho total é limitado, com remoção LRU dos objetos menos acessados; o
+  objeto antigo de uma URL cujo conteúdo mudou é apagado, e objetos que
+  nenhuma entrada do índice referencia são varridos na remoção;
+- o índice é lido e regravado sob um lock de arquivo (`index.lock`), de modo
+  que vários processos de ETL podem usar o mesmo diretório;
+- a listagem de membros de um zip lê apenas o diretório central (arquivo local
+  ou HTTP Range), sem baixar o zip inteiro.
+"""
+import hashlib
+import io
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+import zipfile
+from contextlib import contextmanager
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import requests
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser('~'), '.cache', 'finance-dashboard', 'cvm')
+DEFAULT_MAX_BYTES = 5 * 1024 ** 3  # 5 GB
+DOWNLOAD_BLOCK_SIZE = 1024 * 1024
+RANGE_BUFFER_SIZE = 64 * 1024
+
+
+@dataclass
+class CachedFile:
+    """Arquivo presente no cache local."""
+    url: str
+    path: Path
+    sha256: str
+    size: int
+    etag: Optional[str] = None
+    last_modified: Optional[str] = None
+
+    def open(self):
+        return open(self.path, 'rb')
+
+    def zip(self) -> zipfile.ZipFile:
+        return zipfile.ZipFile(self.path)
+
+
+class _RangeNotSupported(Exception):
+    pass
+
+
+class _HTTPRangeFile(io.RawIOBase):
+    """Arquivo remoto somente leitura com seek, lido via requisições HTTP Range."""
+
+    def __init__(self, session, url: str, size: int, timeout: int = 60):
+        self.session = session
+        self.url = url
+        self.size = size
+        self.timeout = timeout
+        self.position = 0
+        self.requests_made = 0
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self.position
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_SET:
+            self.position = offset
+        elif whence == io.SEEK_CUR:
+            self.position += offset
+        else:
+            self.position = self.size + offset
+        return self.position
+
+    def readinto(self, buffer):
+        if self.position >= self.size:
+            return 0
+        end = min(self.position + len(buffer), self.size) - 1
+        response = self.session.get(self.url, headers={'Range': f'bytes={self.position}-{end}'}, timeout=self.timeout)
+        self.requests_made += 1
+        if response.status_code != 206:
+            raise _RangeNotSupported(f"Servidor não suporta Range para {self.url} (status {response.status_code})")
+        data = response.content
+        buffer[:len(data)] = data
+        self.position += len(data)
+        return len(data)
+
+
+class CVMDownloadCache:
+    """Cache de downloads endereçado por conteúdo com GET condicional e LRU."""
+
+    def __init__(self, cache_dir: Optional[str] = None, max_bytes: Optional[int] = None, session=None):
+        self.cache_dir = Path(cache_dir or os.environ.get('CVM_CACHE_DIR', DEFAULT_CACHE_DIR))
+        self.max_bytes = int(max_bytes or os.environ.get('CVM_CACHE_MAX_BYTES', DEFAULT_MAX_BYTES))
+        self.session = session or requests.Session()
+        self.objects_dir = self.cache_dir / 'objects'
+        self.index_path = self.cache_dir / 'index.json'
+        self.index_lock_path = self.cache_dir / 'index.lock'
+        self.objects_dir.mkdir(parents=True, exist_ok=True)
+
+        self._lock = threading.RLock()
+        self._url_locks: Dict[str, threading.Lock] = {}
+        self._validated = set()  # URLs já conferidas com o servidor neste processo
+        self.stats = {'hits': 0, 'revalidated': 0, 'downloads': 0, 'bytes_downloaded': 0, 'evictions': 0}
+
+    # --- índice -----------------------------------------------------------
+
+    def _load_index(self) -> Dict[str, dict]:
+        try:
+            with open(self.index_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {}
+
+    def _save_index(self, index: Dict[str, dict]):
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix='.json')
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump(index, f)
+        os.replace(tmp_path, self.index_path)
+
+    @contextmanager
+    def _locked_index(self):
+        """
+        Índice para leitura e alteração exclusivas (entre threads e processos);
+        é regravado na saída. Leituras simples não precisam do lock, porque o
+        índice é sempre substituído por inteiro (os.replace).
+        """
+        with self._lock, open(self.index_lock_path, 'a+b') as lock_file:
+            if fcntl:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            else:
+                lock_file.seek(0)
+                msvcrt.locking(lock_file.fileno(), msvcrt.LK_LOCK, 1)
+            try:
+                index = self._load_index()
+                yield index
+                self._save_index(index)
+            finally:
+                if fcntl:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+                else:
+                    lock_file.seek(0)
+                    msvcrt.locking(lock_file.fileno(), msvcrt.LK_UNLCK, 1)
+
+    def _object_path(self, sha256: str) -> Path:
+        return self.objects_dir / sha256[:2] / sha256
+
+    def _to_cached_file(self, url: str, entry: dict) -> CachedFile:
+        return CachedFile(
+            url=url,
+            path=self._object_path(entry['sha256']),
+            sha256=entry['sha256'],
+            size=entry['size'],
+            etag=entry.get('etag'),
+            last_modified=entry.get('last_modified'),
+        )
+
+    def _touch(self, url: str):
+        with self._locked_index() as index:
+            if url in index:
+                index[url]['last_access'] = time.time()
+
+    def _url_lock(self, url: str) -> threading.Lock:
+        with self._lock:
+            return self._url_locks.setdefault(url, threading.Lock())
+
+    # --- API pública ------------------------------------------------------
+
+    def get_cached(self, url: str) -> Optional[CachedFile]:
+        """Entrada do cache para a URL, sem acessar a rede."""
+        entry = self._load_index().get(url)
+        if entry and self._object_path(entry['sha256']).exists():
+            return self._to_cached_file(url, entry)
+        return None
+
+    def fetch(self, url: str, session=None, timeout: int = 300, revalidate: bool = False) -> Optional[CachedFile]:
+        """
+        Garante a URL no cache e retorna o CachedFile, ou None em caso de 404.
+        Uma URL já validada neste processo é servida direto do disco, a menos
+        que `revalidate=True`. Outros erros HTTP são propagados.
+        """
+        http = session or self.session
+        with self._url_lock(url):
+            cached = self.get_cached(url)
+            if cached and url in self._validated and not revalidate:
+                self.stats['hits'] += 1
+                self._touch(url)
+                return cached
+
+            headers = {}
+            if cached:
+                if cached.etag:
+                    headers['If-None-Match'] = cached.etag
+                if cached.last_modified:
+                    headers['If-Modified-Since'] = cached.last_modified
+
+            with http.get(url, headers=headers, stream=True, timeout=timeout) as response:
+                if response.status_code == 304 and cached:
+                    self.stats['revalidated'] += 1
+                    self._validated.add(url)
+                    self._touch(url)
+                    logger.debug(f"Cache revalidado (304): {url}")
+                    return cached
+                if response.status_code == 404:
+                    return None
+                response.raise_for_status()
+                result = self._store(url, response)
+
+            self._validated.add(url)
+            self.evict(keep=result.sha256)
+            return result
+
+    def _store(self, url: str, response) -> CachedFile:
+        digest = hashlib.sha256()
+        size = 0
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix='.part')
+        try:
+            with os.fdopen(fd, 'wb') as tmp:
+                for block in response.iter_content(chunk_size=DOWNLOAD_BLOCK_SIZE):
+                    tmp.write(block)
+                    digest.update(block)
+                    size += len(block)
+            sha256 = digest.hexdigest()
+            entry = {
+                'sha256': sha256,
+                'size': size,
+                'etag': response.headers.get('ETag'),
+                'last_modified': response.headers.get('Last-Modified'),
+                'last_access': time.time(),
+            }
+            # Objeto e índice mudam juntos sob o lock, para a varredura de órfãos
+            # de outro processo nunca ver um objeto novo ainda sem entrada
+            with self._locked_index() as index:
+                object_path = self._object_path(sha256)
+                object_path.parent.mkdir(parents=True, exist_ok=True)
+                if object_path.exists():
+                    os.remove(tmp_path)  # mesmo conteúdo já armazenado por outra URL
+                else:
+                    os.replace(tmp_path, object_path)
+                previous = index.get(url)
+                index[url] = entry
+                if previous and previous['sha256'] != sha256:
+                    # Conteúdo novo para a URL: o objeto antigo sai se nenhuma outra URL o usa
+                    if not any(other['sha256'] == previous['sha256'] for other in index.values()):
+                        self._remove_object(previous['sha256'])
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+        self.stats['downloads'] += 1
+        self.stats['bytes_downloaded'] += size
+        logger.info(f"Baixado para o cache: {url} ({size / (1024 * 1024):.1f} MB)")
+        return self._to_cached_file(url, entry)
+
+    def list_members(self, url: str, session=None, timeout: int = 60) -> List[str]:
+        """
+        Lista os membros de um zip lendo só o diretório central: do disco se
+        o arquivo já está no cache, senão via HTTP Range. Se o servidor não
+        aceitar Range, recorre ao download completo (que fica no cache).
+        """
+        cached = self.get_cached(url)
+        if cached:
+            with cached.zip() as zip_file:
+                return zip_file.namelist()
+
+        http = session or self.session
+        head = http.head(url, timeout=timeout, allow_redirects=True)
+        if head.status_code == 404:
+            return []
+        head.raise_for_status()
+        size = head.headers.get('Content-Length')
+        if size and head.headers.get('Accept-Ranges', '').lower() == 'bytes':
+            raw = _HTTPRangeFile(http, url, int(size), timeout)
+            try:
+                with zipfile.ZipFile(io.BufferedReader(raw, buffer_size=RANGE_BUFFER_SIZE)) as zip_file:
+                    names = zip_file.namelist()
+                logger.debug(f"Diretório central de {url} lido com {raw.requests_made} requisições Range")
+                return names
+            except _RangeNotSupported as e:
+                logger.warning(str(e))
+
+        fetched = self.fetch(url, session=session)
+        if not fetched:
+            return []
+        with fetched.zip() as zip_file:
+            return zip_file.namelist()
+
+    def _remove_object(self, sha256: str):
+        path = self._object_path(sha256)
+        if path.exists():
+            os.remove(path)
+
+    def _sweep_orphans(self, index: Dict[str, dict]) -> int:
+        """Apaga objetos sem entrada no índice (ex.: gravados antes desta limpeza). Retorna bytes liberados."""
+        referenced = {entry['sha256'] for entry in index.values()}
+        freed = 0
+        for path in self.objects_dir.glob('*/*'):
+            if path.name not in referenced:
+                freed += path.stat().st_size
+                os.remove(path)
+        return freed
+
+    def evict(self, keep: Optional[str] = None) -> int:
+        """
+        Remove objetos órfãos e depois os menos usados até o cache caber em
+        `max_bytes`. Retorna bytes liberados.
+        """
+        with self._locked_index() as index:
+            orphans = self._sweep_orphans(index)
+            objects: Dict[str, dict] = {}
+            for url, entry in index.items():
+                obj = objects.setdefault(entry['sha256'], {'size': entry['size'], 'last_access': 0, 'urls': []})
+                obj['last_access'] = max(obj['last_access'], entry.get('last_access', 0))
+                obj['urls'].append(url)
+
+            total = sum(obj['size'] for obj in objects.values())
+            freed = 0
+            if orphans:
+                logger.info(f"Cache CVM: {orphans / (1024 * 1024):.1f} MB de objetos órfãos removidos")
+            for sha256, obj in sorted(objects.items(), key=lambda item: item[1]['last_access']):
+                if total <= self.max_bytes:
+                    break
+                if sha256 == keep:
+                    continue
+                self._remove_object(sha256)
+                for url in obj['urls']:
+                    index.pop(url, None)
+                    self._validated.discard(url)
+                total -= obj['size']
+                freed += obj['size']
+                self.stats['evictions'] += 1
+
+            if freed:
+                logger.info(f"Cache CVM: {freed / (1024 * 1024):.1f} MB liberados (LRU)")
+            return orphans + freed
+
+
+_default_cache = None
+_default_cache_lock = threading.Lock()
+
+
+def get_download_cache() -> CVMDownloadCache:
+    """Instância compartilhada do cache (mesmo diretório e mesma sessão HTTP)."""
+    global _default_cache
+    with _default_cache_lock:
+        if _default_cache is None:
+            _default_cache = CVMDownloadCache()
+        return _default_cache
@@ -0,0 +1,250 @@
+"""
+Staging colunar (Parquet) para os CSVs de dados abertos da CVM
+
+Cada CSV de `{dataset}_cia_aberta_{ano}.zip` é convertido UMA vez para Parquet,
+particionado por dataset/ano/tipo de demonstração:
+
+    <raiz>/dataset=dfp/year=2023/statement=BPA_con/part-0.parquet
+
+- dtypes explícitos e compactos: categóricas para CD_CONTA/DS_CONTA e demais
+  colunas de baixa cardinalidade, int32 para CD_CVM, float64 para VL_CONTA e
+  datas como datetime64;
+- linhas ordenadas por CD_CVM em row groups pequenos, de modo que filtros por
+  código CVM/CNPJ/conta são empurrados para o leitor (predicate pushdown) e a
+  extração de uma empresa lê kilobytes em vez do CSV do ano inteiro;
+- a conversão é refeita apenas quando o zip de origem muda (sha256 do cache
+  de downloads).
+
+Requer `pyarrow`; sem ele `PARQUET_AVAILABLE` é False e os consumidores
+continuam lendo os CSVs diretamente.
+"""
+import json
+import logging
+import os
+import shutil
+import tempfile
+import threading
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+
+import pandas as pd
+
+try:
+    from .cvm_download_cache import get_download_cache
+except ImportError:
+    from cvm_download_cache import get_download_cache
+
+try:
+    import pyarrow  # noqa: F401
+    PARQUET_AVAILABLE = True
+except ImportError:
+    PARQUET_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+CVM_BASE_URL = "https://dados.cvm.gov.br/dados"
+DEFAULT_STORE_DIR = os.path.join(os.path.expanduser('~'), '.cache', 'finance-dashboard', 'cvm-parquet')
+MANIFEST_FILE = '_manifest.json'
+ROW_GROUP_SIZE = 32 * 1024
+MAIN_STATEMENT = 'cia_aberta'  # arquivo índice do zip (ex.: dfp_cia_aberta_2023.csv)
+
+# Colunas conhecidas dos CSVs de demonstrações (DFP/ITR) e seus dtypes
+CATEGORY_COLUMNS = [
+    'CNPJ_CIA', 'DENOM_CIA', 'GRUPO_DFP', 'MOEDA', 'ESCALA_MOEDA',
+    'ORDEM_EXERC', 'CD_CONTA', 'DS_CONTA', 'ST_CONTA_FIXA', 'COLUNA_DF', 'CATEG_DOC',
+]
+INTEGER_COLUMNS = {'CD_CVM': 'Int32', 'VERSAO': 'Int16', 'ID_DOC': 'Int32'}
+FLOAT_COLUMNS = ['VL_CONTA']
+DATE_COLUMNS = ['DT_REFER', 'DT_INI_EXERC', 'DT_FIM_EXERC', 'DT_RECEB']
+
+
+def statement_name(dataset: str, member: str, year: int) -> str:
+    """`dfp_cia_aberta_BPA_con_2023.csv` -> `BPA_con`; o arquivo índice vira `cia_aberta`."""
+    stem = Path(member).name.rsplit('.', 1)[0]
+    prefix = f"{dataset}_cia_aberta_"
+    suffix = f"_{year}"
+    if stem == f"{dataset}_cia_aberta{suffix}":
+        return MAIN_STATEMENT
+    if stem.startswith(prefix):
+        stem = stem[len(prefix):]
+    if stem.endswith(suffix):
+        stem = stem[:-len(suffix)]
+    return stem
+
+
+def read_cvm_csv(source) -> pd.DataFrame:
+    """Lê um CSV da CVM (latin-1, `;`) aplicando os dtypes compactos às colunas conhecidas."""
+    dtypes = {col: str for col in list(INTEGER_COLUMNS) + FLOAT_COLUMNS + DATE_COLUMNS}
+    dtypes.update({col: 'category' for col in CATEGORY_COLUMNS})
+    df = pd.read_csv(source, sep=';', encoding='latin-1', low_memory=False, dtype=dtypes)
+    for col, dtype in INTEGER_COLUMNS.items():
+        if col in df.columns:
+            df[col] = pd.to_numeric(df[col], errors='coerce').astype(dtype)
+    for col in FLOAT_COLUMNS:
+        if col in df.columns:
+            df[col] = pd.to_numeric(df[col], errors='coerce').astype('float64')
+    for col in DATE_COLUMNS:
+        if col in df.columns:
+            df[col] = pd.to_datetime(df[col], errors='coerce', format='%Y-%m-%d')
+    return df
+
+
+class CVMParquetStore:
+    """Conversão única CSV -> Parquet e consultas com pushdown por empresa/conta."""
+
+    def __init__(self, root: Optional[str] = None, download_cache=None, base_url: str = CVM_BASE_URL):
+        if not PARQUET_AVAILABLE:
+            raise ImportError("pyarrow não está instalado; o staging Parquet da CVM está indisponível")
+        self.root = Path(root or os.environ.get('CVM_PARQUET_DIR', DEFAULT_STORE_DIR))
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.download_cache = download_cache or get_download_cache()
+        self.base_url = base_url
+        self._lock = threading.Lock()
+        self._partition_locks: Dict[str, threading.Lock] = {}
+
+    def zip_url(self, dataset: str, year: int) -> str:
+        return f"{self.base_url}/CIA_ABERTA/DOC/{dataset.upper()}/DADOS/{dataset}_cia_aberta_{year}.zip"
+
+    def _year_dir(self, dataset: str, year: int) -> Path:
+        return self.root / f"dataset={dataset}" / f"year={year}"
+
+    def _statement_path(self, dataset: str, year: int, statement: str) -> Path:
+        return self._year_dir(dataset, year) / f"statement={statement}" / 'part-0.parquet'
+
+    def _load_manifest(self, dataset: str, year: int) -> Optional[dict]:
+        try:
+            with open(self._year_dir(dataset, year) / MANIFEST_FILE, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+
+    def _partition_lock(self, key: str) -> threading.Lock:
+        with self._lock:
+            return self._partition_locks.setdefault(key, threading.Lock())
+
+    # --- conversão -----------------------------------------------------------
+
+    def ensure(self, dataset: str, year: int, session=None) -> Optional[dict]:
+        """
+        Garante o ano convertido para Parquet e retorna o manifesto
+        (`{'source_sha256', 'statements': {statement: chave_original}}`),
+        ou None se o zip não existir na CVM.
+        """
+        with self._partition_lock(f"{dataset}/{year}"):
+            cached_zip = self.download_cache.fetch(self.zip_url(dataset, year), session=session)
+            if cached_zip is None:
+                return None
+
+            manifest = self._load_manifest(dataset, year)
+            if manifest and manifest.get('source_sha256') == cached_zip.sha256:
+                return manifest
+
+            logger.info(f"Convertendo {dataset}_cia_aberta_{year}.zip para Parquet")
+            year_dir = self._year_dir(dataset, year)
+            year_dir.parent.mkdir(parents=True, exist_ok=True)
+            staging_dir = Path(tempfile.mkdtemp(dir=year_dir.parent, prefix=f".year={year}-"))
+            statements = {}
+            try:
+                with cached_zip.zip() as zip_file:
+                    for member in zip_file.namelist():
+                        if not member.endswith('.csv'):
+                            continue
+                        statement = statement_name(dataset, member, year)
+                        with zip_file.open(member) as f:
+                            df = read_cvm_csv(f)
+                        if 'CD_CVM' in df.columns:
+                            df = df.sort_values('CD_CVM', kind='stable')
+                        target = staging_dir / f"statement={statement}" / 'part-0.parquet'
+                        target.parent.mkdir(parents=True)
+                        df.to_parquet(target, engine='pyarrow', index=False, row_group_size=ROW_GROUP_SIZE)
+                        statements[statement] = Path(member).name.rsplit('.', 1)[0]
+                        logger.debug(f"{member}: {len(df)} linhas -> {target.stat().st_size / 1024:.0f} KB")
+
+                manifest = {'source_sha256': cached_zip.sha256, 'statements': statements}
+                with open(staging_dir / MANIFEST_FILE, 'w', encoding='utf-8') as f:
+                    json.dump(manifest, f)
+
+                if year_dir.exists():
+                    shutil.rmtree(year_dir)
+                os.replace(staging_dir, year_dir)
+            except BaseException:
+                shutil.rmtree(staging_dir, ignore_errors=True)
+                raise
+
+            logger.info(f"{dataset} {year}: {len(statements)} arquivos convertidos para Parquet")
+            return manifest
+
+    # --- consultas -----------------------------------------------------------
+
+    def statements(self, dataset: str, year: int, session=None) -> List[str]:
+        manifest = self.ensure(dataset, year, session=session)
+        return sorted(manifest['statements']) if manifest else []
+
+    def read_statement(self, dataset: str, year: int, statement: str,
+                       cvm_codes: Optional[Iterable] = None, cnpjs: Optional[Iterable[str]] = None,
+                       accounts: Optional[Iterable[str]] = None, columns: Optional[List[str]] = None,
+                       session=None) -> pd.DataFrame:
+        """
+        Lê um tipo de demonstração aplicando os filtros no leitor Parquet.
+        Filtros sobre colunas que o arquivo não tem resultam em DataFrame vazio.
+        """
+        manifest = self.ensure(dataset, year, session=session)
+        if not manifest or statement not in manifest['statements']:
+            return pd.DataFrame()
+        return self._read(self._statement_path(dataset, year, statement), cvm_codes, cnpjs, accounts, columns)
+
+    def query(self, dataset: str, year: int, statements: Optional[Iterable[str]] = None,
+              cvm_codes: Optional[Iterable] = None, cnpjs: Optional[Iterable[str]] = None,
+              accounts: Optional[Iterable[str]] = None, columns: Optional[List[str]] = None,
+              session=None) -> Dict[str, pd.DataFrame]:
+        """
+        Consulta vários tipos de demonstração de uma vez. Retorna um dict
+        chaveado pelo nome original do CSV (ex.: `dfp_cia_aberta_BPA_con_2023`),
+        o mesmo formato de `CVMAdvancedScraper.download_and_extract_dataset`,
+        omitindo os arquivos sem linhas após os filtros.
+        """
+        manifest = self.ensure(dataset, year, session=session)
+        if not manifest:
+            return {}
+        wanted = set(statements) if statements is not None else None
+
+        results = {}
+        for statement, original_key in manifest['statements'].items():
+            if wanted is not None and statement not in wanted:
+                continue
+            df = self._read(self._statement_path(dataset, year, statement), cvm_codes, cnpjs, accounts, columns)
+            if not df.empty:
+                results[original_key] = df
+        return results
+
+    @staticmethod
+    def _read(path: Path, cvm_codes, cnpjs, accounts, columns) -> pd.DataFrame:
+        import pyarrow.parquet as pq
+
+        available = set(pq.read_schema(path).names)
+        filters = []
+        for column, values, cast in (('CD_CVM', cvm_codes, int), ('CNPJ_CIA', cnpjs, str), ('CD_CONTA', accounts, str)):
+            if values is None:
+                continue
+            if column not in available:
+                return pd.DataFrame()
+            filters.append((column, 'in', [cast(v) for v in values]))
+
+        if columns is not None:
+            columns = [col for col in columns if col in available]
+        return pd.read_parquet(path, engine='pyarrow', columns=columns, filters=filters or None)
+
+
+_default_store = None
+_default_store_lock = threading.Lock()
+
+
+def get_parquet_store() -> Optional[CVMParquetStore]:
+    """Instância compartilhada do staging, ou None se `pyarrow` não estiver instalado."""
+    global _default_store
+    if not PARQUET_AVAILABLE:
+        return None
+    with _default_store_lock:
+        if _default_store is None:
+            _default_store = CVMParquetStore()
+        return _default_store
@@ -3,15 +3,13 @@ import requests
 import pandas as pd
 import logging
 from datetime import datetime
-from io import BytesIO
-import zipfile
 import time
 from typing import Dict
-import io
 from sqlalchemy import extract
 
 from scraper.config import CVM_DADOS_ABERTOS_URL, REQUESTS_HEADERS, START_YEAR_HISTORICAL_LOAD
 from scraper.database import get_db_session
+from scraper.services.cvm_download_cache import get_download_cache
 from scraper.models import (
     FinancialStatement, Company, CapitalStructure, Shareholder, CompanyAdministrator, CompanyRiskFactor
 )
@@ -24,25 +22,29 @@ class CVMDataCollector:
         self.session = requests.Session()
         self.session.headers.update(REQUESTS_HEADERS)
         self.base_url = CVM_DADOS_ABERTOS_URL
+        self.download_cache = get_download_cache()
 
     def _download_and_extract_zip(self, url: str) -> Dict[str, pd.DataFrame]:
         try:
             logger.info(f"Tentando baixar arquivo de: {url}")
-            response = self.session.get(url, timeout=300)
-            response.raise_for_status()
+            cached_zip = self.download_cache.fetch(url, session=self.session, timeout=300)
+            if cached_zip is None:
+                logger.error(f"ERRO HTTP ao baixar {url}. Status Code: 404.")
+                return {}
 
-            zip_file = zipfile.ZipFile(BytesIO(response.content))
             dataframes = {}
-            for filename in zip_file.namelist():
-                if filename.endswith('.csv'):
-                    content = zip_file.read(filename)
-                    try:
-                        df = pd.read_csv(io.BytesIO(content), sep=';', encoding='latin1', dtype=str, low_memory=False)
-                        dataframes[filename] = df
-                    except (pd.errors.ParserError, ValueError) as e:
-                        logger.warning(f"Falha no parsing de {filename} com motor 'c': {e}. Tentando com motor 'python'.")
-                        df = pd.read_csv(io.BytesIO(content), sep=';', encoding='latin1', dtype=str, engine='python', on_bad_lines='warn')
-                        dataframes[filename] = df
+            with cached_zip.zip() as zip_file:
+                for filename in zip_file.namelist():
+                    if filename.endswith('.csv'):
+                        try:
+                            with zip_file.open(filename) as f:
+                                df = pd.read_csv(f, sep=';', encoding='latin1', dtype=str, low_memory=False)
+                            dataframes[filename] = df
+                        except (pd.errors.ParserError, ValueError) as e:
+                            logger.warning(f"Falha no parsing de {filename} com motor 'c': {e}. Tentando com motor 'python'.")
+                            with zip_file.open(filename) as f:
+                                df = pd.read_csv(f, sep=';', encoding='latin1', dtype=str, engine='python', on_bad_lines='warn')
+                            dataframes[filename] = df
             
             logger.info(f"Sucesso ao baixar e extrair de {url}")
             return dataframes
@@ -1,10 +1,14 @@
 import requests
-import json
 import time
+import contextvars
 from datetime import datetime, timedelta
 from flask import current_app
 from app import redis_client
 from config import Config
+from services.cache_service import CacheService, QUOTE_STALE_TTL
+from services.indicator_state import IndicatorStateStore
+
+QUOTE_BATCH_SIZE = 20  # tickers per multi-symbol brapi request
 
 class DataFetcher:
     def __init__(self):
@@ -12,32 +16,33 @@ class DataFetcher:
         self.partnr_base = Config.PARTNR_BASE_URL
         self.dados_mercado_base = Config.DADOS_MERCADO_BASE_URL
         self.cache_ttl = Config.CACHE_TTL
+        # In-process LRU in front of Redis, with single-flight refills
+        self.cache = CacheService(redis_client)
+        # Live indicator states fed by the streaming quotes, checkpointed to Redis
+        self.indicator_states = IndicatorStateStore(redis_client, history_loader=self._load_indicator_states)
+    
+    def init_app(self, app):
+        """Bind the app whose context wraps the history replays done on background threads"""
+        self.indicator_states.set_loader_context(app.app_context)
     
     def _get_cached_data(self, cache_key):
-        """Get data from Redis cache"""
-        try:
-            cached_data = redis_client.get(cache_key)
-            if cached_data:
-                return json.loads(cached_data)
-        except Exception as e:
-            current_app.logger.error(f"Cache read error: {e}")
-        return None
+        """Get data from the two-tier cache"""
+        return self.cache.get(cache_key)
     
     def _set_cached_data(self, cache_key, data, ttl=3600):
-        """Set data in Redis cache"""
-        try:
-            redis_client.setex(cache_key, ttl, json.dumps(data, default=str))
-        except Exception as e:
-            current_app.logger.error(f"Cache write error: {e}")
+        """Set data in the two-tier cache"""
+        self.cache.set(cache_key, data, ttl)
     
     def fetch_quote(self, ticker):
         """Fetch stock quote from brapi.dev"""
-        cache_key = f"quote:{ticker}"
-        cached_data = self._get_cached_data(cache_key)
-        
-        if cached_data:
-            return cached_data
-        
+        # Concurrent misses share one brapi call; expired quotes are served
+        # stale while a single background refresh runs
+        return self.cache.get_or_set(
+            f"quote:{ticker}", lambda: self._load_quote(ticker),
+            ttl=self.cache_ttl['quotes'], stale_ttl=QUOTE_STALE_TTL
+        )
+    
+    def _load_quote(self, ticker):
         try:
             url = f"{self.brapi_base}/quote/{ticker}"
             headers = {'Authorization': f'Bearer {Config.BRAPI_API_KEY}'}
@@ -47,9 +52,7 @@ class DataFetcher:
             if response.status_code == 200:
                 data = response.json()
                 if data.get('results'):
-                    quote_data = data['results'][0]
-                    self._set_cached_data(cache_key, quote_data, self.cache_ttl['quotes'])
-                    return quote_data
+                    return data['results'][0]
             
             return None
             
@@ -57,6 +60,77 @@ class DataFetcher:
             current_app.logger.error(f"Error fetching quote for {ticker}: {e}")
             return None
     
+    def fetch_quotes(self, tickers, executor=None, batch_size=QUOTE_BATCH_SIZE):
+        """Fetch several quotes, batching cache misses into multi-symbol brapi requests
+
+        Fresh cached quotes are served directly; the remaining tickers are split
+        into comma-separated requests of up to `batch_size` symbols, run on
+        `executor` when given (serially otherwise). Tickers whose batch failed
+        fall back to a stale cached quote, if any. Returns {ticker: quote}.
+        """
+        tickers = list(dict.fromkeys(ticker.upper() for ticker in tickers))
+        quotes = {}
+        stale = {}
+        missing = []
+        for ticker in tickers:
+            quote = self.cache.get(f"quote:{ticker}")
+            if quote is not None:
+                quotes[ticker] = quote
+                continue
+            missing.append(ticker)
+            stale_quote = self.cache.get(f"quote:{ticker}", allow_stale=True)
+            if stale_quote is not None:
+                stale[ticker] = stale_quote
+        
+        batches = [missing[i:i + batch_size] for i in range(0, len(missing), batch_size)]
+        if executor is not None and len(batches) > 1:
+            # Each task gets its own context copy so workers keep the app context
+            futures = [executor.submit(contextvars.copy_context().run, self._load_quotes_batch, batch)
+                       for batch in batches]
+            results = [future.result() for future in futures]
+        else:
+            results = [self._load_quotes_batch(batch) for batch in batches]
+        
+        for loaded in results:
+            for ticker, quote in loaded.items():
+                self.cache.set(f"quote:{ticker}", quote, self.cache_ttl['quotes'], stale_ttl=QUOTE_STALE_TTL)
+                quotes[ticker] = quote
+        
+        for ticker, quote in stale.items():
+            quotes.setdefault(ticker, quote)
+        return quotes
+    
+    def _load_quotes_batch(self, tickers):
+        """One brapi request for up to QUOTE_BATCH_SIZE comma-separated tickers"""
+        if not tickers:
+            return {}
+        try:
+            url = f"{self.brapi_base}/quote/{','.join(tickers)}"
+            headers = {'Authorization': f'Bearer {Config.BRAPI_API_KEY}'}
+            
+            response = requests.get(url, headers=headers, timeout=10)
+            
+            if response.status_code == 200:
+                results = response.json().get('results') or []
+                return {
+                    result['symbol'].upper(): result
+                    for result in results if result.get('symbol')
+                }
+            
+            current_app.logger.warning(
+                f"brapi returned {response.status_code} for batch of {len(tickers)} tickers"
+            )
+            return {}
+            
+        except Exception as e:
+            current_app.logger.error(f"Error fetching quotes for {','.join(tickers)}: {e}")
+            return {}
+    
+    def _load_indicator_states(self, tickers):
+        """Replay the stored daily history of tickers that have no indicator state yet"""
+        from services.etl_technical_indicators import TechnicalIndicatorsETL
+        return TechnicalIndicatorsETL().build_states(tickers)
+    
     def fetch_historical_data(self, ticker, period='1y', interval='1d'):
         """Fetch historical price data"""
         cache_key = f"historical:{ticker}:{period}:{interval}"
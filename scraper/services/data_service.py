@@ -1,7 +1,7 @@
 import logging
 from datetime import datetime, timedelta
 from sqlalchemy import func
-from models import Company, Ticker, Quote, FinancialStatement, FinancialRatio, MarketRatio, Dividend
+from models import Company, Ticker, Quote, FinancialStatement, CompanyRatios, Dividend
 from .cache_service import CacheService
 
 logger = logging.getLogger(__name__)
@@ -79,6 +79,10 @@ class DataService:
         
         return None
     
+    def _company_ratios(self, company_id):
+        """Latest `company_ratios` snapshot row of the company (batch-computed by CompanyRatiosETL)"""
+        return CompanyRatios.query.filter_by(company_id=company_id).first()
+    
     def get_company_financial_ratios(self, company_id):
         """Get latest financial ratios for company"""
         cache_key = f"ratios:financial:{company_id}"
@@ -87,13 +91,11 @@ class DataService:
         if cached_ratios:
             return cached_ratios
         
-        latest_ratio = FinancialRatio.query.filter_by(
-            company_id=company_id
-        ).order_by(FinancialRatio.reference_date.desc()).first()
+        latest_ratio = self._company_ratios(company_id)
         
         if latest_ratio:
             ratios_data = {
-                'reference_date': latest_ratio.reference_date.isoformat(),
+                'reference_date': latest_ratio.reference_date.isoformat() if latest_ratio.reference_date else None,
                 'liquidity': {
                     'current_ratio': latest_ratio.current_ratio,
                     'quick_ratio': latest_ratio.quick_ratio,
@@ -111,6 +113,11 @@ class DataService:
                     'debt_to_equity': latest_ratio.debt_to_equity,
                     'debt_to_assets': latest_ratio.debt_to_assets,
                     'interest_coverage': latest_ratio.interest_coverage
+                },
+                'efficiency': {
+                    'asset_turnover': latest_ratio.asset_turnover,
+                    'inventory_turnover': latest_ratio.inventory_turnover,
+                    'receivables_turnover': latest_ratio.receivables_turnover
                 }
             }
             
@@ -128,13 +135,11 @@ class DataService:
         if cached_ratios:
             return cached_ratios
         
-        latest_ratio = MarketRatio.query.filter_by(
-            company_id=company_id
-        ).order_by(MarketRatio.reference_date.desc()).first()
+        latest_ratio = self._company_ratios(company_id)
         
         if latest_ratio:
             ratios_data = {
-                'reference_date': latest_ratio.reference_date.isoformat(),
+                'reference_date': latest_ratio.computed_at.isoformat() if latest_ratio.computed_at else None,
                 'valuation': {
                     'pe_ratio': latest_ratio.pe_ratio,
                     'pb_ratio': latest_ratio.pb_ratio,
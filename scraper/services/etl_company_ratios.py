@@ -0,0 +1,191 @@
+"""
+ETL do snapshot de indicadores (`company_ratios`)
+
+Calcula os indicadores de liquidez, rentabilidade, endividamento,
+eficiência e valuation de todas as empresas de uma vez:
+
+- uma consulta traz a DFP mais recente de cada empresa (`cvm_financial_data`);
+- uma consulta traz o total de ações do evento de capital mais recente;
+- uma consulta traz o último preço de cada ticker;
+- os três frames são unidos por empresa e `ratio_engine.compute_ratios`
+  calcula todos os indicadores em forma vetorizada;
+- o snapshot é gravado por `cvm_code` (chave primária) com
+  `bulk_insert_mappings` + `bulk_update_mappings` e um único commit;
+- depois do commit, o snapshot do screener e as respostas de indicadores em
+  cache (`ratios:financial:{id}` / `ratios:market:{id}` do DataService) são
+  invalidados.
+
+A API lê o snapshot pela chave, sem recalcular nada por requisição.
+"""
+import logging
+import time
+from datetime import datetime
+from typing import Iterable, Optional
+
+import pandas as pd
+from sqlalchemy import func
+
+from app import db, redis_client
+from models import CapitalStructure, Company, CompanyRatios, CVMFinancialData, Quote
+from services.cache_service import CacheService
+from services.ratio_engine import FINANCIAL_INPUTS, compute_ratios
+from services.screener import screener_cache
+
+logger = logging.getLogger(__name__)
+
+
+class CompanyRatiosETL:
+    def __init__(self, statement_type: str = 'DFP', session=None):
+        self.statement_type = statement_type
+        self.session = session or db.session
+
+    def load_financials(self, company_ids: Optional[Iterable[int]] = None) -> pd.DataFrame:
+        """Demonstração mais recente de cada empresa, uma coluna por métrica"""
+        metrics = [name for name in FINANCIAL_INPUTS if name in CVMFinancialData.__table__.columns]
+        latest = self.session.query(
+            CVMFinancialData.company_id, func.max(CVMFinancialData.year).label('year')
+        ).filter(
+            CVMFinancialData.statement_type == self.statement_type
+        )
+        if company_ids is not None:
+            latest = latest.filter(CVMFinancialData.company_id.in_(list(company_ids)))
+        latest = latest.group_by(CVMFinancialData.company_id).subquery()
+
+        rows = self.session.query(
+            CVMFinancialData.company_id, CVMFinancialData.cvm_code, CVMFinancialData.year,
+            *[getattr(CVMFinancialData, name) for name in metrics]
+        ).join(
+            latest, (CVMFinancialData.company_id == latest.c.company_id) & (CVMFinancialData.year == latest.c.year)
+        ).filter(
+            CVMFinancialData.statement_type == self.statement_type
+        ).all()
+
+        frame = pd.DataFrame(rows, columns=['company_id', 'cvm_code', 'year'] + metrics)
+        # Um registro por empresa (trimestres/versões repetidas no mesmo ano)
+        return frame.drop_duplicates('company_id', keep='last')
+
+    def load_shares(self) -> pd.DataFrame:
+        """Total de ações do evento de capital mais recente de cada empresa"""
+        latest = self.session.query(
+            CapitalStructure.company_id, func.max(CapitalStructure.approval_date).label('approval_date')
+        ).filter(
+            CapitalStructure.qty_total_shares > 0
+        ).group_by(CapitalStructure.company_id).subquery()
+
+        rows = self.session.query(
+            CapitalStructure.company_id, CapitalStructure.qty_total_shares
+        ).join(
+            latest, (CapitalStructure.company_id == latest.c.company_id)
+            & (CapitalStructure.approval_date == latest.c.approval_date)
+        ).all()
+        frame = pd.DataFrame(rows, columns=['company_id', 'shares_outstanding'])
+        return frame.drop_duplicates('company_id', keep='last')
+
+    def load_prices(self, tickers: Iterable[str]) -> pd.DataFrame:
+        """Último preço de cada ticker"""
+        tickers = sorted({ticker for ticker in tickers if ticker})
+        if not tickers:
+            return pd.DataFrame(columns=['ticker', 'price'])
+        latest = self.session.query(
+            Quote.ticker, func.max(Quote.timestamp).label('timestamp')
+        ).filter(
+            Quote.ticker.in_(tickers)
+        ).group_by(Quote.ticker).subquery()
+
+        rows = self.session.query(Quote.ticker, Quote.price).join(
+            latest, (Quote.ticker == latest.c.ticker) & (Quote.timestamp == latest.c.timestamp)
+        ).all()
+        frame = pd.DataFrame(rows, columns=['ticker', 'price'])
+        return frame.drop_duplicates('ticker', keep='last')
+
+    def build_frame(self, company_ids: Optional[Iterable[int]] = None) -> pd.DataFrame:
+        """Frame colunar com demonstrações, ações e preço, uma linha por empresa"""
+        financials = self.load_financials(company_ids)
+        if financials.empty:
+            return financials
+
+        companies = pd.DataFrame(
+            self.session.query(Company.id, Company.ticker).filter(
+                Company.id.in_([int(company_id) for company_id in financials['company_id']])
+            ).all(),
+            columns=['company_id', 'ticker']
+        )
+        frame = financials.merge(companies, on='company_id', how='left')
+        frame = frame.merge(self.load_shares(), on='company_id', how='left')
+        frame = frame.merge(self.load_prices(frame['ticker'].dropna()), on='ticker', how='left')
+        return frame
+
+    def upsert(self, frame: pd.DataFrame, ratios: pd.DataFrame) -> dict:
+        """Grava o snapshot por cvm_code em um único commit"""
+        columns = set(CompanyRatios.__table__.columns.keys())
+        snapshot = pd.concat([frame[['cvm_code', 'company_id', 'ticker', 'year', 'price']], ratios], axis=1)
+        snapshot = snapshot.astype(object).where(snapshot.notna(), None)
+
+        existing = {code for code, in self.session.query(CompanyRatios.cvm_code)}
+        now = datetime.utcnow()
+        inserts, updates = [], []
+        for record in snapshot.to_dict('records'):
+            year = record.pop('year')
+            mapping = {key: value for key, value in record.items() if key in columns}
+            mapping.update(
+                cvm_code=int(record['cvm_code']),
+                company_id=int(record['company_id']),
+                statement_type=self.statement_type,
+                reference_year=int(year) if year is not None else None,
+                reference_date=datetime(int(year), 12, 31) if year is not None else None,
+                computed_at=now,
+            )
+            (updates if mapping['cvm_code'] in existing else inserts).append(mapping)
+
+        try:
+            self.session.bulk_insert_mappings(CompanyRatios, inserts)
+            self.session.bulk_update_mappings(CompanyRatios, updates)
+            self.session.commit()
+        except Exception as e:
+            logger.error(f"Erro ao gravar snapshot de indicadores: {str(e)}")
+            self.session.rollback()
+            raise
+
+        return {'inserted': len(inserts), 'updated': len(updates)}
+
+    def run(self, company_ids: Optional[Iterable[int]] = None) -> dict:
+        """Executa o ETL completo e retorna estatísticas da execução"""
+        started = time.perf_counter()
+        logger.info("Iniciando ETL de indicadores das empresas")
+
+        frame = self.build_frame(company_ids)
+        if frame.empty:
+            logger.warning("Nenhuma demonstração financeira para calcular indicadores")
+            return {'companies': 0, 'inserted': 0, 'updated': 0, 'seconds': 0.0}
+
+        frame = frame.reset_index(drop=True)
+        ratios = compute_ratios(frame)
+        result = self.upsert(frame, ratios)
+        # O screener deste processo recarrega o snapshot na próxima consulta e as
+        # rotas de indicadores deixam de servir os valores antigos do cache
+        screener_cache.invalidate()
+        CacheService(redis_client).invalidate_company_ratios(
+            None if company_ids is None else frame['company_id'].astype(int).tolist()
+        )
+
+        seconds = time.perf_counter() - started
+        stats = {
+            'companies': len(frame),
+            'with_price': int(frame['price'].notna().sum()),
+            **result,
+            'seconds': round(seconds, 3),
+        }
+        logger.info(f"Indicadores das empresas: {stats['companies']} empresas "
+                    f"({stats['with_price']} com preço) em {seconds:.2f}s")
+        return stats
+
+
+def run_company_ratios_etl():
+    """Função para executar o ETL de indicadores das empresas"""
+    etl = CompanyRatiosETL()
+    return etl.run()
+
+
+if __name__ == '__main__':
+    etl = CompanyRatiosETL()
+    etl.run()
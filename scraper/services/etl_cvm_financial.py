@@ -2,7 +2,9 @@
 ETL para Dados Financeiros da CVM
 Integra os scrapers avançados com o banco de dados
 """
+import json
 import logging
+import re
 from datetime import datetime, timedelta
 from typing import Dict, List, Optional, Any
 import pandas as pd
@@ -17,6 +19,95 @@ from services.scraper_rad_cvm import RADCVMScraper
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Plano de contas padronizado da CVM (DFP/ITR): código da conta -> métrica canônica.
+# O primeiro nível do código identifica a demonstração (1 BPA, 2 BPP, 3 DRE, 6 DFC).
+ACCOUNT_METRICS = pd.DataFrame([
+    ('1', 'total_assets'),
+    ('1.01', 'current_assets'),
+    ('1.02', 'non_current_assets'),
+    ('2', 'total_liabilities'),
+    ('2.01', 'current_liabilities'),
+    ('2.03', 'shareholders_equity'),
+    ('3.01', 'revenue'),
+    ('3.03', 'gross_profit'),
+    ('3.11', 'net_income'),
+    ('6.01', 'operating_cash_flow'),
+], columns=['CD_CONTA', 'metric'])
+METRIC_COLUMNS = list(ACCOUNT_METRICS['metric'])
+METRIC_KEY = ['cvm_code', 'year', 'quarter']
+
+# Preferência entre arquivos que trazem a mesma conta (ex.: dfp_cia_aberta_BPA_con_2023
+# e ..._BPA_ind_2023): consolidado antes do individual e, na DFC (6.01 existe nos
+# dois métodos), o indireto antes do direto. Maior = preferido.
+SCOPE_PATTERN = re.compile(r'_con(_|$)', re.IGNORECASE)
+PREFERRED_DFC_METHOD = 'DFC_MI'
+
+def _scope_rank(dataset_name: str) -> int:
+    rank = 2 if SCOPE_PATTERN.search(dataset_name) else 0
+    return rank + (1 if PREFERRED_DFC_METHOD in dataset_name.upper() else 0)
+
+# Métricas com coluna própria em cvm_financial_data
+STORED_METRICS = {
+    'DFP': ['total_assets', 'current_assets', 'total_liabilities', 'shareholders_equity',
+            'revenue', 'net_income', 'operating_cash_flow'],
+    'ITR': ['total_assets', 'revenue', 'net_income'],
+}
+
+def build_metrics_frame(datasets: Dict[str, pd.DataFrame], statement_type: str,
+                        cvm_codes: Optional[List[int]] = None) -> pd.DataFrame:
+    """
+    Aplica o mapeamento de contas a todos os arquivos de uma vez e devolve um
+    frame largo com uma linha por empresa/ano/trimestre e uma coluna por métrica.
+
+    Considera só o exercício corrente (ORDEM_EXERC = ÚLTIMO) e, havendo mais de
+    uma linha por conta, o consolidado (e a DFC pelo método indireto), depois a
+    versão mais recente do documento e o período mais curto (trimestre isolado
+    da DRE no ITR). Trimestre é '' para DFP.
+    """
+    columns = ['CD_CVM', 'DT_REFER', 'VERSAO', 'ORDEM_EXERC', 'DT_INI_EXERC', 'CD_CONTA', 'VL_CONTA']
+    codes = set(ACCOUNT_METRICS['CD_CONTA'])
+    parts = []
+    for name, df in datasets.items():
+        if not {'CD_CVM', 'CD_CONTA', 'VL_CONTA', 'DT_REFER'}.issubset(df.columns):
+            continue
+        part = df[[col for col in columns if col in df.columns]]
+        mask = part['CD_CONTA'].isin(codes)
+        if cvm_codes is not None:
+            mask &= part['CD_CVM'].isin(cvm_codes)
+        if 'ORDEM_EXERC' in part.columns:
+            mask &= part['ORDEM_EXERC'] == 'ÚLTIMO'
+        parts.append(part[mask].assign(scope_rank=_scope_rank(name)))
+
+    if not parts:
+        return pd.DataFrame(columns=METRIC_KEY + METRIC_COLUMNS)
+
+    data = pd.concat(parts, ignore_index=True)
+    data['CD_CONTA'] = data['CD_CONTA'].astype(str)
+    data['cvm_code'] = pd.to_numeric(data['CD_CVM'], errors='coerce')
+    reference = pd.to_datetime(data['DT_REFER'], errors='coerce')
+    data['year'] = reference.dt.year
+    data['quarter'] = reference.dt.quarter.astype('Int64').astype(str) + 'T' if statement_type == 'ITR' else ''
+    data['VL_CONTA'] = pd.to_numeric(data['VL_CONTA'], errors='coerce')
+    data = data.dropna(subset=['cvm_code', 'year'])
+
+    order = ['scope_rank'] + [col for col in ('VERSAO', 'DT_INI_EXERC') if col in data.columns]
+    data = data.sort_values(order, kind='stable')
+    data = data.drop_duplicates(METRIC_KEY + ['CD_CONTA'], keep='last')
+
+    wide = (
+        data.merge(ACCOUNT_METRICS, on='CD_CONTA')
+        .pivot_table(index=METRIC_KEY, columns='metric', values='VL_CONTA', aggfunc='first')
+        .reindex(columns=METRIC_COLUMNS)
+        .reset_index()
+    )
+    wide.columns.name = None
+    wide[['cvm_code', 'year']] = wide[['cvm_code', 'year']].astype(int)
+    return wide
+
+def _json_records(df: pd.DataFrame) -> List[Dict[str, Any]]:
+    """Registros serializáveis em JSON (datas ISO, nulos como None)"""
+    return json.loads(df.to_json(orient='records', date_format='iso'))
+
 class CVMFinancialETL:
     """ETL para dados financeiros estruturados da CVM"""
     
@@ -153,7 +244,7 @@ class CVMFinancialETL:
                 )
             
             # Extrair indicadores principais dos dados DFP
-            financial_metrics = self._extract_financial_metrics(dfp_data)
+            financial_metrics = self._extract_financial_metrics(dfp_data, 'DFP')
             
             # Atualizar campos calculados
             financial_record.total_assets = financial_metrics.get('total_assets')
@@ -166,7 +257,7 @@ class CVMFinancialETL:
             
             # Salvar dados brutos como JSON
             financial_record.raw_dfp_data = {
-                dataset_name: df.to_dict('records') 
+                dataset_name: _json_records(df)
                 for dataset_name, df in dfp_data.items()
             }
             
@@ -183,15 +274,12 @@ class CVMFinancialETL:
     def _process_itr_data(self, company: Company, itr_data: Dict[str, pd.DataFrame], year: int):
         """Processa dados ITR (trimestrais)"""
         try:
-            # ITR pode ter múltiplos trimestres
-            quarters = ['1T', '2T', '3T', '4T']
+            # Métricas de todos os trimestres calculadas de uma vez
+            metrics_frame = build_metrics_frame(itr_data, 'ITR', [company.cvm_code])
+            metrics_frame = metrics_frame[metrics_frame['year'] == year]
             
-            for quarter in quarters:
-                # Filtrar dados do trimestre específico
-                quarter_data = self._filter_by_quarter(itr_data, quarter, year)
-                
-                if not quarter_data:
-                    continue
+            for metrics in metrics_frame.to_dict('records'):
+                quarter = metrics['quarter']
                 
                 # Verificar se já existe
                 existing = CVMFinancialData.query.filter_by(
@@ -213,17 +301,13 @@ class CVMFinancialETL:
                         quarter=quarter
                     )
                 
-                # Extrair métricas do trimestre
-                metrics = self._extract_financial_metrics(quarter_data)
-                
-                financial_record.total_assets = metrics.get('total_assets')
-                financial_record.revenue = metrics.get('revenue')
-                financial_record.net_income = metrics.get('net_income')
+                for metric in STORED_METRICS['ITR']:
+                    setattr(financial_record, metric, self._metric_value(metrics[metric]))
                 
                 # Salvar dados brutos
                 financial_record.raw_itr_data = {
-                    dataset_name: df.to_dict('records') 
-                    for dataset_name, df in quarter_data.items()
+                    dataset_name: _json_records(df)
+                    for dataset_name, df in self._filter_by_quarter(itr_data, quarter, year).items()
                 }
                 
                 if not existing:
@@ -256,7 +340,7 @@ class CVMFinancialETL:
             
             # Salvar dados FRE brutos
             financial_record.raw_fre_data = {
-                dataset_name: df.to_dict('records') 
+                dataset_name: _json_records(df)
                 for dataset_name, df in fre_data.items()
             }
             
@@ -268,79 +352,24 @@ class CVMFinancialETL:
         except Exception as e:
             logger.error(f"Erro ao processar FRE {company.cvm_code}: {str(e)}")
     
-    def _extract_financial_metrics(self, data: Dict[str, pd.DataFrame]) -> Dict[str, float]:
+    def _extract_financial_metrics(self, data: Dict[str, pd.DataFrame], statement_type: str = 'DFP') -> Dict[str, float]:
         """Extrai métricas financeiras principais dos dados brutos"""
         metrics = {}
         
         try:
-            # Buscar dados do Balanço Patrimonial (BPA/BPP)
-            bpa_data = None
-            bpp_data = None
-            dre_data = None
-            dfc_data = None
-            
-            for dataset_name, df in data.items():
-                if 'bpa' in dataset_name.lower():
-                    bpa_data = df
-                elif 'bpp' in dataset_name.lower():
-                    bpp_data = df
-                elif 'dre' in dataset_name.lower():
-                    dre_data = df
-                elif 'dfc' in dataset_name.lower():
-                    dfc_data = df
-            
-            # Extrair métricas do BPA (Ativo)
-            if bpa_data is not None and not bpa_data.empty:
-                metrics['total_assets'] = self._find_account_value(bpa_data, ['Ativo Total', 'Total do Ativo'])
-                metrics['current_assets'] = self._find_account_value(bpa_data, ['Ativo Circulante'])
-                metrics['non_current_assets'] = self._find_account_value(bpa_data, ['Ativo Não Circulante'])
-            
-            # Extrair métricas do BPP (Passivo)  
-            if bpp_data is not None and not bpp_data.empty:
-                metrics['total_liabilities'] = self._find_account_value(bpp_data, ['Passivo Total', 'Total do Passivo'])
-                metrics['current_liabilities'] = self._find_account_value(bpp_data, ['Passivo Circulante'])
-                metrics['shareholders_equity'] = self._find_account_value(bpp_data, ['Patrimônio Líquido'])
-            
-            # Extrair métricas da DRE
-            if dre_data is not None and not dre_data.empty:
-                metrics['revenue'] = self._find_account_value(dre_data, ['Receita de Venda', 'Receita Operacional'])
-                metrics['net_income'] = self._find_account_value(dre_data, ['Lucro Líquido', 'Resultado Líquido'])
-                metrics['gross_profit'] = self._find_account_value(dre_data, ['Resultado Bruto', 'Lucro Bruto'])
-            
-            # Extrair métricas do DFC
-            if dfc_data is not None and not dfc_data.empty:
-                metrics['operating_cash_flow'] = self._find_account_value(dfc_data, ['Fluxo de Caixa Operacional'])
+            metrics_frame = build_metrics_frame(data, statement_type)
+            if not metrics_frame.empty:
+                latest = metrics_frame.sort_values(['year', 'quarter']).iloc[-1]
+                metrics = {metric: self._metric_value(latest[metric]) for metric in METRIC_COLUMNS}
             
         except Exception as e:
             logger.warning(f"Erro ao extrair métricas financeiras: {str(e)}")
         
         return metrics
     
-    def _find_account_value(self, df: pd.DataFrame, account_names: List[str]) -> Optional[float]:
-        """Busca valor de uma conta específica no DataFrame"""
-        try:
-            value_columns = ['VL_CONTA', 'VALOR', 'VL_EXERCICIO']
-            name_columns = ['DS_CONTA', 'CONTA', 'DESCRICAO']
-            
-            for name_col in name_columns:
-                if name_col not in df.columns:
-                    continue
-                    
-                for account_name in account_names:
-                    mask = df[name_col].str.contains(account_name, case=False, na=False)
-                    matches = df[mask]
-                    
-                    if not matches.empty:
-                        for value_col in value_columns:
-                            if value_col in matches.columns:
-                                value = matches[value_col].iloc[0]
-                                if pd.notna(value):
-                                    return float(value)
-                                    
-        except Exception as e:
-            logger.debug(f"Erro ao buscar conta {account_names}: {str(e)}")
-        
-        return None
+    @staticmethod
+    def _metric_value(value) -> Optional[float]:
+        return float(value) if pd.notna(value) else None
     
     def _filter_by_quarter(self, data: Dict[str, pd.DataFrame], quarter: str, year: int) -> Dict[str, pd.DataFrame]:
         """Filtra dados por trimestre específico"""
@@ -394,33 +423,99 @@ class CVMFinancialETL:
                 return 0
             
             success_count = 0
+            company_ids = {company.cvm_code: company.id for company in companies}
             
-            for i, company in enumerate(companies, 1):
-                try:
-                    logger.info(f"Processando {i}/{len(companies)}: {company.company_name} (CVM: {company.cvm_code})")
-                    
-                    success = self.extract_company_financial_data(str(company.cvm_code), year)
+            # Carrega e indexa DFP/ITR/FRE do ano uma única vez para o lote inteiro
+            try:
+                indexes = {
+                    dataset_code: self.cvm_scraper.get_company_index(dataset_code, year)
+                    for dataset_code in ('dfp', 'itr', 'fre')
+                }
+                
+                # Métricas de todas as empresas e trimestres numa única passada vetorizada
+                dfp_metrics = build_metrics_frame(indexes['dfp'].datasets, 'DFP', list(company_ids))
+                itr_metrics = build_metrics_frame(indexes['itr'].datasets, 'ITR', list(company_ids))
+                dfp_metrics = dfp_metrics[dfp_metrics['year'] == year]
+                itr_metrics = itr_metrics[itr_metrics['year'] == year]
+                
+                written = self.bulk_upsert_metrics(dfp_metrics, 'DFP', company_ids)
+                written += self.bulk_upsert_metrics(itr_metrics, 'ITR', company_ids)
+                logger.info(f"{written} registros de métricas gravados em lote")
+                
+                with_dfp = set(dfp_metrics['cvm_code'])
+                with_itr = set(itr_metrics['cvm_code'])
+                for company in companies:
+                    fre_data = indexes['fre'].get(company.cvm_code)
+                    if fre_data:
+                        self._process_fre_data(company, fre_data, year)
                     
-                    if success:
+                    company.has_dfp_data = company.cvm_code in with_dfp
+                    company.has_itr_data = company.cvm_code in with_itr
+                    company.has_fre_data = bool(fre_data)
+                    company.last_dfp_year = year
+                    company.updated_at = datetime.utcnow()
+                    if company.has_dfp_data or company.has_itr_data:
                         success_count += 1
-                    
-                    # Delay entre empresas para não sobrecarregar os servidores da CVM
-                    if i % 10 == 0:
-                        logger.info(f"Processadas {i} empresas, {success_count} com sucesso")
-                        import time
-                        time.sleep(2)
-                        
-                except Exception as e:
-                    logger.error(f"Erro ao processar empresa {company.company_name}: {str(e)}")
-                    continue
+                
+                db.session.commit()
+            finally:
+                self.cvm_scraper.clear_company_indexes(year)
             
             logger.info(f"Extração em lote concluída: {success_count}/{len(companies)} empresas processadas")
             return success_count
             
         except Exception as e:
             logger.error(f"Erro na extração em lote: {str(e)}")
+            db.session.rollback()
             return 0
     
+    def bulk_upsert_metrics(self, metrics: pd.DataFrame, statement_type: str, company_ids: Dict[int, int]) -> int:
+        """
+        Grava o frame largo de métricas em cvm_financial_data: uma consulta
+        para localizar os registros existentes e um INSERT/UPDATE em lote.
+        """
+        metrics = metrics[metrics['cvm_code'].isin(list(company_ids))]
+        if metrics.empty:
+            return 0
+        
+        existing = {
+            (row.cvm_code, row.year, row.quarter or ''): row.id
+            for row in db.session.query(
+                CVMFinancialData.id, CVMFinancialData.cvm_code, CVMFinancialData.year, CVMFinancialData.quarter
+            ).filter(
+                CVMFinancialData.statement_type == statement_type,
+                CVMFinancialData.cvm_code.in_([int(code) for code in metrics['cvm_code'].unique()]),
+                CVMFinancialData.year.in_([int(year) for year in metrics['year'].unique()])
+            )
+        }
+        
+        stored = STORED_METRICS[statement_type]
+        frame = metrics[METRIC_KEY + stored].astype(object)
+        frame = frame.where(frame.notna(), None)
+        now = datetime.utcnow()
+        inserts, updates = [], []
+        
+        for record in frame.to_dict('records'):
+            mapping = {metric: record[metric] for metric in stored}
+            mapping['updated_at'] = now
+            key = (int(record['cvm_code']), int(record['year']), record['quarter'])
+            if key in existing:
+                mapping['id'] = existing[key]
+                updates.append(mapping)
+            else:
+                mapping.update(
+                    company_id=company_ids[key[0]],
+                    cvm_code=key[0],
+                    statement_type=statement_type,
+                    year=key[1],
+                    quarter=key[2] or None
+                )
+                inserts.append(mapping)
+        
+        db.session.bulk_insert_mappings(CVMFinancialData, inserts)
+        db.session.bulk_update_mappings(CVMFinancialData, updates)
+        return len(inserts) + len(updates)
+    
     def get_extraction_status(self) -> Dict[str, Any]:
         """Retorna status da extração de dados"""
         try:
@@ -7,11 +7,13 @@ from datetime import datetime
 import schedule
 import time
 from concurrent.futures import ThreadPoolExecutor, as_completed
-from app import db, create_app
+from app import db, create_app, init_db
 from services.scraper_cvm import CVMScraper
 from services.scraper_bacen import BacenScraper  
 from services.scraper_b3 import B3Scraper
 from services.scraper_news import NewsScraper
+from services.etl_technical_indicators import TechnicalIndicatorsETL
+from services.etl_company_ratios import CompanyRatiosETL
 
 logger = logging.getLogger(__name__)
 
@@ -24,6 +26,9 @@ class ETLMaster:
             'news': NewsScraper()
         }
         
+        self.technical_indicators = TechnicalIndicatorsETL()
+        self.company_ratios = CompanyRatiosETL()
+        
         self.execution_log = []
     
     def run_all_scrapers(self, parallel=True):
@@ -165,6 +170,32 @@ class ETLMaster:
             logger.error(f"Erro na atualização de demonstrações: {str(e)}")
             return {'error': str(e)}
     
+    def run_technical_indicators_update(self):
+        """Recalcula os indicadores técnicos de todos os tickers em uma passada"""
+        logger.info("Executando atualização de indicadores técnicos")
+        
+        try:
+            results = self.technical_indicators.run()
+            logger.info(f"Atualização de indicadores técnicos concluída: {results}")
+            return results
+            
+        except Exception as e:
+            logger.error(f"Erro na atualização de indicadores técnicos: {str(e)}")
+            return {'error': str(e)}
+    
+    def run_company_ratios_update(self):
+        """Recalcula o snapshot de indicadores de todas as empresas em uma passada"""
+        logger.info("Executando atualização de indicadores das empresas")
+        
+        try:
+            results = self.company_ratios.run()
+            logger.info(f"Atualização de indicadores das empresas concluída: {results}")
+            return results
+            
+        except Exception as e:
+            logger.error(f"Erro na atualização de indicadores das empresas: {str(e)}")
+            return {'error': str(e)}
+    
     def schedule_jobs(self):
         """Configura agendamento automático dos ETLs"""
         logger.info("Configurando agendamento de ETLs")
@@ -175,6 +206,12 @@ class ETLMaster:
         # Atualização completa diária às 6h
         schedule.every().day.at("06:00").do(self.run_all_scrapers)
         
+        # Indicadores técnicos diariamente após o fechamento do pregão
+        schedule.every().day.at("19:00").do(self.run_technical_indicators_update)
+        
+        # Snapshot de indicadores das empresas com o preço de fechamento
+        schedule.every().day.at("19:30").do(self.run_company_ratios_update)
+        
         # Atualização de empresas semanal (domingos às 2h)
         schedule.every().sunday.at("02:00").do(self.run_companies_update)
         
@@ -184,6 +221,8 @@ class ETLMaster:
         logger.info("Agendamento configurado:")
         logger.info("- Atualização rápida: a cada 15 minutos")
         logger.info("- Atualização completa: diariamente às 6h")
+        logger.info("- Indicadores técnicos: diariamente às 19h")
+        logger.info("- Indicadores das empresas: diariamente às 19h30")
         logger.info("- Empresas: domingos às 2h")
         logger.info("- Demonstrações: mensalmente")
     
@@ -259,7 +298,7 @@ class ETLMaster:
 def run_etl_master():
     """Função principal para executar o ETL Master"""
     # Criar contexto da aplicação Flask
-    app = create_app()
+    app = init_db(create_app())
     
     with app.app_context():
         master = ETLMaster()
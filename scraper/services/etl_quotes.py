@@ -2,81 +2,39 @@
 ETL para cotações e dados de mercado
 Integração com brapi.dev, Yahoo Finance e outras fontes
 """
-import requests
 import logging
-from datetime import datetime, timedelta
+from datetime import datetime
 from app import db
 from models import Quote, Ticker, Company
 from services.external_apis import BrapiAPI
+from services.quote_loader import bulk_load_quotes
+from services.quote_collector import QuoteCollector
 
 logger = logging.getLogger(__name__)
 
 class QuotesETL:
     def __init__(self):
         self.brapi = BrapiAPI()
+        # Sessão com pool + retry compartilhada por todas as coletas em paralelo
+        self.collector = QuoteCollector()
         
     def extract_real_time_quotes(self, tickers_list=None):
-        """Extrai cotações em tempo real"""
+        """Extrai cotações em tempo real (lotes de 50 tickers, todos em paralelo)"""
         try:
             if not tickers_list:
                 # Buscar todos os tickers ativos
                 tickers = Ticker.query.all()
                 tickers_list = [t.symbol for t in tickers]
             
-            # Limitar a 50 tickers por request para evitar timeout
-            batch_size = 50
-            all_quotes = []
-            
-            for i in range(0, len(tickers_list), batch_size):
-                batch = tickers_list[i:i+batch_size]
-                quotes_batch = self._fetch_quotes_batch(batch)
-                all_quotes.extend(quotes_batch)
-            
-            return all_quotes
+            return self.collector.fetch_quotes(tickers_list)
             
         except Exception as e:
             logger.error(f"Erro ao extrair cotações: {str(e)}")
             return []
     
-    def _fetch_quotes_batch(self, tickers):
-        """Busca batch de cotações da brapi"""
-        try:
-            tickers_str = ','.join(tickers)
-            url = f"https://brapi.dev/api/quote/{tickers_str}"
-            
-            response = requests.get(url, timeout=30)
-            response.raise_for_status()
-            
-            data = response.json()
-            return data.get('results', [])
-            
-        except Exception as e:
-            logger.error(f"Erro ao buscar batch de cotações: {str(e)}")
-            return []
-    
     def extract_historical_quotes(self, ticker, days=30):
         """Extrai cotações históricas"""
-        try:
-            end_date = datetime.now()
-            start_date = end_date - timedelta(days=days)
-            
-            url = f"https://brapi.dev/api/quote/{ticker}"
-            params = {
-                'range': f'{days}d',
-                'interval': '1d'
-            }
-            
-            response = requests.get(url, params=params, timeout=30)
-            response.raise_for_status()
-            
-            data = response.json()
-            if 'results' in data and len(data['results']) > 0:
-                return data['results'][0].get('historicalDataPrice', [])
-            return []
-            
-        except Exception as e:
-            logger.error(f"Erro ao buscar histórico de {ticker}: {str(e)}")
-            return []
+        return self.collector.fetch_histories([ticker], days)[ticker]
     
     def transform_quote_data(self, raw_quote):
         """Transforma dados brutos de cotação"""
@@ -109,47 +67,24 @@ class QuotesETL:
             return None
     
     def load_quote(self, quote_data):
-        """Carrega cotação no banco"""
+        """Carrega uma cotação no banco (atalho para `load_quotes` com um item)"""
         if not quote_data:
             return None
-            
+        return quote_data if self.load_quotes([quote_data]) else None
+    
+    def load_quotes(self, quotes_data):
+        """Carrega um lote de cotações transformadas com uma escrita em lote; retorna o total gravado"""
         try:
-            # Verificar se ticker existe
-            ticker_obj = Ticker.query.filter_by(symbol=quote_data['ticker']).first()
-            if ticker_obj:
-                quote_data['ticker_id'] = ticker_obj.id
-            
-            # Verificar se já existe cotação recente (últimos 5 minutos)
-            recent_quote = Quote.query.filter_by(
-                ticker=quote_data['ticker']
-            ).filter(
-                Quote.timestamp > datetime.utcnow() - timedelta(minutes=5)
-            ).first()
-            
-            if recent_quote:
-                # Atualizar cotação existente
-                for key, value in quote_data.items():
-                    if hasattr(recent_quote, key):
-                        setattr(recent_quote, key, value)
-                quote = recent_quote
-            else:
-                # Criar nova cotação
-                quote = Quote(**quote_data)
-                db.session.add(quote)
-            
-            db.session.commit()
-            return quote
-            
+            return bulk_load_quotes(quotes_data)['rows']
         except Exception as e:
-            logger.error(f"Erro ao carregar cotação: {str(e)}")
-            db.session.rollback()
-            return None
+            logger.error(f"Erro ao carregar cotações: {str(e)}")
+            return 0
     
     def extract_ibovespa_composition(self):
         """Extrai composição do Ibovespa"""
         try:
-            url = "https://brapi.dev/api/quote/list"
-            response = requests.get(url, timeout=30)
+            url = f"{self.collector.base_url}/quote/list"
+            response = self.collector.get(url)
             response.raise_for_status()
             
             data = response.json()
@@ -167,25 +102,24 @@ class QuotesETL:
             return []
     
     def extract_currency_rates(self):
-        """Extrai taxas de câmbio"""
+        """Extrai taxas de câmbio (uma requisição por moeda, em paralelo)"""
         try:
             currencies = ['USDBRL', 'EURBRL', 'GBPBRL']
+            responses = self.collector.map(
+                lambda currency: self.collector.get_json(f"{self.collector.base_url}/quote/{currency}=X"),
+                currencies
+            )
             rates = []
             
-            for currency in currencies:
-                url = f"https://brapi.dev/api/quote/{currency}=X"
-                response = requests.get(url, timeout=30)
-                
-                if response.status_code == 200:
-                    data = response.json()
-                    if 'results' in data and len(data['results']) > 0:
-                        rates.append({
-                            'symbol': currency,
-                            'rate': data['results'][0].get('regularMarketPrice', 0),
-                            'change': data['results'][0].get('regularMarketChange', 0),
-                            'change_percent': data['results'][0].get('regularMarketChangePercent', 0),
-                            'timestamp': datetime.utcnow()
-                        })
+            for currency, data in zip(currencies, responses):
+                if data and data.get('results'):
+                    rates.append({
+                        'symbol': currency,
+                        'rate': data['results'][0].get('regularMarketPrice', 0),
+                        'change': data['results'][0].get('regularMarketChange', 0),
+                        'change_percent': data['results'][0].get('regularMarketChangePercent', 0),
+                        'timestamp': datetime.utcnow()
+                    })
             
             return rates
             
@@ -197,8 +131,6 @@ class QuotesETL:
         """Executa ETL de cotações em tempo real"""
         logger.info("Iniciando ETL de cotações em tempo real")
         
-        quotes_processed = 0
-        
         # 1. Buscar composição do Ibovespa
         ibov_tickers = self.extract_ibovespa_composition()
         logger.info(f"Encontrados {len(ibov_tickers)} papéis do Ibovespa")
@@ -206,21 +138,12 @@ class QuotesETL:
         # 2. Buscar cotações principais
         main_quotes = self.extract_real_time_quotes(ibov_tickers[:30])  # Top 30
         
-        for quote_data in main_quotes:
-            transformed = self.transform_quote_data(quote_data)
-            if transformed:
-                quote = self.load_quote(transformed)
-                if quote:
-                    quotes_processed += 1
-        
         # 3. Buscar taxas de câmbio
         currency_rates = self.extract_currency_rates()
-        for rate_data in currency_rates:
-            transformed = self.transform_quote_data(rate_data)
-            if transformed:
-                quote = self.load_quote(transformed)
-                if quote:
-                    quotes_processed += 1
+        
+        # 4. Gravar tudo em uma carga em lote
+        transformed = [self.transform_quote_data(raw) for raw in main_quotes + currency_rates]
+        quotes_processed = self.load_quotes([quote for quote in transformed if quote])
         
         logger.info(f"ETL de cotações concluído. {quotes_processed} cotações processadas")
         return quotes_processed
@@ -232,10 +155,12 @@ class QuotesETL:
         # Buscar principais tickers
         main_tickers = ['PETR4', 'VALE3', 'ITUB4', 'BBDC4', 'ABEV3', 'WEGE3', 'MGLU3', 'VVAR3']
         
-        for ticker in main_tickers:
-            historical_data = self.extract_historical_quotes(ticker, days)
-            
-            for hist_quote in historical_data:
+        # Históricos de todos os tickers em paralelo
+        histories = self.collector.fetch_histories(main_tickers, days)
+        
+        quotes_data = []
+        for ticker, historical_data in histories.items():
+            for hist_quote in historical_data or []:
                 # Transformar dados históricos
                 quote_data = {
                     'ticker': ticker,
@@ -247,17 +172,28 @@ class QuotesETL:
                     'timestamp': datetime.fromtimestamp(hist_quote.get('date', 0)),
                     'quote_datetime': datetime.fromtimestamp(hist_quote.get('date', 0))
                 }
-                
-                # Verificar se já existe
-                existing = Quote.query.filter_by(
-                    ticker=ticker,
-                    timestamp=quote_data['timestamp']
-                ).first()
-                
-                if not existing:
-                    self.load_quote(quote_data)
+                quotes_data.append(quote_data)
+        
+        if not quotes_data:
+            logger.info("ETL histórico concluído: nenhum dado retornado")
+            return 0
+        
+        # Uma consulta para os (ticker, timestamp) já gravados no período
+        existing = set(db.session.query(Quote.ticker, Quote.timestamp).filter(
+            Quote.ticker.in_(main_tickers),
+            Quote.timestamp >= min(quote['timestamp'] for quote in quotes_data)
+        ))
+        new_quotes = [quote for quote in quotes_data if (quote['ticker'], quote['timestamp']) not in existing]
+        
+        # Histórico só insere: não há mescla com a janela de cotação recente
+        try:
+            loaded = bulk_load_quotes(new_quotes, merge_window=None)['rows']
+        except Exception as e:
+            logger.error(f"Erro ao carregar histórico: {str(e)}")
+            loaded = 0
         
-        logger.info("ETL histórico concluído")
+        logger.info(f"ETL histórico concluído: {loaded} cotações inseridas")
+        return loaded
 
 if __name__ == '__main__':
     etl = QuotesETL()
@@ -0,0 +1,209 @@
+"""
+ETL de indicadores técnicos
+
+Calcula os indicadores de todos os tickers de uma vez com o
+`indicator_engine`:
+
+- uma única consulta traz as cotações da janela (`LOOKBACK_DAYS`);
+- as cotações viram barras diárias (último preço, máxima, mínima, volume) e
+  são pivotadas em matrizes tickers x datas;
+- `compute_indicators_by_bars` gera as séries completas para todas as
+  linhas, cada ticker sobre os próprios pregões (as colunas são a união das
+  datas de todos os tickers);
+- a gravação em `TechnicalIndicator` é um upsert por (ticker_id, data): uma
+  consulta dos registros existentes, `bulk_insert_mappings` +
+  `bulk_update_mappings` e um único commit.
+
+Por padrão só a última data de cada ticker é gravada; `full_history=True`
+grava todas as datas da janela (backfill).
+"""
+import logging
+import time
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import DateTime
+
+from app import db
+from models import Quote, TechnicalIndicator
+from services import indicator_engine
+from services.indicator_state import IndicatorState
+from services.quote_loader import ticker_ids as ticker_id_map
+
+logger = logging.getLogger(__name__)
+
+# SMA 200 precisa de 200 pregões; a folga cobre feriados e o aquecimento das EMAs
+LOOKBACK_DAYS = 400
+BAR_FIELDS = ('close', 'high', 'low', 'volume')
+
+
+class TechnicalIndicatorsETL:
+    def __init__(self, lookback_days: int = LOOKBACK_DAYS, session=None):
+        self.lookback_days = lookback_days
+        self.session = session or db.session
+
+    def load_daily_bars(self, ticker_ids: Optional[Iterable[int]] = None) -> Dict[str, pd.DataFrame]:
+        """Matrizes tickers x datas de fechamento, máxima, mínima e volume"""
+        start_date = datetime.utcnow() - timedelta(days=self.lookback_days)
+        query = self.session.query(
+            Quote.ticker_id, Quote.quote_datetime, Quote.price,
+            Quote.high_price, Quote.low_price, Quote.volume
+        ).filter(
+            Quote.ticker_id.isnot(None),
+            Quote.quote_datetime >= start_date
+        )
+        if ticker_ids is not None:
+            query = query.filter(Quote.ticker_id.in_(list(ticker_ids)))
+
+        quotes = pd.DataFrame(query.all(), columns=['ticker_id', 'quote_datetime', 'price', 'high', 'low', 'volume'])
+        if quotes.empty:
+            return {}
+
+        quotes['quote_datetime'] = pd.to_datetime(quotes['quote_datetime'])
+        quotes['date'] = quotes['quote_datetime'].dt.normalize()
+        quotes = quotes.sort_values('quote_datetime')
+        daily = quotes.groupby(['ticker_id', 'date']).agg(
+            close=('price', 'last'), high=('high', 'max'), low=('low', 'min'), volume=('volume', 'max')
+        )
+        # Cotações sem máxima/mínima contam como barra de um só preço
+        daily['high'] = daily['high'].fillna(daily['close'])
+        daily['low'] = daily['low'].fillna(daily['close'])
+
+        return {field: daily[field].astype(float).unstack('date').sort_index(axis=1) for field in BAR_FIELDS}
+
+    def compute(self, bars: Dict[str, pd.DataFrame]) -> Dict[str, np.ndarray]:
+        """
+        Séries completas de todos os indicadores (uma linha por ticker). Uma
+        data em que o ticker não negociou (NaN do pivot) não quebra as janelas
+        dele: cada ticker é calculado sobre as próprias barras.
+        """
+        return indicator_engine.compute_indicators_by_bars(
+            bars['close'].values, bars['high'].values, bars['low'].values, bars['volume'].values
+        )
+
+    def build_rows(self, bars: Dict[str, pd.DataFrame], series: Dict[str, np.ndarray],
+                   full_history: bool = False) -> List[dict]:
+        """Mapeamentos para `TechnicalIndicator` com as colunas que o modelo conhece"""
+        columns = set(TechnicalIndicator.__table__.columns.keys())
+        series = {name: values for name, values in series.items() if name in columns}
+        close = bars['close'].values
+        has_bar = ~np.isnan(close)
+
+        if full_history:
+            rows_idx, cols_idx = np.nonzero(has_bar)
+        else:
+            # Última data com barra de cada ticker
+            rows_idx = np.flatnonzero(has_bar.any(axis=1))
+            cols_idx = close.shape[1] - 1 - np.argmax(has_bar[rows_idx, ::-1], axis=1)
+
+        ticker_ids = bars['close'].index.values
+        dates = [self._indicator_date(date) for date in bars['close'].columns]
+        rows = []
+        for row, col in zip(rows_idx, cols_idx):
+            mapping = {'ticker_id': int(ticker_ids[row]), 'indicator_date': dates[col]}
+            for name, values in series.items():
+                value = values[row, col]
+                mapping[name] = None if np.isnan(value) else float(value)
+            rows.append(mapping)
+        return rows
+
+    @staticmethod
+    def _indicator_date(date: pd.Timestamp):
+        if isinstance(TechnicalIndicator.__table__.columns['indicator_date'].type, DateTime):
+            return date.to_pydatetime()
+        return date.date()
+
+    def upsert(self, rows: List[dict]) -> dict:
+        """Insere ou atualiza os indicadores por (ticker_id, indicator_date) em um único commit"""
+        if not rows:
+            return {'inserted': 0, 'updated': 0}
+
+        ticker_ids = {row['ticker_id'] for row in rows}
+        first_date = min(row['indicator_date'] for row in rows)
+        existing = {
+            (ticker_id, self._date_key(indicator_date)): indicator_id
+            for indicator_id, ticker_id, indicator_date in self.session.query(
+                TechnicalIndicator.id, TechnicalIndicator.ticker_id, TechnicalIndicator.indicator_date
+            ).filter(
+                TechnicalIndicator.ticker_id.in_(ticker_ids),
+                TechnicalIndicator.indicator_date >= first_date
+            )
+        }
+
+        inserts, updates = [], []
+        for row in rows:
+            indicator_id = existing.get((row['ticker_id'], self._date_key(row['indicator_date'])))
+            if indicator_id is None:
+                inserts.append(row)
+            else:
+                updates.append(dict(row, id=indicator_id))
+
+        try:
+            self.session.bulk_insert_mappings(TechnicalIndicator, inserts)
+            self.session.bulk_update_mappings(TechnicalIndicator, updates)
+            self.session.commit()
+        except Exception as e:
+            logger.error(f"Erro ao gravar indicadores técnicos: {str(e)}")
+            self.session.rollback()
+            raise
+
+        return {'inserted': len(inserts), 'updated': len(updates)}
+
+    @staticmethod
+    def _date_key(value):
+        return value.date() if isinstance(value, datetime) else value
+
+    def build_states(self, symbols: Iterable[str]) -> Dict[str, IndicatorState]:
+        """Estados incrementais (`IndicatorState`) dos símbolos, a partir do histórico diário da janela"""
+        ids = ticker_id_map.resolve(symbols, self.session)
+        bars = self.load_daily_bars(ids.values()) if ids else {}
+        if not bars:
+            return {}
+
+        dates = [date.date() for date in bars['close'].columns]
+        states = {}
+        for symbol, ticker_id in ids.items():
+            if ticker_id in bars['close'].index:
+                states[symbol] = IndicatorState.from_bars(
+                    dates, *(bars[field].loc[ticker_id].values for field in BAR_FIELDS)
+                )
+        return states
+
+    def run(self, ticker_ids: Optional[Iterable[int]] = None, full_history: bool = False) -> dict:
+        """Executa o ETL completo e retorna estatísticas da execução"""
+        started = time.perf_counter()
+        logger.info("Iniciando ETL de indicadores técnicos")
+
+        bars = self.load_daily_bars(ticker_ids)
+        if not bars:
+            logger.warning("Nenhuma cotação na janela para calcular indicadores")
+            return {'tickers': 0, 'rows': 0, 'inserted': 0, 'updated': 0, 'seconds': 0.0}
+
+        series = self.compute(bars)
+        rows = self.build_rows(bars, series, full_history)
+        result = self.upsert(rows)
+
+        seconds = time.perf_counter() - started
+        stats = {
+            'tickers': len(bars['close'].index),
+            'periods': len(bars['close'].columns),
+            'rows': len(rows),
+            **result,
+            'seconds': round(seconds, 3),
+        }
+        logger.info(f"Indicadores técnicos: {stats['tickers']} tickers, {result['inserted']} novos, "
+                    f"{result['updated']} atualizados em {seconds:.2f}s")
+        return stats
+
+
+def run_technical_indicators_etl(full_history: bool = False):
+    """Função para executar o ETL de indicadores técnicos"""
+    etl = TechnicalIndicatorsETL()
+    return etl.run(full_history=full_history)
+
+
+if __name__ == '__main__':
+    etl = TechnicalIndicatorsETL()
+    etl.run()
@@ -0,0 +1,235 @@
+"""
+Vectorized technical-indicator engine
+
+Every function takes 2-D arrays shaped (tickers, periods), one row per
+ticker aligned on the same dates, with NaN where a ticker has no bar, and
+returns full rolling series of the same shape:
+
+- windowed indicators (SMA, Bollinger) use cumulative sums, O(n) per series
+  regardless of the window;
+- recursive indicators (EMA, Wilder RSI/ATR, MACD) advance all tickers one
+  period at a time, so the Python loop runs once per period, not per ticker.
+
+Gaps (NaN) inside a series are skipped by the recursive smoothers and make
+windowed values NaN until the window is complete again.
+"""
+import warnings
+from typing import Dict, Optional, Sequence, Tuple
+
+import numpy as np
+
+DEFAULT_SMA_WINDOWS = (20, 50, 200)
+DEFAULT_EMA_WINDOWS = (20, 50)
+RSI_PERIOD = 14
+MACD_PERIODS = (12, 26, 9)
+BOLLINGER = (20, 2.0)
+ATR_PERIOD = 14
+
+
+def as_matrix(values) -> np.ndarray:
+    """float64 2-D view of a single series or a (tickers, periods) matrix"""
+    matrix = np.asarray(values, dtype=np.float64)
+    return matrix.reshape(1, -1) if matrix.ndim == 1 else matrix
+
+
+def _window_sums(x: np.ndarray, window: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Rolling sums of the valid values and of the valid-value counts"""
+    valid = ~np.isnan(x)
+    filled = np.where(valid, x, 0.0)
+    sums = np.cumsum(filled, axis=1)
+    counts = np.cumsum(valid, axis=1)
+    sums[:, window:] = sums[:, window:] - sums[:, :-window]
+    counts[:, window:] = counts[:, window:] - counts[:, :-window]
+    return sums, counts
+
+
+def sma(x, window: int) -> np.ndarray:
+    """Simple moving average; NaN until `window` valid bars are in the window"""
+    x = as_matrix(x)
+    sums, counts = _window_sums(x, window)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return np.where(counts == window, sums / window, np.nan)
+
+
+def rolling_std(x, window: int) -> np.ndarray:
+    """Rolling population standard deviation (ddof=0), via shifted cumulative sums"""
+    x = as_matrix(x)
+    # Centering each row on its mean keeps the sums of squares well conditioned
+    with np.errstate(invalid='ignore'), warnings.catch_warnings():
+        warnings.simplefilter('ignore', RuntimeWarning)
+        center = np.nanmean(x, axis=1, keepdims=True)
+    shifted = x - np.nan_to_num(center)
+    sums, counts = _window_sums(shifted, window)
+    squares, _ = _window_sums(shifted * shifted, window)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        variance = squares / window - (sums / window) ** 2
+    return np.where(counts == window, np.sqrt(np.clip(variance, 0.0, None)), np.nan)
+
+
+def _smooth(x: np.ndarray, alpha: float, period: int, seed_with_mean: bool) -> np.ndarray:
+    """
+    Recursive smoothing s = alpha * x + (1 - alpha) * s_prev over each row.
+
+    With `seed_with_mean` the first value is the mean of the first `period`
+    observations (Wilder); otherwise the recursion starts at the first
+    observation and values are reported from the `period`-th on
+    (pandas `ewm(adjust=False, min_periods=period)`).
+    """
+    rows, periods = x.shape
+    out = np.full_like(x, np.nan)
+    state = np.full(rows, np.nan)
+    seen = np.zeros(rows, dtype=np.int64)
+    seed_sum = np.zeros(rows)
+
+    for t in range(periods):
+        value = x[:, t]
+        valid = ~np.isnan(value)
+        seen += valid
+        if seed_with_mean:
+            warming = valid & (seen <= period)
+            seed_sum[warming] += value[warming]
+            seeded = warming & (seen == period)
+            state[seeded] = seed_sum[seeded] / period
+            running = valid & (seen > period)
+        else:
+            starting = valid & (seen == 1)
+            state[starting] = value[starting]
+            running = valid & (seen > 1)
+        state[running] = alpha * value[running] + (1 - alpha) * state[running]
+        out[:, t] = np.where(seen >= period, state, np.nan)
+    return out
+
+
+def ema(x, span: int) -> np.ndarray:
+    """Exponential moving average with alpha = 2 / (span + 1)"""
+    return _smooth(as_matrix(x), 2.0 / (span + 1), span, seed_with_mean=False)
+
+
+def wilder(x, period: int) -> np.ndarray:
+    """Wilder's smoothing (alpha = 1 / period, seeded with the simple mean)"""
+    return _smooth(as_matrix(x), 1.0 / period, period, seed_with_mean=True)
+
+
+def _diff(x: np.ndarray) -> np.ndarray:
+    """Change from the previous valid bar of each row (NaN where there is none)"""
+    previous = _forward_fill(np.concatenate([np.full((x.shape[0], 1), np.nan), x[:, :-1]], axis=1))
+    return x - previous
+
+
+def _forward_fill(x: np.ndarray) -> np.ndarray:
+    valid = ~np.isnan(x)
+    index = np.where(valid, np.arange(x.shape[1]), 0)
+    np.maximum.accumulate(index, axis=1, out=index)
+    filled = x[np.arange(x.shape[0])[:, None], index]
+    filled[~valid & ~np.maximum.accumulate(valid, axis=1)] = np.nan
+    return filled
+
+
+def rsi(close, period: int = RSI_PERIOD) -> np.ndarray:
+    """Wilder RSI"""
+    close = as_matrix(close)
+    change = _diff(close)
+    gains = np.where(change > 0, change, np.where(np.isnan(change), np.nan, 0.0))
+    losses = np.where(change < 0, -change, np.where(np.isnan(change), np.nan, 0.0))
+    avg_gain = wilder(gains, period)
+    avg_loss = wilder(losses, period)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        result = 100.0 - 100.0 / (1.0 + avg_gain / avg_loss)
+    # No losses in the window: RSI is 100 (or 50 if the price did not move at all)
+    flat = (avg_loss == 0)
+    result[flat] = np.where(avg_gain[flat] > 0, 100.0, 50.0)
+    return result
+
+
+def macd(close, fast: int = MACD_PERIODS[0], slow: int = MACD_PERIODS[1],
+         signal: int = MACD_PERIODS[2]) -> Dict[str, np.ndarray]:
+    """MACD line (EMA fast - EMA slow), its signal EMA and the histogram"""
+    close = as_matrix(close)
+    line = ema(close, fast) - ema(close, slow)
+    signal_line = ema(line, signal)
+    return {'macd_line': line, 'macd_signal': signal_line, 'macd_histogram': line - signal_line}
+
+
+def bollinger(close, window: int = BOLLINGER[0], k: float = BOLLINGER[1]) -> Dict[str, np.ndarray]:
+    close = as_matrix(close)
+    middle = sma(close, window)
+    width = k * rolling_std(close, window)
+    return {'bb_upper': middle + width, 'bb_middle': middle, 'bb_lower': middle - width}
+
+
+def atr(high, low, close, period: int = ATR_PERIOD) -> np.ndarray:
+    """Average true range with Wilder's smoothing"""
+    high, low, close = as_matrix(high), as_matrix(low), as_matrix(close)
+    previous_close = close - _diff(close)
+    with np.errstate(invalid='ignore'):
+        true_range = np.fmax(high - low, np.fmax(np.abs(high - previous_close), np.abs(low - previous_close)))
+    return wilder(true_range, period)
+
+
+def obv(close, volume) -> np.ndarray:
+    """On-balance volume (cumulative volume signed by the close direction)"""
+    close, volume = as_matrix(close), as_matrix(volume)
+    direction = np.sign(np.nan_to_num(_diff(close)))
+    flow = np.nan_to_num(direction * volume)
+    return np.where(np.isnan(close), np.nan, np.cumsum(flow, axis=1))
+
+
+def compute_indicators(close, high=None, low=None, volume=None,
+                       sma_windows: Sequence[int] = DEFAULT_SMA_WINDOWS,
+                       ema_windows: Sequence[int] = DEFAULT_EMA_WINDOWS,
+                       rsi_period: int = RSI_PERIOD, macd_periods: Tuple[int, int, int] = MACD_PERIODS,
+                       bollinger_params: Tuple[int, float] = BOLLINGER,
+                       atr_period: int = ATR_PERIOD) -> Dict[str, np.ndarray]:
+    """
+    All indicators for a (tickers, periods) close matrix, keyed like the
+    `TechnicalIndicator` columns (`sma_20`, `ema_50`, `rsi`, `macd_line`,
+    `bb_upper`, ...). ATR needs `high`/`low` and OBV needs `volume`.
+    """
+    close = as_matrix(close)
+    series: Dict[str, np.ndarray] = {}
+    for window in sma_windows:
+        series[f'sma_{window}'] = sma(close, window)
+    for window in ema_windows:
+        series[f'ema_{window}'] = ema(close, window)
+    series['rsi'] = rsi(close, rsi_period)
+    series.update(macd(close, *macd_periods))
+    series.update(bollinger(close, *bollinger_params))
+    if high is not None and low is not None:
+        series[f'atr_{atr_period}'] = atr(high, low, close, atr_period)
+    if volume is not None:
+        series['obv'] = obv(close, volume)
+    return series
+
+
+def compute_indicators_by_bars(close, high=None, low=None, volume=None, **params) -> Dict[str, np.ndarray]:
+    """
+    `compute_indicators` for rows aligned on the union of several tickers'
+    dates, where NaN marks a date the ticker did not trade rather than a
+    gap in its own series. Each row is computed over its own bars, packed to
+    the left in date order, and the values are scattered back to the
+    original columns (NaN where the row has no bar).
+    """
+    close = as_matrix(close)
+    has_bar = ~np.isnan(close)
+    # Stable sort on "missing": each row's bars first, still in date order
+    order = np.argsort(~has_bar, axis=1, kind='stable')
+    packed = [None if values is None else np.take_along_axis(as_matrix(values), order, axis=1)
+              for values in (close, high, low, volume)]
+    series = compute_indicators(*packed, **params)
+
+    rows = np.arange(close.shape[0])[:, None]
+    for name, values in series.items():
+        scattered = np.empty_like(values)
+        scattered[rows, order] = values
+        scattered[~has_bar] = np.nan
+        series[name] = scattered
+    return series
+
+
+def latest(series: Dict[str, np.ndarray], row: int = 0) -> Dict[str, Optional[float]]:
+    """Last value of each series for one ticker (None when not yet defined)"""
+    values = {}
+    for name, matrix in series.items():
+        value = matrix[row, -1]
+        values[name] = None if np.isnan(value) else float(value)
+    return values
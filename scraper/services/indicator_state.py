@@ -0,0 +1,552 @@
+"""
+Incremental technical-indicator state for live ticks
+
+`IndicatorState` keeps, per ticker, everything the indicators need to move
+forward by one bar: ring buffers with running sums / sums of squares for the
+SMA and Bollinger windows, the running EMA and Wilder averages (RSI, ATR,
+MACD), the previous close and the OBV total. Indicators are daily, so a
+tick does not append a bar: it replaces the still-open bar of its day, and
+the values are computed from the committed state plus that bar without
+mutating anything. A tick for a later day commits the open bar first.
+Every operation is O(1) per tick, independent of the history length, and
+matches `indicator_engine.compute_indicators` on the same gap-free bars
+(missing days are simply skipped here).
+
+`IndicatorStateStore` holds the states of the streamed tickers, fed by the
+quote pipeline, and checkpoints the ones that changed to Redis, so other
+workers (and restarts) pick them up without replaying the history.
+"""
+import json
+import logging
+import math
+import threading
+import time
+from contextlib import nullcontext
+from datetime import date, datetime
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from services.indicator_engine import (
+    ATR_PERIOD, BOLLINGER, DEFAULT_EMA_WINDOWS, DEFAULT_SMA_WINDOWS, MACD_PERIODS, RSI_PERIOD,
+)
+
+logger = logging.getLogger(__name__)
+
+CHECKPOINT_PREFIX = 'indicator_state:'
+CHECKPOINT_TTL = 7 * 86400
+CHECKPOINT_INTERVAL = 30  # seconds between checkpoints of the changed states
+LOAD_RETRY_INTERVAL = 300  # seconds before retrying a ticker whose history failed to load
+
+
+class RollingWindow:
+    """Fixed-size ring buffer with running sum and sum of squares"""
+
+    __slots__ = ('size', 'buffer', 'index', 'count', 'total', 'total_sq', 'pushes')
+
+    def __init__(self, size: int, values: Sequence[float] = ()):
+        self.size = size
+        self.buffer = [0.0] * size
+        self.index = 0
+        self.count = 0
+        self.pushes = 0
+        for value in values[-size:]:
+            self.buffer[self.index] = value
+            self.index = (self.index + 1) % size
+            self.count += 1
+        self._resync()
+
+    def _resync(self):
+        """Recompute the sums from the buffer, discarding accumulated rounding"""
+        values = self.values()
+        self.total = math.fsum(values)
+        self.total_sq = math.fsum(value * value for value in values)
+
+    def values(self) -> List[float]:
+        """Buffered values, oldest first"""
+        if self.count < self.size:
+            return self.buffer[:self.count]
+        return self.buffer[self.index:] + self.buffer[:self.index]
+
+    def _sums_with(self, value: float) -> Tuple[int, float, float]:
+        oldest = self.buffer[self.index] if self.count == self.size else 0.0
+        return (min(self.count + 1, self.size),
+                self.total + value - oldest,
+                self.total_sq + value * value - oldest * oldest)
+
+    def push(self, value: float):
+        self.count, self.total, self.total_sq = self._sums_with(value)
+        self.buffer[self.index] = value
+        self.index = (self.index + 1) % self.size
+        self.pushes += 1
+        if self.pushes % (self.size * 10) == 0:
+            self._resync()  # amortized O(1)
+
+    def peek(self, value: float) -> Optional[Tuple[float, float]]:
+        """(mean, population std) of the window if `value` were pushed; None until full"""
+        count, total, total_sq = self._sums_with(value)
+        if count < self.size:
+            return None
+        mean = total / count
+        return mean, math.sqrt(max(total_sq / count - mean * mean, 0.0))
+
+
+class Smoother:
+    """One step of `indicator_engine._smooth` (EMA, or Wilder when seeded with the mean)"""
+
+    __slots__ = ('alpha', 'period', 'seed_with_mean', 'value', 'seen', 'seed_sum')
+
+    def __init__(self, alpha: float, period: int, seed_with_mean: bool):
+        self.alpha = alpha
+        self.period = period
+        self.seed_with_mean = seed_with_mean
+        self.value = None
+        self.seen = 0
+        self.seed_sum = 0.0
+
+    @classmethod
+    def ema(cls, span: int) -> 'Smoother':
+        return cls(2.0 / (span + 1), span, seed_with_mean=False)
+
+    @classmethod
+    def wilder(cls, period: int) -> 'Smoother':
+        return cls(1.0 / period, period, seed_with_mean=True)
+
+    def _advance(self, x: float) -> Tuple[Optional[float], int, float]:
+        seen = self.seen + 1
+        value, seed_sum = self.value, self.seed_sum
+        if self.seed_with_mean:
+            if seen <= self.period:
+                seed_sum += x
+                if seen == self.period:
+                    value = seed_sum / self.period
+            else:
+                value = self.alpha * x + (1 - self.alpha) * value
+        elif seen == 1:
+            value = x
+        else:
+            value = self.alpha * x + (1 - self.alpha) * value
+        return value, seen, seed_sum
+
+    def push(self, x: float):
+        self.value, self.seen, self.seed_sum = self._advance(x)
+
+    def peek(self, x: Optional[float]) -> Optional[float]:
+        """Smoothed value after `x` (None = no observation this bar), without mutating"""
+        if x is None:
+            return self.current()
+        value, seen, _ = self._advance(x)
+        return value if seen >= self.period else None
+
+    def current(self) -> Optional[float]:
+        return self.value if self.seen >= self.period else None
+
+    def to_dict(self) -> dict:
+        return {'value': self.value, 'seen': self.seen, 'seed_sum': self.seed_sum}
+
+    def load(self, data: dict):
+        self.value, self.seen, self.seed_sum = data['value'], data['seen'], data['seed_sum']
+
+
+class IndicatorState:
+    """Committed daily-bar state of one ticker plus its open (intraday) bar"""
+
+    def __init__(self, sma_windows: Sequence[int] = DEFAULT_SMA_WINDOWS,
+                 ema_windows: Sequence[int] = DEFAULT_EMA_WINDOWS, rsi_period: int = RSI_PERIOD,
+                 macd_periods: Tuple[int, int, int] = MACD_PERIODS,
+                 bollinger_params: Tuple[int, float] = BOLLINGER, atr_period: int = ATR_PERIOD):
+        self.sma_windows = tuple(sma_windows)
+        self.ema_windows = tuple(ema_windows)
+        self.rsi_period = rsi_period
+        self.macd_periods = tuple(macd_periods)
+        self.bollinger_params = tuple(bollinger_params)
+        self.atr_period = atr_period
+
+        sizes = set(self.sma_windows) | {self.bollinger_params[0]}
+        self.windows = {size: RollingWindow(size) for size in sorted(sizes)}
+        self.emas = {span: Smoother.ema(span) for span in self.ema_windows}
+        fast, slow, signal = self.macd_periods
+        self.macd_fast, self.macd_slow, self.macd_signal = Smoother.ema(fast), Smoother.ema(slow), Smoother.ema(signal)
+        self.avg_gain, self.avg_loss = Smoother.wilder(rsi_period), Smoother.wilder(rsi_period)
+        self.atr = Smoother.wilder(atr_period)
+        self.prev_close: Optional[float] = None
+        self.obv = 0.0
+        self.bars = 0
+
+        # Open bar: (close, high, low, volume) of `bar_date`
+        self.bar_date: Optional[date] = None
+        self.bar: Optional[Tuple[float, float, float, float]] = None
+        self._committed_values: Dict[str, Optional[float]] = {}
+        self.updated_at: Optional[float] = None
+
+    # --- feeding -----------------------------------------------------------
+
+    def update(self, price: float, high: Optional[float] = None, low: Optional[float] = None,
+               volume: Optional[float] = None, bar_date: Optional[date] = None) -> bool:
+        """
+        Apply a tick to the bar of `bar_date` (today by default). `high`,
+        `low` and `volume` are the day's values when the source has them;
+        otherwise high/low track the tick prices. Returns False for ticks
+        older than the open bar.
+        """
+        price = _number(price)
+        if price is None:
+            return False
+        bar_date = bar_date or date.today()
+        if self.bar_date is not None and bar_date < self.bar_date:
+            return False
+        if self.bar is not None and bar_date > self.bar_date:
+            self.commit()
+
+        if self.bar is None:
+            self.bar = (price, high if high is not None else price, low if low is not None else price, volume or 0.0)
+        else:
+            _, bar_high, bar_low, bar_volume = self.bar
+            self.bar = (
+                price,
+                high if high is not None else max(bar_high, price),
+                low if low is not None else min(bar_low, price),
+                volume if volume is not None else bar_volume,
+            )
+        self.bar_date = bar_date
+        self.updated_at = time.time()
+        return True
+
+    def commit(self):
+        """Close the open bar into the running state"""
+        if self.bar is None:
+            return
+        self._committed_values = self._compute(self.bar)
+        close, high, low, volume = self.bar
+
+        for window in self.windows.values():
+            window.push(close)
+        for smoother in self.emas.values():
+            smoother.push(close)
+        self.macd_fast.push(close)
+        self.macd_slow.push(close)
+        if self._committed_values['macd_line'] is not None:
+            self.macd_signal.push(self._committed_values['macd_line'])
+        self.atr.push(self._true_range(high, low))
+        if self.prev_close is not None:
+            change = close - self.prev_close
+            self.avg_gain.push(max(change, 0.0))
+            self.avg_loss.push(max(-change, 0.0))
+            self.obv += math.copysign(volume, change) if change else 0.0
+
+        self.prev_close = close
+        self.bars += 1
+        self.bar = None
+
+    @classmethod
+    def from_bars(cls, dates: Sequence[date], closes: Sequence[float], highs: Optional[Sequence[float]] = None,
+                  lows: Optional[Sequence[float]] = None, volumes: Optional[Sequence[float]] = None,
+                  **params) -> 'IndicatorState':
+        """Replay a daily history (NaN bars skipped); the last bar stays open"""
+        state = cls(**params)
+        for i, bar_date in enumerate(dates):
+            close = closes[i]
+            if close is None or math.isnan(close):
+                continue
+            state.update(close,
+                         _number(highs[i]) if highs is not None else None,
+                         _number(lows[i]) if lows is not None else None,
+                         _number(volumes[i]) if volumes is not None else None,
+                         bar_date)
+        return state
+
+    # --- reading -----------------------------------------------------------
+
+    def _true_range(self, high: float, low: float) -> float:
+        if self.prev_close is None:
+            return high - low
+        return max(high - low, abs(high - self.prev_close), abs(low - self.prev_close))
+
+    def _compute(self, bar: Tuple[float, float, float, float]) -> Dict[str, Optional[float]]:
+        close, high, low, volume = bar
+        values: Dict[str, Optional[float]] = {}
+
+        for size in self.sma_windows:
+            stats = self.windows[size].peek(close)
+            values[f'sma_{size}'] = stats[0] if stats else None
+        for span, smoother in self.emas.items():
+            values[f'ema_{span}'] = smoother.peek(close)
+
+        change = close - self.prev_close if self.prev_close is not None else None
+        avg_gain = self.avg_gain.peek(None if change is None else max(change, 0.0))
+        avg_loss = self.avg_loss.peek(None if change is None else max(-change, 0.0))
+        if avg_gain is None or avg_loss is None:
+            values['rsi'] = None
+        elif avg_loss == 0:
+            values['rsi'] = 100.0 if avg_gain > 0 else 50.0
+        else:
+            values['rsi'] = 100.0 - 100.0 / (1.0 + avg_gain / avg_loss)
+
+        fast, slow = self.macd_fast.peek(close), self.macd_slow.peek(close)
+        line = fast - slow if fast is not None and slow is not None else None
+        signal = self.macd_signal.peek(line)
+        values['macd_line'] = line
+        values['macd_signal'] = signal
+        values['macd_histogram'] = line - signal if line is not None and signal is not None else None
+
+        window, k = self.bollinger_params
+        stats = self.windows[window].peek(close)
+        if stats:
+            mean, std = stats
+            values.update({'bb_upper': mean + k * std, 'bb_middle': mean, 'bb_lower': mean - k * std})
+        else:
+            values.update({'bb_upper': None, 'bb_middle': None, 'bb_lower': None})
+
+        values[f'atr_{self.atr_period}'] = self.atr.peek(self._true_range(high, low))
+        values['obv'] = self.obv + (math.copysign(volume, change) if change else 0.0)
+        return values
+
+    def values(self) -> Dict[str, Optional[float]]:
+        """Indicators as of the open bar (intraday), or of the last committed bar"""
+        if self.bar is not None:
+            return self._compute(self.bar)
+        return dict(self._committed_values)
+
+    @property
+    def price(self) -> Optional[float]:
+        return self.bar[0] if self.bar is not None else self.prev_close
+
+    # --- checkpoints -------------------------------------------------------
+
+    def to_dict(self) -> dict:
+        return {
+            'params': {
+                'sma_windows': self.sma_windows, 'ema_windows': self.ema_windows,
+                'rsi_period': self.rsi_period, 'macd_periods': self.macd_periods,
+                'bollinger_params': self.bollinger_params, 'atr_period': self.atr_period,
+            },
+            'windows': {str(size): window.values() for size, window in self.windows.items()},
+            'emas': {str(span): smoother.to_dict() for span, smoother in self.emas.items()},
+            'macd': [self.macd_fast.to_dict(), self.macd_slow.to_dict(), self.macd_signal.to_dict()],
+            'rsi': [self.avg_gain.to_dict(), self.avg_loss.to_dict()],
+            'atr': self.atr.to_dict(),
+            'prev_close': self.prev_close,
+            'obv': self.obv,
+            'bars': self.bars,
+            'bar_date': self.bar_date.isoformat() if self.bar_date else None,
+            'bar': self.bar,
+            'committed_values': self._committed_values,
+            'updated_at': self.updated_at,
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> 'IndicatorState':
+        params = data['params']
+        state = cls(params['sma_windows'], params['ema_windows'], params['rsi_period'],
+                    tuple(params['macd_periods']), tuple(params['bollinger_params']), params['atr_period'])
+        for size, values in data['windows'].items():
+            state.windows[int(size)] = RollingWindow(int(size), values)
+        for span, smoother in data['emas'].items():
+            state.emas[int(span)].load(smoother)
+        for smoother, saved in zip((state.macd_fast, state.macd_slow, state.macd_signal), data['macd']):
+            smoother.load(saved)
+        state.avg_gain.load(data['rsi'][0])
+        state.avg_loss.load(data['rsi'][1])
+        state.atr.load(data['atr'])
+        state.prev_close = data['prev_close']
+        state.obv = data['obv']
+        state.bars = data['bars']
+        state.bar_date = date.fromisoformat(data['bar_date']) if data['bar_date'] else None
+        state.bar = tuple(data['bar']) if data['bar'] else None
+        state._committed_values = data['committed_values']
+        state.updated_at = data['updated_at']
+        return state
+
+
+def _number(value) -> Optional[float]:
+    if value is None:
+        return None
+    value = float(value)
+    return None if math.isnan(value) else value
+
+
+def _quote_date(quote: dict) -> Optional[date]:
+    """Trading day of a brapi quote (`regularMarketTime`), today when absent"""
+    market_time = quote.get('regularMarketTime')
+    if isinstance(market_time, str):
+        try:
+            return datetime.fromisoformat(market_time.replace('Z', '+00:00')).date()
+        except ValueError:
+            return None
+    if isinstance(market_time, (int, float)):
+        return datetime.utcfromtimestamp(market_time).date()
+    return None
+
+
+class IndicatorStateStore:
+    """
+    Live indicator states by ticker.
+
+    A ticker not in memory is restored from its Redis checkpoint, or else
+    replayed from `history_loader(symbols) -> {symbol: IndicatorState}`.
+    Without a loader (e.g. the RTD worker) only tickers that already have a
+    checkpoint are fed, so a worker without database history never
+    overwrites a seeded state with an empty one. Loads usually run on the
+    quote-updater thread, which has no app context: `set_loader_context`
+    gives the context (e.g. `app.app_context`) entered around each load.
+    """
+
+    def __init__(self, redis_client=None,
+                 history_loader: Optional[Callable[[Iterable[str]], Dict[str, IndicatorState]]] = None,
+                 checkpoint_interval: float = CHECKPOINT_INTERVAL, checkpoint_ttl: int = CHECKPOINT_TTL):
+        self.redis = redis_client
+        self.history_loader = history_loader
+        self._loader_context: Optional[Callable[[], object]] = None
+        self.checkpoint_interval = checkpoint_interval
+        self.checkpoint_ttl = checkpoint_ttl
+        self._states: Dict[str, IndicatorState] = {}
+        self._fed_at: Dict[str, float] = {}
+        self._dirty = set()
+        self._load_failed_at: Dict[str, float] = {}
+        self._last_checkpoint = time.monotonic()
+        self._lock = threading.RLock()
+
+    def set_loader_context(self, context: Optional[Callable[[], object]]):
+        """Enter `context()` around every `history_loader` call"""
+        self._loader_context = context
+
+    @staticmethod
+    def _key(ticker: str) -> str:
+        return f"{CHECKPOINT_PREFIX}{ticker}"
+
+    def _restore(self, tickers: List[str]) -> Dict[str, IndicatorState]:
+        """States from the Redis checkpoints (one MGET)"""
+        if not self.redis or not tickers:
+            return {}
+        try:
+            raw_values = self.redis.mget([self._key(ticker) for ticker in tickers])
+        except Exception as e:
+            logger.error(f"Indicator checkpoint read error: {str(e)}")
+            return {}
+        restored = {}
+        for ticker, raw in zip(tickers, raw_values):
+            if raw:
+                try:
+                    restored[ticker] = IndicatorState.from_dict(json.loads(raw))
+                except (ValueError, KeyError, TypeError) as e:
+                    logger.warning(f"Discarding unreadable indicator checkpoint for {ticker}: {str(e)}")
+        return restored
+
+    def _ensure(self, tickers: Iterable[str]) -> Dict[str, IndicatorState]:
+        """States for `tickers`, restoring or replaying the missing ones in one pass"""
+        tickers = {ticker.upper() for ticker in tickers}
+        missing = [ticker for ticker in tickers if ticker not in self._states]
+        if missing:
+            self._states.update(self._restore(missing))
+            missing = [ticker for ticker in missing if ticker not in self._states]
+
+        now = time.monotonic()
+        missing = [ticker for ticker in missing
+                   if now - self._load_failed_at.get(ticker, -LOAD_RETRY_INTERVAL) >= LOAD_RETRY_INTERVAL]
+        if missing and self.history_loader:
+            try:
+                with self._loader_context() if self._loader_context else nullcontext():
+                    loaded = self.history_loader(missing)
+            except Exception as e:
+                logger.error(f"Indicator history load error: {str(e)}")
+                self._load_failed_at.update((ticker, now) for ticker in missing)
+            else:
+                for ticker in missing:
+                    # No stored history: the state starts with the live bars
+                    self._states[ticker] = loaded.get(ticker) or IndicatorState()
+                    self._dirty.add(ticker)
+        return {ticker: self._states[ticker] for ticker in tickers if ticker in self._states}
+
+    def feed(self, ticker: str, price: float, high: Optional[float] = None, low: Optional[float] = None,
+             volume: Optional[float] = None, bar_date: Optional[date] = None) -> bool:
+        """Apply one tick; see `IndicatorState.update`"""
+        return self.feed_many([(ticker, price, high, low, volume, bar_date)]) == 1
+
+    def feed_many(self, ticks: Iterable[tuple]) -> int:
+        """Apply `(ticker, price, high, low, volume, bar_date)` ticks; returns how many were applied"""
+        ticks = [(tick[0].upper(),) + tuple(tick[1:]) for tick in ticks]
+        applied = 0
+        with self._lock:
+            states = self._ensure(tick[0] for tick in ticks)
+            now = time.monotonic()
+            for ticker, price, high, low, volume, bar_date in ticks:
+                state = states.get(ticker)
+                if state is not None and state.update(price, high, low, volume, bar_date):
+                    self._fed_at[ticker] = now
+                    self._dirty.add(ticker)
+                    applied += 1
+        self.maybe_checkpoint()
+        return applied
+
+    def feed_quotes(self, quotes: Dict[str, dict]) -> int:
+        """Apply brapi quotes (`regularMarketPrice`, day high/low/volume, `regularMarketTime`)"""
+        ticks = []
+        for ticker, quote in quotes.items():
+            price = _number(quote.get('regularMarketPrice')) if quote else None
+            if price:
+                ticks.append((ticker, price, _number(quote.get('regularMarketDayHigh')),
+                              _number(quote.get('regularMarketDayLow')),
+                              _number(quote.get('regularMarketVolume')), _quote_date(quote)))
+        return self.feed_many(ticks) if ticks else 0
+
+    def values(self, ticker: str, max_local_age: Optional[float] = None) -> Optional[dict]:
+        """
+        Current indicators of `ticker` with its price, bar date and update
+        time, or None if there is no state. A state not fed in this process
+        for `max_local_age` seconds (default: the checkpoint interval) is
+        re-read from its checkpoint, which another worker may be feeding.
+        """
+        ticker = ticker.upper()
+        max_local_age = self.checkpoint_interval if max_local_age is None else max_local_age
+        with self._lock:
+            idle = time.monotonic() - self._fed_at.get(ticker, float('-inf')) > max_local_age
+            if idle and ticker not in self._dirty:
+                restored = self._restore([ticker])
+                if restored:
+                    self._states[ticker] = restored[ticker]
+                    self._fed_at[ticker] = time.monotonic()
+            state = self._states.get(ticker)
+            if state is None or state.bar_date is None:
+                return None
+            return {
+                'price': state.price,
+                'date': state.bar_date.isoformat(),
+                'updated_at': state.updated_at,
+                'indicators': state.values(),
+            }
+
+    def maybe_checkpoint(self) -> int:
+        if time.monotonic() - self._last_checkpoint < self.checkpoint_interval:
+            return 0
+        return self.checkpoint()
+
+    def checkpoint(self) -> int:
+        """Write the states changed since the last checkpoint to Redis (one pipeline)"""
+        with self._lock:
+            dirty, self._dirty = self._dirty, set()
+            payloads = {ticker: json.dumps(self._states[ticker].to_dict()) for ticker in dirty}
+            self._last_checkpoint = time.monotonic()
+        if not self.redis or not payloads:
+            return 0
+        try:
+            pipeline = self.redis.pipeline(transaction=False)
+            for ticker, payload in payloads.items():
+                pipeline.set(self._key(ticker), payload, ex=self.checkpoint_ttl)
+            pipeline.execute()
+        except Exception as e:
+            logger.error(f"Indicator checkpoint write error: {str(e)}")
+            with self._lock:
+                self._dirty.update(payloads)
+            return 0
+        return len(payloads)
+
+    def forget(self, tickers: Iterable[str]):
+        """Drop in-memory states (their checkpoints stay in Redis)"""
+        with self._lock:
+            for ticker in tickers:
+                ticker = ticker.upper()
+                self._states.pop(ticker, None)
+                self._fed_at.pop(ticker, None)
+                self._dirty.discard(ticker)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {'states': len(self._states), 'dirty': len(self._dirty)}
@@ -0,0 +1,136 @@
+"""
+Per-ticker NumPy OHLCV arrays of the recent quotes
+
+Each request first asks the database only for the ticker's latest
+`quote_datetime` (an index lookup). If it has not moved, the cached arrays
+and every result derived from them are served as they are; otherwise only
+the rows newer than the cached ones are read (ids, timestamps and the four
+price/volume columns, no ORM objects), merged in and the derived results
+are dropped. Derived results are therefore cached until the next quote
+arrives.
+
+The series covers the last `window_days` days but never fewer than the last
+`min_rows` quotes: a ticker that has not traded recently still gets its
+latest bars, whatever their date.
+"""
+import threading
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, Hashable, Optional
+
+import numpy as np
+from sqlalchemy import func
+
+from app import db
+from models import Quote
+
+DEFAULT_WINDOW_DAYS = 90
+DEFAULT_MIN_ROWS = 60
+MAX_TICKERS = 500
+
+
+class OHLCVSeries:
+    """Recent quotes of one ticker as parallel arrays, oldest first"""
+
+    __slots__ = ('ids', 'datetimes', 'close', 'high', 'low', 'volume', 'last_quote', 'results')
+
+    def __init__(self):
+        self.ids = np.empty(0, dtype=np.int64)
+        self.datetimes = np.empty(0, dtype='datetime64[us]')
+        self.close = np.empty(0)
+        self.high = np.empty(0)
+        self.low = np.empty(0)
+        self.volume = np.empty(0)
+        self.last_quote: Optional[datetime] = None
+        self.results: Dict[Hashable, Any] = {}
+
+    def __len__(self):
+        return len(self.ids)
+
+    def tail(self, rows: int) -> 'OHLCVSeries':
+        """View of the last `rows` quotes"""
+        view = OHLCVSeries()
+        for name in ('ids', 'datetimes', 'close', 'high', 'low', 'volume'):
+            setattr(view, name, getattr(self, name)[-rows:])
+        view.last_quote = self.last_quote
+        return view
+
+    def merge(self, rows: list, start: datetime, min_rows: int = 0):
+        """Append newer rows (replacing re-read ids) and drop rows before `start`, keeping the last `min_rows`"""
+        if rows:
+            new = np.array(rows, dtype=object)
+            new_ids = new[:, 0].astype(np.int64)
+            keep = ~np.isin(self.ids, new_ids)
+            self.ids = np.concatenate([self.ids[keep], new_ids])
+            self.datetimes = np.concatenate([self.datetimes[keep], new[:, 1].astype('datetime64[us]')])
+            for column, name in enumerate(('close', 'high', 'low', 'volume'), start=2):
+                values = np.array([np.nan if value is None else value for value in new[:, column]], dtype=np.float64)
+                setattr(self, name, np.concatenate([getattr(self, name)[keep], values]))
+
+        recent = self.datetimes >= np.datetime64(start, 'us')
+        if min_rows:
+            recent[-min_rows:] = True
+        if not recent.all():
+            for name in ('ids', 'datetimes', 'close', 'high', 'low', 'volume'):
+                setattr(self, name, getattr(self, name)[recent])
+
+
+class OHLCVCache:
+    """LRU of `OHLCVSeries` by ticker_id, refreshed incrementally from `Quote`"""
+
+    def __init__(self, window_days: int = DEFAULT_WINDOW_DAYS, max_tickers: int = MAX_TICKERS, session=None,
+                 min_rows: int = DEFAULT_MIN_ROWS):
+        self.window_days = window_days
+        self.min_rows = min_rows
+        self.max_tickers = max_tickers
+        self.session = session or db.session
+        self._series: "OrderedDict[int, OHLCVSeries]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, ticker_id: int) -> OHLCVSeries:
+        """Up-to-date series of the ticker (empty when it has no quotes at all)"""
+        latest = self.session.query(func.max(Quote.quote_datetime)).filter(Quote.ticker_id == ticker_id).scalar()
+        with self._lock:
+            series = self._series.get(ticker_id)
+            if series is not None:
+                self._series.move_to_end(ticker_id)
+                if series.last_quote == latest:
+                    return series
+
+        start = datetime.utcnow() - timedelta(days=self.window_days)
+        since = series.last_quote if series is not None and series.last_quote else start
+        query = self.session.query(
+            Quote.id, Quote.quote_datetime, Quote.price, Quote.high_price, Quote.low_price, Quote.volume
+        ).filter(Quote.ticker_id == ticker_id)
+        rows = query.filter(Quote.quote_datetime >= since).order_by(Quote.quote_datetime.asc()).all()
+        if since is start and len(rows) < self.min_rows:
+            # Few quotes in the window (stale ticker): its last `min_rows`, whatever their date
+            rows = query.order_by(Quote.quote_datetime.desc()).limit(self.min_rows).all()[::-1]
+
+        with self._lock:
+            series = self._series.get(ticker_id) or OHLCVSeries()
+            series.merge(rows, start, self.min_rows)
+            series.last_quote = latest
+            series.results = {}
+            self._series[ticker_id] = series
+            self._series.move_to_end(ticker_id)
+            while len(self._series) > self.max_tickers:
+                self._series.popitem(last=False)
+            return series
+
+    def derived(self, ticker_id: int, key: Hashable, compute: Callable[[OHLCVSeries], Any]) -> Any:
+        """`compute(series)` cached on the series until the ticker's next quote"""
+        series = self.get(ticker_id)
+        if key not in series.results:
+            series.results[key] = compute(series)
+        return series.results[key]
+
+    def invalidate(self, ticker_id: Optional[int] = None):
+        with self._lock:
+            if ticker_id is None:
+                self._series.clear()
+            else:
+                self._series.pop(ticker_id, None)
+
+
+ohlcv_cache = OHLCVCache()
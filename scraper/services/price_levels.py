@@ -0,0 +1,97 @@
+"""
+Vectorized support/resistance levels
+
+Candidate levels are the pivot highs and lows of the series (a bar whose
+high/low is the extreme of the `order` bars on each side, found with one
+sliding-window max/min). Candidates are sorted and split wherever the gap
+to the next one exceeds `tolerance`, so each cluster becomes one level (its
+mean). Touches are the highs and lows inside the level's band, counted with
+binary searches on the sorted highs/lows. Everything is O(n log n).
+"""
+from typing import Dict, List, Tuple
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+DEFAULT_TOLERANCE = 0.01  # 1% band around each level
+PIVOT_ORDER = 2
+MAX_LEVELS = 3
+STRONG_TOUCHES = 3
+
+
+def pivot_points(high: np.ndarray, low: np.ndarray, order: int = PIVOT_ORDER) -> Tuple[np.ndarray, np.ndarray]:
+    """Indices of the pivot highs and pivot lows (extreme within `order` bars each side)"""
+    size = 2 * order + 1
+    if len(high) < size:
+        # Too short for pivots: every bar is a candidate
+        index = np.arange(len(high))
+        return index, index
+    center = slice(order, len(high) - order)
+    pivot_highs = np.flatnonzero(high[center] >= sliding_window_view(high, size).max(axis=1)) + order
+    pivot_lows = np.flatnonzero(low[center] <= sliding_window_view(low, size).min(axis=1)) + order
+    return pivot_highs, pivot_lows
+
+
+def cluster_levels(prices: np.ndarray, tolerance: float = DEFAULT_TOLERANCE) -> Tuple[np.ndarray, np.ndarray]:
+    """Levels (cluster means) and cluster sizes of `prices` grouped within `tolerance`"""
+    if len(prices) == 0:
+        return np.empty(0), np.empty(0, dtype=np.int64)
+    values = np.sort(prices)
+    breaks = np.flatnonzero(np.diff(values) > tolerance * values[:-1]) + 1
+    starts = np.concatenate(([0], breaks))
+    counts = np.diff(np.append(starts, len(values)))
+    return np.add.reduceat(values, starts) / counts, counts
+
+
+def count_touches(levels: np.ndarray, high: np.ndarray, low: np.ndarray,
+                  tolerance: float = DEFAULT_TOLERANCE) -> np.ndarray:
+    """Highs plus lows within `tolerance` of each level"""
+    lower, upper = levels * (1 - tolerance), levels * (1 + tolerance)
+    touches = np.zeros(len(levels), dtype=np.int64)
+    for values in (np.sort(high), np.sort(low)):
+        touches += np.searchsorted(values, upper, side='right') - np.searchsorted(values, lower, side='left')
+    return touches
+
+
+def support_resistance(high, low, close, tolerance: float = DEFAULT_TOLERANCE, order: int = PIVOT_ORDER,
+                       max_levels: int = MAX_LEVELS) -> Dict[str, List[dict]]:
+    """
+    Nearest `max_levels` support levels below and resistance levels above the
+    last close, each as `{'level', 'touches', 'distance_percent', 'strength'}`.
+    Missing highs/lows fall back to the close; bars without a close are dropped.
+    """
+    close = np.asarray(close, dtype=np.float64)
+    valid = ~np.isnan(close)
+    close = close[valid]
+    high = np.asarray(high, dtype=np.float64)[valid]
+    low = np.asarray(low, dtype=np.float64)[valid]
+    high = np.where(np.isnan(high), close, high)
+    low = np.where(np.isnan(low), close, low)
+    if len(close) == 0:
+        return {'support': [], 'resistance': []}
+
+    pivot_highs, pivot_lows = pivot_points(high, low, order)
+    levels, _ = cluster_levels(np.concatenate([high[pivot_highs], low[pivot_lows]]), tolerance)
+    touches = count_touches(levels, high, low, tolerance)
+    current = close[-1]
+
+    def describe(mask, reverse):
+        order_index = np.argsort(levels[mask])
+        if reverse:
+            order_index = order_index[::-1]
+        chosen = order_index[:max_levels]
+        return [
+            {
+                'level': float(level),
+                'touches': int(count),
+                'distance_percent': float(abs(level - current) / current * 100),
+                'strength': 'strong' if count >= STRONG_TOUCHES else 'moderate',
+            }
+            for level, count in zip(levels[mask][chosen], touches[mask][chosen])
+        ]
+
+    # Nearest first: supports descending from the price, resistances ascending
+    return {
+        'support': describe(levels < current * (1 - tolerance), reverse=True),
+        'resistance': describe(levels > current * (1 + tolerance), reverse=False),
+    }
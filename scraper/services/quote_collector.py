@@ -0,0 +1,116 @@
+"""
+Coletor concorrente de cotações
+
+Um único `requests.Session` com pool de conexões e retry/backoff
+(urllib3 `Retry`: 429/5xx e erros de conexão, respeitando Retry-After)
+compartilhado por um pool de threads limitado. Cada host tem seu próprio
+limite de requisições simultâneas, de modo que lotes de cotações,
+históricos e câmbio saem em paralelo sem estourar o limite da fonte.
+
+Não depende do app/banco: os resultados são devolvidos para quem chama
+(ex.: `QuotesETL`) gravar com `bulk_load_quotes`.
+"""
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Iterable, List, Optional
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+logger = logging.getLogger(__name__)
+
+BRAPI_BASE_URL = "https://brapi.dev/api"
+QUOTES_PER_REQUEST = 50
+DEFAULT_MAX_WORKERS = 16
+DEFAULT_PER_HOST_LIMIT = 8
+RETRY_STATUS = (429, 500, 502, 503, 504)
+
+
+class QuoteCollector:
+    """Requisições HTTP em paralelo com pool de conexões, limite por host e retry"""
+
+    def __init__(self, base_url: str = BRAPI_BASE_URL, max_workers: int = DEFAULT_MAX_WORKERS,
+                 per_host_limit: int = DEFAULT_PER_HOST_LIMIT, host_limits: Optional[Dict[str, int]] = None,
+                 retries: int = 3, backoff: float = 0.5, timeout: float = 30, headers: Optional[dict] = None):
+        self.base_url = base_url.rstrip('/')
+        self.timeout = timeout
+        self.per_host_limit = per_host_limit
+        self.host_limits = host_limits or {}
+        self._host_semaphores: Dict[str, threading.BoundedSemaphore] = {}
+        self._lock = threading.Lock()
+
+        retry = Retry(
+            total=retries, backoff_factor=backoff, status_forcelist=RETRY_STATUS,
+            allowed_methods=frozenset(['GET', 'HEAD']), respect_retry_after_header=True,
+            raise_on_status=False,
+        )
+        pool_size = max(per_host_limit, *self.host_limits.values()) if self.host_limits else per_host_limit
+        adapter = HTTPAdapter(pool_connections=8, pool_maxsize=pool_size, max_retries=retry)
+        self.session = requests.Session()
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        if headers:
+            self.session.headers.update(headers)
+
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='quote-collector')
+
+    def _host_semaphore(self, url: str) -> threading.BoundedSemaphore:
+        host = urlparse(url).netloc
+        with self._lock:
+            if host not in self._host_semaphores:
+                limit = self.host_limits.get(host, self.per_host_limit)
+                self._host_semaphores[host] = threading.BoundedSemaphore(limit)
+            return self._host_semaphores[host]
+
+    def get(self, url: str, params: Optional[dict] = None, **kwargs) -> requests.Response:
+        """GET respeitando o limite do host; retry/backoff ficam a cargo do adapter"""
+        with self._host_semaphore(url):
+            return self.session.get(url, params=params, timeout=kwargs.pop('timeout', self.timeout), **kwargs)
+
+    def get_json(self, url: str, params: Optional[dict] = None) -> Optional[dict]:
+        """JSON da resposta, ou None em erro (já logado)"""
+        try:
+            response = self.get(url, params=params)
+            response.raise_for_status()
+            return response.json()
+        except Exception as e:
+            logger.error(f"Erro ao buscar {url}: {str(e)}")
+            return None
+
+    def map(self, func: Callable, items: Iterable) -> list:
+        """Aplica `func` em paralelo no pool, preservando a ordem; falhas viram None"""
+        def run(item):
+            try:
+                return func(item)
+            except Exception as e:
+                logger.error(f"Erro na coleta de {item}: {str(e)}")
+                return None
+
+        return list(self.executor.map(run, items))
+
+    # --- brapi -----------------------------------------------------------------
+
+    def fetch_quotes(self, tickers: List[str], batch_size: int = QUOTES_PER_REQUEST) -> List[dict]:
+        """Cotações de `tickers` em requisições multi-símbolo de até `batch_size`, todas em paralelo"""
+        batches = [tickers[i:i + batch_size] for i in range(0, len(tickers), batch_size)]
+        results = self.map(lambda batch: self.get_json(f"{self.base_url}/quote/{','.join(batch)}"), batches)
+        return [quote for data in results if data for quote in data.get('results', [])]
+
+    def fetch_histories(self, tickers: List[str], days: int = 30, interval: str = '1d') -> Dict[str, list]:
+        """`historicalDataPrice` de cada ticker, uma requisição por ticker, em paralelo"""
+        params = {'range': f'{days}d', 'interval': interval}
+
+        def fetch(ticker):
+            data = self.get_json(f"{self.base_url}/quote/{ticker}", params=params)
+            if data and data.get('results'):
+                return data['results'][0].get('historicalDataPrice', [])
+            return []
+
+        return dict(zip(tickers, self.map(fetch, tickers)))
+
+    def close(self):
+        self.executor.shutdown(wait=True)
+        self.session.close()
@@ -0,0 +1,168 @@
+"""
+Batched quote fan-out for the streaming updater
+
+Each cycle takes the set of subscribed tickers, fetches them through
+`DataFetcher.fetch_quotes` (multi-symbol brapi requests run on a bounded
+thread pool) and hands only the quotes that changed since the last cycle
+to the `publish` callback, together with field-level deltas against the
+quote previously sent.
+
+Deltas map each changed or new field to its value and each removed field to
+None; a ticker seen for the first time gets its full quote as the delta.
+`encode_message` optionally packs payloads with MessagePack.
+"""
+import logging
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Iterable, Optional, Union
+
+try:
+    import msgpack
+    MSGPACK_AVAILABLE = True
+except ImportError:
+    MSGPACK_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_WORKERS = 8
+METRICS_WINDOW = 120  # cycles kept for the latency percentiles
+ENCODINGS = ('json', 'msgpack')
+_MISSING = object()
+
+
+def quote_delta(previous: Optional[dict], current: dict) -> dict:
+    """Fields of `current` that differ from `previous`; removed fields map to None"""
+    if not previous:
+        return dict(current)
+    delta = {key: value for key, value in current.items() if previous.get(key, _MISSING) != value}
+    delta.update({key: None for key in previous.keys() - current.keys()})
+    return delta
+
+
+def encode_message(payload: dict, encoding: str = 'json') -> Union[dict, bytes]:
+    """Payload as-is for JSON transport, or MessagePack bytes (sent as a binary frame)"""
+    if encoding == 'msgpack':
+        if not MSGPACK_AVAILABLE:
+            raise ImportError("msgpack is not installed")
+        return msgpack.packb(payload, use_bin_type=True)
+    return payload
+
+
+class QuoteFanout:
+    """Fetches subscribed quotes in batches and publishes only the changed ones"""
+
+    def __init__(self, fetcher, publish: Callable[[Dict[str, dict], Dict[str, dict]], None],
+                 batch_size: Optional[int] = None, max_workers: int = DEFAULT_MAX_WORKERS):
+        self.fetcher = fetcher
+        self.publish = publish
+        self.batch_size = batch_size
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='quote-fanout')
+        self._last_sent: Dict[str, dict] = {}
+        self._lock = threading.Lock()
+        self._cycles = deque(maxlen=METRICS_WINDOW)
+        self._totals = {'cycles': 0, 'published': 0, 'errors': 0}
+
+    def fetch(self, tickers: Iterable[str]) -> Dict[str, dict]:
+        """Fetch quotes for `tickers` using the shared pool (no diffing)"""
+        kwargs = {'batch_size': self.batch_size} if self.batch_size else {}
+        return self.fetcher.fetch_quotes(tickers, executor=self.executor, **kwargs)
+
+    def snapshot(self, tickers: Iterable[str]) -> Dict[str, dict]:
+        """
+        Full quotes for a new subscriber. Tickers already being broadcast
+        return the last sent quote, so the next deltas apply cleanly on top.
+        """
+        tickers = list(dict.fromkeys(ticker.upper() for ticker in tickers))
+        with self._lock:
+            quotes = {ticker: self._last_sent[ticker] for ticker in tickers if ticker in self._last_sent}
+        missing = [ticker for ticker in tickers if ticker not in quotes]
+        if missing:
+            quotes.update(self.fetch(missing))
+        return quotes
+
+    def run_cycle(self, tickers: Iterable[str]) -> Dict[str, dict]:
+        """Fetch all `tickers`, publish the changed quotes and their deltas, return the deltas"""
+        started = time.perf_counter()
+        tickers = list(dict.fromkeys(ticker.upper() for ticker in tickers))
+        error = None
+        changed = {}
+        deltas = {}
+        try:
+            quotes = self.fetch(tickers)
+            fetched = time.perf_counter()
+
+            with self._lock:
+                # Forget tickers nobody is subscribed to anymore
+                for ticker in set(self._last_sent) - set(tickers):
+                    del self._last_sent[ticker]
+                for ticker, quote in quotes.items():
+                    previous = self._last_sent.get(ticker)
+                    if previous != quote:
+                        changed[ticker] = quote
+                        deltas[ticker] = quote_delta(previous, quote)
+
+            if changed:
+                self.publish(changed, deltas)
+                with self._lock:
+                    self._last_sent.update(changed)
+        except Exception as e:
+            error = e
+            quotes = {}
+            fetched = time.perf_counter()
+            logger.error(f"Quote fan-out cycle failed: {e}")
+
+        finished = time.perf_counter()
+        self._record({
+            'tickers': len(tickers),
+            'quotes': len(quotes),
+            'missing': len(tickers) - len(quotes),
+            'changed': len(changed),
+            'delta_fields': sum(len(delta) for delta in deltas.values()),
+            'fetch_ms': (fetched - started) * 1000,
+            'publish_ms': (finished - fetched) * 1000,
+            'total_ms': (finished - started) * 1000,
+            'error': str(error) if error else None,
+            'finished_at': time.time(),
+        })
+        if error:
+            raise error
+        return deltas
+
+    def _record(self, cycle: dict):
+        with self._lock:
+            self._cycles.append(cycle)
+            self._totals['cycles'] += 1
+            self._totals['published'] += cycle['changed']
+            self._totals['errors'] += 1 if cycle['error'] else 0
+
+    def forget(self, ticker: str):
+        """Drop the last sent quote so the next cycle publishes `ticker` again"""
+        with self._lock:
+            self._last_sent.pop(ticker.upper(), None)
+
+    def stats(self) -> dict:
+        """Totals, the last cycle and latency percentiles over the recent window"""
+        with self._lock:
+            cycles = list(self._cycles)
+            totals = dict(self._totals)
+        if not cycles:
+            return {**totals, 'last_cycle': None}
+
+        durations = sorted(cycle['total_ms'] for cycle in cycles)
+
+        def percentile(p):
+            return round(durations[min(len(durations) - 1, int(p * len(durations)))], 2)
+
+        return {
+            **totals,
+            'window': len(cycles),
+            'total_ms_p50': percentile(0.50),
+            'total_ms_p95': percentile(0.95),
+            'total_ms_max': round(durations[-1], 2),
+            'last_cycle': {k: round(v, 2) if isinstance(v, float) else v for k, v in cycles[-1].items()},
+        }
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False)
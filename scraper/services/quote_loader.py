@@ -0,0 +1,148 @@
+"""
+Carga de cotações em lote (set-based)
+
+Substitui o caminho linha a linha (SELECT do ticker + SELECT da cotação
+recente + commit por cotação) por, a cada lote:
+
+- resolução de `ticker_id` por um mapa símbolo -> id em memória, recarregado
+  com uma única consulta quando aparece um símbolo desconhecido;
+- uma consulta para localizar as cotações recentes (janela de 5 minutos) de
+  todos os tickers do lote;
+- um INSERT multi-linha para as novas e um UPDATE em lote (executemany) para
+  as que caem na janela, com um único commit.
+
+Usa apenas o ORM (`bulk_insert_mappings`/`bulk_update_mappings`), então
+funciona igual em PostgreSQL e em SQLite nos testes.
+"""
+import logging
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional
+
+from sqlalchemy import func
+
+from app import db
+from models import Quote, Ticker
+
+logger = logging.getLogger(__name__)
+
+RECENT_QUOTE_WINDOW = timedelta(minutes=5)
+QUOTE_LOAD_BATCH = 500
+TICKER_MAP_REFRESH = 60  # segundos mínimos entre recargas por símbolo desconhecido
+
+
+class TickerIdMap:
+    """Mapa símbolo -> ticker_id compartilhado entre as cargas"""
+
+    def __init__(self, refresh_interval: float = TICKER_MAP_REFRESH):
+        self.refresh_interval = refresh_interval
+        self._ids: Dict[str, int] = {}
+        self._loaded_at = 0.0
+        self._lock = threading.Lock()
+
+    def _reload(self, session):
+        self._ids = {symbol.upper(): ticker_id for ticker_id, symbol in session.query(Ticker.id, Ticker.symbol)}
+        self._loaded_at = time.monotonic()
+
+    def resolve(self, symbols: Iterable[str], session=None) -> Dict[str, int]:
+        """ids dos símbolos conhecidos; recarrega o mapa (no máximo a cada `refresh_interval`) se faltar algum"""
+        session = session or db.session
+        symbols = {symbol.upper() for symbol in symbols}
+        with self._lock:
+            stale = time.monotonic() - self._loaded_at > self.refresh_interval
+            if not self._loaded_at or (stale and not symbols <= self._ids.keys()):
+                self._reload(session)
+            return {symbol: self._ids[symbol] for symbol in symbols if symbol in self._ids}
+
+    def invalidate(self):
+        with self._lock:
+            self._loaded_at = 0.0
+
+
+ticker_ids = TickerIdMap()
+
+
+def _quote_columns() -> set:
+    return set(Quote.__table__.columns.keys())
+
+
+def bulk_load_quotes(quotes: List[dict], session=None, merge_window: Optional[timedelta] = RECENT_QUOTE_WINDOW,
+                     batch_size: int = QUOTE_LOAD_BATCH) -> dict:
+    """
+    Grava um lote de cotações já transformadas (`QuotesETL.transform_quote_data`
+    ou `B3Scraper.scrape_stock_quotes`).
+
+    Uma cotação cujo ticker já tem registro dentro de `merge_window` atualiza
+    esse registro (o mais recente); as demais são inseridas. Com
+    `merge_window=None` todas são inseridas (carga histórica).
+
+    Retorna `{'rows', 'inserted', 'updated', 'seconds', 'rows_per_sec'}`.
+    """
+    session = session or db.session
+    started = time.perf_counter()
+    columns = _quote_columns()
+    inserted = updated = 0
+
+    try:
+        for start in range(0, len(quotes), batch_size):
+            batch = [quote for quote in quotes[start:start + batch_size] if quote and quote.get('ticker')]
+            if merge_window is not None:
+                # Dentro da janela só a última cotação de cada ticker importa
+                batch = list({quote['ticker']: quote for quote in batch}.values())
+            if not batch:
+                continue
+
+            symbols = {quote['ticker'] for quote in batch}
+            ids = ticker_ids.resolve(symbols, session)
+
+            recent = {}
+            if merge_window is not None:
+                cutoff = datetime.utcnow() - merge_window
+                latest = session.query(
+                    Quote.ticker, func.max(Quote.timestamp).label('timestamp')
+                ).filter(
+                    Quote.ticker.in_(symbols), Quote.timestamp > cutoff
+                ).group_by(Quote.ticker).subquery()
+                recent = {
+                    ticker: quote_id
+                    for quote_id, ticker in session.query(Quote.id, Quote.ticker).join(
+                        latest, (Quote.ticker == latest.c.ticker) & (Quote.timestamp == latest.c.timestamp)
+                    )
+                }
+
+            inserts, updates = [], []
+            for quote in batch:
+                mapping = {key: value for key, value in quote.items() if key in columns}
+                ticker_id = ids.get(quote['ticker'].upper())
+                if ticker_id is not None:
+                    mapping['ticker_id'] = ticker_id
+                if quote['ticker'] in recent:
+                    mapping['id'] = recent[quote['ticker']]
+                    updates.append(mapping)
+                else:
+                    inserts.append(mapping)
+
+            session.bulk_insert_mappings(Quote, inserts)
+            session.bulk_update_mappings(Quote, updates)
+            session.commit()
+            inserted += len(inserts)
+            updated += len(updates)
+
+    except Exception as e:
+        logger.error(f"Erro na carga em lote de cotações: {str(e)}")
+        session.rollback()
+        raise
+
+    seconds = time.perf_counter() - started
+    rows = inserted + updated
+    stats = {
+        'rows': rows,
+        'inserted': inserted,
+        'updated': updated,
+        'seconds': round(seconds, 3),
+        'rows_per_sec': round(rows / seconds, 1) if seconds > 0 else None,
+    }
+    logger.info(f"Cotações carregadas: {inserted} novas, {updated} atualizadas "
+                f"em {seconds:.2f}s ({stats['rows_per_sec']} linhas/s)")
+    return stats
@@ -0,0 +1,122 @@
+"""
+Vectorized financial and market ratios
+
+`compute_ratios` takes one row per company with the statement and market
+inputs as columns (any of `FINANCIAL_INPUTS` / `MARKET_INPUTS`; missing
+columns count as unknown) and returns every ratio as a column of the same
+index. A ratio is NaN when its denominator is missing or not positive,
+so a screen can tell "unknown" apart from zero.
+
+Additive components that are often not reported (inventory, debt, cash)
+are treated as zero, the way `FinancialCalculations` always did.
+"""
+from typing import Dict, List
+
+import numpy as np
+import pandas as pd
+
+FINANCIAL_INPUTS = (
+    'total_assets', 'current_assets', 'total_liabilities', 'current_liabilities', 'shareholders_equity',
+    'cash_and_equivalents', 'inventory', 'accounts_receivable', 'total_debt',
+    'revenue', 'cost_of_goods_sold', 'gross_profit', 'operating_income', 'ebitda', 'interest_expense',
+    'net_income', 'operating_cash_flow', 'dividends_paid',
+)
+MARKET_INPUTS = ('price', 'shares_outstanding', 'market_cap')
+
+RATIO_GROUPS: Dict[str, List[str]] = {
+    'liquidity_ratios': ['current_ratio', 'quick_ratio', 'cash_ratio'],
+    'profitability_ratios': ['gross_margin', 'operating_margin', 'net_margin', 'roe', 'roa', 'roic'],
+    'leverage_ratios': ['debt_to_equity', 'debt_to_assets', 'interest_coverage', 'net_debt_to_ebitda'],
+    'efficiency_ratios': ['asset_turnover', 'inventory_turnover', 'receivables_turnover'],
+    'valuation_ratios': ['pe_ratio', 'pb_ratio', 'ev_ebitda', 'price_to_sales', 'price_to_book',
+                         'price_to_cash_flow'],
+    'per_share_data': ['earnings_per_share', 'book_value_per_share', 'dividend_per_share',
+                       'cash_flow_per_share'],
+    'market_data': ['market_cap', 'enterprise_value', 'shares_outstanding'],
+}
+RATIO_COLUMNS = [column for columns in RATIO_GROUPS.values() for column in columns]
+
+
+def _column(frame: pd.DataFrame, name: str, default: float = np.nan) -> pd.Series:
+    if name not in frame.columns:
+        return pd.Series(default, index=frame.index, dtype=np.float64)
+    values = pd.to_numeric(frame[name], errors='coerce').astype(np.float64)
+    return values if np.isnan(default) else values.fillna(default)
+
+
+def _ratio(numerator: pd.Series, denominator: pd.Series) -> pd.Series:
+    """numerator / denominator where the denominator is positive, NaN elsewhere"""
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return numerator.where(denominator > 0) / denominator.where(denominator > 0)
+
+
+def compute_ratios(frame: pd.DataFrame) -> pd.DataFrame:
+    """All `RATIO_COLUMNS` for every row of `frame`"""
+    col = lambda name: _column(frame, name)
+    zero = lambda name: _column(frame, name, 0.0)
+
+    total_assets = col('total_assets')
+    current_liabilities = col('current_liabilities')
+    equity = col('shareholders_equity').fillna(total_assets - col('total_liabilities'))
+    revenue = col('revenue')
+    operating_income = col('operating_income')
+    net_income = col('net_income')
+    total_debt = zero('total_debt')
+    cash = zero('cash_and_equivalents')
+    gross_profit = col('gross_profit').fillna(revenue - col('cost_of_goods_sold'))
+
+    shares = col('shares_outstanding')
+    price = col('price')
+    market_cap = (price * shares).fillna(col('market_cap'))
+    enterprise_value = market_cap + total_debt - cash
+    eps = _ratio(net_income, shares)
+    bvps = _ratio(equity, shares)
+    cfps = _ratio(col('operating_cash_flow'), shares)
+
+    ratios = pd.DataFrame({
+        'current_ratio': _ratio(col('current_assets'), current_liabilities),
+        'quick_ratio': _ratio(col('current_assets') - zero('inventory'), current_liabilities),
+        'cash_ratio': _ratio(cash, current_liabilities),
+
+        'gross_margin': _ratio(gross_profit, revenue),
+        'operating_margin': _ratio(operating_income, revenue),
+        'net_margin': _ratio(net_income, revenue),
+        'roe': _ratio(net_income, equity),
+        'roa': _ratio(net_income, total_assets),
+        'roic': _ratio(operating_income, equity + total_debt),
+
+        'debt_to_equity': _ratio(total_debt, equity),
+        'debt_to_assets': _ratio(total_debt, total_assets),
+        'interest_coverage': _ratio(operating_income, col('interest_expense')),
+        'net_debt_to_ebitda': _ratio(total_debt - cash, col('ebitda')),
+
+        'asset_turnover': _ratio(revenue, total_assets),
+        'inventory_turnover': _ratio(col('cost_of_goods_sold'), col('inventory')),
+        'receivables_turnover': _ratio(revenue, col('accounts_receivable')),
+
+        'pe_ratio': _ratio(price, eps),
+        'pb_ratio': _ratio(price, bvps),
+        'ev_ebitda': _ratio(enterprise_value, col('ebitda')),
+        'price_to_sales': _ratio(market_cap, revenue),
+        'price_to_book': _ratio(market_cap, equity),
+        'price_to_cash_flow': _ratio(price, cfps),
+
+        'earnings_per_share': eps,
+        'book_value_per_share': bvps,
+        'dividend_per_share': _ratio(zero('dividends_paid').abs(), shares),
+        'cash_flow_per_share': cfps,
+
+        'market_cap': market_cap,
+        'enterprise_value': enterprise_value.where(market_cap.notna()),
+        'shares_outstanding': shares,
+    }, index=frame.index)
+    return ratios.replace([np.inf, -np.inf], np.nan)
+
+
+def group_ratios(row: Dict[str, float], groups=RATIO_GROUPS, missing=None) -> Dict[str, Dict[str, float]]:
+    """Nest one row of ratios by group, NaN/None replaced with `missing`"""
+    def value(name):
+        result = row.get(name)
+        return missing if result is None or (isinstance(result, float) and np.isnan(result)) else result
+
+    return {group: {name: value(name) for name in names} for group, names in groups.items()}
@@ -5,12 +5,14 @@ Busca cotações, dividendos e dados de mercado diretamente do site da B3
 import requests
 import pandas as pd
 import logging
-from datetime import datetime, timedelta
+from datetime import datetime
 from bs4 import BeautifulSoup
 from app import db
-from models import Quote, Ticker, Dividend
+from models import Dividend
 import trafilatura
 import re
+from services.quote_loader import bulk_load_quotes
+from services.quote_collector import QuoteCollector
 
 logger = logging.getLogger(__name__)
 
@@ -22,6 +24,11 @@ class B3Scraper:
         self.session.headers.update({
             'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
         })
+        # Páginas de cotação buscadas em paralelo, no máximo 4 simultâneas no site da B3
+        self.collector = QuoteCollector(
+            base_url=self.quotes_url, per_host_limit=4, timeout=15,
+            headers=dict(self.session.headers)
+        )
     
     def scrape_ibovespa_composition(self):
         """Scraper da composição atual do Ibovespa"""
@@ -72,59 +79,23 @@ class B3Scraper:
             return []
     
     def scrape_stock_quotes(self, tickers_list):
-        """Scraper de cotações de ações da B3"""
+        """Scraper de cotações de ações da B3 (páginas buscadas em paralelo)"""
         try:
-            quotes_data = []
+            # URL da página de cotação individual
+            url = f"{self.quotes_url}/mdf/executar/ConsultarInstrumento"
+            responses = self.collector.map(
+                lambda ticker: self.collector.get(url, params={'acao': ticker, 'idioma': 'pt-br'}),
+                tickers_list
+            )
             
-            for ticker in tickers_list:
+            quotes_data = []
+            for ticker, response in zip(tickers_list, responses):
+                if response is None or response.status_code != 200:
+                    continue
                 try:
-                    # URL da página de cotação individual
-                    url = f"{self.quotes_url}/mdf/executar/ConsultarInstrumento"
-                    
-                    params = {
-                        'acao': ticker,
-                        'idioma': 'pt-br'
-                    }
-                    
-                    response = self.session.get(url, params=params, timeout=15)
-                    if response.status_code == 200:
-                        soup = BeautifulSoup(response.content, 'html.parser')
-                        
-                        # Extrair dados da cotação
-                        price_elem = soup.find('span', class_='cotacao')
-                        if price_elem:
-                            price_text = price_elem.get_text(strip=True).replace(',', '.')
-                            price = float(re.findall(r'[\d,\.]+', price_text)[0])
-                            
-                            # Buscar outros dados
-                            variation_elem = soup.find('span', class_='variacao')
-                            volume_elem = soup.find('span', class_='volume')
-                            
-                            variation = 0
-                            if variation_elem:
-                                var_text = variation_elem.get_text(strip=True)
-                                var_match = re.search(r'([-+]?\d+[\.,]?\d*)', var_text)
-                                if var_match:
-                                    variation = float(var_match.group(1).replace(',', '.'))
-                            
-                            volume = 0
-                            if volume_elem:
-                                vol_text = volume_elem.get_text(strip=True)
-                                vol_match = re.search(r'(\d+[\.,]?\d*)', vol_text)
-                                if vol_match:
-                                    volume = int(float(vol_match.group(1).replace(',', '.')))
-                            
-                            quotes_data.append({
-                                'ticker': ticker,
-                                'price': price,
-                                'change': variation,
-                                'change_percent': (variation / (price - variation)) * 100 if price > variation else 0,
-                                'volume': volume,
-                                'timestamp': datetime.utcnow(),
-                                'quote_datetime': datetime.utcnow(),
-                                'market_status': 'OPEN' if self._is_market_open() else 'CLOSED'
-                            })
-                
+                    quote = self._parse_stock_quote(ticker, response.content)
+                    if quote:
+                        quotes_data.append(quote)
                 except Exception as e:
                     logger.warning(f"Erro ao extrair cotação de {ticker}: {str(e)}")
                     continue
@@ -136,6 +107,47 @@ class B3Scraper:
             logger.error(f"Erro ao extrair cotações B3: {str(e)}")
             return []
     
+    def _parse_stock_quote(self, ticker, content):
+        """Extrai os dados da cotação da página de um instrumento"""
+        soup = BeautifulSoup(content, 'html.parser')
+        
+        # Extrair dados da cotação
+        price_elem = soup.find('span', class_='cotacao')
+        if not price_elem:
+            return None
+        
+        price_text = price_elem.get_text(strip=True).replace(',', '.')
+        price = float(re.findall(r'[\d,\.]+', price_text)[0])
+        
+        # Buscar outros dados
+        variation_elem = soup.find('span', class_='variacao')
+        volume_elem = soup.find('span', class_='volume')
+        
+        variation = 0
+        if variation_elem:
+            var_text = variation_elem.get_text(strip=True)
+            var_match = re.search(r'([-+]?\d+[\.,]?\d*)', var_text)
+            if var_match:
+                variation = float(var_match.group(1).replace(',', '.'))
+        
+        volume = 0
+        if volume_elem:
+            vol_text = volume_elem.get_text(strip=True)
+            vol_match = re.search(r'(\d+[\.,]?\d*)', vol_text)
+            if vol_match:
+                volume = int(float(vol_match.group(1).replace(',', '.')))
+        
+        return {
+            'ticker': ticker,
+            'price': price,
+            'change': variation,
+            'change_percent': (variation / (price - variation)) * 100 if price > variation else 0,
+            'volume': volume,
+            'timestamp': datetime.utcnow(),
+            'quote_datetime': datetime.utcnow(),
+            'market_status': 'OPEN' if self._is_market_open() else 'CLOSED'
+        }
+    
     def scrape_dividends_calendar(self, year=None):
         """Scraper do calendário de dividendos"""
         if not year:
@@ -333,46 +345,14 @@ class B3Scraper:
         return None
     
     def load_quotes_to_db(self, quotes_data):
-        """Carrega cotações no banco"""
-        loaded_count = 0
-        
+        """Carrega cotações no banco com uma escrita em lote"""
         try:
-            for quote_data in quotes_data:
-                # Check if ticker exists
-                ticker_obj = Ticker.query.filter_by(symbol=quote_data['ticker']).first()
-                if ticker_obj:
-                    quote_data['ticker_id'] = ticker_obj.id
-                
-                # Check for recent quote (last 5 minutes)
-                recent_quote = Quote.query.filter_by(
-                    ticker=quote_data['ticker']
-                ).filter(
-                    Quote.timestamp > datetime.utcnow() - timedelta(minutes=5)
-                ).first()
-                
-                if recent_quote:
-                    # Update existing quote
-                    for key, value in quote_data.items():
-                        if hasattr(recent_quote, key):
-                            setattr(recent_quote, key, value)
-                else:
-                    # Create new quote
-                    quote = Quote(**quote_data)
-                    db.session.add(quote)
-                
-                loaded_count += 1
-                
-                if loaded_count % 50 == 0:
-                    db.session.commit()
-                    logger.info(f"Carregadas {loaded_count} cotações...")
-            
-            db.session.commit()
-            logger.info(f"Total de {loaded_count} cotações carregadas")
-            return loaded_count
+            stats = bulk_load_quotes(quotes_data)
+            logger.info(f"Total de {stats['rows']} cotações carregadas ({stats['rows_per_sec']} linhas/s)")
+            return stats['rows']
             
         except Exception as e:
             logger.error(f"Erro ao carregar cotações: {str(e)}")
-            db.session.rollback()
             return 0
     
     def load_dividends_to_db(self, dividends_data):
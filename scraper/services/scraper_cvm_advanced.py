@@ -6,14 +6,15 @@ import requests
 import pandas as pd
 import logging
 from datetime import datetime, timedelta
-from typing import Dict, List, Optional, Any
+from typing import Dict, List, Optional, Any, Tuple
 from dataclasses import dataclass
-from io import StringIO, BytesIO
-import zipfile
 import os
 import time
 from pathlib import Path
 
+from .cvm_download_cache import get_download_cache
+from .cvm_parquet_store import MAIN_STATEMENT, get_parquet_store, read_cvm_csv
+
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -28,6 +29,32 @@ class CVMDataset:
     years_available: List[int]
     data_types: List[str]
 
+class CompanyDatasetIndex:
+    """
+    Datasets de um ano carregados uma única vez e indexados por CD_CVM.
+    Cada empresa é servida por posição (`iloc`) em vez de varrer o ano inteiro.
+    """
+    
+    def __init__(self, datasets: Dict[str, pd.DataFrame]):
+        self.datasets = datasets
+        self.positions = {
+            name: df.groupby('CD_CVM', sort=False, observed=True).indices
+            for name, df in datasets.items()
+            if 'CD_CVM' in df.columns
+        }
+    
+    def get(self, cvm_code) -> Dict[str, pd.DataFrame]:
+        """Dados da empresa em cada arquivo do dataset (arquivos sem a empresa são omitidos)"""
+        code = int(cvm_code)
+        return {
+            name: self.datasets[name].iloc[positions[code]]
+            for name, positions in self.positions.items()
+            if code in positions
+        }
+    
+    def company_codes(self) -> set:
+        return {int(code) for positions in self.positions.values() for code in positions}
+
 class CVMAdvancedScraper:
     """Scraper avançado para todos os dados estruturados da CVM"""
     
@@ -37,6 +64,12 @@ class CVMAdvancedScraper:
         self.session.headers.update({
             'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
         })
+        # Cache compartilhado: cada zip é baixado no máximo uma vez por coleta
+        self.download_cache = get_download_cache()
+        # Staging Parquet (None sem pyarrow: volta a ler os CSVs do zip)
+        self.parquet_store = get_parquet_store()
+        # Índices por CD_CVM dos anos carregados em lote: (dataset, ano) -> índice
+        self.company_indexes: Dict[Tuple[str, int], CompanyDatasetIndex] = {}
         
         # Datasets disponíveis na CVM
         self.datasets = {
@@ -82,15 +115,10 @@ class CVMAdvancedScraper:
             
             logger.info(f"Verificando arquivos para {dataset.name} - {year}")
             
-            # Fazer download do ZIP
-            response = self.session.get(zip_url, timeout=30)
-            response.raise_for_status()
-            
-            # Listar conteúdo do ZIP
-            with zipfile.ZipFile(BytesIO(response.content)) as zip_file:
-                files = zip_file.namelist()
-                logger.info(f"Encontrados {len(files)} arquivos no dataset {dataset_code}_{year}")
-                return files
+            # Lê apenas o diretório central do ZIP (cache local ou HTTP Range)
+            files = self.download_cache.list_members(zip_url, session=self.session)
+            logger.info(f"Encontrados {len(files)} arquivos no dataset {dataset_code}_{year}")
+            return files
                 
         except Exception as e:
             logger.error(f"Erro ao listar arquivos {dataset_code}_{year}: {str(e)}")
@@ -105,26 +133,25 @@ class CVMAdvancedScraper:
             logger.info(f"Baixando {dataset.name} - {year}")
             logger.info(f"URL: {zip_url}")
             
-            # Download do arquivo ZIP
-            response = self.session.get(zip_url, timeout=60)
-            response.raise_for_status()
+            # Download do arquivo ZIP (ou reaproveitamento do cache local)
+            cached_zip = self.download_cache.fetch(zip_url, session=self.session, timeout=60)
+            if cached_zip is None:
+                logger.warning(f"Dataset {dataset_code}_{year} não encontrado (404)")
+                return {}
             
             # Extrair e processar CSVs
             dataframes = {}
             
-            with zipfile.ZipFile(BytesIO(response.content)) as zip_file:
+            with cached_zip.zip() as zip_file:
                 csv_files = [f for f in zip_file.namelist() if f.endswith('.csv')]
                 
                 logger.info(f"Processando {len(csv_files)} arquivos CSV")
                 
                 for csv_file in csv_files:
                     try:
-                        # Extrair e ler CSV
-                        csv_content = zip_file.read(csv_file)
-                        csv_text = csv_content.decode('latin-1', errors='ignore')
-                        
-                        # Converter para DataFrame
-                        df = pd.read_csv(StringIO(csv_text), sep=';', encoding='latin-1')
+                        # Ler o CSV direto do membro do ZIP, com os dtypes compactos do staging
+                        with zip_file.open(csv_file) as f:
+                            df = read_cvm_csv(f)
                         
                         # Limpar nome do arquivo
                         file_key = csv_file.replace('.csv', '').split('/')[-1]
@@ -142,6 +169,63 @@ class CVMAdvancedScraper:
             logger.error(f"Erro ao baixar dataset {dataset_code}_{year}: {str(e)}")
             return {}
     
+    def get_company_index(self, dataset_code: str, year: int) -> CompanyDatasetIndex:
+        """Carrega o dataset do ano uma única vez e o indexa por CD_CVM"""
+        key = (dataset_code, year)
+        if key not in self.company_indexes:
+            datasets = None
+            if self.parquet_store is not None:
+                try:
+                    datasets = self.parquet_store.query(dataset_code, year, session=self.session)
+                except Exception as e:
+                    logger.warning(f"Staging Parquet indisponível para {dataset_code}_{year}: {str(e)}")
+            if datasets is None:
+                datasets = self.download_and_extract_dataset(dataset_code, year)
+            
+            started = time.perf_counter()
+            self.company_indexes[key] = CompanyDatasetIndex(datasets)
+            logger.info(f"Índice por empresa de {dataset_code}_{year} montado em "
+                        f"{(time.perf_counter() - started) * 1000:.0f} ms")
+        return self.company_indexes[key]
+    
+    def clear_company_indexes(self, year: Optional[int] = None):
+        """Libera os índices em memória (de um ano ou todos)"""
+        for key in [k for k in self.company_indexes if year is None or k[1] == year]:
+            del self.company_indexes[key]
+    
+    def _company_datasets(self, dataset_code: str, year: int, cvm_code: str) -> Dict[str, pd.DataFrame]:
+        """Usa o índice do ano se já foi carregado em lote; senão lê só a empresa"""
+        index = self.company_indexes.get((dataset_code, year))
+        if index is not None:
+            return index.get(cvm_code)
+        return self.load_companies_data(dataset_code, year, [cvm_code])
+    
+    def load_companies_data(self, dataset_code: str, year: int, cvm_codes: List[str],
+                            statements: Optional[List[str]] = None) -> Dict[str, pd.DataFrame]:
+        """
+        Dados de um dataset restritos às empresas informadas. Usa o staging
+        Parquet (filtro por CD_CVM empurrado para o leitor) quando disponível;
+        senão baixa o dataset completo e filtra em memória.
+        """
+        if self.parquet_store is not None:
+            try:
+                return self.parquet_store.query(dataset_code, year, statements=statements,
+                                                cvm_codes=cvm_codes, session=self.session)
+            except Exception as e:
+                logger.warning(f"Staging Parquet indisponível para {dataset_code}_{year}: {str(e)}")
+
+        datasets = self.download_and_extract_dataset(dataset_code, year)
+        if statements is not None:
+            datasets = {k: v for k, v in datasets.items() if any(f"_{st}_" in k for st in statements)}
+        if len(cvm_codes) == 1:
+            return self._filter_company_data(datasets, cvm_codes[0])
+        codes = {int(code) for code in cvm_codes}
+        return {
+            name: df[df['CD_CVM'].isin(codes)]
+            for name, df in datasets.items()
+            if 'CD_CVM' in df.columns and df['CD_CVM'].isin(codes).any()
+        }
+
     def extract_company_financial_data(self, cvm_code: str, year: int = 2024) -> Dict[str, Any]:
         """Extrai dados financeiros completos de uma empresa específica"""
         try:
@@ -157,23 +241,20 @@ class CVMAdvancedScraper:
             }
             
             # 1. DFP - Demonstrações Financeiras Padronizadas
-            dfp_data = self.download_and_extract_dataset('dfp', year)
-            if dfp_data:
-                company_dfp = self._filter_company_data(dfp_data, cvm_code)
+            company_dfp = self._company_datasets('dfp', year, cvm_code)
+            if company_dfp:
                 company_data['dfp_data'] = company_dfp
                 logger.info(f"DFP extraído: {len(company_dfp)} datasets")
             
             # 2. ITR - Informações Trimestrais
-            itr_data = self.download_and_extract_dataset('itr', year)
-            if itr_data:
-                company_itr = self._filter_company_data(itr_data, cvm_code)
+            company_itr = self._company_datasets('itr', year, cvm_code)
+            if company_itr:
                 company_data['itr_data'] = company_itr
                 logger.info(f"ITR extraído: {len(company_itr)} datasets")
             
             # 3. FRE - Formulário de Referência
-            fre_data = self.download_and_extract_dataset('fre', year)
-            if fre_data:
-                company_fre = self._filter_company_data(fre_data, cvm_code)
+            company_fre = self._company_datasets('fre', year, cvm_code)
+            if company_fre:
                 company_data['fre_data'] = company_fre
                 logger.info(f"FRE extraído: {len(company_fre)} datasets")
             
@@ -213,6 +294,19 @@ class CVMAdvancedScraper:
         try:
             logger.info(f"Extraindo dados básicos de todas as empresas - {year}")
             
+            # Staging Parquet: lê só as colunas cadastrais do arquivo índice do DFP
+            if self.parquet_store is not None:
+                try:
+                    companies_df = self.parquet_store.read_statement(
+                        'dfp', year, MAIN_STATEMENT, columns=['CD_CVM', 'DENOM_CIA', 'CNPJ_CIA'], session=self.session
+                    )
+                    if not companies_df.empty:
+                        companies_df = companies_df.drop_duplicates('CD_CVM', keep='last')
+                        logger.info(f"Encontradas {len(companies_df)} empresas com dados DFP")
+                        return companies_df
+                except Exception as e:
+                    logger.warning(f"Staging Parquet indisponível para dfp_{year}: {str(e)}")
+            
             # Baixar DFP do ano (contém dados de todas as empresas)
             dfp_data = self.download_and_extract_dataset('dfp', year)
             
@@ -247,7 +341,8 @@ class CVMAdvancedScraper:
         try:
             logger.info(f"Extraindo balanço patrimonial - CVM {cvm_code} - {year}")
             
-            dfp_data = self.download_and_extract_dataset('dfp', year)
+            dfp_data = self.load_companies_data('dfp', year, [cvm_code],
+                                                statements=['BPA_con', 'BPA_ind', 'BPP_con', 'BPP_ind'])
             
             balance_data = {
                 'cvm_code': cvm_code,
@@ -287,7 +382,7 @@ class CVMAdvancedScraper:
         try:
             logger.info(f"Extraindo DRE - CVM {cvm_code} - {year}")
             
-            dfp_data = self.download_and_extract_dataset('dfp', year)
+            dfp_data = self.load_companies_data('dfp', year, [cvm_code], statements=['DRE_con', 'DRE_ind'])
             
             income_data = {
                 'cvm_code': cvm_code,
@@ -318,9 +413,9 @@ class CVMAdvancedScraper:
         try:
             logger.info(f"Extraindo dados de {len(cvm_codes)} empresas - {year}")
             
-            # Download dos datasets uma vez só
-            dfp_data = self.download_and_extract_dataset('dfp', year)
-            itr_data = self.download_and_extract_dataset('itr', year)
+            # Cada dataset é carregado e indexado uma vez só para o lote inteiro
+            dfp_index = self.get_company_index('dfp', year)
+            itr_index = self.get_company_index('itr', year)
             
             batch_results = {}
             
@@ -329,13 +424,13 @@ class CVMAdvancedScraper:
                     company_data = {
                         'cvm_code': cvm_code,
                         'year': year,
-                        'dfp_data': self._filter_company_data(dfp_data, cvm_code),
-                        'itr_data': self._filter_company_data(itr_data, cvm_code),
+                        'dfp_data': dfp_index.get(cvm_code),
+                        'itr_data': itr_index.get(cvm_code),
                         'extracted_at': datetime.now()
                     }
                     
                     batch_results[cvm_code] = company_data
-                    logger.info(f"Extraído dados da empresa {cvm_code}")
+                    logger.debug(f"Extraído dados da empresa {cvm_code}")
                     
                 except Exception as e:
                     logger.error(f"Erro ao extrair empresa {cvm_code}: {str(e)}")
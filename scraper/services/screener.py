@@ -0,0 +1,194 @@
+"""
+In-memory stock screener over the `company_ratios` snapshot
+
+The whole snapshot (one row per company, a few hundred rows in practice) is
+held as one NumPy array per metric plus a few label arrays (ticker, name,
+sector). A screen is a handful of vectorized comparisons ANDed into a mask;
+the sort uses an argsort per metric computed once per snapshot, so a sorted
+page is `order[mask[order]][offset:offset + limit]` without sorting again.
+Missing values (NULL ratios) never match a predicate and always sort last.
+
+`ScreenerCache` reloads the snapshot when `CompanyRatiosETL` writes a new
+one: at most every `check_interval` seconds it probes
+`max(computed_at)`/`count(*)` and rebuilds the arrays only if they moved.
+"""
+import logging
+import operator
+import re
+import threading
+import time
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+from sqlalchemy import func
+
+from models import Company, CompanyRatios
+from services.ratio_engine import RATIO_COLUMNS
+
+logger = logging.getLogger(__name__)
+
+METRICS = ['price'] + RATIO_COLUMNS
+LABELS = ('ticker', 'company_name', 'sector', 'subsector', 'segment')
+DEFAULT_FIELDS = ['price', 'market_cap', 'pe_ratio', 'pb_ratio', 'roe', 'net_margin', 'debt_to_equity']
+DEFAULT_SORT = 'market_cap'
+CHECK_INTERVAL = 60  # seconds between snapshot version probes
+
+OPERATORS = {
+    '>=': operator.ge,
+    '<=': operator.le,
+    '!=': operator.ne,
+    '>': operator.gt,
+    '<': operator.lt,
+    '=': operator.eq,
+}
+_PREDICATE = re.compile(r'^\s*([a-z_]+)\s*(>=|<=|!=|>|<|=)\s*(-?[0-9.]+(?:e-?[0-9]+)?)\s*$', re.IGNORECASE)
+
+Predicate = Tuple[str, str, float]
+
+
+def parse_predicates(expressions: Iterable[str]) -> List[Predicate]:
+    """
+    Parse `metric<op>value` expressions (e.g. `roe>0.15`, `net_debt_to_ebitda<2`).
+    Each expression may hold several predicates separated by commas.
+    Raises ValueError on unknown metrics or malformed expressions.
+    """
+    predicates = []
+    for expression in expressions:
+        for part in filter(None, (item.strip() for item in expression.split(','))):
+            match = _PREDICATE.match(part)
+            if not match:
+                raise ValueError(f"Invalid filter '{part}' (expected metric<op>value, op one of "
+                                 f"{', '.join(OPERATORS)})")
+            metric, op, value = match.group(1).lower(), match.group(2), float(match.group(3))
+            if metric not in METRICS:
+                raise ValueError(f"Unknown metric '{metric}'")
+            predicates.append((metric, op, value))
+    return predicates
+
+
+class ScreenerSnapshot:
+    """Columnar copy of `company_ratios` with per-metric sort orders"""
+
+    def __init__(self, cvm_codes: Sequence[int], metrics: Dict[str, Sequence[float]],
+                 labels: Dict[str, Sequence[Optional[str]]], version=None):
+        self.cvm_codes = np.asarray(cvm_codes, dtype=np.int64)
+        self.metrics = {name: np.asarray(values, dtype=np.float64) for name, values in metrics.items()}
+        self.labels = {name: np.asarray(values, dtype=object) for name, values in labels.items()}
+        # Case-insensitive label filters compare against lower-cased copies
+        self._folded = {name: np.array([(value or '').lower() for value in values], dtype=object)
+                        for name, values in self.labels.items()}
+        self.version = version
+        self._orders: Dict[str, np.ndarray] = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.cvm_codes)
+
+    def order(self, metric: str, descending: bool = False) -> np.ndarray:
+        """Row indices sorted by `metric`, missing values last in both directions"""
+        with self._lock:
+            ascending = self._orders.get(metric)
+            if ascending is None:
+                ascending = np.argsort(self.metrics[metric], kind='stable')
+                self._orders[metric] = ascending
+        if not descending:
+            return ascending
+        valid = int(np.count_nonzero(~np.isnan(self.metrics[metric])))
+        return np.concatenate([ascending[:valid][::-1], ascending[valid:]])
+
+    def mask(self, predicates: Sequence[Predicate] = (), labels: Optional[Dict[str, str]] = None) -> np.ndarray:
+        """Rows matching every predicate and label filter"""
+        selected = np.ones(len(self), dtype=bool)
+        with np.errstate(invalid='ignore'):
+            for metric, op, value in predicates:
+                values = self.metrics[metric]
+                selected &= OPERATORS[op](values, value) & ~np.isnan(values)
+        for name, value in (labels or {}).items():
+            selected &= self._folded[name] == value.lower()
+        return selected
+
+    def screen(self, predicates: Sequence[Predicate] = (), labels: Optional[Dict[str, str]] = None,
+               sort: str = DEFAULT_SORT, descending: bool = True, offset: int = 0,
+               limit: int = 50) -> Tuple[int, np.ndarray]:
+        """Total matches and the row indices of the requested page"""
+        selected = self.mask(predicates, labels)
+        ordered = self.order(sort, descending)
+        matches = ordered[selected[ordered]]
+        return len(matches), matches[offset:offset + limit]
+
+    def rows(self, indices: np.ndarray, fields: Sequence[str]) -> List[dict]:
+        """Result dicts for `indices` (missing values as None)"""
+        result = []
+        for index in indices:
+            row = {'cvm_code': int(self.cvm_codes[index])}
+            for name in LABELS:
+                row[name] = self.labels[name][index]
+            for name in fields:
+                value = self.metrics[name][index]
+                row[name] = None if np.isnan(value) else float(value)
+            result.append(row)
+        return result
+
+
+class ScreenerCache:
+    """Holds the current `ScreenerSnapshot` and reloads it when the ETL writes a new one"""
+
+    def __init__(self, session=None, check_interval: float = CHECK_INTERVAL):
+        self._session = session
+        self.check_interval = check_interval
+        self._snapshot: Optional[ScreenerSnapshot] = None
+        self._checked = 0.0
+        self._lock = threading.Lock()
+
+    @property
+    def session(self):
+        if self._session is None:
+            from app import db
+            self._session = db.session
+        return self._session
+
+    def _version(self):
+        return tuple(self.session.query(
+            func.max(CompanyRatios.computed_at), func.count(CompanyRatios.cvm_code)
+        ).one())
+
+    def load(self, version=None) -> ScreenerSnapshot:
+        """Read the whole snapshot (joined with the company labels) in one query"""
+        metric_columns = [getattr(CompanyRatios, name) for name in METRICS]
+        rows = self.session.query(
+            CompanyRatios.cvm_code, CompanyRatios.ticker, Company.company_name,
+            Company.b3_sector, Company.b3_subsector, Company.b3_segment, *metric_columns
+        ).outerjoin(Company, Company.id == CompanyRatios.company_id).all()
+
+        columns = list(zip(*rows)) if rows else [()] * (6 + len(METRICS))
+        labels = dict(zip(LABELS, columns[1:6]))
+        metrics = {
+            name: np.array(values, dtype=np.float64) if values else np.empty(0)
+            for name, values in zip(METRICS, columns[6:])
+        }
+        return ScreenerSnapshot(columns[0], metrics, labels, version=version)
+
+    def snapshot(self) -> ScreenerSnapshot:
+        """Current snapshot, reloaded if the table changed since the last probe"""
+        now = time.monotonic()
+        if self._snapshot is not None and now - self._checked < self.check_interval:
+            return self._snapshot
+
+        with self._lock:
+            if self._snapshot is not None and now - self._checked < self.check_interval:
+                return self._snapshot
+            version = self._version()
+            if self._snapshot is None or self._snapshot.version != version:
+                started = time.perf_counter()
+                self._snapshot = self.load(version)
+                logger.info(f"Screener snapshot loaded: {len(self._snapshot)} companies "
+                            f"in {(time.perf_counter() - started) * 1000:.1f}ms")
+            self._checked = now
+            return self._snapshot
+
+    def invalidate(self):
+        """Force a version probe on the next request"""
+        self._checked = 0.0
+
+
+screener_cache = ScreenerCache()
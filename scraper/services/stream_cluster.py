@@ -0,0 +1,347 @@
+"""
+Shared streaming state for running Socket.IO on several workers
+
+- `SubscriptionRegistry`: each worker keeps its rooms -> client ids in
+  memory and mirrors the reference counts (room -> clients) to a Redis hash
+  of its own (`stream:worker:{id}:rooms`), refreshed by a heartbeat and
+  expiring with it. The cluster-wide subscription count of a room is the
+  sum over the live workers, so a crashed worker's clients drop out when
+  its hash expires, without any cleanup.
+- `LeaderLease`: a `SET NX PX` lease renewed by its holder (compare-and-
+  renew in Lua), so exactly one worker runs the quote updater.
+- `QuoteRelay`: the updater publishes each cycle (changed quotes and their
+  deltas) on a Redis channel and keeps the last full quotes in a hash;
+  every worker delivers the cycle to its own clients and serves snapshots
+  from the hash.
+
+With `redis_client=None` the registry is purely local (single process).
+"""
+import json
+import logging
+import os
+import socket
+import threading
+import time
+import uuid
+from collections import defaultdict
+from typing import Callable, Dict, Iterable, List, Optional, Set
+
+logger = logging.getLogger(__name__)
+
+KEY_PREFIX = 'stream'
+DEFAULT_TTL = 15  # seconds; workers heartbeat (and the leader renews) well within it
+RECONNECT_DELAY = 5
+
+RENEW_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('PEXPIRE', KEYS[1], ARGV[2])
+end
+return 0
+"""
+RELEASE_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+
+def new_worker_id() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+
+
+def _text(value) -> str:
+    return value.decode() if isinstance(value, bytes) else value
+
+
+class SubscriptionRegistry:
+    """Rooms -> client ids of this worker, with cluster-wide reference counts in Redis"""
+
+    def __init__(self, redis_client=None, worker_id: Optional[str] = None, ttl: int = DEFAULT_TTL,
+                 prefix: str = KEY_PREFIX):
+        self.redis = redis_client
+        self.worker_id = worker_id or new_worker_id()
+        self.ttl = ttl
+        self.ttl_ms = int(ttl * 1000)
+        self.workers_key = f"{prefix}:workers"
+        self.worker_key = f"{prefix}:worker:{self.worker_id}:rooms"
+        self.worker_prefix = f"{prefix}:worker:"
+        self._rooms: Dict[str, Set[str]] = defaultdict(set)
+        self._sid_rooms: Dict[str, Set[str]] = defaultdict(set)
+        self._lock = threading.Lock()
+
+    def add(self, room: str, sid: str) -> bool:
+        """Register `sid` in `room`; False if it was already there"""
+        return bool(self.add_many([room], sid))
+
+    def add_many(self, rooms: Iterable[str], sid: str) -> List[str]:
+        """Register `sid` in several rooms with one Redis round trip; returns the new ones"""
+        counts = {}
+        with self._lock:
+            for room in rooms:
+                if sid in self._rooms[room]:
+                    continue
+                self._rooms[room].add(sid)
+                self._sid_rooms[sid].add(room)
+                counts[room] = len(self._rooms[room])
+        if counts:
+            self._sync(counts)
+        return list(counts)
+
+    def remove(self, room: str, sid: str) -> bool:
+        """Unregister `sid` from `room`; False if it was not there"""
+        with self._lock:
+            members = self._rooms.get(room)
+            if not members or sid not in members:
+                return False
+            members.discard(sid)
+            count = len(members)
+            if not count:
+                del self._rooms[room]
+            rooms = self._sid_rooms.get(sid)
+            if rooms is not None:
+                rooms.discard(room)
+                if not rooms:
+                    del self._sid_rooms[sid]
+        self._sync({room: count})
+        return True
+
+    def remove_sid(self, sid: str) -> List[str]:
+        """Unregister `sid` from every room (disconnect); returns the rooms it left"""
+        with self._lock:
+            rooms = self._sid_rooms.pop(sid, set())
+            counts = {}
+            for room in rooms:
+                members = self._rooms.get(room)
+                if members is None:
+                    continue
+                members.discard(sid)
+                counts[room] = len(members)
+                if not members:
+                    del self._rooms[room]
+        if counts:
+            self._sync(counts)
+        return sorted(rooms)
+
+    def rooms_of(self, sid: str) -> Set[str]:
+        with self._lock:
+            return set(self._sid_rooms.get(sid, ()))
+
+    def local_counts(self, prefix: str = '') -> Dict[str, int]:
+        """Clients per room on this worker"""
+        with self._lock:
+            return {room: len(members) for room, members in self._rooms.items()
+                    if members and room.startswith(prefix)}
+
+    def count(self, room: str) -> int:
+        """Clients in one room across the live workers (this worker only without Redis)"""
+        if self.redis is None:
+            with self._lock:
+                return len(self._rooms.get(room, ()))
+        try:
+            pipeline = self.redis.pipeline(transaction=False)
+            for worker_id in self.live_workers():
+                pipeline.hget(f"{self.worker_prefix}{worker_id}:rooms", room)
+            return sum(int(count) for count in pipeline.execute() if count is not None)
+        except Exception as e:
+            logger.error(f"Subscription registry read error: {str(e)}")
+            with self._lock:
+                return len(self._rooms.get(room, ()))
+
+    def counts(self, prefix: str = '') -> Dict[str, int]:
+        """Clients per room across the live workers (this worker only without Redis)"""
+        if self.redis is None:
+            return self.local_counts(prefix)
+        try:
+            live = self.live_workers()
+            pipeline = self.redis.pipeline(transaction=False)
+            for worker_id in live:
+                pipeline.hgetall(f"{self.worker_prefix}{worker_id}:rooms")
+            totals: Dict[str, int] = defaultdict(int)
+            for rooms in pipeline.execute():
+                for room, count in rooms.items():
+                    room = _text(room)
+                    if room.startswith(prefix):
+                        totals[room] += int(count)
+            return {room: count for room, count in totals.items() if count > 0}
+        except Exception as e:
+            logger.error(f"Subscription registry read error: {str(e)}")
+            return self.local_counts(prefix)
+
+    def live_workers(self) -> List[str]:
+        """Workers that sent a heartbeat within the TTL (stale ones are pruned)"""
+        now = time.time()
+        pipeline = self.redis.pipeline(transaction=False)
+        pipeline.zremrangebyscore(self.workers_key, '-inf', now - self.ttl)
+        pipeline.zrange(self.workers_key, 0, -1)
+        return [_text(worker_id) for worker_id in pipeline.execute()[1]]
+
+    def heartbeat(self):
+        """Rewrite this worker's counts (healing any missed update) and refresh its TTL"""
+        if self.redis is None:
+            return
+        counts = self.local_counts()
+        try:
+            pipeline = self.redis.pipeline()
+            pipeline.delete(self.worker_key)
+            if counts:
+                pipeline.hset(self.worker_key, mapping=counts)
+                pipeline.pexpire(self.worker_key, self.ttl_ms)
+            pipeline.zadd(self.workers_key, {self.worker_id: time.time()})
+            pipeline.execute()
+        except Exception as e:
+            logger.error(f"Subscription registry heartbeat error: {str(e)}")
+
+    def _sync(self, counts: Dict[str, int]):
+        if self.redis is None:
+            return
+        try:
+            pipeline = self.redis.pipeline()
+            for room, count in counts.items():
+                if count:
+                    pipeline.hset(self.worker_key, room, count)
+                else:
+                    pipeline.hdel(self.worker_key, room)
+            pipeline.pexpire(self.worker_key, self.ttl_ms)
+            pipeline.zadd(self.workers_key, {self.worker_id: time.time()})
+            pipeline.execute()
+        except Exception as e:
+            # The next heartbeat rewrites the whole hash
+            logger.error(f"Subscription registry write error: {str(e)}")
+
+    def close(self):
+        """Drop this worker's state from Redis (clean shutdown)"""
+        if self.redis is None:
+            return
+        try:
+            pipeline = self.redis.pipeline()
+            pipeline.delete(self.worker_key)
+            pipeline.zrem(self.workers_key, self.worker_id)
+            pipeline.execute()
+        except Exception as e:
+            logger.error(f"Subscription registry close error: {str(e)}")
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                'worker_id': self.worker_id,
+                'clients': len(self._sid_rooms),
+                'rooms': len(self._rooms),
+                'subscriptions': sum(len(members) for members in self._rooms.values()),
+            }
+
+
+class LeaderLease:
+    """Redis lease held by at most one worker at a time"""
+
+    def __init__(self, redis_client, name: str = 'updater', worker_id: Optional[str] = None,
+                 ttl: int = DEFAULT_TTL, prefix: str = KEY_PREFIX):
+        self.redis = redis_client
+        self.key = f"{prefix}:leader:{name}"
+        self.worker_id = worker_id or new_worker_id()
+        self.ttl_ms = int(ttl * 1000)
+        self.is_leader = False
+        self._renew = redis_client.register_script(RENEW_SCRIPT)
+        self._release = redis_client.register_script(RELEASE_SCRIPT)
+
+    def acquire(self) -> bool:
+        """Renew the lease if held, otherwise try to take it; returns leadership"""
+        try:
+            if self.is_leader and self._renew(keys=[self.key], args=[self.worker_id, self.ttl_ms]):
+                return True
+            if self.is_leader:
+                logger.warning(f"Lost leadership of {self.key}")
+            self.is_leader = bool(self.redis.set(self.key, self.worker_id, nx=True, px=self.ttl_ms))
+            if self.is_leader:
+                logger.info(f"{self.worker_id} is now leader of {self.key}")
+        except Exception as e:
+            logger.error(f"Leader lease error: {str(e)}")
+            self.is_leader = False
+        return self.is_leader
+
+    def release(self):
+        if not self.is_leader:
+            return
+        try:
+            self._release(keys=[self.key], args=[self.worker_id])
+        except Exception as e:
+            logger.error(f"Leader release error: {str(e)}")
+        self.is_leader = False
+
+    def holder(self) -> Optional[str]:
+        try:
+            value = self.redis.get(self.key)
+            return _text(value) if value is not None else None
+        except Exception:
+            return None
+
+
+class QuoteRelay:
+    """Quote cycles from the elected updater to every worker"""
+
+    def __init__(self, redis_client, on_cycle: Callable[[Dict[str, dict], Dict[str, dict]], None],
+                 prefix: str = KEY_PREFIX, quotes_ttl: int = 86400):
+        self.redis = redis_client
+        self.on_cycle = on_cycle
+        self.channel = f"{prefix}:quote_cycles"
+        self.quotes_key = f"{prefix}:last_quotes"
+        self.quotes_ttl = quotes_ttl
+        self._listener: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self.received = 0
+
+    def publish(self, changed: Dict[str, dict], deltas: Dict[str, dict]):
+        """Store the changed quotes (snapshots for new subscribers) and broadcast the cycle"""
+        pipeline = self.redis.pipeline()
+        pipeline.hset(self.quotes_key, mapping={
+            ticker: json.dumps(quote, default=str) for ticker, quote in changed.items()
+        })
+        pipeline.expire(self.quotes_key, self.quotes_ttl)
+        pipeline.publish(self.channel, json.dumps({'changed': changed, 'deltas': deltas}, default=str))
+        pipeline.execute()
+
+    def last_quotes(self, tickers: Iterable[str]) -> Dict[str, dict]:
+        """Last quotes published for `tickers` (those never published are left out)"""
+        tickers = list(tickers)
+        if not tickers:
+            return {}
+        try:
+            values = self.redis.hmget(self.quotes_key, tickers)
+        except Exception as e:
+            logger.error(f"Quote relay read error: {str(e)}")
+            return {}
+        return {ticker: json.loads(value) for ticker, value in zip(tickers, values) if value is not None}
+
+    def prune(self, tickers: Iterable[str]):
+        """Drop stored quotes of tickers nobody is subscribed to anymore"""
+        try:
+            stored = {_text(ticker) for ticker in self.redis.hkeys(self.quotes_key)}
+            stale = stored - set(tickers)
+            if stale:
+                self.redis.hdel(self.quotes_key, *stale)
+        except Exception as e:
+            logger.error(f"Quote relay prune error: {str(e)}")
+
+    def start(self):
+        """Listen for cycles in a daemon thread (once)"""
+        with self._lock:
+            if self._listener is not None:
+                return
+            self._listener = threading.Thread(target=self._listen, name='quote-relay', daemon=True)
+            self._listener.start()
+
+    def _listen(self):
+        while True:
+            try:
+                pubsub = self.redis.pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(self.channel)
+                for message in pubsub.listen():
+                    self.received += 1
+                    try:
+                        cycle = json.loads(message['data'])
+                        self.on_cycle(cycle['changed'], cycle['deltas'])
+                    except Exception as e:
+                        logger.error(f"Quote relay handler error: {str(e)}")
+            except Exception as e:
+                logger.error(f"Quote relay listener error: {str(e)}")
+                time.sleep(RECONNECT_DELAY)
@@ -0,0 +1,148 @@
+"""
+Per-client outbound queues for the quote stream
+
+Each client has an `Outbox` keyed by ticker: a newer update for a ticker
+already waiting replaces it (full quotes) or is merged into it (field
+deltas, later fields win), so a queue never holds more entries than the
+client has subscriptions and a slow consumer receives the latest state
+instead of a backlog of stale quotes.
+
+`OutboxManager.flush` sends a client's pending updates unless the client is
+still busy:
+- with acknowledgements enabled, while the previous message is unacked
+  (up to `ack_timeout` seconds, after which it is considered lost);
+- when the transport backlog reported by `backlog(sid)` (packets queued by
+  the Socket.IO server for that client) exceeds `max_backlog`.
+Held updates go out with the next flush (next quote cycle or ack).
+"""
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional
+
+DEFAULT_ACK_TIMEOUT = 10.0
+DEFAULT_MAX_BACKLOG = 32
+
+
+class Outbox:
+    """Latest undelivered update per ticker for one client"""
+
+    __slots__ = ('merge', 'ack', 'pending', 'in_flight_since', 'coalesced', 'sent', 'held')
+
+    def __init__(self, merge: bool = False, ack: bool = False):
+        self.merge = merge
+        self.ack = ack
+        self.pending: "OrderedDict[Hashable, Any]" = OrderedDict()
+        self.in_flight_since: Optional[float] = None
+        self.coalesced = 0
+        self.sent = 0
+        self.held = 0
+
+    def put(self, key: Hashable, payload: Any):
+        waiting = self.pending.get(key)
+        if waiting is None:
+            self.pending[key] = dict(payload) if self.merge else payload
+            return
+        self.coalesced += 1
+        if self.merge:
+            waiting.update(payload)
+        else:
+            self.pending[key] = payload
+
+    def drain(self) -> "OrderedDict[Hashable, Any]":
+        pending, self.pending = self.pending, OrderedDict()
+        return pending
+
+
+class OutboxManager:
+    """Outboxes of the connected clients of this worker"""
+
+    def __init__(self, send: Callable[[str, Dict[Hashable, Any], Optional[Callable]], None],
+                 backlog: Optional[Callable[[str], int]] = None, max_backlog: int = DEFAULT_MAX_BACKLOG,
+                 ack_timeout: float = DEFAULT_ACK_TIMEOUT):
+        self.send = send
+        self.backlog = backlog
+        self.max_backlog = max_backlog
+        self.ack_timeout = ack_timeout
+        self._outboxes: Dict[str, Outbox] = {}
+        self._lock = threading.Lock()
+        self._closed = {'coalesced': 0, 'sent': 0, 'held': 0}
+
+    def register(self, sid: str, merge: bool = False, ack: bool = False) -> Outbox:
+        with self._lock:
+            outbox = self._outboxes.get(sid)
+            if outbox is None or outbox.merge != merge or outbox.ack != ack:
+                outbox = self._outboxes[sid] = Outbox(merge=merge, ack=ack)
+            return outbox
+
+    def unregister(self, sid: str):
+        with self._lock:
+            outbox = self._outboxes.pop(sid, None)
+            if outbox is not None:
+                for name in self._closed:
+                    self._closed[name] += getattr(outbox, name)
+
+    def discard(self, sid: str, keys):
+        """Forget pending updates for keys the client no longer follows"""
+        with self._lock:
+            outbox = self._outboxes.get(sid)
+            if outbox is not None:
+                for key in keys:
+                    outbox.pending.pop(key, None)
+
+    def offer(self, sid: str, updates: Dict[Hashable, Any]):
+        """Queue updates for `sid` and send them if the client can take them"""
+        with self._lock:
+            outbox = self._outboxes.get(sid)
+            if outbox is None:
+                return
+            for key, payload in updates.items():
+                outbox.put(key, payload)
+        self.flush(sid)
+
+    def acked(self, sid: str):
+        with self._lock:
+            outbox = self._outboxes.get(sid)
+            if outbox is None:
+                return
+            outbox.in_flight_since = None
+        self.flush(sid)
+
+    def _busy(self, sid: str, outbox: Outbox) -> bool:
+        if outbox.in_flight_since is not None and time.monotonic() - outbox.in_flight_since < self.ack_timeout:
+            return True
+        return bool(self.backlog) and self.backlog(sid) > self.max_backlog
+
+    def flush(self, sid: str) -> bool:
+        """Send the pending updates of `sid` now unless it is busy; True if something was sent"""
+        with self._lock:
+            outbox = self._outboxes.get(sid)
+            if outbox is None or not outbox.pending:
+                return False
+            if self._busy(sid, outbox):
+                outbox.held += 1
+                return False
+            updates = outbox.drain()
+            outbox.sent += 1
+            if outbox.ack:
+                outbox.in_flight_since = time.monotonic()
+        self.send(sid, updates, (lambda *args: self.acked(sid)) if outbox.ack else None)
+        return True
+
+    def stats(self) -> dict:
+        with self._lock:
+            depths = [len(outbox.pending) for outbox in self._outboxes.values()]
+            totals = dict(self._closed)
+            for outbox in self._outboxes.values():
+                for name in totals:
+                    totals[name] += getattr(outbox, name)
+            awaiting_ack = sum(1 for outbox in self._outboxes.values() if outbox.in_flight_since is not None)
+        return {
+            'clients': len(depths),
+            'queued_updates': sum(depths),
+            'max_queue_depth': max(depths, default=0),
+            'awaiting_ack': awaiting_ack,
+            'messages_sent': totals['sent'],
+            'stale_updates_dropped': totals['coalesced'],
+            'flushes_held': totals['held'],
+        }
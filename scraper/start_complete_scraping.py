@@ -10,7 +10,7 @@ import logging
 from datetime import datetime
 sys.path.append('.')
 
-from app import create_app, db
+from app import create_app, init_db, db
 from models import Company
 
 # Configure logging
@@ -35,7 +35,7 @@ def start_complete_cvm_scraping():
     print("📊 Escopo: Todas as empresas B3 listadas no database")
     print()
     
-    app = create_app()
+    app = init_db(create_app())
     with app.app_context():
         try:
             # Check companies in database
@@ -94,7 +94,7 @@ def show_system_status():
     print("📊 STATUS ATUAL DO SISTEMA")
     print("-" * 30)
     
-    app = create_app()
+    app = init_db(create_app())
     with app.app_context():
         try:
             # Check companies
@@ -18,6 +18,7 @@ const AppState = {
     socket: null,
     isConnected: false,
     subscriptions: [],
+    quotes: {},
     currentUser: null,
     settings: {
         theme: 'light',
@@ -331,6 +332,14 @@ const WebSocketManager = {
             this.onQuoteUpdate(data);
         });
 
+        this.socket.on('quotes_snapshot', (data) => {
+            this.applyQuotes(data, false);
+        });
+
+        this.socket.on('quotes_batch', (data) => {
+            this.applyQuotes(data, true);
+        });
+
         this.socket.on('orderbook_update', (data) => {
             this.onOrderBookUpdate(data);
         });
@@ -361,10 +370,29 @@ const WebSocketManager = {
             return;
         }
 
-        this.socket.emit('subscribe_quotes', { tickers });
+        this.socket.emit('subscribe_quotes', { tickers, protocol: 'delta' });
         AppState.subscriptions.push(...tickers.map(ticker => ({ type: 'quotes', ticker })));
     },
 
+    /**
+     * Apply a quotes snapshot or a batch of field deltas (null removes a field)
+     */
+    applyQuotes(message, isDelta) {
+        const timestamp = new Date(message.ts).toISOString();
+        Object.entries(message.quotes).forEach(([ticker, fields]) => {
+            const quote = isDelta ? { ...(AppState.quotes[ticker] || {}) } : {};
+            Object.entries(fields).forEach(([field, value]) => {
+                if (value === null) {
+                    delete quote[field];
+                } else {
+                    quote[field] = value;
+                }
+            });
+            AppState.quotes[ticker] = quote;
+            this.onQuoteUpdate({ ticker, data: quote, timestamp });
+        });
+    },
+
     /**
      * Unsubscribe from updates
      */
@@ -7,13 +7,13 @@ from flask import Flask, render_template, jsonify, request
 import sys
 sys.path.append('.')
 
-from app import create_app, db
+from app import create_app, init_db, db
 from models import Company, Quote, News
 import logging
 from datetime import datetime
 
 # Create Flask app
-app = create_app() 
+app = init_db(create_app()) 
 
 @app.route('/')
 def financial_dashboard():
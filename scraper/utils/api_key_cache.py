@@ -0,0 +1,168 @@
+"""
+In-process cache of validated API keys and batched `last_used` writes
+
+`ApiKeyCache` keeps key hash -> key info for `ttl` seconds (unknown or
+inactive hashes are cached as None for `negative_ttl`, so a flood of bad
+keys does not reach the database either). Revoking a key publishes its
+hash on a Redis channel; every worker listens on it and drops the entry,
+so revocation takes effect everywhere without waiting for the TTL.
+
+`LastUsedFlusher` replaces the UPDATE + COMMIT that used to run on every
+request: requests only record (key id -> latest timestamp) in memory and a
+background thread hands the pending map to `flush` every `interval` seconds.
+The flusher is started by whoever owns the app (`start(context)`), and the
+context it is given (e.g. `app.app_context`) wraps every write, so the
+thread never has to import or build an app of its own.
+"""
+import atexit
+import logging
+import threading
+import time
+from contextlib import nullcontext
+from datetime import datetime
+from typing import Any, Callable, Dict, Optional
+
+from services.cache_service import LocalLRUCache
+
+logger = logging.getLogger(__name__)
+
+INVALIDATION_CHANNEL = 'api_keys:invalidate'
+INVALIDATE_ALL = '*'
+RECONNECT_DELAY = 5
+
+
+class ApiKeyCache:
+    """TTL cache of key hash -> key info (None for invalid keys), invalidated over Redis pub/sub"""
+
+    def __init__(self, redis_client=None, ttl: int = 60, negative_ttl: int = 10,
+                 max_entries: int = 10000, channel: str = INVALIDATION_CHANNEL):
+        self.redis = redis_client
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.channel = channel
+        self.local = LocalLRUCache(max_entries)
+        self._listener: Optional[threading.Thread] = None
+        self._listener_lock = threading.Lock()
+        self.stats = {'hits': 0, 'misses': 0, 'invalidations': 0}
+
+    def get_or_load(self, key_hash: str, loader: Callable[[str], Any]) -> Any:
+        """Cached info for `key_hash`, calling `loader(key_hash)` on a miss"""
+        self.start_listener()
+        entry = self.local.get(key_hash)
+        if entry is not None:
+            self.stats['hits'] += 1
+            return entry[0]
+
+        self.stats['misses'] += 1
+        value = loader(key_hash)
+        ttl = self.ttl if value is not None else self.negative_ttl
+        self.local.set(key_hash, value, time.time() + ttl)
+        return value
+
+    def invalidate(self, key_hash: Optional[str] = None):
+        """Drop one key (or everything) from this worker's cache"""
+        self.stats['invalidations'] += 1
+        if key_hash is None or key_hash == INVALIDATE_ALL:
+            self.local.clear()
+        else:
+            self.local.delete(key_hash)
+
+    def revoke(self, key_hash: Optional[str] = None):
+        """Invalidate here and tell every other worker to do the same"""
+        self.invalidate(key_hash)
+        if self.redis is None:
+            return
+        try:
+            self.redis.publish(self.channel, key_hash or INVALIDATE_ALL)
+        except Exception as e:
+            logger.error(f"API key invalidation publish error: {str(e)}")
+
+    def start_listener(self):
+        """Subscribe to the invalidation channel in a daemon thread (once)"""
+        if self.redis is None or self._listener is not None:
+            return
+        with self._listener_lock:
+            if self._listener is not None:
+                return
+            self._listener = threading.Thread(target=self._listen, name='api-key-invalidation', daemon=True)
+            self._listener.start()
+
+    def _listen(self):
+        while True:
+            try:
+                pubsub = self.redis.pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(self.channel)
+                # Entries cached while disconnected may have missed a revocation
+                self.local.clear()
+                for message in pubsub.listen():
+                    data = message.get('data')
+                    if isinstance(data, bytes):
+                        data = data.decode()
+                    if isinstance(data, str):
+                        self.invalidate(data)
+            except Exception as e:
+                logger.error(f"API key invalidation listener error: {str(e)}")
+                self.local.clear()
+                time.sleep(RECONNECT_DELAY)
+
+
+class LastUsedFlusher:
+    """Collects key id -> last use in memory and writes them in batches"""
+
+    def __init__(self, flush: Callable[[Dict[Any, datetime]], None], interval: float = 30):
+        self._flush = flush
+        self.interval = interval
+        self._pending: Dict[Any, datetime] = {}
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._context: Optional[Callable[[], Any]] = None
+        self._stopped = threading.Event()
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None
+
+    def touch(self, key_id, when: Optional[datetime] = None):
+        """Record a use of `key_id` (no I/O)"""
+        when = when or datetime.utcnow()
+        with self._lock:
+            previous = self._pending.get(key_id)
+            if previous is None or previous < when:
+                self._pending[key_id] = when
+
+    def flush(self) -> int:
+        """Write the pending timestamps now; returns how many keys were written"""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        if not pending:
+            return 0
+        try:
+            with self._context() if self._context else nullcontext():
+                self._flush(pending)
+            return len(pending)
+        except Exception as e:
+            logger.error(f"API key last_used flush error: {str(e)}")
+            # Keep them for the next round, without overwriting newer uses
+            with self._lock:
+                for key_id, when in pending.items():
+                    if key_id not in self._pending or self._pending[key_id] < when:
+                        self._pending[key_id] = when
+            return 0
+
+    def start(self, context: Optional[Callable[[], Any]] = None):
+        """Start the writer thread (once); `context()` is entered around each flush"""
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._context = context
+            self._thread = threading.Thread(target=self._run, name='api-key-last-used', daemon=True)
+            self._thread.start()
+        atexit.register(self.flush)
+
+    def stop(self):
+        self._stopped.set()
+        self.flush()
+
+    def _run(self):
+        while not self._stopped.wait(self.interval):
+            self.flush()
@@ -1,10 +1,21 @@
 import os
 import hashlib
 import jwt
+import logging
+from collections import namedtuple
 from functools import wraps
 from flask import request, jsonify, current_app
 from models import ApiKey, db
-from datetime import datetime, timedelta
+from app import redis_client
+from utils.api_key_cache import ApiKeyCache, LastUsedFlusher
+
+logger = logging.getLogger(__name__)
+
+# Detached copy of the ApiKey columns the request path uses (safe to share across requests)
+CachedApiKey = namedtuple('CachedApiKey', ['id', 'key_hash', 'user_email', 'plan', 'requests_per_hour'])
+
+API_KEY_CACHE_TTL = int(os.getenv('API_KEY_CACHE_TTL', 60))
+LAST_USED_FLUSH_INTERVAL = int(os.getenv('API_KEY_LAST_USED_FLUSH_INTERVAL', 30))
 
 def hash_api_key(api_key):
     """Hash an API key for secure storage"""
@@ -15,23 +26,74 @@ def generate_api_key():
     import secrets
     return secrets.token_urlsafe(32)
 
+def _load_api_key(key_hash):
+    """Active key for `key_hash` as a CachedApiKey (None if unknown/inactive)"""
+    api_key_obj = ApiKey.query.filter_by(key_hash=key_hash, is_active=True).first()
+    if not api_key_obj:
+        return None
+    return CachedApiKey(
+        id=api_key_obj.id,
+        key_hash=api_key_obj.key_hash,
+        user_email=api_key_obj.user_email,
+        plan=api_key_obj.plan,
+        requests_per_hour=api_key_obj.requests_per_hour
+    )
+
+def _flush_last_used(pending):
+    """Write the collected last_used values in one batch (runs inside the flusher's app context)"""
+    try:
+        db.session.bulk_update_mappings(ApiKey, [
+            {'id': key_id, 'last_used': last_used} for key_id, last_used in pending.items()
+        ])
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+
+api_key_cache = ApiKeyCache(redis_client, ttl=API_KEY_CACHE_TTL)
+last_used_flusher = LastUsedFlusher(_flush_last_used, interval=LAST_USED_FLUSH_INTERVAL)
+
+def start_last_used_flusher(app):
+    """Start the batched last_used writer bound to `app` (no-op if already running)"""
+    last_used_flusher.start(app.app_context)
+
 def validate_api_key(api_key):
     """Validate an API key and return the associated plan"""
     if not api_key:
         return None, "API key required"
     
     key_hash = hash_api_key(api_key)
-    api_key_obj = ApiKey.query.filter_by(key_hash=key_hash, is_active=True).first()
+    api_key_obj = api_key_cache.get_or_load(key_hash, _load_api_key)
     
     if not api_key_obj:
         return None, "Invalid API key"
     
-    # Update last used timestamp
-    api_key_obj.last_used = datetime.utcnow()
-    db.session.commit()
+    # Update last used timestamp (written in batches by the flusher)
+    if not last_used_flusher.running:
+        start_last_used_flusher(current_app._get_current_object())
+    last_used_flusher.touch(api_key_obj.id)
     
     return api_key_obj, None
 
+def revoke_api_key(api_key):
+    """Deactivate an API key and drop it from the validation cache of every worker"""
+    key_hash = hash_api_key(api_key)
+    
+    try:
+        api_key_obj = ApiKey.query.filter_by(key_hash=key_hash).first()
+        if not api_key_obj:
+            return False
+        api_key_obj.is_active = False
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        logger.error(f"Failed to revoke API key: {str(e)}")
+        return False
+    
+    # Published only after the commit, so no worker reloads the key as still active
+    api_key_cache.revoke(key_hash)
+    return True
+
 def require_api_key(f):
     """Decorator to require API key authentication"""
     @wraps(f)
@@ -0,0 +1,155 @@
+"""
+Redis rate limiter: GCRA in a single Lua call, with a per-worker token lease
+
+`check` consumes one request and returns allowed/remaining/reset/retry-after
+from the same round trip. When the limit is large enough, a worker leases up
+to `local_budget` tokens per call and serves the next requests from memory
+until the lease is used up or `lease_seconds` pass. Tokens left in an expired
+lease are given back to Redis on the key's next call, so requests spaced
+wider than the lease still cost one token each.
+"""
+import os
+import threading
+import time
+from collections import namedtuple
+
+# GCRA (generic cell rate algorithm) in one round trip. The key holds the
+# "theoretical arrival time" (TAT, ms): each token pushes it `interval` ms
+# further and a request fits while TAT stays within `window` ms of now, which
+# allows `limit` requests per window with a smooth refill (one token every
+# window / limit). Up to ARGV[4] tokens are granted at once (local budget);
+# fewer are granted when fewer are available, none when the key is exhausted.
+# ARGV[5] unused tokens of an expired lease are refunded first (TAT moves back,
+# never before now). Returns {granted, remaining, reset_ms, retry_after_ms}.
+GCRA_SCRIPT = """
+local now = tonumber(ARGV[1])
+local window = tonumber(ARGV[2])
+local limit = tonumber(ARGV[3])
+local wanted = tonumber(ARGV[4])
+local refund = tonumber(ARGV[5]) or 0
+local interval = window / limit
+
+local tat = tonumber(redis.call('GET', KEYS[1]))
+if tat and refund > 0 then
+    tat = tat - refund * interval
+end
+if not tat or tat < now then
+    tat = now
+end
+
+local available = math.floor((now + window - tat) / interval)
+local granted = math.min(wanted, available)
+if granted > 0 or refund > 0 then
+    tat = tat + granted * interval
+    redis.call('SET', KEYS[1], tostring(tat), 'PX', math.ceil(tat - now) + 1)
+end
+
+local remaining = math.max(0, math.floor((now + window - tat) / interval))
+local retry_after = 0
+if granted <= 0 then
+    retry_after = math.ceil(tat + interval - window - now)
+end
+return {granted, remaining, math.ceil(tat - now), retry_after}
+"""
+
+RateLimitResult = namedtuple('RateLimitResult', ['allowed', 'limit', 'remaining', 'reset', 'retry_after'])
+
+# Tokens a worker may take from Redis at once (0/1 disables the local fast path)
+LOCAL_BUDGET = int(os.getenv('RATE_LIMIT_LOCAL_BUDGET', 10))
+# Leased tokens not used within this many seconds go back to Redis on the next call
+LEASE_SECONDS = float(os.getenv('RATE_LIMIT_LEASE_SECONDS', 2))
+
+
+class RateLimiter:
+    def __init__(self, redis_client, local_budget=LOCAL_BUDGET, lease_seconds=LEASE_SECONDS):
+        self.redis = redis_client
+        self.local_budget = local_budget
+        self.lease_seconds = lease_seconds
+        self._script = redis_client.register_script(GCRA_SCRIPT) if redis_client is not None else None
+        # key -> [tokens left, lease expiry (monotonic), remaining in Redis after the lease, reset epoch]
+        self._leases = {}
+        self._lock = threading.Lock()
+
+    def _budget(self, limit):
+        """Tokens to lease per Redis call: at most 1% of the limit, so idle leases cost little"""
+        return max(1, min(self.local_budget, limit // 100))
+
+    def _take_local(self, key, limit):
+        """(result served from the lease or None, unused tokens of an expired lease to refund)"""
+        with self._lock:
+            lease = self._leases.get(key)
+            if not lease:
+                return None, 0
+            if lease[0] <= 0 or lease[1] < time.monotonic():
+                del self._leases[key]
+                return None, lease[0]
+            lease[0] -= 1
+            return RateLimitResult(True, limit, lease[2] + lease[0], lease[3], 0), 0
+
+    def check(self, key, limit, window=3600):
+        """
+        Consume one request for `key` and return a RateLimitResult
+        key: unique identifier (e.g., API key hash)
+        limit: max requests allowed
+        window: time window in seconds (default 1 hour)
+        """
+        result, refund = self._take_local(key, limit)
+        if result is not None:
+            return result
+
+        budget = self._budget(limit)
+        try:
+            now_ms = int(time.time() * 1000)
+            granted, remaining, reset_ms, retry_ms = (
+                int(value) for value in
+                self._script(keys=[key], args=[now_ms, window * 1000, limit, budget, refund])
+            )
+        except Exception:
+            # Fallback: allow request if Redis fails (for demo purposes)
+            return RateLimitResult(True, limit, limit, int(time.time()) + window, 0)
+
+        reset = (now_ms + reset_ms) // 1000
+        if granted <= 0:
+            return RateLimitResult(False, limit, 0, reset, max(1, -(-retry_ms // 1000)))
+
+        if granted > 1:
+            with self._lock:
+                self._leases[key] = [granted - 1, time.monotonic() + self.lease_seconds, remaining, reset]
+        return RateLimitResult(True, limit, remaining + granted - 1, reset, 0)
+
+    def is_rate_limited(self, key, limit, window=3600):
+        """
+        Check if a key is rate limited
+        Returns (is_limited, remaining)
+        """
+        result = self.check(key, limit, window)
+        return not result.allowed, result.remaining
+
+    @staticmethod
+    def headers(result):
+        """Rate limit headers for a RateLimitResult (no extra Redis call)"""
+        headers = {
+            'X-RateLimit-Limit': str(result.limit),
+            'X-RateLimit-Remaining': str(result.remaining),
+            'X-RateLimit-Reset': str(result.reset)
+        }
+        if not result.allowed:
+            headers['Retry-After'] = str(result.retry_after)
+        return headers
+
+    def get_rate_limit_headers(self, key, limit, window=3600):
+        """Get rate limit headers for response (read-only)"""
+        with self._lock:
+            lease = self._leases.get(key)
+        if lease and lease[1] >= time.monotonic():
+            return self.headers(RateLimitResult(True, limit, lease[2] + lease[0], lease[3], 0))
+
+        try:
+            now_ms = int(time.time() * 1000)
+            _, remaining, reset_ms, _ = (
+                int(value) for value in self._script(keys=[key], args=[now_ms, window * 1000, limit, 0, 0])
+            )
+            return self.headers(RateLimitResult(True, limit, remaining, (now_ms + reset_ms) // 1000, 0))
+        except Exception:
+            # Fallback headers
+            return self.headers(RateLimitResult(True, limit, limit, int(time.time()) + window, 0))
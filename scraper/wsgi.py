@@ -0,0 +1,12 @@
+"""
+Entrypoint WSGI do scraper (gunicorn)
+
+    gunicorn -k eventlet -w 1 wsgi:app
+
+Cada worker cria a app e inicia as tarefas em segundo plano aqui. Evite
+--preload: com ele as threads nasceriam no processo mestre, antes do fork.
+As tabelas são criadas no deploy com `flask --app app init-db`.
+"""
+from app import get_app, start
+
+app = start(get_app())
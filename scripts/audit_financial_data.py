@@ -1,20 +1,10 @@
 # scripts/audit_financial_data.py
 import os
-from dotenv import load_dotenv
+import sys
 import pandas as pd
-from sqlalchemy import create_engine
 
-def get_db_connection_string():
-    """Lê as credenciais do .env."""
-    load_dotenv()
-    # ... (código igual aos outros scripts)
-    user = os.getenv("DB_USER")
-    password = os.getenv("DB_PASSWORD")
-    host = os.getenv("DB_HOST")
-    dbname = os.getenv("DB_NAME", "postgres")
-    if not all([user, password, host, dbname]):
-        raise ValueError("Credenciais do banco de dados não encontradas.")
-    return f"postgresql+psycopg2://{user}:{password}@{host}/{dbname}?sslmode=require"
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from backend.database import get_engine
 
 def audit_company_financials(company_cnpj):
     """
@@ -25,7 +15,7 @@ def audit_company_financials(company_cnpj):
     print(f"📊 AUDITORIA DE DADOS FINANCEIROS PARA O CNPJ: {company_cnpj}")
     print("="*60)
 
-    engine = create_engine(get_db_connection_string())
+    engine = get_engine()
     with engine.connect() as connection:
         # Contas chave que nosso frontend precisa para a DRE e Balanço
         DRE_ACCOUNTS = ('3.01', '3.02', '3.03', '3.04') # Receita, Custo, Lucro Bruto, Despesas
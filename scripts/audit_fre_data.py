@@ -1,13 +1,13 @@
 # scripts/audit_fre_data.py
 import os
 import sys
-from sqlalchemy import create_engine, func, text
+from sqlalchemy import func, text
 from sqlalchemy.orm import sessionmaker
 
 # Adiciona o diretório raiz ao path para importações corretas
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
-from scraper.config import DATABASE_URL
+from backend.database import get_engine
 from scraper.models import Company, CapitalStructure, Shareholder, CompanyAdministrator, CompanyRiskFactor
 
 def audit_fre_tables():
@@ -17,7 +17,7 @@ def audit_fre_tables():
     """
     print("--- INICIANDO AUDITORIA DAS TABELAS DO FRE ---")
     
-    engine = create_engine(DATABASE_URL)
+    engine = get_engine()
     Session = sessionmaker(bind=engine)
     
     with Session() as session:
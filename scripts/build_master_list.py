@@ -1,25 +1,19 @@
 # scripts/build_master_list.py (Versão Definitiva com Mapeamento e Agregação Dinâmica)
 import os
 import sys
+import numpy as np
 import pandas as pd
 import io
-from dotenv import load_dotenv
-from sqlalchemy import create_engine, text
-from sqlalchemy.orm import sessionmaker
+import json
+from sqlalchemy import bindparam, text
 from datetime import datetime
 import requests
 import zipfile
 
 # --- CONFIGURAÇÃO DE PATH ---
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
-sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'scraper')))
-from models import Base, Company
-
-def get_db_connection_string():
-    load_dotenv(dotenv_path=os.path.join(os.path.dirname(__file__), '..', '.env'))
-    user, pw, host, db = os.getenv("DB_USER"), os.getenv("DB_PASSWORD"), os.getenv("DB_HOST"), os.getenv("DB_NAME")
-    if not all([user, pw, host, db]): raise ValueError("Credenciais do banco não encontradas.")
-    return f"postgresql+psycopg2://{user}:{pw}@{host}/{db}?sslmode=require"
+from backend.database import get_engine
+from etl_incremental import upsert_dataframe
 
 def get_reference_tickers():
     csv_data = """"Ticker","Nome"
@@ -481,12 +475,105 @@ def download_and_process_cvm_files():
         print(f"❌ ERRO CRÍTICO ao baixar dados da CVM: {e}")
         return pd.DataFrame(), pd.DataFrame(), pd.DataFrame()
 
+# Colunas de `companies` preenchidas pela lista mestra. Só elas são gravadas no
+# upsert: as demais (enriquecidas por outros ETLs) ficam como estão.
+MASTER_COLUMNS = ['cnpj', 'cvm_code', 'company_name', 'trade_name', 'b3_sector', 'main_activity',
+                  'website', 'tickers', 'ticker', 'is_b3_listed']
+WEBSITE_MAX_LENGTH = 255
+
+def build_master_frame(df_cad, df_fca_vm, reference_tickers, df_fca_geral=None, active_only=True):
+    """
+    Monta a lista mestra (uma linha por CNPJ, colunas de MASTER_COLUMNS) só com
+    operações vetorizadas do pandas:
+    - valores mobiliários cujo ticker está na lista de referência, agrupados em
+      uma lista ordenada e sem repetição por CNPJ (`tickers`; `ticker` = o primeiro);
+    - um registro do cadastro por CNPJ (com `active_only`, só os ATIVOS);
+    - website do FCA geral, ou o do cadastro quando o FCA não tem.
+    """
+    tickers = df_fca_vm.loc[df_fca_vm['ticker'].notna(), ['cnpj', 'ticker']]
+    tickers = tickers.assign(ticker=tickers['ticker'].str.strip())
+    tickers = tickers[tickers['ticker'].str.upper().isin(reference_tickers)] \
+        .drop_duplicates().sort_values(['cnpj', 'ticker'])
+    # Lista por CNPJ cortando o array ordenado nas fronteiras de grupo
+    # (groupby().agg(list) chamaria Python uma vez por grupo sobre Series)
+    cnpjs = tickers['cnpj'].to_numpy(dtype=object)
+    values = tickers['ticker'].to_numpy(dtype=object)
+    starts = np.flatnonzero(cnpjs[1:] != cnpjs[:-1]) + 1
+    groups = np.split(values, starts) if len(values) else []
+    tickers = pd.Series([group.tolist() for group in groups], index=cnpjs[np.r_[0, starts][:len(groups)]],
+                        name='tickers', dtype=object)
+
+    cad = df_cad
+    if active_only and 'status' in cad.columns:
+        cad = cad[cad['status'] == 'ATIVO']
+    cad = cad.drop_duplicates('cnpj')
+    df = cad.join(tickers, on='cnpj', how='inner')
+
+    for column in ('company_name', 'b3_sector', 'main_activity', 'website'):
+        if column not in df.columns:
+            df[column] = None
+    if df_fca_geral is not None and not df_fca_geral.empty and 'website' in df_fca_geral.columns:
+        websites = df_fca_geral.dropna(subset=['website']).drop_duplicates('cnpj').set_index('cnpj')['website']
+        df['website'] = df['cnpj'].map(websites).fillna(df['website'])
+    df['website'] = df['website'].str.slice(0, WEBSITE_MAX_LENGTH)
+
+    df['cvm_code'] = pd.to_numeric(df['cvm_code'], errors='coerce')
+    df = df.dropna(subset=['cvm_code', 'company_name']).drop_duplicates('cvm_code')
+    df['cvm_code'] = df['cvm_code'].astype(int)
+    df['trade_name'] = df['company_name']
+    df['ticker'] = df['tickers'].str[0]
+    df['is_b3_listed'] = True
+    return df[MASTER_COLUMNS].reset_index(drop=True)
+
+def align_existing_cnpjs(connection, df_final):
+    """
+    Outros ETLs (etl_companies, etl_cvm_financial) gravam o CNPJ como vem da
+    CVM ('33.000.167/0001-01') ou vazio. Antes do upsert por CNPJ, a linha que
+    já tem o código CVM de uma empresa da lista passa a ter o CNPJ só com
+    dígitos da lista; sem isso o INSERT não conflita pelo CNPJ e esbarra no
+    UNIQUE de cvm_code. Um CNPJ que já pertence a outra linha não é tomado.
+    Retorna o número de linhas ajustadas.
+    """
+    existing = pd.read_sql(text("SELECT id, cnpj, cvm_code FROM companies WHERE cvm_code IS NOT NULL"), connection)
+    if existing.empty:
+        return 0
+    existing['cvm_code'] = pd.to_numeric(existing['cvm_code'], errors='coerce')
+    merged = existing.merge(df_final[['cvm_code', 'cnpj']], on='cvm_code', suffixes=('', '_new'))
+    stale = merged[(merged['cnpj'].fillna('') != merged['cnpj_new'])
+                   & ~merged['cnpj_new'].isin(existing['cnpj'].dropna())]
+    if not stale.empty:
+        connection.execute(text("UPDATE companies SET cnpj = :cnpj WHERE id = :id"),
+                           [{'id': int(row.id), 'cnpj': row.cnpj_new} for row in stale.itertuples()])
+    return len(stale)
+
+def load_master_list(connection, df_final):
+    """
+    Mescla a lista mestra em `companies` com upsert por CNPJ (sem TRUNCATE, sem
+    CASCADE): os ids e as linhas dependentes (demonstrativos, documentos,
+    acionistas...) são preservados. Linhas já existentes com o mesmo código
+    CVM e CNPJ formatado ou vazio são casadas antes (align_existing_cnpjs).
+    Empresas que saíram da lista ficam com is_b3_listed = false. Retorna
+    (linhas enviadas, empresas desmarcadas).
+    """
+    align_existing_cnpjs(connection, df_final)
+    now = datetime.utcnow().strftime('%Y-%m-%d %H:%M:%S')
+    staged = df_final.assign(tickers=df_final['tickers'].map(json.dumps), created_at=now, updated_at=now)
+    update_columns = [col for col in MASTER_COLUMNS if col != 'cnpj']
+    sent = upsert_dataframe(connection, staged, 'companies', ['cnpj'], update_columns,
+                            touch_columns=['updated_at'], text_columns=['tickers'])
+
+    delisted = connection.execute(
+        text("UPDATE companies SET is_b3_listed = false, updated_at = :now "
+             "WHERE is_b3_listed AND (cnpj IS NULL OR cnpj NOT IN :cnpjs)")
+        .bindparams(bindparam('cnpjs', expanding=True)),
+        {'now': now, 'cnpjs': list(df_final['cnpj'])}
+    ).rowcount
+    return sent, delisted
+
 def run_etl():
     print("--- INICIANDO ETL DA LISTA MESTRA DE EMPRESAS (VERSÃO DEFINITIVA) ---")
     
-    engine = create_engine(get_db_connection_string())
-    Session = sessionmaker(bind=engine)
-    session = Session()
+    engine = get_engine()
 
     try:
         reference_tickers = get_reference_tickers()
@@ -496,67 +583,21 @@ def run_etl():
             print("Dados essenciais da CVM (Cadastro e Valores Mobiliários) não puderam ser carregados. Abortando.")
             return
 
-        print("Enriquecendo e filtrando dados...")
-        
-        df_fca_filtered = df_fca_vm[df_fca_vm['ticker'].str.upper().isin(reference_tickers)].copy()
-        
-        # Merge 1: Junta dados cadastrais com os tickers filtrados
-        df_merged = pd.merge(df_cad, df_fca_filtered[['cnpj', 'ticker']], on='cnpj', how='inner')
-        
-        # Merge 2: Adiciona o website (se disponível)
-        if not df_fca_geral.empty and 'website' in df_fca_geral.columns:
-            df_merged = pd.merge(df_merged, df_fca_geral[['cnpj', 'website']], on='cnpj', how='left')
-
-        print("Agrupando tickers por empresa...")
-        
-        # Constrói o dicionário de agregação dinamicamente
-        agg_funcs = {'ticker': (lambda x: sorted(list(x.unique())))}
-        first_cols = ['company_name', 'cvm_code', 'b3_sector', 'main_activity', 'website', 'status']
-        for col in first_cols:
-            if col in df_merged.columns:
-                agg_funcs[col] = 'first'
-        
-        df_final_agg = df_merged.groupby('cnpj').agg(agg_funcs).reset_index()
-        
-        df_final = df_final_agg[df_final_agg['status'] == 'ATIVO'].copy()
+        print("Enriquecendo, filtrando e agrupando tickers por empresa...")
+        df_final = build_master_frame(df_cad, df_fca_vm, reference_tickers, df_fca_geral)
         print(f"{len(df_final)} empresas da sua lista foram encontradas, estão ativas e foram enriquecidas.")
+        if df_final.empty:
+            print("Nenhuma empresa para carregar. A tabela 'companies' não foi alterada.")
+            return
 
-        print("Limpando a tabela 'companies'...")
-        session.execute(text("TRUNCATE TABLE public.companies RESTART IDENTITY CASCADE;"))
-        
-        print(f"Populando a tabela 'companies' com {len(df_final)} registros...")
-        
-        valid_model_columns = {c.name for c in Company.__table__.columns}
-        records_to_load = df_final.to_dict(orient='records')
-        
-        cleaned_load = []
-        for record in records_to_load:
-            # FIX: Map list of tickers to 'tickers' (JSON) and first ticker to 'ticker' (String)
-            tickers_list = record.get('ticker', [])
-            record['tickers'] = tickers_list
-            record['ticker'] = tickers_list[0] if tickers_list else None
-            
-            record['trade_name'] = record.get('trade_name') or record.get('company_name')
-            record['is_b3_listed'] = True
-            
-            # Garante que o website não exceda o limite do modelo
-            if 'website' in record and record['website'] and len(record['website']) > 255:
-                record['website'] = record['website'][:255]
-                
-            cleaned_record = {k: v for k, v in record.items() if k in valid_model_columns}
-            cleaned_load.append(cleaned_record)
-        
-        if cleaned_load:
-            session.bulk_insert_mappings(Company, cleaned_load)
+        print(f"Mesclando {len(df_final)} registros na tabela 'companies' (upsert por CNPJ)...")
+        with engine.begin() as connection:
+            sent, delisted = load_master_list(connection, df_final)
 
-        session.commit()
-        print("🎉 Tabela 'companies' populada com sucesso!")
+        print(f"🎉 Tabela 'companies' atualizada: {sent} empresas mescladas, {delisted} fora da lista desmarcadas.")
 
     except Exception as e:
         print(f"❌ ERRO durante o ETL: {e}")
-        session.rollback()
-    finally:
-        session.close()
 
 if __name__ == "__main__":
     run_etl()
@@ -1,11 +1,15 @@
 # scripts/etl_dadosfinanceiros.py
 
 import os
+import argparse
+import csv
 import requests
+import sqlite3
 import zipfile
 import io
 import pandas as pd
 import logging
+from dataclasses import dataclass, field
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy import text
 from tqdm import tqdm
@@ -16,7 +20,10 @@ import sys
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
 from backend.config import get_db_engine
-from backend.models import FinancialStatement, Company
+from scraper.services.cvm_download_cache import get_download_cache
+from etl_incremental import (
+    EtlManifest, ZIP_MEMBER, remote_fingerprint, download_with_hash, member_fingerprint, upsert_dataframe
+)
 
 # Configuração do logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -46,15 +53,34 @@ COLUMN_MAPPING = {
     'PERIODO': 'period'
 }
 
+# --- Modo streaming (memória constante) ---
+TARGET_TABLE = 'cvm_dados_financeiros'
+# Ordem fixa das colunas enviadas ao COPY / sinks locais
+STREAM_COLUMNS = list(COLUMN_MAPPING.values())
+STREAM_DATE_COLUMNS = ['reference_date', 'fiscal_year_start', 'fiscal_year_end']
+STREAM_CHUNK_SIZE = 100000
+
+# --- Modo incremental ---
+# Chave natural de uma linha de demonstração. `statement_scope` ('con'/'ind')
+# separa as versões consolidada e individual, que compartilham report_type.
+UPSERT_KEY = [
+    'company_cnpj', 'reference_date', 'report_version', 'account_code',
+    'statement_scope', 'report_type', 'period', 'fiscal_year_order'
+]
+INCREMENTAL_COLUMNS = STREAM_COLUMNS + ['statement_scope']
+UPSERT_UPDATE_COLUMNS = [col for col in INCREMENTAL_COLUMNS if col not in UPSERT_KEY]
+
 def download_and_process_file(url, file_type, year):
     """Baixa um arquivo, descompacta e processa em um DataFrame."""
     try:
         logging.info(f"--> Tentando baixar {file_type} para o ano {year}...")
-        response = requests.get(url, stream=True)
-        response.raise_for_status()
+        cached_zip = get_download_cache().fetch(url)
+        if cached_zip is None:
+            logging.warning(f"    - AVISO: Arquivo não encontrado (404). Pulando.")
+            return None
 
         logging.info("    + Download concluído. Processando...")
-        zip_file = zipfile.ZipFile(io.BytesIO(response.content))
+        zip_file = cached_zip.zip()
         all_dfs = []
         
         csv_files = [f for f in zip_file.namelist() if f.endswith('.csv')]
@@ -90,6 +116,8 @@ def load_data(session, df, batch_size=50000):
     """
     Carrega os dados do DataFrame para o banco de dados em lotes (batches).
     """
+    from backend.models import FinancialStatement
+
     logging.info("Limpando a tabela 'cvm_dados_financeiros' para a carga completa...")
     session.execute(text("TRUNCATE TABLE cvm_dados_financeiros RESTART IDENTITY;"))
     session.commit()
@@ -133,6 +161,9 @@ def load_data(session, df, batch_size=50000):
 
 def process_historical_financial_reports():
     """Orquestra o processo de ETL para os relatórios financeiros."""
+    # Importado aqui para que o modo streaming não dependa dos modelos ORM
+    from backend.models import Company
+
     logging.info("Iniciando o script de ETL para dados financeiros...")
     print("="*80)
     print(f"INICIANDO PROCESSO DE CARGA HISTÓRICA COMPLETA")
@@ -203,5 +234,400 @@ def process_historical_financial_reports():
     finally:
         session.close()
 
+# ============================================================================
+# MODO STREAMING
+# Cada membro do zip é lido como um iterador de chunks; nenhum ano inteiro
+# (nem o histórico completo) fica em memória. O pico de RSS é limitado pelo
+# tamanho do chunk, independentemente do intervalo de anos.
+# ============================================================================
+
+@dataclass
+class ThroughputReport:
+    """Acumula as métricas de vazão da carga em streaming."""
+    rows_read: int = 0
+    rows_loaded: int = 0
+    bytes_read: int = 0
+    files: int = 0
+    started_at: float = field(default_factory=time.perf_counter)
+
+    @property
+    def elapsed(self):
+        return max(time.perf_counter() - self.started_at, 1e-9)
+
+    @property
+    def rows_per_second(self):
+        return self.rows_loaded / self.elapsed
+
+    @property
+    def mb_per_second(self):
+        return self.bytes_read / (1024 * 1024) / self.elapsed
+
+    def summary(self):
+        return (
+            f"{self.files} arquivos | {self.rows_read} linhas lidas | {self.rows_loaded} carregadas | "
+            f"{self.bytes_read / (1024 * 1024):.1f} MB em {self.elapsed:.1f}s | "
+            f"{self.rows_per_second:,.0f} linhas/s | {self.mb_per_second:.2f} MB/s"
+        )
+
+
+class PostgresCopySink:
+    """Envia cada chunk ao PostgreSQL via `COPY ... FROM STDIN` (formato CSV)."""
+
+    def __init__(self, engine, table=TARGET_TABLE, columns=STREAM_COLUMNS, truncate=True):
+        self.table = table
+        self.columns = columns
+        self.connection = engine.raw_connection()
+        self.copy_sql = f"COPY {table} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv)"
+        if truncate:
+            with self.connection.cursor() as cur:
+                cur.execute(f"TRUNCATE TABLE {table} RESTART IDENTITY;")
+            self.connection.commit()
+
+    def write(self, df):
+        buffer = io.StringIO()
+        df.to_csv(buffer, columns=self.columns, index=False, header=False, date_format='%Y-%m-%d')
+        buffer.seek(0)
+        with self.connection.cursor() as cur:
+            cur.copy_expert(self.copy_sql, buffer)
+        # Commit por chunk: uma falha posterior não desfaz o que já foi carregado
+        self.connection.commit()
+        return len(df)
+
+    def close(self):
+        self.connection.close()
+
+
+class SQLiteSink:
+    """Sink local para testes: grava os chunks numa tabela SQLite."""
+
+    def __init__(self, path, table=TARGET_TABLE, columns=STREAM_COLUMNS, truncate=True):
+        self.table = table
+        self.columns = columns
+        self.connection = sqlite3.connect(path)
+        self.connection.execute(f"CREATE TABLE IF NOT EXISTS {table} ({', '.join(columns)})")
+        if truncate:
+            self.connection.execute(f"DELETE FROM {table}")
+        self.insert_sql = f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})"
+
+    def write(self, df):
+        frame = df[self.columns].copy()
+        for col in STREAM_DATE_COLUMNS:
+            frame[col] = frame[col].dt.strftime('%Y-%m-%d')
+        frame = frame.astype(object).where(pd.notnull(frame), None)
+        self.connection.executemany(self.insert_sql, frame.itertuples(index=False, name=None))
+        self.connection.commit()
+        return len(frame)
+
+    def close(self):
+        self.connection.close()
+
+
+class CSVSink:
+    """Sink local para testes: anexa os chunks num arquivo CSV."""
+
+    def __init__(self, path, columns=STREAM_COLUMNS, truncate=True):
+        self.path = path
+        self.columns = columns
+        if truncate or not os.path.exists(path):
+            with open(path, 'w', newline='', encoding='utf-8') as f:
+                csv.writer(f).writerow(columns)
+
+    def write(self, df):
+        df.to_csv(self.path, columns=self.columns, mode='a', index=False, header=False,
+                  date_format='%Y-%m-%d', encoding='utf-8')
+        return len(df)
+
+    def close(self):
+        pass
+
+
+def open_cached_zip(url, timeout=180):
+    """
+    Obtém o zip pelo cache local compartilhado (download em blocos direto
+    para disco, GET condicional). Retorna o arquivo aberto ou None se não existir.
+    """
+    cached_zip = get_download_cache().fetch(url, timeout=timeout)
+    if cached_zip is None:
+        logging.warning(f"    - AVISO: Arquivo não encontrado (404). Pulando. URL: {url}")
+        return None
+    return cached_zip.open()
+
+
+def iter_zip_csv_chunks(zip_source, chunk_size=STREAM_CHUNK_SIZE, report=None):
+    """
+    Itera sobre todos os CSVs de um zip, devolvendo `(nome_do_membro, chunk)`.
+    `zip_source` pode ser um caminho ou um objeto de arquivo binário.
+    """
+    with zipfile.ZipFile(zip_source) as zip_file:
+        for info in zip_file.infolist():
+            if not info.filename.endswith('.csv'):
+                continue
+            with zip_file.open(info) as f:
+                reader = pd.read_csv(f, sep=';', encoding='latin1', dtype=str, chunksize=chunk_size)
+                for chunk in reader:
+                    yield info.filename, chunk
+            if report is not None:
+                report.files += 1
+                report.bytes_read += info.file_size
+
+
+def normalize_chunk(chunk, doc_type, valid_cnpjs=None):
+    """
+    Aplica a um chunk as mesmas transformações do modo completo: tipo de
+    demonstração, período, CNPJ normalizado, renomeação e datas.
+    """
+    if 'GRUPO_DFP' in chunk.columns:
+        chunk['TIPO_DEMONSTRACAO'] = chunk['GRUPO_DFP'].str.split(' - ').str[1].fillna(chunk['GRUPO_DFP'])
+    else:
+        chunk['TIPO_DEMONSTRACAO'] = 'N/A'
+    chunk['PERIODO'] = 'ANUAL' if doc_type == 'DFP' else 'TRIMESTRAL'
+
+    chunk['CNPJ_CIA'] = chunk['CNPJ_CIA'].str.replace(r'[./-]', '', regex=True).str.zfill(14)
+    if valid_cnpjs is not None:
+        chunk = chunk[chunk['CNPJ_CIA'].isin(valid_cnpjs)]
+
+    chunk = chunk.rename(columns=COLUMN_MAPPING).reindex(columns=STREAM_COLUMNS)
+    for col in STREAM_DATE_COLUMNS:
+        chunk[col] = pd.to_datetime(chunk[col], errors='coerce')
+    chunk['account_value'] = pd.to_numeric(chunk['account_value'], errors='coerce')
+    return chunk.dropna(subset=['reference_date'])
+
+
+def fetch_valid_cnpjs(engine):
+    """Conjunto de CNPJs (somente dígitos) presentes na tabela 'companies'."""
+    with engine.connect() as connection:
+        result = connection.execute(text("SELECT cnpj FROM companies;"))
+        return {str(row[0]).zfill(14) for row in result if row[0]}
+
+
+def stream_historical_financial_reports(sink, start_year=START_YEAR, end_year=END_YEAR,
+                                        chunk_size=STREAM_CHUNK_SIZE, valid_cnpjs=None):
+    """
+    Carga histórica em streaming: baixa cada zip para disco, lê os CSVs em
+    chunks e envia cada chunk normalizado ao sink. Retorna o ThroughputReport.
+    """
+    report = ThroughputReport()
+    doc_types = [
+        {'type': 'DFP', 'url_base': BASE_URL},
+        {'type': 'ITR', 'url_base': BASE_URL_ITR}
+    ]
+
+    try:
+        for year in range(start_year, end_year + 1):
+            for doc in doc_types:
+                file_url = f"{doc['url_base']}{doc['type'].lower()}_cia_aberta_{year}.zip"
+                logging.info(f"--> Streaming {doc['type']} {year}...")
+                try:
+                    zip_tmp = open_cached_zip(file_url)
+                except requests.exceptions.RequestException as e:
+                    logging.error(f"    - ERRO: Falha no download de {file_url}: {e}")
+                    continue
+                if zip_tmp is None:
+                    continue
+
+                with zip_tmp:
+                    for member, chunk in iter_zip_csv_chunks(zip_tmp, chunk_size, report):
+                        report.rows_read += len(chunk)
+                        normalized = normalize_chunk(chunk, doc['type'], valid_cnpjs)
+                        if normalized.empty:
+                            continue
+                        report.rows_loaded += sink.write(normalized)
+                logging.info(f"    + {doc['type']} {year} concluído. {report.summary()}")
+    finally:
+        sink.close()
+
+    logging.info(f"THROUGHPUT FINAL: {report.summary()}")
+    return report
+
+
+# ============================================================================
+# MODO INCREMENTAL
+# Em vez de TRUNCATE + recarga de 15 anos, só processa zips/CSVs cujo
+# fingerprint mudou no manifesto, faz upsert pela chave natural e grava um
+# checkpoint por chunk para retomar do ponto exato após uma falha.
+# ============================================================================
+
+def ensure_incremental_schema(engine):
+    """Garante a coluna `statement_scope` e o índice único usado pelo upsert."""
+    with engine.begin() as conn:
+        if conn.dialect.name == 'postgresql':
+            conn.execute(text(f"ALTER TABLE {TARGET_TABLE} ADD COLUMN IF NOT EXISTS statement_scope VARCHAR(3);"))
+        else:
+            conn.execute(text(f"CREATE TABLE IF NOT EXISTS {TARGET_TABLE} ({', '.join(INCREMENTAL_COLUMNS)})"))
+        conn.execute(text(
+            f"CREATE UNIQUE INDEX IF NOT EXISTS ux_{TARGET_TABLE}_natural_key "
+            f"ON {TARGET_TABLE} ({', '.join(UPSERT_KEY)})"
+        ))
+
+
+def statement_scope(member_name):
+    """'con' ou 'ind' a partir do nome do CSV (ex.: dfp_cia_aberta_BPA_con_2023.csv)."""
+    if '_con_' in member_name:
+        return 'con'
+    if '_ind_' in member_name:
+        return 'ind'
+    return None
+
+
+def remove_legacy_rows(engine, period, year):
+    """
+    Remove as linhas do ano/período gravadas por cargas completas anteriores
+    (sem `statement_scope`), que nunca colidiriam com o índice único.
+    """
+    with engine.begin() as conn:
+        result = conn.execute(text(f"""
+            DELETE FROM {TARGET_TABLE}
+            WHERE period = :period AND statement_scope IS NULL
+              AND reference_date >= :start AND reference_date < :end
+        """), {'period': period, 'start': f"{year}-01-01", 'end': f"{year + 1}-01-01"})
+    if result.rowcount:
+        logging.info(f"    + {result.rowcount} linhas legadas de {period} {year} removidas.")
+
+
+def load_zip_incrementally(engine, manifest, source_file, zip_tmp, doc_type, chunk_size, valid_cnpjs, report):
+    """Processa os CSVs alterados de um zip já baixado, com checkpoint por chunk."""
+    with zipfile.ZipFile(zip_tmp) as zip_file:
+        for info in zip_file.infolist():
+            if not info.filename.endswith('.csv'):
+                continue
+            fingerprint = member_fingerprint(info)
+            if manifest.is_complete(source_file, info.filename, fingerprint):
+                logging.info(f"    = {info.filename} inalterado. Pulando.")
+                continue
+
+            start_chunk = manifest.resume_chunk(source_file, info.filename, fingerprint, chunk_size)
+            if start_chunk:
+                logging.info(f"    > Retomando {info.filename} a partir do chunk {start_chunk}.")
+            else:
+                manifest.start(source_file, info.filename, fingerprint, chunk_size)
+
+            scope = statement_scope(info.filename)
+            with zip_file.open(info) as f:
+                reader = pd.read_csv(f, sep=';', encoding='latin1', dtype=str, chunksize=chunk_size)
+                for chunk_index, chunk in enumerate(reader):
+                    if chunk_index < start_chunk:
+                        continue
+                    report.rows_read += len(chunk)
+                    rows = 0
+                    # O CSV-índice do zip (sem CD_CONTA) não tem linhas de demonstração
+                    if 'CD_CONTA' in chunk.columns:
+                        normalized = normalize_chunk(chunk, doc_type, valid_cnpjs)
+                        normalized['statement_scope'] = scope
+                        with engine.begin() as conn:
+                            rows = upsert_dataframe(conn, normalized, TARGET_TABLE, UPSERT_KEY, UPSERT_UPDATE_COLUMNS)
+                            manifest.checkpoint(conn, source_file, info.filename, fingerprint, chunk_index, rows)
+                    else:
+                        with engine.begin() as conn:
+                            manifest.checkpoint(conn, source_file, info.filename, fingerprint, chunk_index, 0)
+                    report.rows_loaded += rows
+
+            manifest.mark_complete(source_file, info.filename, fingerprint)
+            report.files += 1
+            report.bytes_read += info.file_size
+
+
+def incremental_load_financial_reports(engine, start_year=START_YEAR, end_year=END_YEAR,
+                                       chunk_size=STREAM_CHUNK_SIZE, valid_cnpjs=None):
+    """
+    Carga incremental: pula zips e CSVs inalterados segundo o manifesto e faz
+    upsert apenas do conteúdo alterado. Retorna o ThroughputReport.
+    """
+    manifest = EtlManifest(engine)
+    manifest.ensure_table()
+    ensure_incremental_schema(engine)
+    report = ThroughputReport()
+    doc_types = [
+        {'type': 'DFP', 'url_base': BASE_URL},
+        {'type': 'ITR', 'url_base': BASE_URL_ITR}
+    ]
+
+    for year in range(start_year, end_year + 1):
+        for doc in doc_types:
+            source_file = f"{doc['type'].lower()}_cia_aberta_{year}.zip"
+            file_url = f"{doc['url_base']}{source_file}"
+            try:
+                remote = remote_fingerprint(file_url)
+                if remote is None:
+                    logging.warning(f"    - AVISO: {source_file} não encontrado (404). Pulando.")
+                    continue
+                if manifest.is_complete(source_file, ZIP_MEMBER, remote):
+                    logging.info(f"--> {source_file} inalterado desde a última carga. Pulando.")
+                    continue
+
+                logging.info(f"--> {source_file} novo ou alterado. Baixando...")
+                downloaded = download_with_hash(file_url)
+                if downloaded is None:
+                    continue
+                zip_tmp, fingerprint = downloaded
+            except requests.exceptions.RequestException as e:
+                logging.error(f"    - ERRO: Falha no download de {file_url}: {e}")
+                continue
+
+            with zip_tmp:
+                if manifest.is_complete(source_file, ZIP_MEMBER, fingerprint):
+                    # Cabeçalhos mudaram mas o conteúdo (sha256) é o mesmo
+                    manifest.mark_complete(source_file, ZIP_MEMBER, fingerprint)
+                    continue
+                if manifest.get(source_file, ZIP_MEMBER) is None:
+                    remove_legacy_rows(engine, 'ANUAL' if doc['type'] == 'DFP' else 'TRIMESTRAL', year)
+                    manifest.start(source_file, ZIP_MEMBER, fingerprint)
+
+                load_zip_incrementally(engine, manifest, source_file, zip_tmp, doc['type'],
+                                       chunk_size, valid_cnpjs, report)
+                manifest.mark_complete(source_file, ZIP_MEMBER, fingerprint)
+            logging.info(f"    + {source_file} concluído. {report.summary()}")
+
+    logging.info(f"THROUGHPUT FINAL (incremental): {report.summary()}")
+    return report
+
+
+def build_sink(kind, path=None):
+    """Cria o sink solicitado na linha de comando."""
+    if kind == 'postgres':
+        return PostgresCopySink(get_db_engine())
+    if kind == 'sqlite':
+        return SQLiteSink(path or 'cvm_dados_financeiros.sqlite3')
+    if kind == 'csv':
+        return CSVSink(path or 'cvm_dados_financeiros.csv')
+    raise ValueError(f"Sink desconhecido: {kind}")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="ETL de DFP/ITR da CVM para 'cvm_dados_financeiros'.")
+    parser.add_argument("--mode", choices=["full", "stream", "incremental"], default="full",
+                        help="'full': carga original em memória. 'stream': leitura em chunks com memória constante. "
+                             "'incremental': só arquivos alterados, com upsert e checkpoints.")
+    parser.add_argument("--sink", choices=["postgres", "sqlite", "csv"], default="postgres",
+                        help="Destino do modo streaming (sqlite/csv são sinks locais para testes).")
+    parser.add_argument("--sink-path", help="Arquivo de destino para os sinks 'sqlite' e 'csv'.")
+    parser.add_argument("--start-year", type=int, default=START_YEAR)
+    parser.add_argument("--end-year", type=int, default=END_YEAR)
+    parser.add_argument("--chunk-size", type=int, default=STREAM_CHUNK_SIZE)
+    parser.add_argument("--all-companies", action="store_true",
+                        help="Não filtra pelos CNPJs da tabela 'companies' (útil com sinks locais).")
+    return parser.parse_args()
+
+
 if __name__ == "__main__":
-    process_historical_financial_reports()
\ No newline at end of file
+    args = parse_args()
+    if args.mode == "incremental":
+        engine = get_db_engine()
+        valid_cnpjs = None if args.all_companies else fetch_valid_cnpjs(engine)
+        incremental_load_financial_reports(
+            engine,
+            start_year=args.start_year,
+            end_year=args.end_year,
+            chunk_size=args.chunk_size,
+            valid_cnpjs=valid_cnpjs,
+        )
+    elif args.mode == "stream":
+        valid_cnpjs = None if args.all_companies else fetch_valid_cnpjs(get_db_engine())
+        stream_historical_financial_reports(
+            build_sink(args.sink, args.sink_path),
+            start_year=args.start_year,
+            end_year=args.end_year,
+            chunk_size=args.chunk_size,
+            valid_cnpjs=valid_cnpjs,
+        )
+    else:
+        process_historical_financial_reports()
\ No newline at end of file
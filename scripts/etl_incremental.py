@@ -0,0 +1,267 @@
+# scripts/etl_incremental.py
+"""
+Infraestrutura de carga incremental e retomável para os ETLs da CVM.
+
+- Manifesto (`cvm_etl_manifest`) com a impressão digital de cada zip
+  `*_cia_aberta_{ano}.zip` (tamanho/ETag/Last-Modified/sha256) e de cada CSV
+  dentro dele (tamanho/CRC32 lidos do diretório central do zip).
+- Checkpoint por chunk gravado na MESMA transação do upsert, de modo que uma
+  queda no meio de um ano retoma a partir do último chunk confirmado. O
+  tamanho do chunk fica no manifesto: retomar com outro tamanho recomeça o
+  arquivo (o índice do chunk não apontaria mais para as mesmas linhas).
+- Upsert via tabela de staging + `INSERT ... ON CONFLICT DO UPDATE`, que só
+  reescreve linhas cujo conteúdo realmente mudou.
+"""
+import io
+import logging
+import os
+import sys
+from dataclasses import dataclass
+from datetime import datetime
+from typing import List, Optional
+
+import requests
+from sqlalchemy import inspect, text
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from scraper.services.cvm_download_cache import get_download_cache
+
+MANIFEST_TABLE = 'cvm_etl_manifest'
+ZIP_MEMBER = ''  # 'member' usado para a linha que representa o zip inteiro
+STATUS_IN_PROGRESS = 'in_progress'
+STATUS_COMPLETE = 'complete'
+
+MANIFEST_DDL = f"""
+CREATE TABLE IF NOT EXISTS {MANIFEST_TABLE} (
+    source_file VARCHAR(255) NOT NULL,
+    member VARCHAR(255) NOT NULL DEFAULT '',
+    size_bytes BIGINT,
+    etag VARCHAR(255),
+    last_modified VARCHAR(64),
+    content_hash VARCHAR(64),
+    status VARCHAR(20) NOT NULL,
+    last_chunk INTEGER NOT NULL DEFAULT -1,
+    chunk_size INTEGER,
+    rows_loaded BIGINT NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP,
+    PRIMARY KEY (source_file, member)
+)
+"""
+
+
+@dataclass
+class Fingerprint:
+    """Impressão digital de um arquivo remoto ou de um membro do zip."""
+    size: Optional[int] = None
+    etag: Optional[str] = None
+    last_modified: Optional[str] = None
+    content_hash: Optional[str] = None
+
+    def matches(self, other: Optional['Fingerprint']) -> bool:
+        """
+        Compara usando o identificador mais forte disponível nos dois lados:
+        hash de conteúdo, depois ETag, depois tamanho + Last-Modified.
+        """
+        if other is None:
+            return False
+        if self.content_hash and other.content_hash:
+            return self.content_hash == other.content_hash
+        if self.etag and other.etag:
+            return self.etag == other.etag
+        if self.size is not None and self.last_modified and other.last_modified:
+            return self.size == other.size and self.last_modified == other.last_modified
+        return False
+
+
+def remote_fingerprint(url: str, session=None, timeout: int = 60) -> Optional[Fingerprint]:
+    """Obtém tamanho/ETag/Last-Modified via HEAD. Retorna None se o arquivo não existir."""
+    http = session or requests
+    response = http.head(url, timeout=timeout, allow_redirects=True)
+    if response.status_code == 404:
+        return None
+    response.raise_for_status()
+    size = response.headers.get('Content-Length')
+    return Fingerprint(
+        size=int(size) if size else None,
+        etag=response.headers.get('ETag'),
+        last_modified=response.headers.get('Last-Modified'),
+    )
+
+
+def download_with_hash(url: str, session=None, timeout: int = 180):
+    """
+    Obtém o arquivo pelo cache local compartilhado. O sha256 sai de graça do
+    endereçamento por conteúdo do cache.
+    Retorna `(arquivo_aberto, Fingerprint)` ou None se o arquivo não existir.
+    """
+    cached = get_download_cache().fetch(url, session=session, timeout=timeout)
+    if cached is None:
+        return None
+    fingerprint = Fingerprint(
+        size=cached.size,
+        etag=cached.etag,
+        last_modified=cached.last_modified,
+        content_hash=cached.sha256,
+    )
+    return cached.open(), fingerprint
+
+
+def member_fingerprint(info) -> Fingerprint:
+    """Fingerprint de um membro do zip a partir do diretório central (sem descompactar)."""
+    return Fingerprint(size=info.file_size, content_hash=f"{info.CRC:08x}")
+
+
+class EtlManifest:
+    """Leitura e escrita do manifesto de arquivos/chunks já carregados."""
+
+    def __init__(self, engine, table: str = MANIFEST_TABLE):
+        self.engine = engine
+        self.table = table
+
+    def ensure_table(self):
+        with self.engine.begin() as conn:
+            conn.execute(text(MANIFEST_DDL.replace(MANIFEST_TABLE, self.table)))
+            # Manifestos criados antes da coluna chunk_size
+            columns = {column['name'] for column in inspect(conn).get_columns(self.table)}
+            if 'chunk_size' not in columns:
+                conn.execute(text(f"ALTER TABLE {self.table} ADD COLUMN chunk_size INTEGER"))
+
+    def get(self, source_file: str, member: str = ZIP_MEMBER) -> Optional[dict]:
+        with self.engine.connect() as conn:
+            row = conn.execute(
+                text(f"SELECT * FROM {self.table} WHERE source_file = :source_file AND member = :member"),
+                {'source_file': source_file, 'member': member},
+            ).mappings().first()
+        return dict(row) if row else None
+
+    @staticmethod
+    def _fingerprint_of(entry: Optional[dict]) -> Optional[Fingerprint]:
+        if not entry:
+            return None
+        return Fingerprint(
+            size=entry['size_bytes'],
+            etag=entry['etag'],
+            last_modified=entry['last_modified'],
+            content_hash=entry['content_hash'],
+        )
+
+    def is_complete(self, source_file: str, member: str, fingerprint: Fingerprint) -> bool:
+        """True se o arquivo/membro já foi carregado por completo com o mesmo conteúdo."""
+        entry = self.get(source_file, member)
+        return bool(entry) and entry['status'] == STATUS_COMPLETE and fingerprint.matches(self._fingerprint_of(entry))
+
+    def resume_chunk(self, source_file: str, member: str, fingerprint: Fingerprint, chunk_size: int) -> int:
+        """
+        Índice do primeiro chunk a processar: retoma após o último checkpoint
+        se a carga anterior foi interrompida com o mesmo conteúdo e o mesmo
+        tamanho de chunk, senão 0 (o chamador recomeça o arquivo com start()).
+        """
+        entry = self.get(source_file, member)
+        if (entry and entry['status'] == STATUS_IN_PROGRESS and entry['chunk_size'] == chunk_size
+                and fingerprint.matches(self._fingerprint_of(entry))):
+            return entry['last_chunk'] + 1
+        return 0
+
+    def _upsert(self, conn, source_file, member, fingerprint, status, last_chunk, rows, chunk_size=None):
+        conn.execute(text(f"""
+            INSERT INTO {self.table}
+                (source_file, member, size_bytes, etag, last_modified, content_hash,
+                 status, last_chunk, chunk_size, rows_loaded, updated_at)
+            VALUES
+                (:source_file, :member, :size_bytes, :etag, :last_modified, :content_hash,
+                 :status, :last_chunk, :chunk_size, :rows, :updated_at)
+            ON CONFLICT (source_file, member) DO UPDATE SET
+                size_bytes = EXCLUDED.size_bytes,
+                etag = EXCLUDED.etag,
+                last_modified = EXCLUDED.last_modified,
+                content_hash = EXCLUDED.content_hash,
+                status = EXCLUDED.status,
+                last_chunk = EXCLUDED.last_chunk,
+                rows_loaded = {self.table}.rows_loaded + EXCLUDED.rows_loaded,
+                updated_at = EXCLUDED.updated_at
+        """), {
+            'source_file': source_file,
+            'member': member,
+            'size_bytes': fingerprint.size,
+            'etag': fingerprint.etag,
+            'last_modified': fingerprint.last_modified,
+            'content_hash': fingerprint.content_hash,
+            'status': status,
+            'last_chunk': last_chunk,
+            'chunk_size': chunk_size,
+            'rows': rows,
+            'updated_at': datetime.utcnow(),
+        })
+
+    def start(self, source_file: str, member: str, fingerprint: Fingerprint, chunk_size: Optional[int] = None):
+        """
+        Zera o progresso de um membro cujo conteúdo (ou tamanho de chunk) mudou:
+        nova carga desde o chunk 0, com `chunk_size` registrado para a retomada.
+        """
+        with self.engine.begin() as conn:
+            conn.execute(
+                text(f"DELETE FROM {self.table} WHERE source_file = :source_file AND member = :member"),
+                {'source_file': source_file, 'member': member},
+            )
+            self._upsert(conn, source_file, member, fingerprint, STATUS_IN_PROGRESS, -1, 0, chunk_size)
+
+    def checkpoint(self, conn, source_file: str, member: str, fingerprint: Fingerprint,
+                   chunk_index: int, rows: int):
+        """Registra o chunk como confirmado. Deve rodar na transação que gravou os dados."""
+        self._upsert(conn, source_file, member, fingerprint, STATUS_IN_PROGRESS, chunk_index, rows)
+
+    def mark_complete(self, source_file: str, member: str, fingerprint: Fingerprint):
+        with self.engine.begin() as conn:
+            entry = conn.execute(
+                text(f"SELECT last_chunk FROM {self.table} WHERE source_file = :source_file AND member = :member"),
+                {'source_file': source_file, 'member': member},
+            ).first()
+            self._upsert(conn, source_file, member, fingerprint, STATUS_COMPLETE,
+                         entry[0] if entry else -1, 0)
+
+
+def upsert_dataframe(conn, df, table: str, key_columns: List[str], update_columns: List[str],
+                     touch_columns: Optional[List[str]] = None, text_columns: Optional[List[str]] = None) -> int:
+    """
+    Grava `df` em `table` via staging + `INSERT ... ON CONFLICT DO UPDATE`.
+    Linhas idênticas às existentes não são reescritas. Retorna o número de
+    linhas enviadas. Funciona em PostgreSQL (COPY para tabela temporária) e
+    em SQLite (staging via `to_sql`) para testes locais.
+    `touch_columns` (ex.: updated_at) são gravadas quando a linha muda, mas
+    não entram na comparação. `text_columns` são comparadas como texto (json
+    não tem operador de igualdade no PostgreSQL).
+    """
+    if df.empty:
+        return 0
+    # Um mesmo INSERT não pode atualizar a mesma linha duas vezes
+    df = df.drop_duplicates(subset=key_columns, keep='last')
+    columns = list(df.columns)
+    staging = f"staging_{table}"
+    column_list = ', '.join(columns)
+
+    if conn.dialect.name == 'postgresql':
+        conn.execute(text(f"CREATE TEMP TABLE {staging} (LIKE {table} INCLUDING DEFAULTS) ON COMMIT DROP"))
+        buffer = io.StringIO()
+        df.to_csv(buffer, index=False, header=False, date_format='%Y-%m-%d')
+        buffer.seek(0)
+        cursor = conn.connection.cursor()
+        cursor.copy_expert(f"COPY {staging} ({column_list}) FROM STDIN WITH (FORMAT csv)", buffer)
+    else:
+        df.to_sql(staging, conn, if_exists='replace', index=False)
+
+    set_clause = ', '.join(f"{col} = EXCLUDED.{col}" for col in update_columns + list(touch_columns or []))
+    as_text = set(text_columns or [])
+    compared = lambda ref, col: f"CAST({ref}.{col} AS TEXT)" if col in as_text else f"{ref}.{col}"
+    current = ', '.join(compared(table, col) for col in update_columns)
+    incoming = ', '.join(compared('EXCLUDED', col) for col in update_columns)
+    conn.execute(text(f"""
+        INSERT INTO {table} ({column_list})
+        SELECT {column_list} FROM {staging} WHERE true
+        ON CONFLICT ({', '.join(key_columns)}) DO UPDATE SET {set_clause}
+        WHERE ({current}) IS DISTINCT FROM ({incoming})
+    """))
+
+    if conn.dialect.name != 'postgresql':
+        conn.execute(text(f"DROP TABLE {staging}"))
+    logging.debug(f"Upsert de {len(df)} linhas em {table}")
+    return len(df)
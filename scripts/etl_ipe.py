@@ -1,34 +1,37 @@
 
 import os
 import pandas as pd
-from sqlalchemy import create_engine, text
+from sqlalchemy import inspect, text
 from sqlalchemy.exc import SQLAlchemyError
-import requests
 import zipfile
 import io
 from datetime import datetime
-from dotenv import load_dotenv
 import csv
+import argparse
+import sys
 
-def get_db_engine_vm():
-    load_dotenv()
-    user = os.getenv("DB_USER")
-    password = os.getenv("DB_PASSWORD")
-    host = os.getenv("DB_HOST")
-    dbname = os.getenv("DB_NAME", "postgres")
-    if not all([user, password, host]):
-        raise ValueError("Credenciais do banco não encontradas no arquivo .env")
-    return create_engine(f"postgresql+psycopg2://{user}:{password}@{host}/{dbname}?sslmode=require", echo=False)
-
-def process_and_load_chunk(df_chunk, connection, cnpjs_to_process):
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from backend.database import get_engine
+from scraper.services.cvm_download_cache import get_download_cache
+from etl_incremental import (
+    EtlManifest, ZIP_MEMBER, remote_fingerprint, download_with_hash, member_fingerprint, upsert_dataframe
+)
+
+# Chave natural de um documento IPE, usada pelo upsert do modo incremental
+IPE_UPSERT_KEY = ['company_cnpj', 'delivery_protocol']
+IPE_UPSERT_INDEX = 'ux_cvm_documents_natural_key'
+
+def process_and_load_chunk(df_chunk, connection, cnpjs_to_process, upsert=False):
     """
     Filtra, mapeia, transforma e carrega um chunk de dados.
+    Com `upsert=True` grava via ON CONFLICT na chave natural em vez de append.
+    Retorna o número de linhas enviadas ao banco.
     """
     df_chunk.columns = [col.lower() for col in df_chunk.columns]
     
     # Garante que a coluna de CNPJ exista antes de filtrar
     if 'cnpj_companhia' not in df_chunk.columns:
-        return # Se o chunk não tem a coluna, não há o que fazer
+        return 0 # Se o chunk não tem a coluna, não há o que fazer
 
     # Limpa a coluna CNPJ para fazer a correspondência
     df_chunk['cnpj_companhia'] = df_chunk['cnpj_companhia'].str.replace(r'\D', '', regex=True)
@@ -38,7 +41,7 @@ def process_and_load_chunk(df_chunk, connection, cnpjs_to_process):
 
     # Se o lote ficou vazio após o filtro, não há mais nada a fazer
     if df_chunk_filtered.empty:
-        return
+        return 0
 
     df_to_load = df_chunk_filtered.copy()
 
@@ -58,6 +61,10 @@ def process_and_load_chunk(df_chunk, connection, cnpjs_to_process):
     final_columns = list(column_mapping.values())
     df_final = df_to_load[[col for col in final_columns if col in df_to_load.columns]]
 
+    if upsert:
+        update_columns = [col for col in df_final.columns if col not in IPE_UPSERT_KEY]
+        return upsert_dataframe(connection, df_final, 'cvm_documents', IPE_UPSERT_KEY, update_columns)
+
     df_final.to_sql(
         'cvm_documents',
         connection, 
@@ -65,10 +72,11 @@ def process_and_load_chunk(df_chunk, connection, cnpjs_to_process):
         index=False, 
         method='multi'
     )
+    return len(df_final)
 
 def run_ipe_etl_pipeline():
     print("--- INICIANDO PIPELINE ETL OTIMIZADO PARA 'cvm_documents' ---")
-    engine = get_db_engine_vm()
+    engine = get_engine()
 
     # --- PASSO 1: Obter a lista de CNPJs de interesse ---
     try:
@@ -96,13 +104,12 @@ def run_ipe_etl_pipeline():
         print(f"--- Processando IPE para o ano: {ano} ---")
         try:
             url = f"https://dados.cvm.gov.br/dados/CIA_ABERTA/DOC/IPE/DADOS/ipe_cia_aberta_{ano}.zip"
-            response = requests.get(url, timeout=180)
-            if response.status_code != 200:
-                print(f"  -> Arquivo ZIP para o ano {ano} não encontrado (Status: {response.status_code}). Pulando.")
+            cached_zip = get_download_cache().fetch(url, timeout=180)
+            if cached_zip is None:
+                print(f"  -> Arquivo ZIP para o ano {ano} não encontrado (Status: 404). Pulando.")
                 continue
 
-            zip_buffer = io.BytesIO(response.content)
-            with zipfile.ZipFile(zip_buffer) as z:
+            with cached_zip.zip() as z:
                 for file_info in z.infolist():
                     if file_info.filename.endswith('.csv'):
                         print(f"  -> Processando arquivo: {file_info.filename}...")
@@ -141,5 +148,121 @@ def run_ipe_etl_pipeline():
 
     print("--- CARGA COMPLETA E OTIMIZADA PARA 'cvm_documents' CONCLUÍDA! ---")
 
+def ensure_ipe_upsert_index(engine):
+    """
+    Índice único exigido pelo ON CONFLICT do modo incremental. As cargas
+    completas antigas podem ter deixado o mesmo documento (CNPJ + protocolo)
+    em mais de uma linha, o que impede a criação do índice: antes de criá-lo,
+    fica só a linha carregada por último (maior id) de cada documento.
+    """
+    key_columns = ', '.join(IPE_UPSERT_KEY)
+    with engine.begin() as connection:
+        indexes = {index['name'] for index in inspect(connection).get_indexes('cvm_documents')}
+        if IPE_UPSERT_INDEX in indexes:
+            return
+
+        same_key = ' AND '.join(f"newer.{col} = cvm_documents.{col}" for col in IPE_UPSERT_KEY)
+        deleted = connection.execute(text(f"""
+            DELETE FROM cvm_documents
+            WHERE EXISTS (
+                SELECT 1 FROM cvm_documents AS newer
+                WHERE {same_key} AND newer.id > cvm_documents.id
+            )
+        """)).rowcount
+        if deleted:
+            print(f"  -> {deleted} linhas repetidas de cvm_documents removidas antes de criar o índice único.")
+
+        try:
+            connection.execute(text(f"CREATE UNIQUE INDEX {IPE_UPSERT_INDEX} ON cvm_documents ({key_columns});"))
+        except SQLAlchemyError as e:
+            raise RuntimeError(
+                f"Não foi possível criar o índice único {IPE_UPSERT_INDEX} em cvm_documents ({key_columns}), "
+                f"exigido pelo modo incremental. Verifique documentos repetidos por ({key_columns}). "
+                f"Detalhes: {str(e)[:200]}"
+            ) from e
+
+def load_ipe_member_incrementally(engine, manifest, source_file, z, file_info, company_cnpjs_set, batch_size=20000):
+    """Carrega um CSV do zip IPE em lotes, com checkpoint por lote no manifesto."""
+    fingerprint = member_fingerprint(file_info)
+    if manifest.is_complete(source_file, file_info.filename, fingerprint):
+        print(f"  -> {file_info.filename} inalterado. Pulando.")
+        return
+
+    start_batch = manifest.resume_chunk(source_file, file_info.filename, fingerprint, batch_size)
+    if start_batch:
+        print(f"  -> Retomando {file_info.filename} a partir do lote {start_batch}...")
+    else:
+        manifest.start(source_file, file_info.filename, fingerprint, batch_size)
+        print(f"  -> Processando arquivo: {file_info.filename}...")
+
+    with z.open(file_info.filename) as f:
+        reader = pd.read_csv(f, sep=';', encoding='latin-1', dtype=str, chunksize=batch_size)
+        for batch_index, df_chunk in enumerate(reader):
+            if batch_index < start_batch:
+                continue
+            # Dados e checkpoint na mesma transação: uma queda não perde nem duplica lotes
+            with engine.begin() as connection:
+                rows = process_and_load_chunk(df_chunk, connection, company_cnpjs_set, upsert=True)
+                manifest.checkpoint(connection, source_file, file_info.filename, fingerprint, batch_index, rows)
+
+    manifest.mark_complete(source_file, file_info.filename, fingerprint)
+
+def run_ipe_incremental_pipeline():
+    """
+    Versão incremental do pipeline IPE: sem TRUNCATE, só baixa e processa os
+    zips/CSVs cujo fingerprint mudou e retoma do último lote confirmado.
+    """
+    print("--- INICIANDO PIPELINE ETL INCREMENTAL PARA 'cvm_documents' ---")
+    engine = get_engine()
+
+    try:
+        with engine.connect() as connection:
+            result = connection.execute(text("SELECT cnpj FROM companies;"))
+            company_cnpjs_set = {row[0] for row in result}
+        print(f"Encontradas {len(company_cnpjs_set)} empresas na tabela 'companies' para processar.")
+    except SQLAlchemyError as e:
+        print(f"ERRO CRÍTICO: Não foi possível ler a tabela 'companies'. Detalhes: {e}")
+        return
+
+    manifest = EtlManifest(engine)
+    manifest.ensure_table()
+    ensure_ipe_upsert_index(engine)
+
+    for ano in range(2010, datetime.now().year + 1):
+        source_file = f"ipe_cia_aberta_{ano}.zip"
+        url = f"https://dados.cvm.gov.br/dados/CIA_ABERTA/DOC/IPE/DADOS/{source_file}"
+        try:
+            remote = remote_fingerprint(url)
+            if remote is None:
+                print(f"  -> Arquivo ZIP para o ano {ano} não encontrado. Pulando.")
+                continue
+            if manifest.is_complete(source_file, ZIP_MEMBER, remote):
+                print(f"--- IPE {ano} inalterado desde a última carga. Pulando. ---")
+                continue
+
+            print(f"--- Processando IPE para o ano: {ano} ---")
+            downloaded = download_with_hash(url)
+            if downloaded is None:
+                continue
+            zip_tmp, fingerprint = downloaded
+            with zip_tmp:
+                if not manifest.is_complete(source_file, ZIP_MEMBER, fingerprint):
+                    with zipfile.ZipFile(zip_tmp) as z:
+                        for file_info in z.infolist():
+                            if file_info.filename.endswith('.csv'):
+                                load_ipe_member_incrementally(engine, manifest, source_file, z, file_info, company_cnpjs_set)
+                manifest.mark_complete(source_file, ZIP_MEMBER, fingerprint)
+        except Exception as e:
+            print(f"  -> ERRO no processamento do ano {ano}: {e}. O próximo run retoma do último lote confirmado.")
+
+    print("--- CARGA INCREMENTAL PARA 'cvm_documents' CONCLUÍDA! ---")
+
 if __name__ == "__main__":
-    run_ipe_etl_pipeline()
+    parser = argparse.ArgumentParser(description="ETL de documentos IPE da CVM para 'cvm_documents'.")
+    parser.add_argument("--incremental", action="store_true",
+                        help="Carga incremental e retomável (sem TRUNCATE).")
+    args = parser.parse_args()
+    if args.incremental:
+        run_ipe_incremental_pipeline()
+    else:
+        run_ipe_etl_pipeline()
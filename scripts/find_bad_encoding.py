@@ -1,20 +1,9 @@
 # scripts/find_bad_encoding.py
 import os
-from dotenv import load_dotenv
-import psycopg2
 import sys
 
-def get_db_connection_string():
-    """Lê as credenciais do .env e cria uma string de conexão para o RDS."""
-    load_dotenv()
-    user = os.getenv("DB_USER")
-    password = os.getenv("DB_PASSWORD")
-    host = os.getenv("DB_HOST")
-    dbname = os.getenv("DB_NAME", "postgres")
-    if not all([user, password, host, dbname]):
-        raise ValueError("Credenciais do banco de dados não encontradas.")
-    
-    return f"postgresql://{user}:{password}@{host}/{dbname}?sslmode=require"
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from backend.database import get_engine
 
 def find_bad_encoding_company():
     """Conecta ao DB e itera sobre a tabela 'companies' para encontrar erros de codificação."""
@@ -24,19 +13,17 @@ def find_bad_encoding_company():
     cur = None
     
     try:
-        # Conecta ao DB com a codificação padrão (UTF-8)
-        conn = psycopg2.connect(get_db_connection_string())
-        cur = conn.cursor()
+        # Conexão do pool compartilhado, com a codificação padrão (UTF-8)
+        conn = get_engine().raw_connection()
+        # Cursor no servidor: a tabela é lida em lotes, não inteira na memória
+        cur = conn.cursor(name='find_bad_encoding')
+        cur.itersize = 2000
         
         print("Executando query: SELECT cnpj, name FROM companies;")
         cur.execute("SELECT cnpj, name FROM companies;")
         
         row_count = 0
-        while True:
-            row = cur.fetchone()
-            if row is None:
-                break
-            
+        for row in cur:
             row_count += 1
             cnpj, name = row
             
@@ -1,24 +1,13 @@
 import os
+import sys
 import pandas as pd
 import requests
 import zipfile
 import io
-from dotenv import load_dotenv
 from datetime import datetime
-import psycopg2
-
-def get_db_connection_string():
-    """Lê as credenciais do .env e cria uma string de conexão para o RDS."""
-    load_dotenv()
-    user = os.getenv("DB_USER")
-    password = os.getenv("DB_PASSWORD")
-    host = os.getenv("DB_HOST")
-    dbname = os.getenv("DB_NAME", "postgres")
-    if not all([user, password, host, dbname]):
-        raise ValueError("Credenciais do banco (DB_USER, DB_PASSWORD, DB_HOST, DB_NAME) não encontradas.")
-    
-    # Retorna a string de conexão base, sem forçar codificação.
-    return f"postgresql://{user}:{password}@{host}/{dbname}?sslmode=require"
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from backend.database import get_engine
 
 def run_company_list_pipeline():
     """
@@ -27,7 +16,6 @@ def run_company_list_pipeline():
     """
     print("--- INICIANDO PIPELINE DE CARGA DE EMPRESAS E TICKERS ---")
     
-    base_connection_str = get_db_connection_string()
     conn = None
     cur = None
 
@@ -62,9 +50,9 @@ def run_company_list_pipeline():
 
         print("Carregando dados nas tabelas companies e tickers...")
         
-        # PASSO 2: Conectar ao DB UTF-8 da maneira padrão.
+        # PASSO 2: Conexão do pool compartilhado, no DB UTF-8 da maneira padrão.
         # O psycopg2 irá, por padrão, lidar com a conversão das strings Python para UTF-8.
-        conn = psycopg2.connect(base_connection_str)
+        conn = get_engine().raw_connection()
         cur = conn.cursor()
 
         for index, row in df_filtrado.iterrows():
@@ -1,19 +1,9 @@
 # scripts/migrate_schema.py
 import os
-from dotenv import load_dotenv
-import psycopg2
+import sys
 
-def get_db_connection_string():
-    """Lê as credenciais do .env e cria uma string de conexão."""
-    load_dotenv()
-    user = os.getenv("DB_USER")
-    password = os.getenv("DB_PASSWORD")
-    host = os.getenv("DB_HOST")
-    dbname = os.getenv("DB_NAME", "postgres")
-    if not all([user, password, host, dbname]):
-        raise ValueError("Credenciais do banco não encontradas.")
-    
-    return f"postgresql://{user}:{password}@{host}/{dbname}?sslmode=require"
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from backend.database import get_engine
 
 def run_migration():
     """Executa os comandos SQL para padronizar o esquema do banco de dados."""
@@ -67,7 +57,7 @@ def run_migration():
     conn = None
     cur = None
     try:
-        conn = psycopg2.connect(get_db_connection_string())
+        conn = get_engine().raw_connection()
         cur = conn.cursor()
         
         print("Executando migrações...")
@@ -1,33 +1,21 @@
 # scripts/populate_companies.py
 import os
 import sys
-from dotenv import load_dotenv
-from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
 
 # Adiciona a pasta 'scraper' e a raiz ao path para importações
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'scraper')))
+from backend.database import get_engine
 
 from scraper.services.company_list_scraper import CompanyListScraper
 from scraper.models import Company # Importa o modelo do esquema que criamos
 
-def get_db_connection_string():
-    """Lê as credenciais do .env na raiz."""
-    load_dotenv(dotenv_path=os.path.join(os.path.dirname(__file__), '..', '.env'))
-    user = os.getenv("DB_USER")
-    password = os.getenv("DB_PASSWORD")
-    host = os.getenv("DB_HOST")
-    dbname = os.getenv("DB_NAME", "postgres")
-    if not all([user, password, host, dbname]):
-        raise ValueError("Credenciais do banco de dados não encontradas.")
-    return f"postgresql+psycopg2://{user}:{password}@{host}/{dbname}?sslmode=require"
-
 def run_etl():
     """Executa o ETL para popular a tabela 'companies'."""
     print("--- INICIANDO ETL DE COMPANHIAS (BASEADO NO SCRAPER) ---")
     
-    engine = create_engine(get_db_connection_string())
+    engine = get_engine()
     Session = sessionmaker(bind=engine)
     session = Session()
 
@@ -1,31 +1,20 @@
 # scripts/populate_companies_from_scraper.py
 import os
 import sys
-from dotenv import load_dotenv
-from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
 
 # Adiciona a pasta 'scraper' ao path para importar seus módulos de serviço
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'scraper')))
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from backend.database import get_engine
 
 from services.company_list_scraper import B3CompanyListScraper # Importa a lógica do scraper
 from models import Company # Importa a definição do modelo
 
-def get_db_connection_string():
-    # ... (lógica para obter a string de conexão do .env da raiz)
-    load_dotenv(dotenv_path=os.path.join(os.path.dirname(__file__), '..', '.env'))
-    user = os.getenv("DB_USER")
-    password = os.getenv("DB_PASSWORD")
-    host = os.getenv("DB_HOST")
-    dbname = os.getenv("DB_NAME", "postgres")
-    if not all([user, password, host, dbname]):
-        raise ValueError("Credenciais do banco não encontradas.")
-    return f"postgresql+psycopg2://{user}:{password}@{host}/{dbname}?sslmode=require"
-
 def run_etl():
     print("--- INICIANDO ETL DE COMPANHIAS USANDO A LÓGICA DO SCRAPER ---")
     
-    engine = create_engine(get_db_connection_string())
+    engine = get_engine()
     Session = sessionmaker(bind=engine)
     session = Session()
 
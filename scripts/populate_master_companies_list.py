@@ -5,25 +5,13 @@ import pandas as pd
 import requests
 import zipfile
 import io
-from dotenv import load_dotenv
-from sqlalchemy import create_engine, text
-from sqlalchemy.orm import sessionmaker
 from datetime import datetime
 
 # Adiciona a pasta 'scraper' ao path para importar o modelo de dados
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'scraper')))
-from models import Base, Company
-
-def get_db_connection_string():
-    """Lê as credenciais do .env na raiz do projeto."""
-    load_dotenv(dotenv_path=os.path.join(os.path.dirname(__file__), '..', '.env'))
-    user = os.getenv("DB_USER")
-    password = os.getenv("DB_PASSWORD")
-    host = os.getenv("DB_HOST")
-    dbname = os.getenv("DB_NAME", "postgres")
-    if not all([user, password, host, dbname]):
-        raise ValueError("Credenciais do banco de dados não encontradas.")
-    return f"postgresql+psycopg2://{user}:{password}@{host}/{dbname}?sslmode=require"
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from backend.database import get_engine
+from build_master_list import build_master_frame, load_master_list
 
 def get_reference_tickers():
     """Carrega apenas o conjunto de tickers da lista de referência."""
@@ -481,9 +469,7 @@ def run_etl():
     """Orquestra o processo de ETL para criar a lista mestra de empresas."""
     print("--- INICIANDO ETL DA LISTA MESTRA DE EMPRESAS (VERSÃO PROFISSIONAL) ---")
     
-    engine = create_engine(get_db_connection_string())
-    Session = sessionmaker(bind=engine)
-    session = Session()
+    engine = get_engine()
 
     try:
         # FASE 1: EXTRAÇÃO
@@ -494,62 +480,28 @@ def run_etl():
             print("Não foi possível obter os dados da CVM. Abortando.")
             return
 
-        # FASE 2: TRANSFORMAÇÃO (ENRIQUECIMENTO)
+        # FASE 2: TRANSFORMAÇÃO (ENRIQUECIMENTO), vetorizada em build_master_list
         print("Enriquecendo dados com informações da CVM...")
-        
-        df_fca_filtered = df_fca[df_fca['CODIGO_NEGOCIACAO'].str.upper().isin(reference_tickers)].copy()
-        
-        df_merged = pd.merge(
-            df_cad,
-            df_fca_filtered[['CNPJ_CIA', 'CODIGO_NEGOCIACAO']],
-            on='CNPJ_CIA',
-            how='inner'
-        )
-        
-        print("Agrupando tickers por empresa...")
-        agg_funcs = {
-            'CODIGO_NEGOCIACAO': (lambda x: sorted(list(x.unique()))),
-            'DENOM_SOCIAL': 'first',
-            'CD_CVM': 'first',
-            'SETOR_ATIV': 'first',
-            'ATIV_PRINC': 'first',
-            'PAG_WEB': 'first'
-        }
-        df_final_agg = df_merged.groupby('CNPJ_CIA').agg(agg_funcs).reset_index()
+        df_cad = df_cad.rename(columns={'CNPJ_CIA': 'cnpj', 'DENOM_SOCIAL': 'company_name', 'CD_CVM': 'cvm_code',
+                                        'SETOR_ATIV': 'b3_sector', 'ATIV_PRINC': 'main_activity',
+                                        'PAG_WEB': 'website', 'SIT': 'status'})
+        df_fca = df_fca.rename(columns={'CNPJ_CIA': 'cnpj', 'CODIGO_NEGOCIACAO': 'ticker'})
+        df_final = build_master_frame(df_cad, df_fca, reference_tickers, active_only=False)
 
-        print(f"{len(df_final_agg)} empresas únicas foram encontradas e enriquecidas.")
+        print(f"{len(df_final)} empresas únicas foram encontradas e enriquecidas.")
+        if df_final.empty:
+            print("Nenhuma empresa para carregar. A tabela 'companies' não foi alterada.")
+            return
 
-        # FASE 3: CARGA
-        print("Limpando a tabela 'companies' (e tabelas dependentes)...")
-        session.execute(text("TRUNCATE TABLE public.companies RESTART IDENTITY CASCADE;"))
-        
-        print(f"Populando a tabela 'companies' com {len(df_final_agg)} registros...")
-        
-        companies_to_load = []
-        for _, row in df_final_agg.iterrows():
-            companies_to_load.append({
-                'cnpj': row['CNPJ_CIA'],
-                'cvm_code': int(row['CD_CVM']),
-                'company_name': row['DENOM_SOCIAL'],
-                'trade_name': row['DENOM_SOCIAL'],
-                'is_b3_listed': True,
-                'tickers': row['CODIGO_NEGOCIACAO'],
-                'b3_sector': row.get('SETOR_ATIV'),
-                'main_activity': row.get('ATIV_PRINC'),
-                'website': row.get('PAG_WEB')
-            })
-        
-        if companies_to_load:
-            session.bulk_insert_mappings(Company, companies_to_load)
+        # FASE 3: CARGA (upsert por CNPJ, sem TRUNCATE ... CASCADE)
+        print(f"Mesclando {len(df_final)} registros na tabela 'companies'...")
+        with engine.begin() as connection:
+            sent, delisted = load_master_list(connection, df_final)
 
-        session.commit()
-        print("🎉 Tabela 'companies' populada com sucesso!")
+        print(f"🎉 Tabela 'companies' atualizada: {sent} empresas mescladas, {delisted} fora da lista desmarcadas.")
 
     except Exception as e:
         print(f"❌ ERRO durante o ETL: {e}")
-        session.rollback()
-    finally:
-        session.close()
 
 if __name__ == "__main__":
     run_etl()
@@ -1,11 +1,11 @@
 # scripts/refactor_schema.py
 import os
 import sys
-from sqlalchemy import create_engine, inspect, text, BigInteger, Text, JSON, String
+from sqlalchemy import inspect, text, BigInteger, Text, JSON, String
 import logging
 
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
-from scraper.config import DATABASE_URL
+from backend.database import get_engine
 from scraper.models import Base
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -17,7 +17,7 @@ def update_database_schema():
     """
     logger.info("Iniciando a verificação e atualização completa do esquema do banco de dados...")
     
-    engine = create_engine(DATABASE_URL)
+    engine = get_engine()
     inspector = inspect(engine)
     
     # 1. Criação de Novas Tabelas
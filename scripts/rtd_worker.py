@@ -1,111 +1,466 @@
+"""
+Worker RTD: publica em `realtime_quotes` as cotações do MetaTrader 5 para
+os ativos de `portfolio_config`.
+
+- O conjunto de tickers fica em memória e só é relido quando a carteira
+  muda: um trigger em `portfolio_config` dispara `NOTIFY` e o worker acorda
+  na hora (LISTEN). Sem permissão para criar o trigger, ou fora do
+  PostgreSQL, a tabela é relida a cada CONFIG_POLL_SECONDS.
+- A fonte de cotações fica atrás de `QuoteSource`: `MT5QuoteSource` faz o
+  `symbol_select` uma vez por ativo e guarda o fechamento anterior por dia
+  (só depois que a barra diária de hoje existe), de modo que cada ciclo é
+  uma única passada de `symbol_info_tick`.
+  `FakeMT5Terminal` substitui o terminal em testes e benchmarks (`--fake`).
+- Só os ativos cujo preço mudou desde o último envio são gravados, com um
+  único `INSERT ... ON CONFLICT` parametrizado (`execute_values` no
+  PostgreSQL, `executemany` nos demais), sem tabela temporária.
+- Com `--redis-url` (ou REDIS_URL), os preços alterados também avançam os
+  estados incrementais de indicadores técnicos (`IndicatorStateStore`) já
+  semeados pela API, e os checkpoints no Redis ficam frescos para os
+  workers da API.
+"""
+import argparse
 import os
+import random
+import select
 import sys
 import time
-import pandas as pd
-import MetaTrader5 as mt5
-from sqlalchemy import create_engine, text
+from abc import ABC, abstractmethod
+from datetime import date, datetime, timedelta, timezone
+from types import SimpleNamespace
+from typing import Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+from sqlalchemy import text
 from dotenv import load_dotenv
 
-# --- 1. CONFIGURAÇÃO E INICIALIZAÇÃO ---
-print("--- Iniciando Worker RTD na VM ---")
-load_dotenv()
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from backend.database import get_engine
 
 # Define a região da AWS onde seus recursos estão
 AWS_REGION = "sa-east-1"  # Região de São Paulo
 PAUSE_INTERVAL_SECONDS = 15
 RETRY_DELAY_SECONDS = 60
+CONFIG_POLL_SECONDS = 60
+CONFIG_CHANNEL = 'portfolio_config_changed'
+
+CONFIG_TRIGGER_DDL = f"""
+CREATE OR REPLACE FUNCTION notify_portfolio_config_changed() RETURNS trigger AS $$
+BEGIN
+    PERFORM pg_notify('{CONFIG_CHANNEL}', '');
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS {CONFIG_CHANNEL} ON portfolio_config;
+CREATE TRIGGER {CONFIG_CHANNEL}
+    AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON portfolio_config
+    FOR EACH STATEMENT EXECUTE PROCEDURE notify_portfolio_config_changed();
+"""
+
+UPSERT_SQL = """
+    INSERT INTO realtime_quotes (ticker, last_price, previous_close)
+    VALUES {values}
+    ON CONFLICT (ticker) DO UPDATE
+    SET last_price = EXCLUDED.last_price,
+        previous_close = EXCLUDED.previous_close,
+        updated_at = CURRENT_TIMESTAMP
+"""
+
+Quote = Tuple[float, float]  # (last_price, previous_close)
+
+
+# --- FONTES DE COTAÇÃO ---
+
+class QuoteSource(ABC):
+    """Interface das fontes de cotação do worker."""
+
+    @abstractmethod
+    def ensure_connected(self) -> bool:
+        """Garante a conexão com a fonte; False se não foi possível."""
+
+    @abstractmethod
+    def prepare(self, tickers: Set[str]):
+        """Chamado quando o conjunto de tickers muda."""
+
+    @abstractmethod
+    def read_ticks(self, tickers: Iterable[str]) -> Dict[str, Quote]:
+        """Lê a cotação atual de todos os tickers em uma passada."""
+
+    def shutdown(self):
+        pass
+
+
+def bar_date(rate) -> date:
+    """Data de uma barra D1 do MT5 (`time` em segundos no horário do servidor)."""
+    return datetime.fromtimestamp(int(rate['time']), timezone.utc).date()
+
+
+class MT5QuoteSource(QuoteSource):
+    """Cotações do terminal MetaTrader 5 (o módulo `MetaTrader5` ou um substituto com a mesma API)."""
+
+    def __init__(self, terminal=None, login: Optional[int] = None, password: Optional[str] = None,
+                 server: Optional[str] = None):
+        if terminal is None:
+            import MetaTrader5 as terminal
+        self.mt5 = terminal
+        self.credentials = {'login': login, 'password': password, 'server': server}
+        self.selected: Set[str] = set()
+        self._tickers: Set[str] = set()
+        self._previous_close: Dict[str, float] = {}
+        self._closes_day: Optional[date] = None
+
+    def ensure_connected(self) -> bool:
+        if self.mt5.terminal_info():
+            return True
+        print(f"[{time.ctime()}] Conexão com MT5 indisponível. Tentando (re)conectar...")
+        self.mt5.shutdown()
+        if not self.mt5.initialize(**{k: v for k, v in self.credentials.items() if v is not None}):
+            print(f"   -> Falha ao inicializar o MT5: {self.mt5.last_error()}")
+            return False
+        # Após reconectar, os símbolos precisam ser selecionados de novo no Market Watch
+        self.selected.clear()
+        self.prepare(self._tickers)
+        return True
+
+    def prepare(self, tickers: Set[str]):
+        self._tickers = set(tickers)
+        for ticker in tickers - self.selected:
+            if self.mt5.symbol_select(ticker, True):
+                self.selected.add(ticker)
+        self.selected &= set(tickers)
+
+    def read_ticks(self, tickers: Iterable[str]) -> Dict[str, Quote]:
+        today = date.today()
+        if today != self._closes_day:
+            # O fechamento anterior só muda de um pregão para o outro
+            self._previous_close.clear()
+            self._closes_day = today
+
+        quotes = {}
+        for ticker in tickers:
+            if ticker not in self.selected:
+                continue
+            tick = self.mt5.symbol_info_tick(ticker)
+            if not tick or tick.last <= 0:
+                continue
+            previous_close = self._previous_close.get(ticker)
+            if previous_close is None:
+                rates = self.mt5.copy_rates_from_pos(ticker, self.mt5.TIMEFRAME_D1, 0, 2)
+                if rates is None or len(rates) == 0:
+                    continue
+                if bar_date(rates[-1]) == today:
+                    if len(rates) <= 1:
+                        continue
+                    previous_close = self._previous_close[ticker] = float(rates[0]['close'])
+                else:
+                    # Antes do primeiro negócio do dia a barra mais recente é a do pregão
+                    # anterior: ela é o fechamento, e nada é guardado até a de hoje existir
+                    previous_close = float(rates[-1]['close'])
+            quotes[ticker] = (float(tick.last), previous_close)
+        return quotes
+
+    def shutdown(self):
+        self.mt5.shutdown()
+
+
+class FakeMT5Terminal:
+    """
+    Substituto local do módulo `MetaTrader5`: preços em passeio aleatório,
+    uma fração `change_rate` dos ativos muda a cada leitura e cada chamada
+    custa `latency_ms` (simula a chamada ao terminal). Com `today_bar` falso
+    ainda não há barra diária de hoje (antes do primeiro negócio do dia).
+    """
+    TIMEFRAME_D1 = 16408
+
+    def __init__(self, change_rate: float = 0.3, latency_ms: float = 0.0, seed: int = 42):
+        self.change_rate = change_rate
+        self.latency = latency_ms / 1000
+        self.rng = random.Random(seed)
+        self.prices: Dict[str, float] = {}
+        self.calls = 0
+        self.today_bar = True
+
+    def _call(self):
+        self.calls += 1
+        if self.latency:
+            time.sleep(self.latency)
+
+    def initialize(self, **kwargs):
+        return True
+
+    def terminal_info(self):
+        return True
+
+    def shutdown(self):
+        pass
+
+    def last_error(self):
+        return (0, 'ok')
+
+    def symbol_select(self, ticker, enable=True):
+        self._call()
+        self.prices.setdefault(ticker, round(self.rng.uniform(5, 100), 2))
+        return True
+
+    def symbol_info_tick(self, ticker):
+        self._call()
+        if ticker not in self.prices:
+            return None
+        if self.rng.random() < self.change_rate:
+            self.prices[ticker] = round(self.prices[ticker] * (1 + self.rng.uniform(-0.005, 0.005)), 2)
+        return SimpleNamespace(last=self.prices[ticker])
+
+    def copy_rates_from_pos(self, ticker, timeframe, start, count):
+        self._call()
+        close = self.prices.get(ticker, 10.0)
+        today = date.today()
+        bars = [
+            {'time': self._epoch(today - timedelta(days=2)), 'close': round(close * 0.98, 2)},
+            {'time': self._epoch(today - timedelta(days=1)), 'close': round(close * 0.99, 2)},
+            {'time': self._epoch(today), 'close': close},
+        ]
+        if not self.today_bar:
+            bars.pop()
+        return bars[-count:]
+
+    @staticmethod
+    def _epoch(day: date) -> int:
+        return int(datetime(day.year, day.month, day.day, tzinfo=timezone.utc).timestamp())
+
+
+# --- BANCO DE DADOS ---
+
+class PortfolioConfigWatcher:
+    """Conjunto de tickers da carteira, relido só quando `portfolio_config` muda."""
+
+    def __init__(self, engine, poll_seconds: float = CONFIG_POLL_SECONDS):
+        self.engine = engine
+        self.poll_seconds = poll_seconds
+        self._listen_conn = None
+        self._last_poll = time.monotonic()
+
+    def load(self) -> Set[str]:
+        with self.engine.connect() as conn:
+            return {row[0] for row in conn.execute(text("SELECT ticker FROM portfolio_config"))}
+
+    def start(self):
+        """Instala o trigger de NOTIFY e passa a escutar o canal (apenas PostgreSQL)."""
+        if self.engine.dialect.name != 'postgresql':
+            print(f"   -> Banco sem LISTEN/NOTIFY: carteira relida a cada {self.poll_seconds}s.")
+            return
+        try:
+            with self.engine.begin() as conn:
+                conn.execute(text(CONFIG_TRIGGER_DDL))
+            self._listen()
+            print(f"   -> Escutando alterações da carteira no canal '{CONFIG_CHANNEL}'.")
+        except Exception as e:
+            print(f"   -> LISTEN/NOTIFY indisponível ({e}); carteira relida a cada {self.poll_seconds}s.")
+            self._listen_conn = None
+
+    def _listen(self):
+        raw = self.engine.raw_connection()
+        dbapi_conn = raw.driver_connection
+        dbapi_conn.autocommit = True
+        dbapi_conn.cursor().execute(f"LISTEN {CONFIG_CHANNEL}")
+        self._listen_conn = raw
+
+    def wait(self, timeout: float) -> bool:
+        """Espera até `timeout` segundos; True se a carteira mudou (ou precisa ser relida)."""
+        if self._listen_conn is None:
+            time.sleep(timeout)
+            if time.monotonic() - self._last_poll >= self.poll_seconds:
+                self._last_poll = time.monotonic()
+                return True
+            return False
+
+        dbapi_conn = self._listen_conn.driver_connection
+        try:
+            if select.select([dbapi_conn], [], [], timeout) == ([], [], []):
+                return False
+            dbapi_conn.poll()
+            changed = bool(dbapi_conn.notifies)
+            dbapi_conn.notifies.clear()
+            return changed
+        except Exception as e:
+            # Conexão de escuta caiu: reabre e força uma releitura
+            print(f"[{time.ctime()}] Conexão LISTEN perdida ({e}). Reabrindo...")
+            try:
+                self._listen_conn.invalidate()
+                self._listen()
+            except Exception:
+                self._listen_conn = None
+            return True
+
+
+class RealtimeQuoteWriter:
+    """Upsert em lote em `realtime_quotes`."""
+
+    def __init__(self, engine):
+        self.engine = engine
+
+    def upsert(self, rows: List[dict]):
+        if not rows:
+            return
+        if self.engine.dialect.name == 'postgresql':
+            from psycopg2.extras import execute_values
+
+            raw = self.engine.raw_connection()
+            try:
+                with raw.cursor() as cursor:
+                    execute_values(
+                        cursor, UPSERT_SQL.format(values='%s'),
+                        [(row['ticker'], row['last_price'], row['previous_close']) for row in rows],
+                        page_size=1000,
+                    )
+                raw.commit()
+            finally:
+                raw.close()
+        else:
+            with self.engine.begin() as conn:
+                conn.execute(text(UPSERT_SQL.format(values='(:ticker, :last_price, :previous_close)')), rows)
+
+
+# --- WORKER ---
+
+class RTDWorker:
+    """Ciclo: lê as cotações, descarta as inalteradas e grava o restante em lote."""
+
+    def __init__(self, source: QuoteSource, config: PortfolioConfigWatcher, writer: RealtimeQuoteWriter,
+                 interval: float = PAUSE_INTERVAL_SECONDS,
+                 listeners: Iterable[Callable[[Dict[str, Quote]], None]] = ()):
+        self.source = source
+        self.config = config
+        self.writer = writer
+        self.interval = interval
+        # Chamados com as cotações gravadas em cada ciclo (ex.: estados de indicadores)
+        self.listeners = list(listeners)
+        self.tickers: Set[str] = set()
+        self.last_pushed: Dict[str, Quote] = {}
+
+    def reload_tickers(self):
+        tickers = self.config.load()
+        if tickers != self.tickers:
+            print(f"[{time.ctime()}] Carteira com {len(tickers)} ativos.")
+        self.tickers = tickers
+        self.source.prepare(tickers)
+        # Ativos removidos saem do diff; se voltarem, são reenviados
+        self.last_pushed = {t: q for t, q in self.last_pushed.items() if t in tickers}
+
+    def run_cycle(self) -> dict:
+        quotes = self.source.read_ticks(sorted(self.tickers))
+        changed = {ticker: quote for ticker, quote in quotes.items() if self.last_pushed.get(ticker) != quote}
+        self.writer.upsert([
+            {'ticker': ticker, 'last_price': last_price, 'previous_close': previous_close}
+            for ticker, (last_price, previous_close) in changed.items()
+        ])
+        # Só depois de gravado: uma falha no upsert faz o próximo ciclo reenviar
+        self.last_pushed.update(changed)
+        for listener in self.listeners:
+            try:
+                listener(changed)
+            except Exception as e:
+                print(f"[{time.ctime()}] Erro ao repassar cotações: {e}")
+        return {'read': len(quotes), 'written': len(changed)}
+
+    def run(self):
+        print(f"\n--- Worker iniciado. Buscando cotações a cada {self.interval} segundos. ---\n")
+        self.config.start()
+        self.reload_tickers()
+        while True:
+            started = time.monotonic()
+            try:
+                if not self.source.ensure_connected():
+                    time.sleep(RETRY_DELAY_SECONDS)
+                    continue
+
+                if not self.tickers:
+                    print(f"[{time.ctime()}] Nenhum ativo na 'portfolio_config'. Insira ativos pelo DBeaver para começar.")
+                else:
+                    stats = self.run_cycle()
+                    if stats['written']:
+                        print(f"[{time.ctime()}] Preços atualizados para {stats['written']} de {stats['read']} ativos.")
+            except Exception as e:
+                print(f"\n[ERRO NO LOOP] {e}. Aguardando {RETRY_DELAY_SECONDS}s...")
+                time.sleep(RETRY_DELAY_SECONDS)
+
+            # Dorme até o próximo ciclo, acordando antes se a carteira mudar
+            if self.config.wait(max(0.0, self.interval - (time.monotonic() - started))):
+                self.reload_tickers()
+
+
+# --- CONFIGURAÇÃO E INICIALIZAÇÃO ---
+
+def create_db_engine(db_url: Optional[str] = None):
+    """Engine compartilhada do banco (AWS RDS por padrão, a partir do .env)."""
+    engine = get_engine(db_url)
+    with engine.connect():
+        pass
+    return engine
+
+
+def create_source(fake: bool) -> QuoteSource:
+    if fake:
+        return MT5QuoteSource(FakeMT5Terminal())
+    mt5_login = os.getenv("MT5_LOGIN")
+    mt5_password = os.getenv("MT5_PASSWORD")
+    mt5_server = os.getenv("MT5_SERVER")
+    if not all([mt5_login, mt5_password, mt5_server]):
+        raise ValueError("Credenciais do MT5 não foram encontradas no arquivo .env.")
+    return MT5QuoteSource(login=int(mt5_login), password=mt5_password, server=mt5_server)
+
+
+def create_indicator_listener(redis_url: str) -> Callable[[Dict[str, Quote]], None]:
+    """Alimenta os estados de indicadores com checkpoint no Redis (sem histórico do banco)"""
+    import redis
+    sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'scraper'))
+    from services.indicator_state import IndicatorStateStore
+
+    store = IndicatorStateStore(redis.Redis.from_url(redis_url))
+
+    def listener(changed: Dict[str, Quote]):
+        store.feed_many((ticker, last_price, None, None, None, None)
+                        for ticker, (last_price, _) in changed.items())
+
+    return listener
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Worker RTD: MetaTrader 5 -> realtime_quotes")
+    parser.add_argument('--fake', action='store_true', help="Usa o terminal MT5 simulado")
+    parser.add_argument('--db-url', help="URL SQLAlchemy (padrão: AWS RDS a partir do .env)")
+    parser.add_argument('--interval', type=float, default=PAUSE_INTERVAL_SECONDS)
+    parser.add_argument('--redis-url',
+                        help="Redis dos checkpoints de indicadores técnicos (opcional)")
+    args = parser.parse_args()
+
+    print("--- Iniciando Worker RTD na VM ---")
+    load_dotenv()
 
-def initialize_services():
-    """Conecta-se aos serviços e retorna a engine do banco."""
     print("--- Configurando Serviços ---")
-    
     try:
-        # --- Carregando credenciais do arquivo .env ---
-        print("1. Lendo credenciais do arquivo .env...")
-        db_user = os.getenv("DB_USER")
-        db_password = os.getenv("DB_PASSWORD")
-        db_host = os.getenv("DB_HOST")
-        db_name = os.getenv("DB_NAME", "postgres") # Usa 'postgres' como padrão
-        
-        mt5_login = int(os.getenv("MT5_LOGIN"))
-        mt5_password = os.getenv("MT5_PASSWORD")
-        mt5_server = os.getenv("MT5_SERVER")
-        
-        if not all([db_user, db_password, db_host, mt5_login, mt5_password, mt5_server]):
-            raise ValueError("Uma ou mais variáveis de ambiente não foram encontradas no arquivo .env.")
-        print("   -> Credenciais carregadas.")
-
-        # --- Conexão com o Banco de Dados (AWS RDS) ---
-        print("2. Conectando ao banco de dados AWS RDS PostgreSQL...")
-        db_url = f"postgresql+psycopg2://{db_user}:{db_password}@{db_host}/{db_name}?sslmode=require"
-        engine = create_engine(db_url)
-        with engine.connect():
-            pass
+        print("1. Conectando ao banco de dados...")
+        engine = create_db_engine(args.db_url)
         print("   -> Conexão com o banco de dados estabelecida.")
 
-        # --- Conexão com o MetaTrader 5 ---
-        print("3. Conectando ao MetaTrader 5...")
-        if not mt5.initialize(login=mt5_login, password=mt5_password, server=mt5_server):
-            raise ConnectionError(f"Falha ao inicializar o MT5: {mt5.last_error()}")
-        print("   -> Conexão com o MetaTrader 5 estabelecida.")
+        print("2. Conectando ao MetaTrader 5..." if not args.fake else "2. Usando terminal MT5 simulado...")
+        source = create_source(args.fake)
+        if not source.ensure_connected():
+            raise ConnectionError("Falha ao inicializar o MT5")
+        print("   -> Fonte de cotações pronta.")
 
+        listeners = []
+        redis_url = args.redis_url or os.getenv("REDIS_URL")
+        if redis_url:
+            print("3. Conectando ao Redis dos indicadores técnicos...")
+            listeners.append(create_indicator_listener(redis_url))
+            print("   -> Estados de indicadores serão atualizados a cada ciclo.")
         print("--- Todos os serviços foram iniciados com sucesso! ---")
-        return engine
-
     except Exception as e:
         print(f"\n[ERRO FATAL] Falha na inicialização: {e}")
         sys.exit(1)
 
-def main_worker(engine):
-    """Loop principal que busca e salva as cotações."""
-    print(f"\n--- Worker iniciado. Buscando cotações a cada {PAUSE_INTERVAL_SECONDS} segundos. ---\n")
-    while True:
-        try:
-            if not mt5.terminal_info():
-                print(f"[{time.ctime()}] Conexão com MT5 perdida. Tentando reconectar...")
-                mt5.shutdown()
-                initialize_services()
-                continue
-            
-            df_config = pd.read_sql("SELECT ticker FROM portfolio_config", engine)
-            if df_config.empty:
-                print(f"[{time.ctime()}] Nenhum ativo na 'portfolio_config'. Insira ativos pelo DBeaver para começar.")
-                time.sleep(PAUSE_INTERVAL_SECONDS)
-                continue
+    RTDWorker(source, PortfolioConfigWatcher(engine), RealtimeQuoteWriter(engine), args.interval, listeners).run()
 
-            quotes_to_upsert = []
-            for ticker in df_config['ticker']:
-                if not mt5.symbol_select(ticker, True): continue
-                tick = mt5.symbol_info_tick(ticker)
-                rates = mt5.copy_rates_from_pos(ticker, mt5.TIMEFRAME_D1, 0, 2)
-                if tick and tick.last > 0 and rates is not None and len(rates) > 1:
-                    quotes_to_upsert.append({
-                        "ticker": ticker,
-                        "last_price": tick.last,
-                        "previous_close": rates[0]['close']
-                    })
-            
-            if quotes_to_upsert:
-                df_quotes = pd.DataFrame(quotes_to_upsert)
-                with engine.connect() as conn:
-                    df_quotes.to_sql('temp_quotes', conn, if_exists='replace', index=False)
-                    upsert_sql = text("""
-                        INSERT INTO realtime_quotes (ticker, last_price, previous_close)
-                        SELECT ticker, last_price, previous_close FROM temp_quotes
-                        ON CONFLICT (ticker) DO UPDATE
-                        SET last_price = EXCLUDED.last_price, 
-                            previous_close = EXCLUDED.previous_close,
-                            updated_at = NOW();
-                    """)
-                    conn.execute(upsert_sql)
-                    conn.commit()
-                print(f"[{time.ctime()}] Preços atualizados para {len(quotes_to_upsert)} ativos.")
-        except Exception as e:
-            print(f"\n[ERRO NO LOOP] {e}. Aguardando {RETRY_DELAY_SECONDS}s...")
-            time.sleep(RETRY_DELAY_SECONDS)
-        
-        time.sleep(PAUSE_INTERVAL_SECONDS)
 
 if __name__ == "__main__":
-    db_engine = initialize_services()
-    main_worker(db_engine)
\ No newline at end of file
+    main()
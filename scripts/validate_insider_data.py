@@ -1,19 +1,10 @@
 # scripts/validate_insider_data.py
 import os
-from dotenv import load_dotenv
+import sys
 import pandas as pd
-from sqlalchemy import create_engine
 
-def get_db_connection_string():
-    """Lê as credenciais do .env e cria uma string de conexão SQLAlchemy."""
-    load_dotenv()
-    user = os.getenv("DB_USER")
-    password = os.getenv("DB_PASSWORD")
-    host = os.getenv("DB_HOST")
-    dbname = os.getenv("DB_NAME", "postgres")
-    if not all([user, password, host, dbname]):
-        raise ValueError("Credenciais do banco de dados não encontradas.")
-    return f"postgresql+psycopg2://{user}:{password}@{host}/{dbname}?sslmode=require"
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from backend.database import get_engine
 
 def print_header(title):
     print("" + "=" * 60)
@@ -25,7 +16,7 @@ def validate_insider_data():
     print_header("INICIANDO VALIDAÇÃO DOS DADOS DE INSIDERS")
     
     try:
-        engine = create_engine(get_db_connection_string())
+        engine = get_engine()
         with engine.connect() as connection:
             
             # --- Análise da Tabela `insider_transactions` ---